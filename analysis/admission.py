@@ -0,0 +1,236 @@
+"""
+Admission control for the expensive job paths (analyses and server renders).
+
+Two limits guard the job queue:
+
+- a queue depth limit: enqueue_analysis/enqueue_render call admit(), which
+  raises Saturated (served as 503 with Retry-After) once ANALYSIS_QUEUE_LIMIT
+  jobs are waiting, instead of piling more work onto the queue;
+- a bounded semaphore of ANALYSIS_MAX_CONCURRENT running jobs: tasks run
+  inside slot(); a task that finds every slot taken is deferred (retried
+  later) rather than kriging alongside the others.
+
+With a shared cache (Redis via CACHE_URL) both are counted across every web
+worker and Celery process. Slots are leases that expire after
+ANALYSIS_SLOT_LEASE seconds, so a killed worker cannot hold one forever, and
+the queue counter expires ANALYSIS_QUEUE_TTL seconds after it was started,
+so counts leaked by lost jobs are forgotten.
+
+With a process-local cache the same limits are kept per process by
+LocalAdmission (system check analysis.W002): each web worker admits at most
+ANALYSIS_QUEUE_LIMIT jobs per ANALYSIS_QUEUE_TTL and each Celery process runs
+at most ANALYSIS_MAX_CONCURRENT at once.
+"""
+import logging
+import math
+import random
+import threading
+import time
+import uuid
+from collections import deque
+from contextlib import contextmanager
+
+from django.conf import settings
+from django.core.cache import cache
+
+from . import metrics
+from .checks import shared_cache
+
+logger = logging.getLogger(__name__)
+
+SHARED = shared_cache()
+MAX_RUNNING = getattr(settings, 'ANALYSIS_MAX_CONCURRENT', 2)
+QUEUE_LIMIT = getattr(settings, 'ANALYSIS_QUEUE_LIMIT', 20)
+SLOT_LEASE = getattr(settings, 'ANALYSIS_SLOT_LEASE', 900)
+QUEUE_TTL = getattr(settings, 'ANALYSIS_QUEUE_TTL', 1800)
+# Typical duration of one job, used for Retry-After estimates
+JOB_SECONDS = getattr(settings, 'ANALYSIS_JOB_SECONDS', 20)
+MAX_RETRY_AFTER = 300
+
+ADMISSION_PREFIX = 'admission'
+QUEUE_KEY = f"{ADMISSION_PREFIX}:queued"
+
+
+class Saturated(Exception):
+    """Raised when a job cannot be admitted now; ``retry_after`` is in seconds."""
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class LocalAdmission:
+    """
+    Process-local queue counter and slot semaphore, standing in for the
+    shared cache. Queued jobs are remembered with their admission time and
+    forgotten after QUEUE_TTL, as the shared counter expires.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._queued = deque()
+        self._slots = {}
+
+    def _expire(self):
+        cutoff = time.monotonic() - QUEUE_TTL
+        while self._queued and self._queued[0] < cutoff:
+            self._queued.popleft()
+
+    def queue_depth(self):
+        with self._lock:
+            self._expire()
+            return len(self._queued)
+
+    def admit(self):
+        """Queue one job and return the new depth, or None if the queue is full."""
+        with self._lock:
+            self._expire()
+            if len(self._queued) >= QUEUE_LIMIT:
+                return None
+            self._queued.append(time.monotonic())
+            return len(self._queued)
+
+    def withdraw(self):
+        with self._lock:
+            if self._queued:
+                self._queued.popleft()
+
+    def running(self):
+        with self._lock:
+            return len(self._slots)
+
+    def acquire(self, token):
+        with self._lock:
+            for index in range(MAX_RUNNING):
+                if index not in self._slots:
+                    self._slots[index] = token
+                    return index, token
+        return None
+
+    def release(self, lease):
+        index, token = lease
+        with self._lock:
+            if self._slots.get(index) == token:
+                del self._slots[index]
+
+
+_local = LocalAdmission()
+
+
+def _slot_key(index):
+    return f"{ADMISSION_PREFIX}:slot:{index}"
+
+
+def queue_depth():
+    """Number of admitted jobs still waiting for a slot."""
+    if not SHARED:
+        return _local.queue_depth()
+    return max(cache.get(QUEUE_KEY, 0), 0)
+
+
+def running():
+    """Number of slots currently held."""
+    if not SHARED:
+        return _local.running()
+    return len(cache.get_many([_slot_key(index) for index in range(MAX_RUNNING)]))
+
+
+def retry_after(depth=None):
+    """Seconds until a job queued behind ``depth`` others is likely to start."""
+    depth = queue_depth() if depth is None else depth
+    waves = (depth + 1) / max(MAX_RUNNING, 1)
+    return max(1, min(MAX_RETRY_AFTER, math.ceil(waves * JOB_SECONDS)))
+
+
+def _count_in():
+    """Atomically count one more queued job and return the new depth."""
+    try:
+        return cache.incr(QUEUE_KEY)
+    except ValueError:
+        # No counter yet (or it expired): start one; its TTL runs from here
+        cache.add(QUEUE_KEY, 0, timeout=QUEUE_TTL)
+        return cache.incr(QUEUE_KEY)
+
+
+def _reject(depth):
+    metrics.incr('admission.rejected')
+    logger.warning(f"Rejected job: {depth} queued (limit {QUEUE_LIMIT}), {running()} running")
+    raise Saturated(f"Server busy: {depth} analysis jobs queued", retry_after(depth))
+
+
+def admit():
+    """Count one more queued job, or raise Saturated if the queue is full."""
+    if not SHARED:
+        if _local.admit() is None:
+            _reject(QUEUE_LIMIT)
+    else:
+        # Count first and compare after, so concurrent admits cannot overshoot
+        depth = _count_in()
+        if depth > QUEUE_LIMIT:
+            withdraw()
+            _reject(depth - 1)
+    metrics.incr('admission.admitted')
+
+
+def withdraw():
+    """Remove one job from the queue count (it started, or never got enqueued)."""
+    if not SHARED:
+        _local.withdraw()
+        return
+    try:
+        if cache.decr(QUEUE_KEY) < 0:
+            cache.set(QUEUE_KEY, 0, timeout=QUEUE_TTL)
+    except ValueError:
+        pass
+
+
+def acquire():
+    """Take a free slot and return its lease, or None if all are held."""
+    token = uuid.uuid4().hex
+    if not SHARED:
+        return _local.acquire(token)
+    for index in random.sample(range(MAX_RUNNING), MAX_RUNNING):
+        if cache.add(_slot_key(index), token, timeout=SLOT_LEASE):
+            return index, token
+    return None
+
+
+def release(lease):
+    if not SHARED:
+        _local.release(lease)
+        return
+    index, token = lease
+    key = _slot_key(index)
+    # Only drop our own lease; it may have expired and been taken over
+    if cache.get(key) == token:
+        cache.delete(key)
+
+
+@contextmanager
+def slot(queued=False):
+    """
+    Hold one of the ANALYSIS_MAX_CONCURRENT slots while running a job, or
+    raise Saturated with a jittered retry delay if none is free. ``queued``
+    jobs were counted by admit() and leave the queue once they get a slot.
+    """
+    lease = acquire()
+    if lease is None:
+        metrics.incr('admission.deferred')
+        raise Saturated("All analysis slots are busy", random.randint(1, max(1, JOB_SECONDS // 2)))
+    if queued:
+        withdraw()
+    try:
+        yield
+    finally:
+        release(lease)
+
+
+def status():
+    """Current queue depth, running jobs and limits for the metrics endpoint."""
+    return {
+        'scope': 'shared' if SHARED else 'process',
+        'queue_depth': queue_depth(),
+        'queue_limit': QUEUE_LIMIT,
+        'running': running(),
+        'max_running': MAX_RUNNING,
+    }
@@ -0,0 +1,275 @@
+"""
+Async variants of the hot read endpoints, served by weather_map.asgi_urls
+under an ASGI server. They answer from the async ORM and cache, so a worker
+is not held while the database or GeoServer responds; URLs and response
+bodies match the synchronous DRF views they stand in for.
+"""
+import asyncio
+import json
+import logging
+import math
+from datetime import datetime, timezone
+
+import aiohttp
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, JsonResponse
+from django.urls import reverse
+from django.utils.decorators import method_decorator
+from django.views import View
+from django.views.decorators.csrf import csrf_exempt
+
+from . import admission
+from .bundles import bundle_response, build_payload, current_bundle
+from .catalogue import SURFACE, UPPERAIR, aavailable_levels, aobservation_times
+from .domains import DomainError, resolve_domain
+from .grids import GRID_FIELDS, run_domains, sample_run
+from .jobs import enqueue_analysis
+from .runs import acurrent_run
+
+logger = logging.getLogger(__name__)
+
+GEOSERVER_URL = getattr(settings, 'GEOSERVER_URL', 'http://127.0.0.1:8081/geoserver')
+GEOSERVER_TIMEOUT = getattr(settings, 'GEOSERVER_TIMEOUT', 30)
+# Keep-alive connections to GeoServer shared by all requests of a worker
+GEOSERVER_POOL_SIZE = getattr(settings, 'GEOSERVER_POOL_SIZE', 64)
+
+CORS_HEADERS = {
+    'Access-Control-Allow-Origin': '*',
+    'Access-Control-Allow-Methods': 'GET, OPTIONS',
+    'Access-Control-Allow-Headers': 'Content-Type',
+}
+
+
+def _parse_time(value):
+    observation_time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+    return observation_time if observation_time.tzinfo else observation_time.replace(tzinfo=timezone.utc)
+
+
+class AsyncObservationTimesView(View):
+    """Async ObservationTimesView."""
+    source = SURFACE
+    default_level = 'SURFACE'
+
+    async def get(self, request):
+        level = request.GET.get('level', self.default_level)
+        try:
+            times = [t.isoformat() + 'Z' for t in await aobservation_times(self.source, level)]
+        except Exception as e:
+            logger.error(f"Error fetching observation times for level={level}: {e}", exc_info=True)
+            return JsonResponse({"error": f"Failed to fetch observation times: {str(e)}"}, status=500)
+        return JsonResponse(times, safe=False)
+
+
+class AsyncUpperAirObservationTimesView(AsyncObservationTimesView):
+    source = UPPERAIR
+    default_level = '200HPA'
+
+
+class AsyncAvailableLevelsView(View):
+    """Async AvailableLevelsView."""
+
+    async def get(self, request):
+        try:
+            levels = list(await aavailable_levels(UPPERAIR))
+        except Exception as e:
+            logger.error(f"Error fetching available levels: {e}", exc_info=True)
+            return JsonResponse({"error": f"Failed to fetch levels: {str(e)}"}, status=500)
+        level_order = {'200HPA': 1, '500HPA': 2, '700HPA': 3, '850HPA': 4}
+        levels.sort(key=lambda x: level_order.get(x['level'], 999))
+        return JsonResponse(levels, safe=False)
+
+
+async def job_accepted(request, job):
+    job = dict(job)
+    job['status_url'] = request.build_absolute_uri(reverse('analysis-job-detail', args=[job['job_id']]))
+    response = JsonResponse(job, status=202)
+    response['Retry-After'] = str(await sync_to_async(admission.retry_after)())
+    return response
+
+
+def saturated(exc):
+    response = JsonResponse({"error": str(exc), "retry_after": exc.retry_after}, status=503)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+
+class AsyncAnalysisBundleView(View):
+    """Async AnalysisBundleView: the stored bundle is read without blocking a worker."""
+    analysis_kind = 'surface'
+    default_level = 'SURFACE'
+
+    async def get(self, request):
+        level = request.GET.get('level', self.default_level)
+        observation_time_str = request.GET.get('observation_time')
+        if not observation_time_str:
+            return JsonResponse({"error": "observation_time is required"}, status=400)
+        try:
+            observation_time = _parse_time(observation_time_str)
+        except ValueError as e:
+            logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
+            return JsonResponse({"observation_time": "Invalid ISO format"}, status=400)
+
+        run = await acurrent_run(self.analysis_kind, level, observation_time)
+        if run is None:
+            try:
+                job = await sync_to_async(enqueue_analysis)(self.analysis_kind, level, observation_time_str)
+            except admission.Saturated as e:
+                return saturated(e)
+            if job['status'] in ('queued', 'running'):
+                return await job_accepted(request, job)
+            payload = await sync_to_async(build_payload)(self.analysis_kind, level, observation_time)
+            return JsonResponse(payload)
+
+        bundle = await sync_to_async(current_bundle)(run)
+        return bundle_response(request, bundle)
+
+
+class AsyncUpperAirAnalysisBundleView(AsyncAnalysisBundleView):
+    analysis_kind = 'upperair'
+    default_level = '200HPA'
+
+
+@method_decorator(csrf_exempt, name='dispatch')
+class AsyncSampleView(View):
+    """Async SampleView (GET one point, POST many); CSRF-exempt like the DRF view it replaces."""
+    max_points = 10000
+
+    async def _resolve(self, level, time_str, fields_str, domain):
+        """Return (run, fields, domain) or an error JsonResponse."""
+        if not time_str:
+            return JsonResponse({"error": "time is required"}, status=400)
+        try:
+            observation_time = _parse_time(time_str)
+        except ValueError:
+            return JsonResponse({"time": "Invalid ISO format"}, status=400)
+        kind = 'surface' if level == 'SURFACE' else 'upperair'
+        fields = [f.strip() for f in fields_str.split(',') if f.strip()] if fields_str else list(GRID_FIELDS[kind])
+        unknown = [f for f in fields if f not in GRID_FIELDS[kind]]
+        if unknown:
+            return JsonResponse(
+                {"error": f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(GRID_FIELDS[kind])}"}, status=400,
+            )
+        if domain:
+            try:
+                resolve_domain(kind, domain)
+            except DomainError as e:
+                return JsonResponse({"domain": str(e)}, status=400)
+        run = await acurrent_run(kind, level, observation_time)
+        domains = await sync_to_async(run_domains)(run.pk) if run else ()
+        if not domains or (domain and domain not in domains):
+            return JsonResponse({"error": "No analysis grid published for this level and time"}, status=404)
+        return run, fields, domain
+
+    async def get(self, request):
+        params = request.GET
+        level = params.get('level', 'SURFACE')
+        resolved = await self._resolve(
+            level, params.get('time') or params.get('observation_time'), params.get('fields'), params.get('domain')
+        )
+        if isinstance(resolved, HttpResponse):
+            return resolved
+        run, fields, domain = resolved
+        try:
+            lon, lat = float(params['lon']), float(params['lat'])
+        except (KeyError, ValueError):
+            return JsonResponse({"error": "lon and lat are required numbers"}, status=400)
+
+        def sample():
+            values, source = {}, None
+            for field in fields:
+                sampled, sources = sample_run(run.pk, field, lon, lat, domain)
+                value = float(sampled[0])
+                values[field] = None if math.isnan(value) else round(value, 2)
+                source = sources[0]
+            return values, source
+
+        values, source = await sync_to_async(sample)()
+        return JsonResponse({'run': run.pk, 'level': level, 'domain': source, 'lon': lon, 'lat': lat, 'values': values})
+
+    async def post(self, request):
+        try:
+            data = json.loads(request.body or b'{}')
+        except ValueError:
+            return JsonResponse({"error": "Body must be JSON"}, status=400)
+        level = data.get('level', 'SURFACE')
+        fields_str = data.get('fields')
+        if isinstance(fields_str, list):
+            fields_str = ','.join(fields_str)
+        resolved = await self._resolve(level, data.get('time') or data.get('observation_time'), fields_str, data.get('domain'))
+        if isinstance(resolved, HttpResponse):
+            return resolved
+        run, fields, domain = resolved
+        try:
+            points = np.asarray(data.get('points') or [], dtype='f8').reshape(-1, 2)
+        except (TypeError, ValueError):
+            return JsonResponse({"error": "points must be a list of [lon, lat] pairs"}, status=400)
+        if len(points) > self.max_points:
+            return JsonResponse({"error": f"At most {self.max_points} points per request"}, status=400)
+
+        def sample():
+            values, sources = {}, None
+            for field in fields:
+                sampled, sources = sample_run(run.pk, field, points[:, 0], points[:, 1], domain)
+                values[field] = [None if math.isnan(v) else v for v in np.round(sampled, 2).tolist()]
+            return values, sources
+
+        values, sources = await sync_to_async(sample)()
+        return JsonResponse({
+            'run': run.pk, 'level': level, 'count': len(points),
+            'domains': sources.tolist() if sources is not None else [], 'values': values,
+        })
+
+
+_session = None
+_session_loop = None
+
+
+async def geoserver_session():
+    """The worker's pooled GeoServer client, created on the running event loop."""
+    global _session, _session_loop
+    loop = asyncio.get_running_loop()
+    if _session is None or _session.closed or _session_loop is not loop:
+        _session_loop = loop
+        _session = aiohttp.ClientSession(
+            connector=aiohttp.TCPConnector(limit=GEOSERVER_POOL_SIZE, keepalive_timeout=30),
+            timeout=aiohttp.ClientTimeout(total=GEOSERVER_TIMEOUT),
+        )
+    return _session
+
+
+class AsyncGeoServerProxy(View):
+    """Async GeoServerProxy: waiting on GeoServer does not hold a worker."""
+
+    async def get(self, request, wms_path):
+        geoserver_url = f"{GEOSERVER_URL}/{wms_path}"
+        logger.debug(f"Proxying to GeoServer: {geoserver_url}")
+        try:
+            session = await geoserver_session()
+            async with session.get(geoserver_url, params=request.GET.dict()) as upstream:
+                body = await upstream.read()
+                if upstream.status >= 400:
+                    logger.error(f"GeoServer error response: {body[:500]!r}")
+                response = HttpResponse(
+                    body, status=upstream.status,
+                    content_type=upstream.headers.get('Content-Type') or 'application/octet-stream',
+                )
+        except asyncio.TimeoutError as e:
+            logger.error(f"GeoServer request timeout: {str(e)}")
+            return JsonResponse({'error': 'GeoServer request timeout', 'details': str(e)}, status=504)
+        except aiohttp.ClientConnectionError as e:
+            logger.error(f"Cannot connect to GeoServer: {str(e)}")
+            return JsonResponse({
+                'error': 'Cannot connect to GeoServer', 'details': str(e), 'geoserver_url': GEOSERVER_URL,
+            }, status=502)
+        for header, value in CORS_HEADERS.items():
+            response[header] = value
+        return response
+
+    async def options(self, request, wms_path):
+        """Handle OPTIONS request for CORS preflight"""
+        response = HttpResponse()
+        for header, value in CORS_HEADERS.items():
+            response[header] = value
+        return response
@@ -0,0 +1,149 @@
+import gzip
+import logging
+
+from django.http import HttpResponse
+from django.utils.cache import get_conditional_response
+from rest_framework.renderers import JSONRenderer
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+from .domains import primary_domain
+from .generalize import FULL_DETAIL
+from .models import (
+    AnalysisBundle, Isobar, Isotherm, PressureCenter, SynopReport, WeatherStation,
+    UpperAirIsobar, UpperAirIsotherm, UpperAirPressureCenter, UpperAirSynopReport, UpperAirWeatherStation,
+)
+from .serializers import (
+    IsobarSerializer, IsothermSerializer, PressureCenterSerializer, SynopReportSerializer,
+    WeatherStationSerializer, UpperAirIsobarSerializer, UpperAirIsothermSerializer,
+    UpperAirPressureCenterSerializer, UpperAirSynopReportSerializer, UpperAirWeatherStationSerializer,
+)
+from .versions import reports_version
+
+logger = logging.getLogger(__name__)
+
+# Layer name -> (model, serializer) for each analysis kind
+BUNDLE_LAYERS = {
+    'surface': {
+        'stations': (WeatherStation, WeatherStationSerializer),
+        'reports': (SynopReport, SynopReportSerializer),
+        'isobars': (Isobar, IsobarSerializer),
+        'isotherms': (Isotherm, IsothermSerializer),
+        'pressure_centers': (PressureCenter, PressureCenterSerializer),
+    },
+    'upperair': {
+        'stations': (UpperAirWeatherStation, UpperAirWeatherStationSerializer),
+        'reports': (UpperAirSynopReport, UpperAirSynopReportSerializer),
+        'isobars': (UpperAirIsobar, UpperAirIsobarSerializer),
+        'isotherms': (UpperAirIsotherm, UpperAirIsothermSerializer),
+        'pressure_centers': (UpperAirPressureCenter, UpperAirPressureCenterSerializer),
+    },
+}
+ANALYSIS_LAYERS = ('isobars', 'isotherms', 'pressure_centers')
+# Layers stored once per analysis domain
+CONTOUR_LAYERS = ('isobars', 'isotherms')
+EMPTY_COLLECTION = {'type': 'FeatureCollection', 'features': []}
+
+
+def build_payload(kind, level, observation_time, run=None):
+    """
+    Serialize every layer of one map into a single dict.
+
+    Stations and the reports of visible stations are always included; the
+    analysis layers come from ``run`` (full-detail contours of the primary
+    domain) and are empty collections when no run is published yet.
+    """
+    layers = BUNDLE_LAYERS[kind]
+    station_model, station_serializer = layers['stations']
+    report_model, report_serializer = layers['reports']
+    reports = report_model.objects.filter(
+        level=level, observation_time=observation_time, station__is_visible=True,
+    ).select_related('station')
+    payload = {
+        'kind': kind,
+        'level': level,
+        'observation_time': observation_time.isoformat(),
+        'run': run.pk if run else None,
+        'stations': station_serializer(station_model.objects.all(), many=True).data,
+        'reports': report_serializer(reports, many=True).data,
+    }
+    for name in ANALYSIS_LAYERS:
+        model, serializer = layers[name]
+        rows = model.objects.filter(run_id=run.pk) if run else None
+        if rows is not None and name in CONTOUR_LAYERS:
+            rows = rows.filter(domain=primary_domain(kind), tolerance=FULL_DETAIL)
+        payload[name] = serializer(rows, many=True).data if run else EMPTY_COLLECTION
+    return payload
+
+
+def store_bundle(run):
+    """
+    Build the bundle for a published run and store it compressed, recording
+    the reports version it was built from (read first, so reports ingested
+    while it is built make it stale rather than lost).
+    """
+    version = reports_version(run.kind, run.level, run.observation_time)
+    raw = JSONRenderer().render(build_payload(run.kind, run.level, run.observation_time, run))
+    bundle, _ = AnalysisBundle.objects.update_or_create(
+        run=run,
+        defaults={
+            'gzip_payload': gzip.compress(raw, compresslevel=9),
+            'brotli_payload': brotli.compress(raw, quality=11) if brotli else None,
+            'raw_size': len(raw),
+            'reports_version': version,
+        },
+    )
+    logger.info(
+        f"Stored analysis bundle for run {run.pk}: {len(raw)} bytes raw, "
+        f"{len(bundle.gzip_payload)} gzip, {len(bundle.brotli_payload) if bundle.brotli_payload else '-'} br"
+    )
+    return bundle
+
+
+def current_bundle(run):
+    """The stored bundle of a run, rebuilt first if its reports changed since it was built."""
+    bundle = AnalysisBundle.objects.filter(run=run).first()
+    if bundle is not None and bundle.reports_version == reports_version(run.kind, run.level, run.observation_time):
+        return bundle
+    return store_bundle(run)
+
+
+def bundle_etag(bundle):
+    # Weak: the same document is served with different content codings
+    return f'W/"bundle-{bundle.run_id}-{bundle.reports_version}"'
+
+
+def accepts_encoding(accept_encoding, coding):
+    """True if ``coding`` is listed in Accept-Encoding without q=0."""
+    for item in accept_encoding.split(','):
+        name, _, params = item.strip().partition(';')
+        if name.strip().lower() in (coding, '*'):
+            return params.replace(' ', '') not in ('q=0', 'q=0.0', 'q=0.00', 'q=0.000')
+    return False
+
+
+def bundle_response(request, bundle):
+    """
+    Serve a stored bundle as-is with the best Content-Encoding the client
+    accepts, or 304 if the client's copy (by run and reports version) is current.
+    """
+    etag = bundle_etag(bundle)
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        accept_encoding = request.META.get('HTTP_ACCEPT_ENCODING', '')
+        if bundle.brotli_payload and accepts_encoding(accept_encoding, 'br'):
+            body, encoding = bytes(bundle.brotli_payload), 'br'
+        elif accepts_encoding(accept_encoding, 'gzip'):
+            body, encoding = bytes(bundle.gzip_payload), 'gzip'
+        else:
+            body, encoding = gzip.decompress(bytes(bundle.gzip_payload)), None
+        response = HttpResponse(body, content_type='application/json')
+        if encoding:
+            response['Content-Encoding'] = encoding
+    response['ETag'] = etag
+    response['Vary'] = 'Accept-Encoding'
+    response['Cache-Control'] = 'no-cache'
+    return response
@@ -0,0 +1,167 @@
+import logging
+from datetime import datetime, timedelta, timezone
+
+from django.core.cache import cache
+from django.db import IntegrityError, transaction
+from django.db.models import F, Sum
+from django.utils import timezone as django_timezone
+
+from .models import ObservationSlot
+
+logger = logging.getLogger(__name__)
+
+SURFACE = 'surface'
+UPPERAIR = 'upperair'
+
+# How far back the observation-time pickers look
+TIMES_WINDOW = {SURFACE: timedelta(days=7), UPPERAIR: timedelta(days=30)}
+
+# Entries are deleted when the catalogue changes; the TTL only bounds memory
+CATALOGUE_TTL = 60 * 60 * 24
+
+
+def _times_key(source, level):
+    return f"catalogue:times:{source}:{level}"
+
+
+def _levels_key(source):
+    return f"catalogue:levels:{source}"
+
+
+def invalidate(source, level):
+    """Drop the cached catalogue answers that depend on (source, level)."""
+    cache.delete_many([_times_key(source, level), _levels_key(source)])
+
+
+def invalidate_source(source):
+    """Drop every cached catalogue answer of ``source``."""
+    levels = ObservationSlot.objects.filter(source=source).values_list('level', flat=True).distinct()
+    cache.delete_many([_times_key(source, level) for level in levels] + [_levels_key(source)])
+
+
+def _invalidate_on_commit(source, level):
+    transaction.on_commit(lambda: invalidate(source, level))
+
+
+def record_report(source, level, observation_time, expected_stations):
+    """
+    Count one new station report in the slot for (source, level, time).
+
+    Call inside the transaction that inserts the report, so the catalogue and
+    the reports commit together. Cached catalogue answers are invalidated once
+    the transaction commits.
+    """
+    expected = max(expected_stations, 1)
+    filters = {'source': source, 'level': level, 'observation_time': observation_time}
+    now = django_timezone.now()
+    updated = ObservationSlot.objects.filter(**filters).update(
+        station_count=F('station_count') + 1,
+        completeness=(F('station_count') + 1) * 1.0 / expected,
+        updated_at=now,
+    )
+    if not updated:
+        try:
+            with transaction.atomic():
+                ObservationSlot.objects.create(
+                    station_count=1, completeness=1.0 / expected, updated_at=now, **filters
+                )
+        except IntegrityError:
+            # Created concurrently by another ingest
+            ObservationSlot.objects.filter(**filters).update(
+                station_count=F('station_count') + 1,
+                completeness=(F('station_count') + 1) * 1.0 / expected,
+                updated_at=now,
+            )
+    _invalidate_on_commit(source, level)
+
+
+def mark_analysis(source, level, observation_time):
+    """Flag a slot as having a published analysis."""
+    ObservationSlot.objects.filter(
+        source=source, level=level, observation_time=observation_time
+    ).update(has_analysis=True, updated_at=django_timezone.now())
+    _invalidate_on_commit(source, level)
+
+
+def forget_before(cutoff, source=None):
+    """Remove slots older than ``cutoff``, e.g. after their partitions were dropped."""
+    slots = ObservationSlot.objects.filter(observation_time__lt=cutoff)
+    if source:
+        slots = slots.filter(source=source)
+    affected = set(slots.values_list('source', 'level').distinct())
+    deleted, _ = slots.delete()
+    for slot_source, level in affected:
+        _invalidate_on_commit(slot_source, level)
+    if deleted:
+        logger.info(f"Removed {deleted} observation slots older than {cutoff:%Y-%m-%d}")
+    return deleted
+
+
+def observation_times(source, level):
+    """Observation times with reports for a level within the picker window, newest first."""
+    key = _times_key(source, level)
+    times = cache.get(key)
+    if times is None:
+        since = datetime.now(timezone.utc) - TIMES_WINDOW[source]
+        times = list(
+            ObservationSlot.objects
+            .filter(source=source, level=level, observation_time__gte=since, station_count__gt=0)
+            .order_by('-observation_time')
+            .values_list('observation_time', flat=True)
+        )
+        cache.set(key, times, timeout=CATALOGUE_TTL)
+    return times
+
+
+async def aobservation_times(source, level):
+    """Async variant of observation_times for the ASGI read path."""
+    key = _times_key(source, level)
+    times = await cache.aget(key)
+    if times is None:
+        since = datetime.now(timezone.utc) - TIMES_WINDOW[source]
+        times = [
+            observation_time async for observation_time in (
+                ObservationSlot.objects
+                .filter(source=source, level=level, observation_time__gte=since, station_count__gt=0)
+                .order_by('-observation_time')
+                .values_list('observation_time', flat=True)
+            )
+        ]
+        await cache.aset(key, times, timeout=CATALOGUE_TTL)
+    return times
+
+
+def available_levels(source):
+    """Levels with reports and their report counts, as [{'level', 'count'}]."""
+    key = _levels_key(source)
+    levels = cache.get(key)
+    if levels is None:
+        levels = [
+            {'level': row['level'], 'count': row['count']}
+            for row in (
+                ObservationSlot.objects
+                .filter(source=source, station_count__gt=0)
+                .values('level')
+                .annotate(count=Sum('station_count'))
+            )
+        ]
+        cache.set(key, levels, timeout=CATALOGUE_TTL)
+    return levels
+
+
+async def aavailable_levels(source):
+    """Async variant of available_levels for the ASGI read path."""
+    key = _levels_key(source)
+    levels = await cache.aget(key)
+    if levels is None:
+        levels = [
+            {'level': row['level'], 'count': row['count']}
+            async for row in (
+                ObservationSlot.objects
+                .filter(source=source, station_count__gt=0)
+                .values('level')
+                .annotate(count=Sum('station_count'))
+            )
+        ]
+        await cache.aset(key, levels, timeout=CATALOGUE_TTL)
+    return levels
@@ -0,0 +1,46 @@
+from django.conf import settings
+from django.core.checks import Error, Tags, Warning, register
+
+# Cache backends whose contents are private to one process
+LOCAL_CACHE_BACKENDS = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def shared_cache(alias='default'):
+    """True if every web and Celery process sees the same ``alias`` cache."""
+    return settings.CACHES.get(alias, {}).get('BACKEND') not in LOCAL_CACHE_BACKENDS
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Analysis counters, job de-duplication, response namespaces and admission
+    control live in the default cache and are only correct when all processes
+    share it. A process-local cache is tolerated with DEBUG on and is an error
+    otherwise.
+    """
+    if shared_cache():
+        return []
+    message = (
+        f"The default cache ({settings.CACHES['default']['BACKEND']}) is local to each process: analysis "
+        "metrics read as zero, jobs are not de-duplicated across workers and admission limits apply per process."
+    )
+    hint = "Set CACHE_URL to a shared cache, e.g. CACHE_URL=redis://127.0.0.1:6379/1."
+    if settings.DEBUG:
+        return [Warning(message, hint=hint, id='analysis.W001')]
+    return [Error(message, hint=hint, id='analysis.E001')]
+
+
+@register(Tags.caches)
+def check_admission_cache(app_configs, **kwargs):
+    """Admission limits are counted across processes only with the shared cache; otherwise per process."""
+    if shared_cache():
+        return []
+    return [Warning(
+        "Admission limits (ANALYSIS_QUEUE_LIMIT, ANALYSIS_MAX_CONCURRENT) apply per process: the default cache "
+        "is local to each process, so queue depth and running slots cannot be counted across workers.",
+        hint="Set CACHE_URL to a shared cache such as Redis.",
+        id='analysis.W002',
+    )]
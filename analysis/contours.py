@@ -1,6 +1,5 @@
 import numpy as np
 from scipy.spatial import distance_matrix
-from scipy.ndimage import gaussian_filter
 from scipy.interpolate import splprep, splev
 from django.contrib.gis.geos import LineString, Point
 from django.db import transaction, utils as db_utils
@@ -9,11 +8,33 @@ import logging
 import pytz
 from datetime import datetime, timedelta
 import matplotlib.pyplot as plt
-from pykrige.ok import OrdinaryKriging
+from .fingerprint import compute_fingerprint
+from . import metrics
+from .locks import default_observation_time, single_flight
+from .runs import activate_run, current_run, fail_run, heartbeat, start_run
+from .bundles import store_bundle
+from .grids import write_grids
+from .domains import analyse_domain, analysis_domains, domain_axes, primary_domain
+from .generalize import CONTOUR_TOLERANCES, FULL_DETAIL, generalize
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Analysis engine parameters. They feed the input fingerprint together with
+# the analysis domains (settings.ANALYSIS_DOMAINS), so any change here
+# invalidates previously stored analyses.
+ENGINE_PARAMS = {
+    'variogram_model': 'spherical',
+    'variogram_range': 10.0,
+    'variogram_nugget': 0.1,
+    'smoothing_sigma': 2.0,
+    'spline_points': 200,
+    'spline_smoothing': 0.1,
+    'pressure_interval': 2,
+    'temperature_interval': 1,
+    'time_tolerance_minutes': 30,
+}
+
 def validate_data(data, data_type, level, observation_time, time_tolerance_minutes=30):
     if not data:
         logger.warning(f"No {data_type} data provided")
@@ -50,12 +71,63 @@ def validate_data(data, data_type, level, observation_time, time_tolerance_minut
     logger.info(f"Validated {len(validated_data)} {data_type} data points")
     return validated_data
 
-def generate_contours(level, observation_time=None, map_type=None):
+def stored_contours(run):
+    """Rebuild the generator's GeoJSON result from a stored analysis run."""
+    level = run.level
+    time_str = run.observation_time.isoformat()
+    domain = primary_domain('surface')
+    return {
+        "isobars": {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [list(c) for c in isobar.geometry.coords]},
+                "properties": {"pressure": isobar.pressure, "level": level, "time": time_str}
+            }
+            for isobar in Isobar.objects.filter(run_id=run.pk, domain=domain, tolerance=FULL_DETAIL)
+        ]},
+        "isotherms": {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [list(c) for c in isotherm.geometry.coords]},
+                "properties": {"temperature": isotherm.temperature, "level": level, "time": time_str}
+            }
+            for isotherm in Isotherm.objects.filter(run_id=run.pk, domain=domain, tolerance=FULL_DETAIL)
+        ]},
+        "centers": {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [center.location.x, center.location.y]},
+                "properties": {"type": center.center_type, "pressure": center.pressure, "level": level, "time": time_str}
+            }
+            for center in PressureCenter.objects.filter(run_id=run.pk)
+        ]},
+    }
+
+def generate_contours(level, observation_time=None, map_type=None, progress=None):
+    """
+    Generate and store the analysis for a level and observation time.
+
+    Concurrent callers for the same key are serialised; callers that waited
+    reuse the stored result through the input fingerprint check.
+
+    ``progress`` is an optional callable(stage, fraction) used by the job API
+    to report which pipeline stage is running. Without ``observation_time``
+    the current hour is analysed; it is resolved before locking so the call
+    shares the lock of an explicit request for that hour.
+    """
+    if observation_time is None:
+        observation_time = default_observation_time().isoformat()
+    with single_flight('surface', level, observation_time):
+        return _generate_contours(level, observation_time, map_type, progress)
+
+def _generate_contours(level, observation_time=None, map_type=None, progress=None):
+    def report_stage(stage, fraction):
+        if progress is not None:
+            progress(stage, fraction)
+
     # Set dynamic observation time to current Nepal time if not provided
     if observation_time is None:
-        observation_time = datetime.now(tz=pytz.timezone('Asia/Kathmandu')).replace(
-            microsecond=0, second=0, minute=0
-        )
+        observation_time = default_observation_time()
         logger.info(f"No observation time provided, using current time: {observation_time}")
     else:
         try:
@@ -70,6 +142,7 @@ def generate_contours(level, observation_time=None, map_type=None):
             return False
 
     logger.info(f"Using observation time: {observation_time}")
+    report_stage('fetching', 0.05)
 
     # Fetch reports with retry mechanism
     for attempt in range(3):
@@ -107,159 +180,147 @@ def generate_contours(level, observation_time=None, map_type=None):
             logger.warning(f"Database error, retrying ({attempt+1}/3): {str(db_err)}")
             continue
 
-    pressure_data = validate_data(pressure_data, 'sea_level_pressure', level, observation_time)
-    temperature_data = validate_data(temperature_data, 'temperature', level, observation_time)
+    # Skip the pipeline if the stored analysis was built from identical inputs
+    fingerprint = compute_fingerprint(
+        {'sea_level_pressure': pressure_data, 'temperature': temperature_data},
+        {'domains': analysis_domains('surface'), 'contour_tolerances': CONTOUR_TOLERANCES}, ENGINE_PARAMS
+    )
+    published = current_run('surface', level, observation_time)
+    if published is not None and published.fingerprint == fingerprint:
+        metrics.incr('surface.skipped')
+        logger.info(f"Inputs unchanged for level={level}, observation_time={observation_time} (fingerprint {fingerprint[:12]}), reusing run {published.pk}")
+        return stored_contours(published)
+    metrics.incr('surface.recomputed')
+    logger.info(f"Recomputing analysis for level={level}, observation_time={observation_time} (fingerprint {fingerprint[:12]})")
+
+    tolerance = ENGINE_PARAMS['time_tolerance_minutes']
+    pressure_data = validate_data(pressure_data, 'sea_level_pressure', level, observation_time, tolerance)
+    temperature_data = validate_data(temperature_data, 'temperature', level, observation_time, tolerance)
     if len(pressure_data) < 3 or len(temperature_data) < 3:
         logger.error("Insufficient valid data")
         return False
 
+    # Rows written by this run stay invisible to readers until activate_run()
+    run = start_run('surface', level, observation_time, fingerprint, {
+        'grid': {'domains': analysis_domains('surface'), 'contour_tolerances': CONTOUR_TOLERANCES}, 'engine': ENGINE_PARAMS,
+    })
+
     pressure_lons, pressure_lats, pressure_vals = zip(*pressure_data)
     temp_lons, temp_lats, temp_vals = zip(*temperature_data)
 
     # Determine pressure levels based on station data
-    min_pressure = np.floor(min(pressure_vals) / 2) * 2
-    max_pressure = np.ceil(max(pressure_vals) / 2) * 2
-    pressure_levels = np.arange(min_pressure, max_pressure + 2, 2)
-    temp_levels = np.arange(np.floor(min(temp_vals)), np.ceil(max(temp_vals)) + 1, 1)  # 1°C intervals
+    pressure_interval = ENGINE_PARAMS['pressure_interval']
+    temp_interval = ENGINE_PARAMS['temperature_interval']
+    min_pressure = np.floor(min(pressure_vals) / pressure_interval) * pressure_interval
+    max_pressure = np.ceil(max(pressure_vals) / pressure_interval) * pressure_interval
+    pressure_levels = np.arange(min_pressure, max_pressure + pressure_interval, pressure_interval)
+    temp_levels = np.arange(np.floor(min(temp_vals)), np.ceil(max(temp_vals)) + temp_interval, temp_interval)  # 1°C intervals
     logger.info(f"Dynamic pressure range: {min_pressure} to {max_pressure} hPa, temperature range: {min(temp_vals)} to {max(temp_vals)}°C")
 
-    with transaction.atomic():
-        Isobar.objects.filter(level=level, observation_time=observation_time).delete()
-        PressureCenter.objects.filter(level=level, observation_time=observation_time).delete()
-
-        # Identify pressure centers directly from station data
-        geojson_centers = {"type": "FeatureCollection", "features": []}
-        pressure_center_count = 0
-        centers = []
-        pressure_range = max(pressure_vals) - min(pressure_vals)
-        threshold = max(1.5, 0.015 * pressure_range)  # Adjusted threshold (min 1.5 hPa)
-        for i, (lon, lat, val) in enumerate(pressure_data):
-            neighbors = []
-            for j, (lon2, lat2, val2) in enumerate(pressure_data):
-                if i != j and distance_matrix([[lon, lat]], [[lon2, lat2]])[0][0] < 4:  # Reduced to 4°
-                    neighbors.append(val2)
-            if neighbors and len(neighbors) > 3:  # Ensure at least 3 neighbors
-                neighbor_max = max(neighbors)
-                neighbor_min = min(neighbors)
-                if val > neighbor_max + threshold:  # High pressure center
-                    centers.append(('HIGH', lon, lat, val))
-                    PressureCenter.objects.create(
-                        level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
-                        center_type='HIGH', pressure=float(val)
-                    )
-                    pressure_center_count += 1
-                    geojson_centers["features"].append({
-                        "type": "Feature",
-                        "geometry": {"type": "Point", "coordinates": [lon, lat]},
-                        "properties": {"type": "HIGH", "pressure": float(val), "level": level, "time": observation_time.isoformat()}
-                    })
-                elif val < neighbor_min - threshold:  # Low pressure center
-                    centers.append(('LOW', lon, lat, val))
-                    PressureCenter.objects.create(
-                        level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
-                        center_type='LOW', pressure=float(val)
-                    )
-                    pressure_center_count += 1
-                    geojson_centers["features"].append({
-                        "type": "Feature",
-                        "geometry": {"type": "Point", "coordinates": [lon, lat]},
-                        "properties": {"type": "LOW", "pressure": float(val), "level": level, "time": observation_time.isoformat()}
-                    })
-            logger.debug(f"Station {i}: val={val}, neighbors={len(neighbors)}, max_diff={max(val - neighbor_max, neighbor_min - val) if neighbors else 0}")
-        logger.info(f"Generated {pressure_center_count} pressure centers")
-
-        # Create region-wide grid based on the image's coverage
-        min_lon, max_lon = 50.0, 100.0
-        min_lat, max_lat = 5.0, 35.0
-        resolution = 0.25  # Finer resolution for smoother contours
-        num_points_lon = int((max_lon - min_lon) / resolution) + 1
-        num_points_lat = int((max_lat - min_lat) / resolution) + 1
-        grid_lon, grid_lat = np.meshgrid(
-            np.linspace(min_lon, max_lon, num_points_lon),
-            np.linspace(min_lat, max_lat, num_points_lat)
-        )
-        logger.debug(f"Grid shapes: grid_lon={grid_lon.shape}, grid_lat={grid_lat.shape}")
-
-        # Interpolate pressure and temperature values onto the grid using Kriging
-        try:
-            # Kriging for pressure
-            ok_pressure = OrdinaryKriging(
-                pressure_lons,
-                pressure_lats,
-                pressure_vals,
-                variogram_model='spherical',
-                variogram_parameters={'sill': np.var(pressure_vals), 'range': 10.0, 'nugget': 0.1},
-                verbose=False,
-                enable_plotting=False
-            )
-            grid_pressure, _ = ok_pressure.execute('grid', np.linspace(min_lon, max_lon, num_points_lon), np.linspace(min_lat, max_lat, num_points_lat))
-            grid_pressure = np.array(grid_pressure)  # Ensure it's a numpy array
-            logger.debug(f"Pressure grid shape after Kriging: {grid_pressure.shape}")
-
-            # Kriging for temperature
-            ok_temp = OrdinaryKriging(
-                temp_lons,
-                temp_lats,
-                temp_vals,
-                variogram_model='spherical',
-                variogram_parameters={'sill': np.var(temp_vals), 'range': 10.0, 'nugget': 0.1},
-                verbose=False,
-                enable_plotting=False
-            )
-            grid_temp, _ = ok_temp.execute('grid', np.linspace(min_lon, max_lon, num_points_lon), np.linspace(min_lat, max_lat, num_points_lat))
-            grid_temp = np.array(grid_temp)  # Ensure it's a numpy array
-            logger.debug(f"Temperature grid shape after Kriging: {grid_temp.shape}")
-
-            # Ensure grid shapes match
-            if grid_pressure.shape != grid_lon.shape:
-                logger.warning(f"Reshaping grid_pressure from {grid_pressure.shape} to {grid_lon.shape}")
-                grid_pressure = grid_pressure.reshape(grid_lon.shape)
-            if grid_temp.shape != grid_lon.shape:
-                logger.warning(f"Reshaping grid_temp from {grid_temp.shape} to {grid_lon.shape}")
-                grid_temp = grid_temp.reshape(grid_lon.shape)
+    report_stage('centers', 0.15)
+    # Identify pressure centers directly from station data
+    center_rows = []
+    geojson_centers = {"type": "FeatureCollection", "features": []}
+    pressure_center_count = 0
+    centers = []
+    pressure_range = max(pressure_vals) - min(pressure_vals)
+    threshold = max(1.5, 0.015 * pressure_range)  # Adjusted threshold (min 1.5 hPa)
+    for i, (lon, lat, val) in enumerate(pressure_data):
+        neighbors = []
+        for j, (lon2, lat2, val2) in enumerate(pressure_data):
+            if i != j and distance_matrix([[lon, lat]], [[lon2, lat2]])[0][0] < 4:  # Reduced to 4°
+                neighbors.append(val2)
+        if neighbors and len(neighbors) > 3:  # Ensure at least 3 neighbors
+            neighbor_max = max(neighbors)
+            neighbor_min = min(neighbors)
+            if val > neighbor_max + threshold:  # High pressure center
+                centers.append(('HIGH', lon, lat, val))
+                center_rows.append(PressureCenter(
+                    run=run, level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
+                    center_type='HIGH', pressure=float(val)
+                ))
+                pressure_center_count += 1
+                geojson_centers["features"].append({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"type": "HIGH", "pressure": float(val), "level": level, "time": observation_time.isoformat()}
+                })
+            elif val < neighbor_min - threshold:  # Low pressure center
+                centers.append(('LOW', lon, lat, val))
+                center_rows.append(PressureCenter(
+                    run=run, level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
+                    center_type='LOW', pressure=float(val)
+                ))
+                pressure_center_count += 1
+                geojson_centers["features"].append({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"type": "LOW", "pressure": float(val), "level": level, "time": observation_time.isoformat()}
+                })
+        logger.debug(f"Station {i}: val={val}, neighbors={len(neighbors)}, max_diff={max(val - neighbor_max, neighbor_min - val) if neighbors else 0}")
+    logger.info(f"Generated {pressure_center_count} pressure centers")
+
+    # Analyse every domain from the same validated stations. Domains are listed
+    # parents first, so a nest's background field is always available.
+    domains = analysis_domains('surface')
+    primary = domains[0]['name']
+    analysed = {}
+    geojson_isobars = {"type": "FeatureCollection", "features": []}
+    geojson_isotherms = {"type": "FeatureCollection", "features": []}
+    isobar_count = 0
+    isotherm_count = 0
+    contour_rows = []
+    isotherm_rows = []
 
+    # Function to smooth contour paths using spline interpolation
+    def smooth_contour_path(path, num_points=200, s=0.1):
+        if len(path) < 4:  # Skip smoothing for very short paths
+            logger.debug(f"Skipping spline smoothing for path with {len(path)} points")
+            return path
+        try:
+            x, y = path[:, 0], path[:, 1]
+            # Fit spline
+            spl, u = splprep([x, y], s=s, k=3, quiet=True)
+            # Generate new points
+            u_new = np.linspace(0, 1, num_points)
+            x_new, y_new = splev(u_new, spl)
+            return np.column_stack((x_new, y_new))
         except Exception as e:
-            logger.error(f"Kriging interpolation failed: {str(e)}")
-            return False
+            logger.warning(f"Spline smoothing failed for path with {len(path)} points: {str(e)}")
+            return path
+
+    for index, domain in enumerate(domains):
+        name = domain['name']
+        parent = analysed.get(domain.get('parent'))
+        if domain.get('parent') and parent is None:
+            logger.warning(f"Skipping domain {name}: parent domain {domain['parent']} was not analysed")
+            continue
 
-        # Fill NaN values with nearest neighbor and apply smoothing
-        mask = np.isnan(grid_pressure)
-        if np.any(mask):
-            from scipy.interpolate import griddata
-            logger.debug(f"Filling {np.sum(mask)} NaN values in grid_pressure")
-            grid_pressure[mask] = griddata(
-                [(lon, lat) for lon, lat, _ in pressure_data],
-                pressure_vals,
-                (grid_lon[mask], grid_lat[mask]),
-                method='nearest'
+        report_stage('kriging', 0.25 + 0.6 * index / len(domains))
+        heartbeat(run)
+        # Kriging, gap filling and smoothing; nests krige residuals against the parent field
+        try:
+            grid_pressure, pressure_variance = analyse_domain(
+                pressure_data, domain, ENGINE_PARAMS,
+                parent and (parent['axes'], parent['pressure'], parent['pressure_variance']),
             )
-        grid_pressure = gaussian_filter(grid_pressure, sigma=2.0)  # Increased sigma for smoother contours
-        logger.debug(f"Applied Gaussian filter to grid_pressure with sigma=2.0")
-
-        mask = np.isnan(grid_temp)
-        if np.any(mask):
-            from scipy.interpolate import griddata
-            logger.debug(f"Filling {np.sum(mask)} NaN values in grid_temp")
-            grid_temp[mask] = griddata(
-                [(lon, lat) for lon, lat, _ in temperature_data],
-                temp_vals,
-                (grid_lon[mask], grid_lat[mask]),
-                method='nearest'
+            grid_temp, temperature_variance = analyse_domain(
+                temperature_data, domain, ENGINE_PARAMS,
+                parent and (parent['axes'], parent['temperature'], parent['temperature_variance']),
             )
-        grid_temp = gaussian_filter(grid_temp, sigma=2.0)  # Increased sigma for smoother contours
-        logger.debug(f"Applied Gaussian filter to grid_temp with sigma=2.0")
-
-        # Verify shapes before contouring
-        logger.debug(f"Final shapes: grid_lon={grid_lon.shape}, grid_lat={grid_lat.shape}, grid_pressure={grid_pressure.shape}, grid_temp={grid_temp.shape}")
-        if grid_pressure.shape != grid_lon.shape or grid_temp.shape != grid_lon.shape:
-            logger.error(f"Shape mismatch: grid_lon={grid_lon.shape}, grid_pressure={grid_pressure.shape}, grid_temp={grid_temp.shape}")
-            return False
+        except Exception as e:
+            if name == primary:
+                logger.error(f"Kriging interpolation failed: {str(e)}")
+                fail_run(run, f"Kriging interpolation failed: {e}")
+                return False
+            logger.error(f"Kriging interpolation failed for domain {name}, skipping it: {str(e)}")
+            continue
+        axes = domain_axes(domain)
+        grid_lon, grid_lat = np.meshgrid(*axes)
+        logger.debug(f"Domain {name}: grid {grid_lon.shape} at {domain['resolution']}°")
 
+        report_stage('contouring', 0.25 + 0.6 * (index + 0.5) / len(domains))
         # Generate isobars and isotherms
-        geojson_isobars = {"type": "FeatureCollection", "features": []}
-        geojson_isotherms = {"type": "FeatureCollection", "features": []}
-        isobar_count = 0
-        isotherm_count = 0
         fig, ax = plt.subplots()
         try:
             cs_pressure = ax.contour(grid_lon, grid_lat, grid_pressure, levels=pressure_levels, colors='blue', corner_mask=True)
@@ -267,79 +328,57 @@ def generate_contours(level, observation_time=None, map_type=None):
             cs_temp = ax.contour(grid_lon, grid_lat, grid_temp, levels=temp_levels, colors='red', linestyles='dashed', corner_mask=True)
             clabels_temp = ax.clabel(cs_temp, fmt='%d°C', inline=True, fontsize=10, inline_spacing=4)
         except Exception as e:
-            logger.error(f"Contour generation failed: {str(e)}")
-            return False
-
-        # Function to smooth contour paths using spline interpolation
-        def smooth_contour_path(path, num_points=200, s=0.1):
-            if len(path) < 4:  # Skip smoothing for very short paths
-                logger.debug(f"Skipping spline smoothing for path with {len(path)} points")
-                return path
-            try:
-                x, y = path[:, 0], path[:, 1]
-                # Parameterize by arc length
-                t = np.linspace(0, 1, len(x))
-                # Fit spline
-                spl, u = splprep([x, y], s=s, k=3, quiet=True)
-                # Generate new points
-                u_new = np.linspace(0, 1, num_points)
-                x_new, y_new = splev(u_new, spl)
-                return np.column_stack((x_new, y_new))
-            except Exception as e:
-                logger.warning(f"Spline smoothing failed for path with {len(path)} points: {str(e)}")
-                return path
+            plt.close(fig)
+            if name == primary:
+                logger.error(f"Contour generation failed: {str(e)}")
+                fail_run(run, f"Contour generation failed: {e}")
+                return False
+            logger.error(f"Contour generation failed for domain {name}, skipping it: {str(e)}")
+            continue
+        analysed[name] = {
+            'domain': domain, 'axes': axes,
+            'pressure': grid_pressure, 'temperature': grid_temp,
+            'pressure_variance': pressure_variance, 'temperature_variance': temperature_variance,
+        }
 
         # Process isobars with spline smoothing
         for i, contour in enumerate(cs_pressure.allsegs):
             for path in contour:
                 if len(path) > 1:
                     # Apply spline smoothing
-                    smoothed_path = smooth_contour_path(path, num_points=200, s=0.1)
-                    logger.debug(f"Isobar path: original points={len(path)}, smoothed points={len(smoothed_path)}")
+                    smoothed_path = smooth_contour_path(path, num_points=ENGINE_PARAMS['spline_points'], s=ENGINE_PARAMS['spline_smoothing'])
                     geom = LineString(smoothed_path, srid=4326)
                     level_val = pressure_levels[i]
-                    Isobar.objects.create(
-                        level=level, observation_time=observation_time, pressure=float(level_val), geometry=geom
-                    )
+                    contour_rows.append(Isobar(
+                        run=run, domain=name, level=level, observation_time=observation_time, pressure=float(level_val), geometry=geom
+                    ))
                     isobar_count += 1
-                    geojson_isobars["features"].append({
-                        "type": "Feature",
-                        "geometry": {"type": "LineString", "coordinates": smoothed_path.tolist()},
-                        "properties": {"pressure": float(level_val), "level": level, "time": observation_time.isoformat()}
-                    })
+                    if name == primary:
+                        geojson_isobars["features"].append({
+                            "type": "Feature",
+                            "geometry": {"type": "LineString", "coordinates": smoothed_path.tolist()},
+                            "properties": {"pressure": float(level_val), "level": level, "time": observation_time.isoformat()}
+                        })
 
         # Process isotherms with spline smoothing
         for i, contour in enumerate(cs_temp.allsegs):
             for path in contour:
                 if len(path) > 1:
                     # Apply spline smoothing
-                    smoothed_path = smooth_contour_path(path, num_points=200, s=0.1)
-                    logger.debug(f"Isotherm path: original points={len(path)}, smoothed points={len(smoothed_path)}")
+                    smoothed_path = smooth_contour_path(path, num_points=ENGINE_PARAMS['spline_points'], s=ENGINE_PARAMS['spline_smoothing'])
                     geom = LineString(smoothed_path, srid=4326)
                     level_val = temp_levels[i]
-                    # Save isotherm to database
-                    try:
-                        Isotherm.objects.create(
-                            level=level,
-                            observation_time=observation_time,
-                            temperature=float(level_val),
-                            geometry=geom
-                        )
-                        isotherm_count += 1
+                    isotherm_rows.append(Isotherm(
+                        run=run, domain=name, level=level, observation_time=observation_time, temperature=float(level_val), geometry=geom
+                    ))
+                    isotherm_count += 1
+                    if name == primary:
                         geojson_isotherms["features"].append({
                             "type": "Feature",
                             "geometry": {"type": "LineString", "coordinates": smoothed_path.tolist()},
-                            "properties": {
-                                "temperature": float(level_val),
-                                "level": level,
-                                "time": observation_time.isoformat()
-                            }
+                            "properties": {"temperature": float(level_val), "level": level, "time": observation_time.isoformat()}
                         })
-                    except Exception as e:
-                        logger.error(f"Failed to save isotherm for temperature {level_val}°C: {str(e)}")
-                        continue
 
-        logger.info(f"Generated {isobar_count} isobars, {isotherm_count} isotherms")
         plt.close(fig)
         # Optional: Plot stations and pressure centers for debugging
         if map_type == 'DEBUG':
@@ -347,11 +386,41 @@ def generate_contours(level, observation_time=None, map_type=None):
             for center_type, lon, lat, val in centers:
                 color = 'blue' if center_type == 'HIGH' else 'red'
                 ax.text(lon, lat, center_type, fontsize=14, ha='center', va='center', color=color, weight='bold')
-            plt.savefig(f"debug_map_{level}_{observation_time.isoformat()}.png", dpi=300, bbox_inches='tight')
-            logger.info("Debug map saved")
+            plt.savefig(f"debug_map_{level}_{name}_{observation_time.isoformat()}.png", dpi=300, bbox_inches='tight')
+            logger.info(f"Debug map saved for domain {name}")
+
+    logger.info(f"Generated {isobar_count} isobars, {isotherm_count} isotherms over {len(analysed)} domains")
+
+    # Publish the run: rows and the current-run pointer flip in one commit
+    report_stage('storing', 0.9)
+    # Grids first, so a published run always has them for point sampling
+    for name, result in analysed.items():
+        lons, lats = result['axes']
+        try:
+            write_grids(run, (lons[0], lats[0], lons[-1], lats[-1]), result['domain']['resolution'], {
+                'pressure': result['pressure'],
+                'temperature': result['temperature'],
+                'pressure_variance': result['pressure_variance'],
+                'temperature_variance': result['temperature_variance'],
+            }, domain=name)
+        except Exception as e:
+            logger.error(f"Failed to store {name} analysis grids for run {run.pk}: {str(e)}")
+    with transaction.atomic():
+        PressureCenter.objects.bulk_create(center_rows)
+        # Full detail plus the simplified copies served at lower zooms
+        Isobar.objects.bulk_create(generalize(contour_rows))
+        Isotherm.objects.bulk_create(generalize(isotherm_rows))
+        activate_run(run)
+
+    # Precompute the one-shot map bundle; the analysis stays valid if this fails
+    report_stage('bundling', 0.95)
+    try:
+        store_bundle(run)
+    except Exception as e:
+        logger.error(f"Failed to build analysis bundle for run {run.pk}: {str(e)}")
 
     return {
         "isobars": geojson_isobars,
         "isotherms": geojson_isotherms,
         "centers": geojson_centers
-    }
\ No newline at end of file
+    }
@@ -0,0 +1,194 @@
+import logging
+import math
+
+import numpy as np
+from django.conf import settings
+from pykrige.ok import OrdinaryKriging
+from scipy.interpolate import RegularGridInterpolator, griddata
+from scipy.ndimage import gaussian_filter
+
+logger = logging.getLogger(__name__)
+
+# Used when settings define no ANALYSIS_DOMAINS: one regional grid per kind
+DEFAULT_DOMAINS = {
+    'surface': [
+        {'name': 'regional', 'min_lon': 50.0, 'max_lon': 100.0, 'min_lat': 5.0, 'max_lat': 35.0, 'resolution': 0.25},
+    ],
+    'upperair': [
+        {'name': 'regional', 'min_lon': 35.0, 'max_lon': 120.0, 'min_lat': 0.0, 'max_lat': 45.0, 'resolution': 0.25},
+    ],
+}
+
+# Stations this far (degrees) outside a nest still inform its residual analysis
+DEFAULT_NEST_MARGIN = 2.0
+# Nest rows/columns over which the nest fades into its parent at the boundary
+DEFAULT_BLEND_CELLS = 8
+
+
+class DomainError(ValueError):
+    """Unknown domain, or an inconsistent ANALYSIS_DOMAINS setting."""
+
+
+def analysis_domains(kind):
+    """
+    Return the configured domains of an analysis kind, parents before nests.
+
+    Each domain is a dict with name, min/max lon/lat, resolution and optionally
+    parent (a nest analysed against that domain's field), min_zoom (first map
+    zoom at which the domain is preferred), margin, blend_cells and
+    smoothing_sigma (grid cells). The first domain is the primary one.
+    """
+    domains = getattr(settings, 'ANALYSIS_DOMAINS', DEFAULT_DOMAINS)[kind]
+    seen = {}
+    for domain in domains:
+        name = domain['name']
+        if name in seen:
+            raise DomainError(f"Duplicate {kind} domain {name}")
+        parent = domain.get('parent')
+        if parent is not None:
+            if parent not in seen:
+                raise DomainError(f"{kind} domain {name}: parent {parent} must be defined before it")
+            outer = seen[parent]
+            if not (outer['min_lon'] <= domain['min_lon'] and domain['max_lon'] <= outer['max_lon']
+                    and outer['min_lat'] <= domain['min_lat'] and domain['max_lat'] <= outer['max_lat']):
+                raise DomainError(f"{kind} domain {name} is not inside its parent {parent}")
+        seen[name] = domain
+    if not domains or domains[0].get('parent') is not None:
+        raise DomainError(f"The first {kind} domain must be a top-level domain")
+    return list(domains)
+
+
+def primary_domain(kind):
+    return analysis_domains(kind)[0]['name']
+
+
+def resolve_domain(kind, requested):
+    """Validate a requested domain name, defaulting to the primary domain."""
+    names = [domain['name'] for domain in analysis_domains(kind)]
+    if not requested:
+        return names[0]
+    if requested not in names:
+        raise DomainError(f"Unknown domain {requested}; choose from {', '.join(names)}")
+    return requested
+
+
+def domain_axes(domain):
+    """Node longitudes and latitudes of a domain grid (south to north)."""
+    count_lon = int(round((domain['max_lon'] - domain['min_lon']) / domain['resolution'])) + 1
+    count_lat = int(round((domain['max_lat'] - domain['min_lat']) / domain['resolution'])) + 1
+    return (
+        np.linspace(domain['min_lon'], domain['max_lon'], count_lon),
+        np.linspace(domain['min_lat'], domain['max_lat'], count_lat),
+    )
+
+
+def boundary_weights(shape, cells):
+    """Weights rising from 0 on the grid edge to 1 at ``cells`` nodes inside it."""
+    if cells <= 0:
+        return np.ones(shape)
+    rows = np.arange(shape[0])
+    cols = np.arange(shape[1])
+    distance = np.minimum.outer(np.minimum(rows, shape[0] - 1 - rows), np.minimum(cols, shape[1] - 1 - cols))
+    return np.clip(distance / cells, 0.0, 1.0)
+
+
+def _krige(lons, lats, values, axes, engine):
+    ok = OrdinaryKriging(
+        lons, lats, values,
+        variogram_model=engine['variogram_model'],
+        variogram_parameters={
+            'sill': max(float(np.var(values)), 1e-6),
+            'range': engine['variogram_range'],
+            'nugget': engine['variogram_nugget'],
+        },
+        verbose=False,
+        enable_plotting=False,
+    )
+    field, variance = ok.execute('grid', axes[0], axes[1])
+    shape = (len(axes[1]), len(axes[0]))
+    return np.array(field).reshape(shape), np.ma.getdata(variance).reshape(shape)
+
+
+def _fill_nearest(field, lons, lats, values, grid_lon, grid_lat):
+    mask = np.isnan(field)
+    if np.any(mask):
+        logger.debug(f"Filling {np.sum(mask)} NaN values from the nearest station")
+        field[mask] = griddata(np.column_stack([lons, lats]), values, (grid_lon[mask], grid_lat[mask]), method='nearest')
+    return field
+
+
+def analyse_domain(points, domain, engine, background=None):
+    """
+    Analyse station values onto one domain grid; returns (field, variance).
+
+    ``points`` is a sequence of (lon, lat, value). A top-level domain krigs the
+    values directly. A nest passes its parent's ``background`` as (axes, field,
+    variance): station residuals against the parent field are kriged on the
+    nest grid and added to the interpolated parent field, faded to zero over
+    ``blend_cells`` at the nest boundary so the nest joins its parent smoothly.
+    """
+    axes = domain_axes(domain)
+    grid_lon, grid_lat = np.meshgrid(*axes)
+    sigma = domain.get('smoothing_sigma', engine['smoothing_sigma'])
+    lons, lats, values = (np.asarray(column, dtype='f8') for column in zip(*points))
+
+    if background is None:
+        field, variance = _krige(lons, lats, values, axes, engine)
+        field = _fill_nearest(field, lons, lats, values, grid_lon, grid_lat)
+        return gaussian_filter(field, sigma=sigma), variance
+
+    (parent_lons, parent_lats), parent_field, parent_variance = background
+    nodes = np.column_stack([grid_lat.ravel(), grid_lon.ravel()])
+    shape = grid_lon.shape
+    base = RegularGridInterpolator((parent_lats, parent_lons), parent_field)(nodes).reshape(shape)
+    base_variance = RegularGridInterpolator((parent_lats, parent_lons), parent_variance)(nodes).reshape(shape)
+
+    margin = domain.get('margin', DEFAULT_NEST_MARGIN)
+    near = (
+        (lons >= domain['min_lon'] - margin) & (lons <= domain['max_lon'] + margin)
+        & (lats >= domain['min_lat'] - margin) & (lats <= domain['max_lat'] + margin)
+        & (lons >= parent_lons[0]) & (lons <= parent_lons[-1])
+        & (lats >= parent_lats[0]) & (lats <= parent_lats[-1])
+    )
+    if np.count_nonzero(near) < 3:
+        logger.info(f"Domain {domain['name']}: {np.count_nonzero(near)} stations nearby, using the parent field")
+        return base, base_variance
+
+    lons, lats = lons[near], lats[near]
+    residuals = values[near] - RegularGridInterpolator((parent_lats, parent_lons), parent_field)(np.column_stack([lats, lons]))
+    correction, variance = _krige(lons, lats, residuals, axes, engine)
+    correction = gaussian_filter(_fill_nearest(correction, lons, lats, residuals, grid_lon, grid_lat), sigma=sigma)
+    weights = boundary_weights(shape, domain.get('blend_cells', DEFAULT_BLEND_CELLS))
+    logger.debug(
+        f"Domain {domain['name']}: {len(residuals)} stations, residual range "
+        f"{residuals.min():.2f} to {residuals.max():.2f}"
+    )
+    return base + weights * correction, weights * variance + (1 - weights) * base_variance
+
+
+def tile_lonlat_bounds(z, x, y):
+    """(min_lon, min_lat, max_lon, max_lat) of a Web Mercator tile."""
+    n = 2 ** z
+
+    def lat(row):
+        return math.degrees(math.atan(math.sinh(math.pi * (1 - 2 * row / n))))
+
+    return x / n * 360.0 - 180.0, lat(y + 1), (x + 1) / n * 360.0 - 180.0, lat(y)
+
+
+def tile_domain(kind, z, x, y):
+    """
+    The domain whose contours a map tile is drawn from: the finest domain
+    enabled at zoom ``z`` that covers the whole tile, else the primary domain.
+    """
+    domains = analysis_domains(kind)
+    min_lon, min_lat, max_lon, max_lat = tile_lonlat_bounds(z, x, y)
+    covering = [
+        domain for domain in domains
+        if domain.get('min_zoom', 0) <= z
+        and domain['min_lon'] <= min_lon and max_lon <= domain['max_lon']
+        and domain['min_lat'] <= min_lat and max_lat <= domain['max_lat']
+    ]
+    if not covering:
+        return domains[0]['name']
+    return min(covering, key=lambda domain: domain['resolution'])['name']
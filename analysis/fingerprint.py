@@ -0,0 +1,48 @@
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def _normalise_observations(data):
+    """Return observation tuples as sorted, JSON-friendly rows."""
+    rows = []
+    for lon, lat, val, station_id, obs_time in data:
+        try:
+            val = round(float(val), 3)
+        except (ValueError, TypeError):
+            val = None
+        rows.append([
+            str(station_id),
+            obs_time.isoformat() if obs_time is not None else None,
+            round(float(lon), 4),
+            round(float(lat), 4),
+            val,
+        ])
+    rows.sort(key=lambda row: (row[0], row[1] or ''))
+    return rows
+
+
+def compute_fingerprint(datasets, grid_params, engine_params):
+    """
+    Hash the inputs of an analysis run.
+
+    Args:
+        datasets (dict): Mapping of variable name to a list of
+            (lon, lat, value, station_id, observation_time) tuples.
+        grid_params (dict): Analysis domains (bounds and resolution).
+        engine_params (dict): Kriging, smoothing and contouring parameters.
+
+    Returns:
+        str: Hex SHA-256 digest that changes whenever any input changes.
+    """
+    payload = {
+        'data': {name: _normalise_observations(data) for name, data in sorted(datasets.items())},
+        'grid': grid_params,
+        'engine': engine_params,
+    }
+    encoded = json.dumps(payload, sort_keys=True, separators=(',', ':'), default=str).encode('utf-8')
+    fingerprint = hashlib.sha256(encoded).hexdigest()
+    logger.debug(f"Computed input fingerprint {fingerprint[:12]} over {sum(len(d) for d in datasets.values())} observations")
+    return fingerprint
@@ -0,0 +1,56 @@
+import logging
+
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+# Douglas–Peucker tolerances (degrees) at which contours are stored in addition
+# to full detail (tolerance 0). Each roughly matches one screen pixel at zoom
+# 8, 6 and 4 (see pixel_tolerance).
+CONTOUR_TOLERANCES = tuple(sorted(getattr(settings, 'CONTOUR_TOLERANCES', (0.005, 0.02, 0.08))))
+FULL_DETAIL = 0.0
+
+
+def pixel_tolerance(z):
+    """Roughly one screen pixel of a 256px tile at zoom ``z``, in degrees."""
+    return 360.0 / (256 * 2 ** z)
+
+
+def stored_tolerances():
+    return (FULL_DETAIL,) + CONTOUR_TOLERANCES
+
+
+def tolerance_for(requested):
+    """The coarsest stored tolerance not above ``requested`` (full detail for 0)."""
+    return max(tolerance for tolerance in stored_tolerances() if tolerance <= max(requested, FULL_DETAIL))
+
+
+def tolerance_for_zoom(z):
+    return tolerance_for(pixel_tolerance(z))
+
+
+def generalize(rows):
+    """
+    Return contour rows plus one simplified copy per stored tolerance.
+
+    Copies use topology-preserving Douglas–Peucker, so a line never
+    self-intersects or collapses; lines that would drop below two points are
+    left out of that tolerance.
+    """
+    if not rows:
+        return []
+    model = type(rows[0])
+    fields = [field.attname for field in model._meta.concrete_fields if not field.primary_key]
+    pyramid = list(rows)
+    for tolerance in CONTOUR_TOLERANCES:
+        kept = 0
+        for row in rows:
+            geometry = row.geometry.simplify(tolerance, preserve_topology=True)
+            if geometry.empty or geometry.geom_type != 'LineString' or geometry.num_points < 2:
+                continue
+            values = {name: getattr(row, name) for name in fields}
+            values.update(geometry=geometry, tolerance=tolerance)
+            pyramid.append(model(**values))
+            kept += 1
+        logger.debug(f"{model.__name__} at tolerance {tolerance}: {kept} of {len(rows)} lines")
+    return pyramid
@@ -1,3 +1,4 @@
+from django.conf import settings
 from django.http import HttpResponse, JsonResponse
 from django.views import View
 import requests
@@ -7,7 +8,7 @@ logger = logging.getLogger(__name__)
 
 
 class GeoServerProxy(View):
-    GEOSERVER_BASE_URL = "http://127.0.0.1:8081/geoserver"
+    GEOSERVER_BASE_URL = getattr(settings, 'GEOSERVER_URL', "http://127.0.0.1:8081/geoserver")
     
     def get(self, request, wms_path):
         try:
@@ -0,0 +1,356 @@
+import gzip
+import json
+import logging
+import os
+import shutil
+import struct
+import threading
+import zlib
+from collections import OrderedDict
+
+import numpy as np
+from django.conf import settings
+
+try:
+    import brotli
+except ImportError:  # Brotli is optional; gzip is always available
+    brotli = None
+
+from .models import AnalysisGrid, AnalysisRun
+
+logger = logging.getLogger(__name__)
+
+# Local, uncompressed copies of stored grids (one directory per run and domain:
+# meta.json plus one float32 .npy per field), memory-mapped by the sampling code
+GRID_STORE_ROOT = getattr(settings, 'GRID_STORE_ROOT', os.path.join(settings.BASE_DIR, 'var', 'grids'))
+# Runs whose grids stay mapped in each process
+GRID_CACHE_SIZE = getattr(settings, 'GRID_CACHE_SIZE', 32)
+# Rows per compressed chunk; a band can be decompressed without the rest
+GRID_CHUNK_ROWS = 32
+GRID_DTYPE = '<f4'
+
+# Fields stored per analysis kind: the analysed fields and their kriging variance
+GRID_FIELDS = {
+    'surface': ('pressure', 'temperature', 'pressure_variance', 'temperature_variance'),
+    'upperair': ('height', 'temperature', 'height_variance', 'temperature_variance'),
+}
+
+
+def run_dir(run_id, domain=None):
+    path = os.path.join(GRID_STORE_ROOT, str(run_id))
+    return os.path.join(path, domain) if domain else path
+
+
+def _compress(fields, chunk_rows):
+    """Return (payload, chunk_index) with every field split into zlib-compressed row bands."""
+    payload = bytearray()
+    index = {}
+    for name, array in fields.items():
+        index[name] = []
+        for start in range(0, array.shape[0], chunk_rows):
+            chunk = zlib.compress(array[start:start + chunk_rows].tobytes(), 6)
+            index[name].append([len(payload), len(chunk)])
+            payload += chunk
+    return bytes(payload), index
+
+
+def read_field(grid, name, rows=None):
+    """
+    Decompress one field of an AnalysisGrid row into a (ny, nx) float32 array.
+    ``rows`` (start, stop) limits decoding to the chunks covering those rows.
+    """
+    payload = memoryview(bytes(grid.payload))
+    chunks = grid.chunk_index[name]
+    first, last = 0, len(chunks)
+    if rows is not None:
+        first, last = rows[0] // grid.chunk_rows, -(-rows[1] // grid.chunk_rows)
+    data = b''.join(zlib.decompress(payload[offset:offset + length]) for offset, length in chunks[first:last])
+    array = np.frombuffer(data, dtype=GRID_DTYPE).reshape(-1, grid.nx)
+    if rows is not None:
+        array = array[rows[0] - first * grid.chunk_rows:rows[1] - first * grid.chunk_rows]
+    return array
+
+
+def write_grids(run, bounds, resolution, fields, domain):
+    """
+    Store the analysis grids of one domain of a run before it is published.
+
+    ``bounds`` is (min_lon, min_lat, max_lon, max_lat) of the node centres and
+    ``fields`` maps a field name to a 2-D array with rows running south to
+    north. The compressed arrays go to an AnalysisGrid row, and a local
+    uncompressed copy is written for memory-mapped sampling.
+    """
+    arrays = {name: np.ascontiguousarray(values, dtype=GRID_DTYPE) for name, values in fields.items()}
+    shape = next(iter(arrays.values())).shape
+    for name, array in arrays.items():
+        if array.shape != shape:
+            raise ValueError(f"Grid {name} has shape {array.shape}, expected {shape}")
+    payload, chunk_index = _compress(arrays, GRID_CHUNK_ROWS)
+    min_lon, min_lat, max_lon, max_lat = map(float, bounds)
+    grid, _ = AnalysisGrid.objects.update_or_create(
+        run=run,
+        domain=domain,
+        defaults={
+            'level': run.level,
+            'observation_time': run.observation_time,
+            'min_lon': min_lon, 'min_lat': min_lat, 'max_lon': max_lon, 'max_lat': max_lat,
+            'resolution': float(resolution),
+            'ny': shape[0], 'nx': shape[1],
+            'fields': list(arrays),
+            'chunk_rows': GRID_CHUNK_ROWS,
+            'chunk_index': chunk_index,
+            'payload': payload,
+            'raw_size': sum(array.nbytes for array in arrays.values()),
+        },
+    )
+    _materialize(grid, arrays)
+    logger.info(f"Stored {len(arrays)} {domain} grids {shape} for run {run.pk}: {grid.raw_size} bytes raw, {len(payload)} compressed")
+    return grid
+
+
+def _materialize(grid, arrays=None):
+    """
+    Write the local uncompressed copy of a stored grid. Files go to a staging
+    directory renamed into place, so readers never see a partial grid.
+    """
+    target = run_dir(grid.run_id, grid.domain)
+    staging = f"{target}.{os.getpid()}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    for name in grid.fields:
+        array = arrays[name] if arrays else read_field(grid, name)
+        np.save(os.path.join(staging, f"{name}.npy"), array)
+    meta = {
+        'run': grid.run_id,
+        'domain': grid.domain,
+        'bounds': [grid.min_lon, grid.min_lat, grid.max_lon, grid.max_lat],
+        'resolution': grid.resolution,
+        'shape': [grid.ny, grid.nx],
+        'fields': list(grid.fields),
+    }
+    with open(os.path.join(staging, 'meta.json'), 'w') as f:
+        json.dump(meta, f)
+    try:
+        os.replace(staging, target)
+    except OSError:
+        # Another process materialized the same run first
+        shutil.rmtree(staging, ignore_errors=True)
+
+
+class RunGrid:
+    """Memory-mapped grids of one run with bilinear point sampling."""
+
+    def __init__(self, path):
+        with open(os.path.join(path, 'meta.json')) as f:
+            self.meta = json.load(f)
+        self.min_lon, self.min_lat, self.max_lon, self.max_lat = self.meta['bounds']
+        self.ny, self.nx = self.meta['shape']
+        self.fields = {
+            name: np.load(os.path.join(path, f"{name}.npy"), mmap_mode='r')
+            for name in self.meta['fields']
+        }
+
+    def sample(self, field, lons, lats):
+        """
+        Bilinearly interpolate ``field`` at the given points; NaN outside the grid.
+        Accepts scalars or arrays and returns a float64 array.
+        """
+        grid = self.fields[field]
+        lons = np.atleast_1d(np.asarray(lons, dtype='f8'))
+        lats = np.atleast_1d(np.asarray(lats, dtype='f8'))
+        fx = (lons - self.min_lon) / (self.max_lon - self.min_lon) * (self.nx - 1)
+        fy = (lats - self.min_lat) / (self.max_lat - self.min_lat) * (self.ny - 1)
+        inside = (fx >= 0) & (fx <= self.nx - 1) & (fy >= 0) & (fy <= self.ny - 1)
+        fx = np.where(inside, fx, 0.0)
+        fy = np.where(inside, fy, 0.0)
+        i0 = np.clip(np.floor(fx).astype(int), 0, self.nx - 2)
+        j0 = np.clip(np.floor(fy).astype(int), 0, self.ny - 2)
+        wx = fx - i0
+        wy = fy - j0
+        values = (
+            grid[j0, i0] * (1 - wx) * (1 - wy)
+            + grid[j0, i0 + 1] * wx * (1 - wy)
+            + grid[j0 + 1, i0] * (1 - wx) * wy
+            + grid[j0 + 1, i0 + 1] * wx * wy
+        )
+        return np.where(inside, values, np.nan)
+
+
+# (run id, domain) -> RunGrid of published runs, least recently used first
+_open_grids = OrderedDict()
+# run id -> domains of published runs
+_run_domains = {}
+_cache_lock = threading.Lock()
+
+
+def _published(run_id):
+    """True once a run is published; its grids are complete and never change after that."""
+    return AnalysisRun.objects.filter(
+        pk=run_id, status__in=[AnalysisRun.STATUS_COMPLETE, AnalysisRun.STATUS_SUPERSEDED],
+    ).exists()
+
+
+def open_grid(run_id, domain):
+    """
+    Return the mapped grids of one domain of a run, or None if not stored.
+    The local copy is decompressed from the grid store on first use. Grids of
+    published runs are kept mapped per process; a grid that is missing, or
+    belongs to a run still being computed, is looked up again next time.
+    """
+    key = (run_id, domain)
+    with _cache_lock:
+        grid = _open_grids.get(key)
+        if grid is not None:
+            _open_grids.move_to_end(key)
+            return grid
+    path = run_dir(run_id, domain)
+    if not os.path.exists(os.path.join(path, 'meta.json')):
+        stored = AnalysisGrid.objects.filter(run_id=run_id, domain=domain).first()
+        if stored is None:
+            return None
+        _materialize(stored)
+    grid = RunGrid(path)
+    if _published(run_id):
+        with _cache_lock:
+            _open_grids[key] = grid
+            if len(_open_grids) > GRID_CACHE_SIZE:
+                _open_grids.popitem(last=False)
+    return grid
+
+
+def run_domains(run_id):
+    """Domains with stored grids for a run, coarsest first."""
+    domains = _run_domains.get(run_id)
+    if domains is None:
+        domains = tuple(
+            AnalysisGrid.objects.filter(run_id=run_id).order_by('-resolution').values_list('domain', flat=True)
+        )
+        # Only complete answers are kept: grids are written before a run is published
+        if domains and _published(run_id):
+            with _cache_lock:
+                if len(_run_domains) >= GRID_CACHE_SIZE * 8:
+                    _run_domains.clear()
+                _run_domains[run_id] = domains
+    return domains
+
+
+def forget_grids():
+    """Drop the per-process grid caches (the local copies stay on disk)."""
+    with _cache_lock:
+        _open_grids.clear()
+        _run_domains.clear()
+
+
+def sample_run(run_id, field, lons, lats, domain=None):
+    """
+    Sample ``field`` of a run at points from the finest domain covering each
+    point, or from ``domain`` only. Returns (values, domain per point), with
+    NaN and None for points outside every grid.
+    """
+    lons = np.atleast_1d(np.asarray(lons, dtype='f8'))
+    values = np.full(lons.shape, np.nan)
+    sources = np.full(lons.shape, None, dtype=object)
+    for name in ([domain] if domain else run_domains(run_id)):
+        grid = open_grid(run_id, name)
+        if grid is None or field not in grid.fields:
+            continue
+        sampled = grid.sample(field, lons, lats)
+        inside = ~np.isnan(sampled)
+        values[inside] = sampled[inside]
+        sources[inside] = name
+    return values, sources
+
+
+# Binary transfer encodings: numpy dtype and the value marking missing nodes
+BINARY_ENCODINGS = {
+    'float32': ('<f4', None),
+    'int16': ('<i2', -32768),
+}
+
+
+def _binary_header(grid, field, encoding, scale, offset):
+    dtype, nodata = BINARY_ENCODINGS[encoding]
+    header = {
+        'run': grid.meta['run'],
+        'domain': grid.meta['domain'],
+        'field': field,
+        'bounds': grid.meta['bounds'],
+        'shape': grid.meta['shape'],
+        'order': 'row-major, south to north',
+        'dtype': dtype,
+        'scale': scale,
+        'offset': offset,
+        'nodata': nodata,
+    }
+    encoded = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    # Pad so the array starts 4-byte aligned (Float32Array/Int16Array views)
+    encoded += b' ' * (-(len(encoded) + 4) % 4)
+    return struct.pack('<I', len(encoded)) + encoded
+
+
+def encode_field(grid, field, encoding):
+    """
+    Encode one mapped field for transfer: a little-endian uint32 header length,
+    a JSON header (bounds, shape, dtype, scale/offset, nodata) and the array.
+
+    int16 packs values as round((value - offset) / scale) with NaN as nodata;
+    float32 is sent as stored (scale 1, offset 0, NaN for missing nodes).
+    """
+    values = np.asarray(grid.fields[field], dtype='f4')
+    if encoding == 'float32':
+        return _binary_header(grid, field, encoding, 1.0, 0.0) + values.astype('<f4').tobytes()
+    finite = values[np.isfinite(values)]
+    low, high = (float(finite.min()), float(finite.max())) if finite.size else (0.0, 0.0)
+    offset = (low + high) / 2
+    scale = max((high - low) / 65000, 1e-6)
+    packed = np.full(values.shape, BINARY_ENCODINGS['int16'][1], dtype='<i2')
+    mask = np.isfinite(values)
+    packed[mask] = np.round((values[mask] - offset) / scale).astype('<i2')
+    return _binary_header(grid, field, encoding, scale, offset) + packed.tobytes()
+
+
+def binary_variants(run_id, domain, field, encoding):
+    """
+    Return {content-coding: path} for the binary transfer file of a field,
+    writing the identity, gzip and (if available) Brotli variants on first
+    use. A run's grids never change, so the files are kept with its local copy.
+    """
+    grid = open_grid(run_id, domain)
+    if grid is None or field not in grid.fields or encoding not in BINARY_ENCODINGS:
+        return None
+    base = os.path.join(run_dir(run_id, domain), f"{field}.{encoding}.bin")
+    variants = {'identity': base, 'gzip': f"{base}.gz"}
+    if brotli:
+        variants['br'] = f"{base}.br"
+    if all(os.path.exists(path) for path in variants.values()):
+        return variants
+    body = encode_field(grid, field, encoding)
+    encoded = {'identity': body, 'gzip': gzip.compress(body, compresslevel=9)}
+    if brotli:
+        encoded['br'] = brotli.compress(body, quality=11)
+    for coding, path in variants.items():
+        staging = f"{path}.{os.getpid()}.tmp"
+        with open(staging, 'wb') as f:
+            f.write(encoded[coding])
+        os.replace(staging, path)
+    logger.info(
+        f"Encoded {domain} {field} of run {run_id} as {encoding}: "
+        + ', '.join(f"{coding} {len(data)} bytes" for coding, data in encoded.items())
+    )
+    return variants
+
+
+def prune_grids():
+    """Remove local grid copies of runs that no longer exist."""
+    if not os.path.isdir(GRID_STORE_ROOT):
+        return 0
+    names = [name for name in os.listdir(GRID_STORE_ROOT) if name.split('.')[0].isdigit()]
+    alive = set(AnalysisRun.objects.filter(id__in={int(name.split('.')[0]) for name in names}).values_list('id', flat=True))
+    removed = 0
+    for name in names:
+        if int(name.split('.')[0]) not in alive:
+            shutil.rmtree(os.path.join(GRID_STORE_ROOT, name), ignore_errors=True)
+            removed += 1
+    if removed:
+        logger.info(f"Removed {removed} local grid copies of deleted runs")
+    return removed
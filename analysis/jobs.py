@@ -0,0 +1,125 @@
+import hashlib
+import json
+import logging
+import uuid
+
+from celery import states
+from celery.result import AsyncResult
+from django.conf import settings
+from django.core.cache import cache
+
+from . import admission
+from .locks import canonical_time, lock_key
+
+logger = logging.getLogger(__name__)
+
+ANALYSIS_KINDS = ('surface', 'upperair', 'tend3h', 'tend24h')
+
+# How long a finished job stays attached to its key before a new request
+# re-enqueues the analysis (e.g. after late reports arrive).
+JOB_KEY_TTL = getattr(settings, 'ANALYSIS_JOB_KEY_TTL', 300)
+
+STATUS_MAP = {
+    states.PENDING: 'queued',
+    states.RECEIVED: 'queued',
+    states.STARTED: 'running',
+    'PROGRESS': 'running',
+    states.RETRY: 'queued',  # Deferred until an admission slot frees up
+    states.SUCCESS: 'done',
+    states.FAILURE: 'failed',
+    states.REVOKED: 'failed',
+}
+
+
+def _job_cache_key(kind, level, observation_time):
+    return f"analysis-job:{lock_key(kind, level, observation_time)}"
+
+
+def _admit(cache_key):
+    """Admit a new job, detaching it from its key again if the queue is full."""
+    try:
+        admission.admit()
+    except admission.Saturated:
+        cache.delete(cache_key)
+        raise
+
+
+def _dispatch(task, cache_key, args, job_id):
+    """Send an admitted job to the broker; if that fails, release its key and queue place."""
+    try:
+        task.apply_async(args=args, task_id=job_id)
+    except Exception:
+        cache.delete(cache_key)
+        admission.withdraw()
+        raise
+
+
+def job_status(job_id):
+    """Describe a job as queued, running, done or failed with stage progress."""
+    result = AsyncResult(job_id)
+    state = result.state
+    status = {
+        'job_id': job_id,
+        'status': STATUS_MAP.get(state, 'running'),
+        'stage': None,
+        'progress': 0.0,
+    }
+    info = result.info
+    if state == 'PROGRESS' and isinstance(info, dict):
+        status['stage'] = info.get('stage')
+        status['progress'] = info.get('progress', 0.0)
+    elif state == states.SUCCESS:
+        status['stage'] = 'done'
+        status['progress'] = 1.0
+        status['result'] = info if isinstance(info, dict) else None
+    elif state in (states.FAILURE, states.REVOKED):
+        status['error'] = str(info) if info else state
+    return status
+
+
+def enqueue_render(kind, level, observation_time, map_type, style, extent, size):
+    """
+    Enqueue a server-side map render unless an identical one is already
+    attached to the same parameters, and return the job status. Raises
+    admission.Saturated if the job queue is full.
+    """
+    from .tasks import render_map
+
+    params = [kind, level, observation_time, map_type, style, extent, size]
+    cache_key = f"render-job:{hashlib.sha256(json.dumps(params).encode('utf-8')).hexdigest()}"
+    job_id = str(uuid.uuid4())
+    if not cache.add(cache_key, job_id, timeout=JOB_KEY_TTL):
+        existing = cache.get(cache_key)
+        if existing:
+            return job_status(existing)
+        cache.set(cache_key, job_id, timeout=JOB_KEY_TTL)
+    _admit(cache_key)
+
+    _dispatch(render_map, cache_key, params, job_id)
+    logger.info(f"Enqueued {map_type} render job {job_id} for {kind} level={level}, observation_time={observation_time}")
+    return {'job_id': job_id, 'status': 'queued', 'stage': None, 'progress': 0.0}
+
+
+def enqueue_analysis(kind, level, observation_time=None):
+    """
+    Enqueue an analysis for (kind, level, observation_time) unless one is
+    already attached to that key, and return the job status. Raises
+    admission.Saturated if the job queue is full.
+    """
+    from .tasks import run_analysis
+
+    if kind not in ANALYSIS_KINDS:
+        raise ValueError(f"Unknown analysis kind: {kind}")
+
+    cache_key = _job_cache_key(kind, level, observation_time)
+    job_id = str(uuid.uuid4())
+    if not cache.add(cache_key, job_id, timeout=JOB_KEY_TTL):
+        existing = cache.get(cache_key)
+        if existing:
+            return job_status(existing)
+        cache.set(cache_key, job_id, timeout=JOB_KEY_TTL)
+    _admit(cache_key)
+
+    _dispatch(run_analysis, cache_key, [kind, level, observation_time], job_id)
+    logger.info(f"Enqueued {kind} analysis job {job_id} for level={level}, observation_time={canonical_time(observation_time)}")
+    return {'job_id': job_id, 'status': 'queued', 'stage': None, 'progress': 0.0}
@@ -0,0 +1,111 @@
+import hashlib
+import logging
+import threading
+import time
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import pytz
+from django.db import connection
+
+logger = logging.getLogger(__name__)
+
+# In-process fallback used when the database has no advisory locks (SQLite in tests)
+_local_locks = {}
+_local_guard = threading.Lock()
+
+
+class LockTimeout(TimeoutError):
+    """Raised when a single-flight lock could not be acquired in time."""
+
+
+def default_observation_time():
+    """The time the generators analyse when none is given: the current hour in Nepal time."""
+    return datetime.now(tz=pytz.timezone('Asia/Kathmandu')).replace(microsecond=0, second=0, minute=0)
+
+
+def canonical_time(observation_time):
+    """
+    Normalise an observation time to a stable UTC key.
+
+    Accepts an ISO string (with 'Z' or an explicit offset), an aware or naive
+    datetime (naive is taken as UTC) or None, which is resolved to
+    default_observation_time() so it shares the key of that explicit time.
+    """
+    if observation_time is None:
+        observation_time = default_observation_time()
+    if isinstance(observation_time, str):
+        try:
+            observation_time = datetime.fromisoformat(observation_time.replace('Z', '+00:00'))
+        except ValueError:
+            return observation_time
+    if observation_time.tzinfo is None:
+        observation_time = observation_time.replace(tzinfo=timezone.utc)
+    return observation_time.astimezone(timezone.utc).strftime('%Y-%m-%dT%H:%M:%SZ')
+
+
+def lock_key(kind, level, observation_time):
+    return f"{kind}:{level}:{canonical_time(observation_time)}"
+
+
+def _advisory_id(key):
+    """Map a lock key onto the signed 64-bit integer space of pg advisory locks."""
+    digest = hashlib.sha1(key.encode('utf-8')).digest()
+    return int.from_bytes(digest[:8], 'big', signed=True)
+
+
+@contextmanager
+def _advisory_lock(key, timeout, poll_interval):
+    lock_id = _advisory_id(key)
+    deadline = time.monotonic() + timeout
+    with connection.cursor() as cursor:
+        while True:
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", [lock_id])
+            if cursor.fetchone()[0]:
+                break
+            if time.monotonic() >= deadline:
+                raise LockTimeout(f"Timed out waiting for analysis lock {key}")
+            time.sleep(poll_interval)
+    try:
+        yield
+    finally:
+        with connection.cursor() as cursor:
+            cursor.execute("SELECT pg_advisory_unlock(%s)", [lock_id])
+
+
+@contextmanager
+def _local_lock(key, timeout):
+    with _local_guard:
+        lock = _local_locks.setdefault(key, threading.Lock())
+    if not lock.acquire(timeout=timeout):
+        raise LockTimeout(f"Timed out waiting for analysis lock {key}")
+    try:
+        yield
+    finally:
+        lock.release()
+
+
+@contextmanager
+def single_flight(kind, level, observation_time, timeout=300, poll_interval=0.25):
+    """
+    Serialise analysis runs for one (kind, level, observation time) key.
+
+    Uses a PostgreSQL session advisory lock so that concurrent web workers and
+    Celery processes share the same lock, and a per-process lock otherwise.
+    Callers that had to wait should re-check for a stored result before
+    computing; the generators do this through the input fingerprint.
+    """
+    key = lock_key(kind, level, observation_time)
+    started = time.monotonic()
+    manager = (
+        _advisory_lock(key, timeout, poll_interval)
+        if connection.vendor == 'postgresql'
+        else _local_lock(key, timeout)
+    )
+    with manager:
+        waited = time.monotonic() - started
+        if waited > poll_interval:
+            logger.info(f"Acquired analysis lock {key} after waiting {waited:.1f}s")
+        else:
+            logger.debug(f"Acquired analysis lock {key}")
+        yield
@@ -0,0 +1,31 @@
+"""
+Recompute which stations publish their reports from the visibility policy
+(STATION_FREE_COUNTRIES, STATION_RESTRICTED_COUNTRIES, STATION_POLICY_CSV).
+Usage: python manage.py apply_station_visibility
+       python manage.py apply_station_visibility --if-changed  # Skip if the policy is unchanged
+"""
+from django.core.management.base import BaseCommand
+
+from analysis.visibility import apply_visibility, load_policy, refresh_visibility
+
+
+class Command(BaseCommand):
+    help = 'Recompute station visibility from the policy settings and CSV'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--if-changed',
+            action='store_true',
+            help='Only recompute when the policy fingerprint changed since the last run',
+        )
+
+    def handle(self, *args, **options):
+        policy = load_policy()
+        self.stdout.write(
+            f"Policy {policy['fingerprint'][:12]}: {len(policy['free'])} free countries, "
+            f"{len(policy['restricted'])} restricted, {len(policy['station_ids'])} listed stations"
+        )
+        changed = refresh_visibility() if options.get('if_changed') else apply_visibility(policy)
+        for model, count in changed.items():
+            self.stdout.write(f"  - {model}: {count} stations changed")
+        self.stdout.write(self.style.SUCCESS('✓ Station visibility up to date'))
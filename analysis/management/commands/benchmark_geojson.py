@@ -0,0 +1,76 @@
+"""
+Benchmark the SQL-built GeoJSON fast path against DRF serialization.
+Usage: python manage.py benchmark_geojson
+       python manage.py benchmark_geojson --endpoint reports --level SURFACE --observation-time 2025-04-24T06:00:00Z --runs 20
+"""
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.test import APIRequestFactory
+
+from analysis.views import (
+    IsobarViewSet, IsothermViewSet, PressureCenterViewSet, SynopReportViewSet, WeatherStationViewSet,
+    UpperAirIsobarViewSet, UpperAirIsothermViewSet, UpperAirPressureCenterViewSet, UpperAirSynopReportViewSet,
+)
+
+ENDPOINTS = {
+    'weather-stations': WeatherStationViewSet,
+    'reports': SynopReportViewSet,
+    'isobars': IsobarViewSet,
+    'isotherms': IsothermViewSet,
+    'pressure-centers': PressureCenterViewSet,
+    'upperair-reports': UpperAirSynopReportViewSet,
+    'upperair-isobars': UpperAirIsobarViewSet,
+    'upperair-isotherms': UpperAirIsothermViewSet,
+    'upperair-pressure-centers': UpperAirPressureCenterViewSet,
+}
+
+
+class Command(BaseCommand):
+    help = 'Compare response time and size of DRF vs SQL GeoJSON serialization for a list endpoint'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--endpoint', default='reports', choices=sorted(ENDPOINTS), help='Endpoint to benchmark')
+        parser.add_argument('--level', default=None, help='Level query parameter')
+        parser.add_argument('--observation-time', default=None, help='observation_time query parameter (ISO 8601)')
+        parser.add_argument('--limit', type=int, default=1000, help='Page size (0 for unpaginated)')
+        parser.add_argument('--runs', type=int, default=10, help='Timed requests per path')
+
+    def _time(self, view, params, runs):
+        factory = APIRequestFactory()
+        timings, size = [], 0
+        for i in range(runs + 1):
+            request = factory.get('/api/benchmark/', params)
+            started = time.perf_counter()
+            response = view(request)
+            if hasattr(response, 'render'):
+                response.render()
+            elapsed = (time.perf_counter() - started) * 1000
+            if response.status_code != 200:
+                raise CommandError(f'Request failed with status {response.status_code}: {response.content[:200]!r}')
+            size = len(response.content)
+            if i:  # First request warms caches and connections
+                timings.append(elapsed)
+        return timings, size
+
+    def handle(self, *args, **options):
+        view = ENDPOINTS[options['endpoint']].as_view({'get': 'list'})
+        params = {}
+        if options['level']:
+            params['level'] = options['level']
+        if options['observation_time']:
+            params['observation_time'] = options['observation_time']
+        if options['limit']:
+            params['limit'] = options['limit']
+
+        results = {}
+        for path in ('drf', 'sql'):
+            timings, size = self._time(view, {**params, 'geojson': path}, options['runs'])
+            results[path] = (statistics.median(timings), min(timings), size)
+            self.stdout.write(
+                f'{path:>4}: median {results[path][0]:8.1f} ms, best {results[path][1]:8.1f} ms, {size} bytes'
+            )
+
+        speedup = results['drf'][0] / results['sql'][0] if results['sql'][0] else float('inf')
+        self.stdout.write(self.style.SUCCESS(f'✓ SQL path is {speedup:.1f}x the speed of the DRF path'))
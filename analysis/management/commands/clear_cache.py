@@ -1,16 +1,30 @@
 """
-Management command to clear the Django cache.
+Management command to invalidate cached surface and upper-air data.
 Usage: python manage.py clear_cache
-       python manage.py clear_cache --keys  # Show cache keys before clearing
+       python manage.py clear_cache --all   # Wipe the entire Django cache
+       python manage.py clear_cache --keys  # Show cache keys before wiping (with --all)
+
+By default only the cache namespaces of reports and analyses are bumped, which
+makes their cached responses and tiles unreachable without touching anything
+else (job de-duplication keys, metrics counters).
 """
 from django.core.management.base import BaseCommand
 from django.core.cache import cache
 
+from analysis.catalogue import SURFACE, UPPERAIR, invalidate_source
+from analysis.namespaces import bump_source
+from analysis.versions import SURFACE_ANALYSIS, SURFACE_REPORTS, UPPERAIR_ANALYSIS, UPPERAIR_REPORTS
+
 
 class Command(BaseCommand):
-    help = 'Clear the Django cache store (including upper air and surface data cache)'
+    help = 'Invalidate cached surface and upper-air data (or wipe the whole cache with --all)'
 
     def add_arguments(self, parser):
+        parser.add_argument(
+            '--all',
+            action='store_true',
+            help='Clear the entire cache store instead of bumping namespaces',
+        )
         parser.add_argument(
             '--keys',
             action='store_true',
@@ -18,9 +32,17 @@ class Command(BaseCommand):
         )
 
     def handle(self, *args, **options):
-        show_keys = options.get('keys', False)
-        
-        if show_keys:
+        if not options.get('all'):
+            for source in (SURFACE_REPORTS, SURFACE_ANALYSIS, UPPERAIR_REPORTS, UPPERAIR_ANALYSIS):
+                bump_source(source)
+            invalidate_source(SURFACE)
+            invalidate_source(UPPERAIR)
+            self.stdout.write(self.style.SUCCESS('✓ Cache namespaces bumped'))
+            self.stdout.write(self.style.SUCCESS('  - Surface and upper air responses and tiles invalidated'))
+            self.stdout.write(self.style.SUCCESS('  - Observation times and available levels invalidated'))
+            return
+
+        if options.get('keys'):
             try:
                 # Try to get all keys (works with some cache backends like Redis/Memcached)
                 if hasattr(cache, 'keys'):
@@ -37,13 +59,9 @@ class Command(BaseCommand):
                     self.stdout.write(self.style.WARNING('Cache backend does not support key listing'))
             except Exception as e:
                 self.stdout.write(self.style.WARNING(f'Could not list cache keys: {e}'))
-        
+
         # Clear the entire cache
         self.stdout.write('Clearing all cache...')
         cache.clear()
-        
+
         self.stdout.write(self.style.SUCCESS('✓ Cache cleared successfully!'))
-        self.stdout.write(self.style.SUCCESS('  - Upper air observation times cache cleared'))
-        self.stdout.write(self.style.SUCCESS('  - Surface observation times cache cleared'))
-        self.stdout.write(self.style.SUCCESS('  - Available levels cache cleared'))
-        self.stdout.write(self.style.SUCCESS('  - All other cached data cleared'))
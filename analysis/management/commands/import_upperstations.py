@@ -2,6 +2,7 @@ import csv
 from django.core.management.base import BaseCommand
 from django.contrib.gis.geos import Point
 from analysis.models import UpperAirWeatherStation
+from analysis.visibility import apply_visibility
 
 class Command(BaseCommand):
     help = 'Import weather stations from a CSV file with decimal coordinates (handles missing elevation)'
@@ -42,5 +43,10 @@ class Command(BaseCommand):
 
         except FileNotFoundError:
             self.stdout.write(self.style.ERROR(f"CSV file not found: {csv_file_path}"))
+            return
         except Exception as e:
             self.stdout.write(self.style.ERROR(f"Error importing stations: {e}"))
+            return
+
+        changed = apply_visibility(models=[UpperAirWeatherStation])
+        self.stdout.write(self.style.SUCCESS(f"✓ Station visibility recomputed ({changed.get('UpperAirWeatherStation', 0)} changed)"))
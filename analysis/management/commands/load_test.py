@@ -0,0 +1,118 @@
+"""
+Ramp concurrent users over the hot read endpoints and report the capacity of
+a deployment, optionally against a second one (e.g. WSGI vs ASGI).
+Usage: python manage.py load_test --base-url http://127.0.0.1:8000
+       python manage.py load_test --base-url http://127.0.0.1:8000 --compare-url http://127.0.0.1:8001 --users 25,50,100,200 --duration 30 --slo-ms 500
+"""
+import asyncio
+import random
+import statistics
+import time
+
+import aiohttp
+from django.core.management.base import BaseCommand, CommandError
+
+
+def endpoint_paths(level, observation_time):
+    """Weighted request mix of a map client: time list, bundle, point samples and WMS tiles."""
+    paths = [
+        (3, f'/api/observation-times/?level={level}'),
+        (1, '/api/available-levels/'),
+        (2, '/api/geoserver/wms?service=WMS&request=GetCapabilities'),
+    ]
+    if observation_time:
+        paths += [
+            (2, f'/api/analysis-bundle/?level={level}&observation_time={observation_time}'),
+            (4, f'/api/sample/?level={level}&time={observation_time}&lon={{lon}}&lat={{lat}}'),
+        ]
+    return paths
+
+
+def percentile(values, fraction):
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class Command(BaseCommand):
+    help = 'Load-test the hot read endpoints with a ramp of concurrent users and report capacity per server'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--base-url', required=True, help='Server under test, e.g. http://127.0.0.1:8000')
+        parser.add_argument('--compare-url', default=None, help='Second server to compare against (e.g. the ASGI one)')
+        parser.add_argument('--users', default='10,25,50,100,200', help='Comma-separated concurrent user steps')
+        parser.add_argument('--duration', type=float, default=20, help='Seconds per step')
+        parser.add_argument('--slo-ms', type=float, default=500, help='p95 latency objective in ms')
+        parser.add_argument('--level', default='SURFACE', help='Level query parameter')
+        parser.add_argument('--observation-time', default=None, help='observation_time for bundle and sample requests')
+
+    async def _user(self, session, base_url, paths, deadline, timings, errors):
+        weights = [weight for weight, _ in paths]
+        while time.monotonic() < deadline:
+            path = random.choices([p for _, p in paths], weights)[0]
+            if '{lon}' in path:
+                path = path.format(lon=round(random.uniform(-10, 40), 3), lat=round(random.uniform(30, 60), 3))
+            started = time.perf_counter()
+            try:
+                async with session.get(base_url + path) as response:
+                    await response.read()
+                    # 202 is a valid answer (analysis accepted); anything 5xx counts against the server
+                    failed = response.status >= 500
+            except (aiohttp.ClientError, asyncio.TimeoutError):
+                failed = True
+            timings.append((time.perf_counter() - started) * 1000)
+            errors.append(failed)
+
+    async def _step(self, base_url, paths, users, duration):
+        timings, errors = [], []
+        connector = aiohttp.TCPConnector(limit=0)
+        async with aiohttp.ClientSession(connector=connector, timeout=aiohttp.ClientTimeout(total=60)) as session:
+            deadline = time.monotonic() + duration
+            await asyncio.gather(*(
+                self._user(session, base_url, paths, deadline, timings, errors) for _ in range(users)
+            ))
+        error_rate = sum(errors) / len(errors) if errors else 1.0
+        return {
+            'rps': len(timings) / duration,
+            'p50': statistics.median(timings) if timings else 0.0,
+            'p95': percentile(timings, 0.95),
+            'errors': error_rate,
+        }
+
+    def _ramp(self, base_url, paths, steps, options):
+        self.stdout.write(f'\n{base_url}')
+        capacity = 0
+        for users in steps:
+            result = asyncio.run(self._step(base_url, paths, users, options['duration']))
+            within = result['p95'] <= options['slo_ms'] and result['errors'] < 0.01
+            if within:
+                capacity = users
+            self.stdout.write(
+                f"{users:>5} users: {result['rps']:8.1f} req/s, p50 {result['p50']:7.1f} ms, "
+                f"p95 {result['p95']:7.1f} ms, errors {result['errors']:6.2%} {'' if within else '(over SLO)'}"
+            )
+        return capacity
+
+    def handle(self, *args, **options):
+        try:
+            steps = sorted({int(value) for value in options['users'].split(',') if value.strip()})
+        except ValueError:
+            raise CommandError('--users must be comma-separated integers')
+        if not steps or steps[0] < 1:
+            raise CommandError('--users needs at least one positive step')
+        paths = endpoint_paths(options['level'], options['observation_time'])
+
+        capacities = {}
+        for url in filter(None, (options['base_url'], options['compare_url'])):
+            capacities[url] = self._ramp(url.rstrip('/'), paths, steps, options)
+
+        self.stdout.write('')
+        for url, capacity in capacities.items():
+            self.stdout.write(self.style.SUCCESS(
+                f'✓ {url}: {capacity} concurrent users within p95 ≤ {options["slo_ms"]:.0f} ms and < 1% errors'
+            ))
+        if options['compare_url']:
+            base, other = capacities[options['base_url']], capacities[options['compare_url']]
+            if base:
+                self.stdout.write(f'{options["compare_url"]} sustains {other / base:.1f}x the users of {options["base_url"]}')
@@ -0,0 +1,41 @@
+"""
+Create upcoming monthly partitions and drop partitions past retention.
+Usage: python manage.py maintain_partitions
+       python manage.py maintain_partitions --ahead 6 --no-retention
+"""
+from django.core.management.base import BaseCommand
+from django.db import connection
+from analysis.partitions import drop_expired_partitions, ensure_future_partitions
+
+
+class Command(BaseCommand):
+    help = 'Create future observation_time partitions and drop expired ones'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--ahead',
+            type=int,
+            default=None,
+            help='Number of months ahead to create partitions for (default: PARTITION_MONTHS_AHEAD)',
+        )
+        parser.add_argument(
+            '--no-retention',
+            action='store_true',
+            help='Only create partitions; do not drop expired ones',
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            self.stdout.write(self.style.WARNING('Partitioning requires PostgreSQL; nothing to do'))
+            return
+
+        created = ensure_future_partitions(months_ahead=options['ahead'])
+        for name in created:
+            self.stdout.write(f'  + {name}')
+        self.stdout.write(self.style.SUCCESS(f'✓ Created {len(created)} partitions'))
+
+        if not options['no_retention']:
+            dropped = drop_expired_partitions()
+            for name in dropped:
+                self.stdout.write(f'  - {name}')
+            self.stdout.write(self.style.SUCCESS(f'✓ Dropped {len(dropped)} expired partitions'))
@@ -1,9 +1,11 @@
 """
-Fetch both surface and upper-air data, then clear the cache.
+Fetch both surface and upper-air data.
 Usage: python manage.py refresh_data
+
+Cached responses for the levels and times that received new reports are
+invalidated by the fetch itself (cache namespace bump); nothing else is evicted.
 """
 from django.core.management.base import BaseCommand
-from django.core.cache import cache
 from analysis.tasks import fetch_meteo_data
 from analysis.upperair_task import fetch_upper_air_data
 import logging
@@ -12,10 +14,10 @@ logger = logging.getLogger(__name__)
 
 
 class Command(BaseCommand):
-    help = 'Fetch surface and upper-air data, then clear cache (refresh)'
+    help = 'Fetch surface and upper-air data (refresh)'
 
     def handle(self, *args, **options):
-        self.stdout.write(self.style.SUCCESS('Starting refresh: surface + upper-air fetch, then cache clear...'))
+        self.stdout.write(self.style.SUCCESS('Starting refresh: surface + upper-air fetch...'))
         try:
             # Fetch surface
             fetch_meteo_data()
@@ -25,10 +27,6 @@ class Command(BaseCommand):
             fetch_upper_air_data()
             self.stdout.write(self.style.SUCCESS('Upper-air data fetched.'))
 
-            # Clear cache
-            cache.clear()
-            self.stdout.write(self.style.SUCCESS('Cache cleared.'))
-
             self.stdout.write(self.style.SUCCESS('Refresh complete.'))
         except Exception as e:
             logger.error('Error during refresh_data command', exc_info=True)
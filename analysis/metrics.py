@@ -0,0 +1,42 @@
+from django.core.cache import cache
+import logging
+
+logger = logging.getLogger(__name__)
+
+METRICS_PREFIX = 'analysis-metrics'
+
+# Counters reported by the metrics endpoint
+ANALYSIS_COUNTERS = [
+    'surface.skipped',
+    'surface.recomputed',
+    'upperair.skipped',
+    'upperair.recomputed',
+    'render.cached',
+    'render.rendered',
+    'admission.admitted',
+    'admission.rejected',
+    'admission.deferred',
+]
+
+
+def _key(name):
+    return f"{METRICS_PREFIX}:{name}"
+
+
+def incr(name, amount=1):
+    """Increment a named counter in the shared cache and return its new value."""
+    key = _key(name)
+    cache.add(key, 0, timeout=None)
+    try:
+        return cache.incr(key, amount)
+    except ValueError:
+        # Key evicted between add() and incr()
+        cache.set(key, amount, timeout=None)
+        return amount
+
+
+def snapshot(names=None):
+    """Return the current value of each counter (0 if never incremented)."""
+    names = names or ANALYSIS_COUNTERS
+    values = cache.get_many([_key(name) for name in names])
+    return {name: values.get(_key(name), 0) for name in names}
@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:00
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0009_add_upperairmap_level'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='isobar',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Hash of the inputs that produced this analysis', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='isotherm',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Hash of the inputs that produced this analysis', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='pressurecenter',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Hash of the inputs that produced this analysis', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='upperairisobar',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Hash of the inputs that produced this analysis', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='upperairisotherm',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Hash of the inputs that produced this analysis', max_length=64),
+        ),
+        migrations.AddField(
+            model_name='upperairpressurecenter',
+            name='input_fingerprint',
+            field=models.CharField(blank=True, default='', help_text='Hash of the inputs that produced this analysis', max_length=64),
+        ),
+    ]
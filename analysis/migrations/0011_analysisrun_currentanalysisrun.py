@@ -0,0 +1,99 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0010_add_input_fingerprint'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('surface', 'Surface'), ('upperair', 'Upper Air')], max_length=10)),
+                ('level', models.CharField(max_length=10)),
+                ('observation_time', models.DateTimeField()),
+                ('engine_params', models.JSONField(default=dict, help_text='Grid and engine parameters used for this run')),
+                ('fingerprint', models.CharField(help_text='Hash of the inputs that produced this run', max_length=64)),
+                ('status', models.CharField(choices=[('RUNNING', 'Running'), ('COMPLETE', 'Complete'), ('FAILED', 'Failed'), ('SUPERSEDED', 'Superseded')], default='RUNNING', max_length=10)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('completed_at', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'level', 'observation_time'], name='analysis_an_kind_66f5d0_idx'), models.Index(fields=['status', 'created_at'], name='analysis_an_status_7c140b_idx')],
+            },
+        ),
+        migrations.CreateModel(
+            name='CurrentAnalysisRun',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('surface', 'Surface'), ('upperair', 'Upper Air')], max_length=10)),
+                ('level', models.CharField(max_length=10)),
+                ('observation_time', models.DateTimeField()),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('run', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='current_pointer', to='analysis.analysisrun')),
+            ],
+            options={
+                'unique_together': {('kind', 'level', 'observation_time')},
+            },
+        ),
+        migrations.RemoveField(
+            model_name='isobar',
+            name='input_fingerprint',
+        ),
+        migrations.AddField(
+            model_name='isobar',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun'),
+        ),
+        migrations.RemoveField(
+            model_name='isotherm',
+            name='input_fingerprint',
+        ),
+        migrations.AddField(
+            model_name='isotherm',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun'),
+        ),
+        migrations.RemoveField(
+            model_name='pressurecenter',
+            name='input_fingerprint',
+        ),
+        migrations.AddField(
+            model_name='pressurecenter',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun'),
+        ),
+        migrations.RemoveField(
+            model_name='upperairisobar',
+            name='input_fingerprint',
+        ),
+        migrations.AddField(
+            model_name='upperairisobar',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun'),
+        ),
+        migrations.RemoveField(
+            model_name='upperairisotherm',
+            name='input_fingerprint',
+        ),
+        migrations.AddField(
+            model_name='upperairisotherm',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun'),
+        ),
+        migrations.RemoveField(
+            model_name='upperairpressurecenter',
+            name='input_fingerprint',
+        ),
+        migrations.AddField(
+            model_name='upperairpressurecenter',
+            name='run',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun'),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:30
+
+from django.db import migrations, models
+
+CONTOUR_MODELS = ['isobar', 'isotherm', 'pressurecenter', 'upperairisobar', 'upperairisotherm', 'upperairpressurecenter']
+
+
+def delete_untimed_contours(apps, schema_editor):
+    """Contour rows without an observation time cannot be placed in a partition."""
+    for model_name in CONTOUR_MODELS:
+        apps.get_model('analysis', model_name).objects.filter(observation_time__isnull=True).delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0011_analysisrun_currentanalysisrun'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_untimed_contours, migrations.RunPython.noop),
+        migrations.AlterField(
+            model_name='isobar',
+            name='observation_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='isotherm',
+            name='observation_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='pressurecenter',
+            name='observation_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='upperairisobar',
+            name='observation_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='upperairisotherm',
+            name='observation_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.AlterField(
+            model_name='upperairpressurecenter',
+            name='observation_time',
+            field=models.DateTimeField(),
+        ),
+        migrations.RemoveIndex(
+            model_name='synopreport',
+            name='analysis_sy_level_d53f86_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='upperairsynopreport',
+            name='analysis_up_level_e8ab87_idx',
+        ),
+        migrations.AddIndex(
+            model_name='synopreport',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_sy_level_f53554_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairsynopreport',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_up_level_dc1e4c_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isobar',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_is_level_7d1290_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isotherm',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_is_level_1bf5a5_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pressurecenter',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_pr_level_917399_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairisobar',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_up_level_8f15c9_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairisotherm',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_up_level_056cc2_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairpressurecenter',
+            index=models.Index(fields=['level', 'observation_time'], name='analysis_up_level_d3d1e3_idx'),
+        ),
+    ]
@@ -0,0 +1,110 @@
+# Generated by Django 5.2.6 on 2026-10-19 09:45
+#
+# Converts the report and contour tables into tables range-partitioned by month
+# on observation_time. PostgreSQL only; other backends keep plain tables.
+#
+# Each table is renamed aside, recreated with PARTITION BY RANGE, given one
+# partition per month of existing data (plus a few future months and a default
+# partition), refilled and then given back its original constraints and
+# indexes. The primary key becomes (id, observation_time) because every unique
+# constraint on a partitioned table must include the partition key, and ids
+# come from a plain sequence since identity columns cannot be used on
+# partitioned tables before PostgreSQL 17.
+
+import re
+from datetime import datetime, timezone
+
+from django.db import migrations
+
+PARTITIONED_TABLES = [
+    'analysis_synopreport',
+    'analysis_upperairsynopreport',
+    'analysis_isobar',
+    'analysis_isotherm',
+    'analysis_pressurecenter',
+    'analysis_upperairisobar',
+    'analysis_upperairisotherm',
+    'analysis_upperairpressurecenter',
+]
+
+MONTHS_AHEAD = 3
+
+
+def _add_months(month, count):
+    index = month.year * 12 + (month.month - 1) + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def _month_start(value):
+    value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def _partition_table(cursor, table):
+    old = f"{table}_unpartitioned"
+    cursor.execute(f'ALTER TABLE "{table}" RENAME TO "{old}"')
+
+    cursor.execute(
+        "SELECT conname, contype, pg_get_constraintdef(oid) FROM pg_constraint "
+        "WHERE conrelid = %s::regclass AND contype IN ('p', 'u', 'f')",
+        [old],
+    )
+    constraints = cursor.fetchall()
+    cursor.execute(
+        "SELECT indexname, indexdef FROM pg_indexes WHERE tablename = %s "
+        "AND indexname NOT IN (SELECT conname FROM pg_constraint WHERE conrelid = %s::regclass)",
+        [old, old],
+    )
+    indexes = cursor.fetchall()
+
+    cursor.execute(
+        f'CREATE TABLE "{table}" (LIKE "{old}" INCLUDING DEFAULTS) PARTITION BY RANGE (observation_time)'
+    )
+    cursor.execute(f'CREATE TABLE "{table}_default" PARTITION OF "{table}" DEFAULT')
+
+    cursor.execute(f'SELECT MIN(observation_time), MAX(id) FROM "{old}"')
+    first_time, max_id = cursor.fetchone()
+    current = _month_start(datetime.now(timezone.utc))
+    month = _month_start(first_time) if first_time else current
+    last = _add_months(current, MONTHS_AHEAD)
+    while month <= last:
+        cursor.execute(
+            f'CREATE TABLE "{table}_p{month:%Y%m}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)',
+            [month, _add_months(month, 1)],
+        )
+        month = _add_months(month, 1)
+
+    cursor.execute(f'INSERT INTO "{table}" SELECT * FROM "{old}"')
+    cursor.execute(f'DROP TABLE "{old}"')
+
+    cursor.execute(f'CREATE SEQUENCE "{table}_id_seq" OWNED BY "{table}".id')
+    cursor.execute(f'ALTER TABLE "{table}" ALTER COLUMN id SET DEFAULT nextval(\'"{table}_id_seq"\')')
+    if max_id:
+        cursor.execute(f'SELECT setval(\'"{table}_id_seq"\', %s)', [max_id])
+
+    for name, contype, definition in constraints:
+        if contype == 'p':
+            definition = 'PRIMARY KEY (id, observation_time)'
+        cursor.execute(f'ALTER TABLE "{table}" ADD CONSTRAINT "{name}" {definition}')
+    for name, definition in indexes:
+        definition = re.sub(rf' ON (\S+\.)?"?{old}"? ', f' ON "{table}" ', definition, count=1)
+        cursor.execute(definition)
+
+
+def partition_tables(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    with schema_editor.connection.cursor() as cursor:
+        for table in PARTITIONED_TABLES:
+            _partition_table(cursor, table)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0012_level_observation_time_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(partition_tables, migrations.RunPython.noop),
+    ]
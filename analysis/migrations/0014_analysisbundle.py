@@ -0,0 +1,25 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:00
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0013_partition_by_observation_time'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AnalysisBundle',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('gzip_payload', models.BinaryField(help_text='gzip-compressed JSON document')),
+                ('brotli_payload', models.BinaryField(blank=True, help_text='Brotli-compressed JSON document', null=True)),
+                ('raw_size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='bundle', to='analysis.analysisrun')),
+            ],
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.6 on 2026-10-19 10:15
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0014_analysisbundle'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='DataVersion',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(max_length=20)),
+                ('level', models.CharField(max_length=20)),
+                ('time_key', models.CharField(help_text="UTC observation time, or 'ALL' for any time", max_length=20)),
+                ('version', models.PositiveBigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('source', 'level', 'time_key')},
+            },
+        ),
+    ]
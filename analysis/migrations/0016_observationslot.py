@@ -0,0 +1,61 @@
+# Generated by Django 5.2.6 on 2026-10-19 11:40
+
+import django.utils.timezone
+from django.db import migrations, models
+from django.db.models import Count
+
+
+def backfill_slots(apps, schema_editor):
+    """Build the catalogue from the reports already stored."""
+    ObservationSlot = apps.get_model('analysis', 'ObservationSlot')
+    CurrentAnalysisRun = apps.get_model('analysis', 'CurrentAnalysisRun')
+    sources = [
+        ('surface', apps.get_model('analysis', 'SynopReport'), apps.get_model('analysis', 'WeatherStation')),
+        ('upperair', apps.get_model('analysis', 'UpperAirSynopReport'), apps.get_model('analysis', 'UpperAirWeatherStation')),
+    ]
+    analysed = set(CurrentAnalysisRun.objects.values_list('kind', 'level', 'observation_time'))
+    for source, report_model, station_model in sources:
+        expected = station_model.objects.count() or 1
+        rows = (
+            report_model.objects
+            .values('level', 'observation_time')
+            .annotate(stations=Count('station', distinct=True))
+        )
+        ObservationSlot.objects.bulk_create([
+            ObservationSlot(
+                source=source,
+                level=row['level'],
+                observation_time=row['observation_time'],
+                station_count=row['stations'],
+                completeness=min(row['stations'] / expected, 1.0),
+                has_analysis=(source, row['level'], row['observation_time']) in analysed,
+            )
+            for row in rows.iterator()
+        ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0015_dataversion'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ObservationSlot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('source', models.CharField(choices=[('surface', 'Surface'), ('upperair', 'Upper air')], max_length=10)),
+                ('level', models.CharField(max_length=10)),
+                ('observation_time', models.DateTimeField()),
+                ('station_count', models.PositiveIntegerField(default=0, help_text='Stations with a report at this time')),
+                ('completeness', models.FloatField(default=0, help_text='Fraction of known stations that reported')),
+                ('has_analysis', models.BooleanField(default=False)),
+                ('updated_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'unique_together': {('source', 'level', 'observation_time')},
+            },
+        ),
+        migrations.RunPython(backfill_slots, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 12:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0016_observationslot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='weatherstation',
+            name='is_visible',
+            field=models.BooleanField(db_index=True, default=True, help_text='Reports are published (see analysis.visibility)'),
+        ),
+        migrations.AddField(
+            model_name='upperairweatherstation',
+            name='is_visible',
+            field=models.BooleanField(db_index=True, default=True, help_text='Reports are published (see analysis.visibility)'),
+        ),
+    ]
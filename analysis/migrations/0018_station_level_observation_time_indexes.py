@@ -0,0 +1,21 @@
+# Generated by Django 5.2.6 on 2026-10-19 13:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0017_station_is_visible'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='synopreport',
+            index=models.Index(fields=['station', 'level', 'observation_time'], name='analysis_sy_station_ccad56_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairsynopreport',
+            index=models.Index(fields=['station', 'level', 'observation_time'], name='analysis_up_station_704991_idx'),
+        ),
+    ]
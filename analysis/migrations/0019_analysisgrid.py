@@ -0,0 +1,43 @@
+# Generated by Django 5.2.6 on 2026-10-19 14:10
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0018_station_level_observation_time_indexes'),
+    ]
+
+    operations = [
+        migrations.DeleteModel(
+            name='GridData',
+        ),
+        migrations.CreateModel(
+            name='AnalysisGrid',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('domain', models.CharField(default='default', max_length=30)),
+                ('level', models.CharField(max_length=20)),
+                ('observation_time', models.DateTimeField()),
+                ('min_lon', models.FloatField()),
+                ('min_lat', models.FloatField()),
+                ('max_lon', models.FloatField()),
+                ('max_lat', models.FloatField()),
+                ('resolution', models.FloatField(help_text='Node spacing in degrees')),
+                ('nx', models.PositiveIntegerField()),
+                ('ny', models.PositiveIntegerField()),
+                ('fields', models.JSONField(default=list, help_text='Field names in storage order')),
+                ('chunk_rows', models.PositiveIntegerField(help_text='Grid rows per compressed chunk')),
+                ('chunk_index', models.JSONField(default=dict, help_text='field -> [[offset, length], ...] into payload')),
+                ('payload', models.BinaryField()),
+                ('raw_size', models.PositiveIntegerField(help_text='Uncompressed size in bytes')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='grid', to='analysis.analysisrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'observation_time'], name='analysis_an_level_dec961_idx')],
+            },
+        ),
+    ]
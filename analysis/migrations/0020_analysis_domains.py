@@ -0,0 +1,57 @@
+# Generated by Django 5.2.6 on 2026-10-19 16:20
+#
+# Analysis runs now store one grid and one set of contours per analysis domain
+# (analysis.domains). Existing grids and contours belong to the regional domain.
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def rename_default_domain(apps, schema_editor):
+    AnalysisGrid = apps.get_model('analysis', 'AnalysisGrid')
+    AnalysisGrid.objects.filter(domain='default').update(domain='regional')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0019_analysisgrid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysisgrid',
+            name='run',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='grids', to='analysis.analysisrun'),
+        ),
+        migrations.AlterField(
+            model_name='analysisgrid',
+            name='domain',
+            field=models.CharField(default='regional', help_text='Analysis domain (analysis.domains)', max_length=30),
+        ),
+        migrations.RunPython(rename_default_domain, migrations.RunPython.noop),
+        migrations.AlterUniqueTogether(
+            name='analysisgrid',
+            unique_together={('run', 'domain')},
+        ),
+        migrations.AddField(
+            model_name='isobar',
+            name='domain',
+            field=models.CharField(default='regional', help_text='Analysis domain (analysis.domains)', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='isotherm',
+            name='domain',
+            field=models.CharField(default='regional', help_text='Analysis domain (analysis.domains)', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='upperairisobar',
+            name='domain',
+            field=models.CharField(default='regional', help_text='Analysis domain (analysis.domains)', max_length=30),
+        ),
+        migrations.AddField(
+            model_name='upperairisotherm',
+            name='domain',
+            field=models.CharField(default='regional', help_text='Analysis domain (analysis.domains)', max_length=30),
+        ),
+    ]
@@ -0,0 +1,36 @@
+# Generated by Django 5.2.6 on 2026-10-19 17:05
+#
+# Contours are stored at full detail (tolerance 0) plus simplified copies at
+# the tolerances in settings.CONTOUR_TOLERANCES (analysis.generalize).
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0020_analysis_domains'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='isobar',
+            name='tolerance',
+            field=models.FloatField(default=0.0, help_text='Douglas–Peucker tolerance in degrees (0 = full detail)'),
+        ),
+        migrations.AddField(
+            model_name='isotherm',
+            name='tolerance',
+            field=models.FloatField(default=0.0, help_text='Douglas–Peucker tolerance in degrees (0 = full detail)'),
+        ),
+        migrations.AddField(
+            model_name='upperairisobar',
+            name='tolerance',
+            field=models.FloatField(default=0.0, help_text='Douglas–Peucker tolerance in degrees (0 = full detail)'),
+        ),
+        migrations.AddField(
+            model_name='upperairisotherm',
+            name='tolerance',
+            field=models.FloatField(default=0.0, help_text='Douglas–Peucker tolerance in degrees (0 = full detail)'),
+        ),
+    ]
@@ -0,0 +1,44 @@
+# Generated by Django 5.2.6 on 2026-10-19 18:20
+
+import django.contrib.gis.db.models.fields
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0021_contour_tolerance'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='analysisrun',
+            name='kind',
+            field=models.CharField(choices=[('surface', 'Surface'), ('upperair', 'Upper Air'), ('tend3h', '3 h tendency'), ('tend24h', '24 h tendency')], max_length=10),
+        ),
+        migrations.AlterField(
+            model_name='currentanalysisrun',
+            name='kind',
+            field=models.CharField(choices=[('surface', 'Surface'), ('upperair', 'Upper Air'), ('tend3h', '3 h tendency'), ('tend24h', '24 h tendency')], max_length=10),
+        ),
+        migrations.CreateModel(
+            name='TendencyContour',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('field', models.CharField(help_text='Differenced field: pressure, height or temperature', max_length=20)),
+                ('change', models.FloatField(help_text="Change over the interval in the field's unit (hPa, m, °C)")),
+                ('hours', models.PositiveSmallIntegerField()),
+                ('geometry', django.contrib.gis.db.models.fields.LineStringField(srid=4326)),
+                ('level', models.CharField(max_length=10)),
+                ('observation_time', models.DateTimeField()),
+                ('domain', models.CharField(default='regional', help_text='Analysis domain (analysis.domains)', max_length=30)),
+                ('tolerance', models.FloatField(default=0.0, help_text='Douglas–Peucker tolerance in degrees (0 = full detail)')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('run', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='analysis.analysisrun')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['level', 'observation_time'], name='analysis_te_level_59c9f3_idx')],
+            },
+        ),
+    ]
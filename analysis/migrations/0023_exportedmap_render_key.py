@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:05
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0022_tendencycontour'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportedmap',
+            name='render_key',
+            field=models.CharField(blank=True, db_index=True, default='', help_text='Cache key of a server-side render (analysis.render); empty for uploads', max_length=64),
+        ),
+    ]
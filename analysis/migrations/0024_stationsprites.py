@@ -0,0 +1,29 @@
+# Generated by Django 5.2.6 on 2026-10-19 19:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0023_exportedmap_render_key'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StationSprites',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('surface', 'Surface'), ('upperair', 'Upper Air')], max_length=10)),
+                ('level', models.CharField(max_length=10)),
+                ('observation_time', models.DateTimeField()),
+                ('image', models.BinaryField(help_text='PNG sprite atlas')),
+                ('index', models.JSONField(default=dict, help_text='Sprite cells and per-station glyph names')),
+                ('reports_version', models.PositiveIntegerField(default=0, help_text='Reports data version the atlas was drawn from')),
+                ('created_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'unique_together': {('kind', 'level', 'observation_time')},
+            },
+        ),
+    ]
@@ -0,0 +1,34 @@
+# Generated by Django 5.2.6 on 2026-10-19 21:40
+
+import django.db.models.deletion
+import uuid
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0024_stationsprites'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='exportedmap',
+            name='content_hash',
+            field=models.CharField(blank=True, default='', help_text='SHA-256 of the file', max_length=64),
+        ),
+        migrations.CreateModel(
+            name='ExportUpload',
+            fields=[
+                ('id', models.UUIDField(default=uuid.uuid4, editable=False, primary_key=True, serialize=False)),
+                ('map_type', models.CharField(choices=[('PNG', 'PNG'), ('PDF', 'PDF'), ('JPEG', 'JPEG')], max_length=50)),
+                ('level', models.CharField(max_length=20)),
+                ('observation_time', models.DateTimeField(null=True)),
+                ('size', models.BigIntegerField(help_text='Total bytes announced when the upload was created')),
+                ('received', models.BigIntegerField(default=0, help_text='Bytes stored so far; the next chunk starts here')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('export', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to='analysis.exportedmap')),
+            ],
+        ),
+    ]
@@ -0,0 +1,23 @@
+# Generated by Django 5.2.6 on 2026-10-19 23:10
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0025_exportupload'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisrun',
+            name='updated_at',
+            field=models.DateTimeField(default=django.utils.timezone.now, help_text='Last status change or progress heartbeat; the GC grace periods count from here'),
+        ),
+        migrations.AddIndex(
+            model_name='analysisrun',
+            index=models.Index(fields=['status', 'updated_at'], name='analysis_an_status_c7c301_idx'),
+        ),
+    ]
@@ -0,0 +1,33 @@
+# Generated by Django 5.2.6 on 2026-10-20 09:15
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0026_analysisrun_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='isobar',
+            index=models.Index(fields=['level', 'pressure', 'id'], name='analysis_is_level_c8d513_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairisobar',
+            index=models.Index(fields=['level', 'pressure', 'id'], name='analysis_up_level_9fb154_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='isotherm',
+            index=models.Index(fields=['level', 'temperature', 'id'], name='analysis_is_level_253fae_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='upperairisotherm',
+            index=models.Index(fields=['level', 'temperature', 'id'], name='analysis_up_level_89c8cc_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tendencycontour',
+            index=models.Index(fields=['level', 'change', 'id'], name='analysis_te_level_6194c5_idx'),
+        ),
+    ]
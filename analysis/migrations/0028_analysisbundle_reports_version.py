@@ -0,0 +1,18 @@
+# Generated by Django 5.2.6 on 2026-10-20 09:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('analysis', '0027_contour_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='analysisbundle',
+            name='reports_version',
+            field=models.PositiveIntegerField(default=0, help_text='Reports data version the bundle was built from'),
+        ),
+    ]
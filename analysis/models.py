@@ -1,3 +1,5 @@
+import uuid
+
 from django.db import models
 from django.contrib.gis.db import models
 from django.contrib.gis.geos import Point, LineString
@@ -8,6 +10,7 @@ class WeatherStation(models.Model):
     location = models.PointField(srid=4326, spatial_index=True)
     elevation = models.FloatField(help_text="Elevation in meters")
     country = models.CharField(max_length=50, default='')
+    is_visible = models.BooleanField(default=True, db_index=True, help_text="Reports are published (see analysis.visibility)")
 
     def __str__(self):
         return f"{self.station_id} - {self.name}"
@@ -53,9 +56,11 @@ class SynopReport(models.Model):
     precipitation_24h = models.FloatField(null=True, blank=True, help_text="24-hour precipitation (mm)")
 
     class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
         indexes = [
             models.Index(fields=['observation_time']),
-            models.Index(fields=['level']),
+            models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['station', 'level', 'observation_time']),
         ]
         unique_together = ('station', 'observation_time', 'level')
 
@@ -66,6 +71,130 @@ class SynopReport(models.Model):
     def location(self):
         return self.station.location
 
+# Base analyses and the tendencies derived from their grids (analysis.tendency)
+ANALYSIS_KIND_CHOICES = [
+    ('surface', 'Surface'),
+    ('upperair', 'Upper Air'),
+    ('tend3h', '3 h tendency'),
+    ('tend24h', '24 h tendency'),
+]
+
+class AnalysisRun(models.Model):
+    """One execution of the analysis pipeline for a (kind, level, observation time) key."""
+    STATUS_RUNNING = 'RUNNING'
+    STATUS_COMPLETE = 'COMPLETE'
+    STATUS_FAILED = 'FAILED'
+    STATUS_SUPERSEDED = 'SUPERSEDED'
+
+    kind = models.CharField(max_length=10, choices=ANALYSIS_KIND_CHOICES)
+    level = models.CharField(max_length=10)
+    observation_time = models.DateTimeField()
+    engine_params = models.JSONField(default=dict, help_text="Grid and engine parameters used for this run")
+    fingerprint = models.CharField(max_length=64, help_text="Hash of the inputs that produced this run")
+    status = models.CharField(
+        max_length=10,
+        choices=[
+            (STATUS_RUNNING, 'Running'),
+            (STATUS_COMPLETE, 'Complete'),
+            (STATUS_FAILED, 'Failed'),
+            (STATUS_SUPERSEDED, 'Superseded'),
+        ],
+        default=STATUS_RUNNING
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+    completed_at = models.DateTimeField(null=True, blank=True)
+    updated_at = models.DateTimeField(
+        default=timezone.now,
+        help_text="Last status change or progress heartbeat; the GC grace periods count from here",
+    )
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['kind', 'level', 'observation_time']),
+            models.Index(fields=['status', 'created_at']),
+            models.Index(fields=['status', 'updated_at']),
+        ]
+
+    def __str__(self):
+        return f"Run {self.pk} {self.kind} {self.level} @ {self.observation_time} ({self.status})"
+
+class CurrentAnalysisRun(models.Model):
+    """Pointer to the published run for a key; flipped atomically when a run completes."""
+    kind = models.CharField(max_length=10, choices=ANALYSIS_KIND_CHOICES)
+    level = models.CharField(max_length=10)
+    observation_time = models.DateTimeField()
+    run = models.OneToOneField('AnalysisRun', on_delete=models.CASCADE, related_name='current_pointer')
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'level', 'observation_time')
+
+    def __str__(self):
+        return f"Current {self.kind} {self.level} @ {self.observation_time} -> run {self.run_id}"
+
+class DataVersion(models.Model):
+    """Change counter per (source, level, observation time), bumped on ingest and analysis."""
+    source = models.CharField(max_length=20)
+    level = models.CharField(max_length=20)
+    time_key = models.CharField(max_length=20, help_text="UTC observation time, or 'ALL' for any time")
+    version = models.PositiveBigIntegerField(default=0)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('source', 'level', 'time_key')
+
+    def __str__(self):
+        return f"{self.source} {self.level} @ {self.time_key}: v{self.version}"
+
+class ObservationSlot(models.Model):
+    """Catalogue of observation times with reports, maintained at ingest."""
+    SOURCE_CHOICES = [('surface', 'Surface'), ('upperair', 'Upper air')]
+
+    source = models.CharField(max_length=10, choices=SOURCE_CHOICES)
+    level = models.CharField(max_length=10)
+    observation_time = models.DateTimeField()
+    station_count = models.PositiveIntegerField(default=0, help_text="Stations with a report at this time")
+    completeness = models.FloatField(default=0, help_text="Fraction of known stations that reported")
+    has_analysis = models.BooleanField(default=False)
+    updated_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        unique_together = ('source', 'level', 'observation_time')
+
+    def __str__(self):
+        return f"{self.source} {self.level} @ {self.observation_time}: {self.station_count} stations"
+
+class AnalysisBundle(models.Model):
+    """All map layers of one analysis run as a single precompressed GeoJSON document."""
+    run = models.OneToOneField('AnalysisRun', on_delete=models.CASCADE, related_name='bundle')
+    gzip_payload = models.BinaryField(help_text="gzip-compressed JSON document")
+    brotli_payload = models.BinaryField(null=True, blank=True, help_text="Brotli-compressed JSON document")
+    raw_size = models.PositiveIntegerField(help_text="Uncompressed size in bytes")
+    reports_version = models.PositiveIntegerField(default=0, help_text="Reports data version the bundle was built from")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    def __str__(self):
+        return f"Bundle for run {self.run_id} ({self.raw_size} bytes)"
+
+class StationSprites(models.Model):
+    """
+    Station-model glyphs of one observation time drawn into a PNG atlas, with
+    the JSON index of sprite cells and stations (analysis.sprites).
+    """
+    kind = models.CharField(max_length=10, choices=[('surface', 'Surface'), ('upperair', 'Upper Air')])
+    level = models.CharField(max_length=10)
+    observation_time = models.DateTimeField()
+    image = models.BinaryField(help_text="PNG sprite atlas")
+    index = models.JSONField(default=dict, help_text="Sprite cells and per-station glyph names")
+    reports_version = models.PositiveIntegerField(default=0, help_text="Reports data version the atlas was drawn from")
+    created_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        unique_together = ('kind', 'level', 'observation_time')
+
+    def __str__(self):
+        return f"Station sprites {self.kind} {self.level} @ {self.observation_time}"
+
 class Isobar(models.Model):
     pressure = models.FloatField(help_text="Pressure in hPa")
     geometry = models.LineStringField(srid=4326)
@@ -79,9 +208,19 @@ class Isobar(models.Model):
             ('200HPA', '200 hPa'),
         ],default='SURFACE'
     )
-    observation_time = models.DateTimeField(null=True)
+    observation_time = models.DateTimeField()
+    domain = models.CharField(max_length=30, default='regional', help_text="Analysis domain (analysis.domains)")
+    tolerance = models.FloatField(default=0.0, help_text="Douglas–Peucker tolerance in degrees (0 = full detail)")
+    run = models.ForeignKey('AnalysisRun', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['level', 'pressure', 'id']),
+        ]
+
     def __str__(self):
         return f"Isobar {self.pressure} hPa ({self.level})"
 
@@ -98,9 +237,19 @@ class Isotherm(models.Model):
             ('200HPA', '200 hPa'),
         ]
     )
-    observation_time = models.DateTimeField(null=True)
+    observation_time = models.DateTimeField()
+    domain = models.CharField(max_length=30, default='regional', help_text="Analysis domain (analysis.domains)")
+    tolerance = models.FloatField(default=0.0, help_text="Douglas–Peucker tolerance in degrees (0 = full detail)")
+    run = models.ForeignKey('AnalysisRun', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['level', 'temperature', 'id']),
+        ]
+
     def __str__(self):
         return f"Isotherm {self.temperature} °C ({self.level})"
 
@@ -118,9 +267,16 @@ class PressureCenter(models.Model):
             ('200HPA', '200 hPa'),
         ]
     )
-    observation_time = models.DateTimeField(null=True)
+    observation_time = models.DateTimeField()
+    run = models.ForeignKey('AnalysisRun', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+        ]
+
     def __str__(self):
         return f"{self.center_type} Center ({self.level})"
 
@@ -140,6 +296,11 @@ class ExportedMap(models.Model):
         ]
     )
     observation_time = models.DateTimeField(null=True)
+    render_key = models.CharField(
+        max_length=64, blank=True, default='', db_index=True,
+        help_text="Cache key of a server-side render (analysis.render); empty for uploads",
+    )
+    content_hash = models.CharField(max_length=64, blank=True, default='', help_text="SHA-256 of the file")
     created_at = models.DateTimeField(auto_now_add=True)
 
     def __str__(self):
@@ -149,18 +310,75 @@ class ExportedMap(models.Model):
         from django.conf import settings
         return f"{settings.MFD_WEBSITE_URL}/media/{self.file_path}"
 
-class GridData(models.Model):
+class ExportUpload(models.Model):
+    """Resumable chunked upload of an exported map; the bytes so far live in a staging file (analysis.uploads)."""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    map_type = models.CharField(max_length=50, choices=[('PNG', 'PNG'), ('PDF', 'PDF'), ('JPEG', 'JPEG')])
     level = models.CharField(max_length=20)
-    observation_time = models.DateTimeField(null=True, blank=True, default=timezone.now)
-    geometry = models.PointField(srid=4326)  # Changed to PointField
-    pressure = models.FloatField(help_text="Pressure in hPa")  # Added for clarity
-    temperature = models.FloatField(help_text="Temperature in °C")  # Added for clarity
+    observation_time = models.DateTimeField(null=True)
+    size = models.BigIntegerField(help_text="Total bytes announced when the upload was created")
+    received = models.BigIntegerField(default=0, help_text="Bytes stored so far; the next chunk starts here")
+    export = models.ForeignKey(ExportedMap, null=True, blank=True, on_delete=models.SET_NULL)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"Export upload {self.id} ({self.received}/{self.size} bytes)"
+
+class TendencyContour(models.Model):
+    """Line of equal change of an analysed field over ``hours`` (analysis.tendency)."""
+    field = models.CharField(max_length=20, help_text="Differenced field: pressure, height or temperature")
+    change = models.FloatField(help_text="Change over the interval in the field's unit (hPa, m, °C)")
+    hours = models.PositiveSmallIntegerField()
+    geometry = models.LineStringField(srid=4326)
+    level = models.CharField(max_length=10)
+    observation_time = models.DateTimeField()
+    domain = models.CharField(max_length=30, default='regional', help_text="Analysis domain (analysis.domains)")
+    tolerance = models.FloatField(default=0.0, help_text="Douglas–Peucker tolerance in degrees (0 = full detail)")
+    run = models.ForeignKey('AnalysisRun', on_delete=models.CASCADE)
+    created_at = models.DateTimeField(auto_now_add=True)
 
     class Meta:
         indexes = [
             models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['level', 'change', 'id']),
         ]
 
+    def __str__(self):
+        return f"{self.field} change {self.change:+g} over {self.hours} h ({self.level})"
+
+class AnalysisGrid(models.Model):
+    """
+    Gridded fields of one analysis run (see analysis.grids): float32 arrays
+    stored as zlib-compressed bands of rows, with the grid geometry.
+    """
+    run = models.ForeignKey('AnalysisRun', on_delete=models.CASCADE, related_name='grids')
+    domain = models.CharField(max_length=30, default='regional', help_text="Analysis domain (analysis.domains)")
+    level = models.CharField(max_length=20)
+    observation_time = models.DateTimeField()
+    min_lon = models.FloatField()
+    min_lat = models.FloatField()
+    max_lon = models.FloatField()
+    max_lat = models.FloatField()
+    resolution = models.FloatField(help_text="Node spacing in degrees")
+    nx = models.PositiveIntegerField()
+    ny = models.PositiveIntegerField()
+    fields = models.JSONField(default=list, help_text="Field names in storage order")
+    chunk_rows = models.PositiveIntegerField(help_text="Grid rows per compressed chunk")
+    chunk_index = models.JSONField(default=dict, help_text="field -> [[offset, length], ...] into payload")
+    payload = models.BinaryField()
+    raw_size = models.PositiveIntegerField(help_text="Uncompressed size in bytes")
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        unique_together = ('run', 'domain')
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+        ]
+
+    def __str__(self):
+        return f"Grid {self.ny}x{self.nx} for run {self.run_id} ({self.domain})"
+
 
 class UpperAirWeatherStation(models.Model):
     station_id = models.CharField(max_length=10, primary_key=True)
@@ -168,6 +386,7 @@ class UpperAirWeatherStation(models.Model):
     location = models.PointField(srid=4326, spatial_index=True)
     elevation = models.FloatField(help_text="Elevation in meters")
     country = models.CharField(max_length=50, default='')
+    is_visible = models.BooleanField(default=True, db_index=True, help_text="Reports are published (see analysis.visibility)")
 
     def __str__(self):
         return f"{self.station_id} - {self.name}"
@@ -197,9 +416,11 @@ class UpperAirSynopReport(models.Model):
     
 
     class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
         indexes = [
             models.Index(fields=['observation_time']),
-            models.Index(fields=['level']),
+            models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['station', 'level', 'observation_time']),
         ]
         unique_together = ('station', 'observation_time', 'level')
 
@@ -223,9 +444,19 @@ class UpperAirIsobar(models.Model):
             ('200HPA', '200 hPa'),
         ],default='SURFACE'
     )
-    observation_time = models.DateTimeField(null=True)
+    observation_time = models.DateTimeField()
+    domain = models.CharField(max_length=30, default='regional', help_text="Analysis domain (analysis.domains)")
+    tolerance = models.FloatField(default=0.0, help_text="Douglas–Peucker tolerance in degrees (0 = full detail)")
+    run = models.ForeignKey('AnalysisRun', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['level', 'pressure', 'id']),
+        ]
+
     def __str__(self):
         return f"Isobar {self.pressure} hPa ({self.level})"
 
@@ -241,9 +472,19 @@ class UpperAirIsotherm(models.Model):
             ('200HPA', '200 hPa'),
         ]
     )
-    observation_time = models.DateTimeField(null=True)
+    observation_time = models.DateTimeField()
+    domain = models.CharField(max_length=30, default='regional', help_text="Analysis domain (analysis.domains)")
+    tolerance = models.FloatField(default=0.0, help_text="Douglas–Peucker tolerance in degrees (0 = full detail)")
+    run = models.ForeignKey('AnalysisRun', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+            models.Index(fields=['level', 'temperature', 'id']),
+        ]
+
     def __str__(self):
         return f"Isotherm {self.temperature} °C ({self.level})"
 
@@ -260,8 +501,15 @@ class UpperAirPressureCenter(models.Model):
             ('200HPA', '200 hPa'),
         ]
     )
-    observation_time = models.DateTimeField(null=True)
+    observation_time = models.DateTimeField()
+    run = models.ForeignKey('AnalysisRun', null=True, blank=True, on_delete=models.CASCADE)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        # The table is range-partitioned by month on observation_time (see analysis.partitions)
+        indexes = [
+            models.Index(fields=['level', 'observation_time']),
+        ]
+
     def __str__(self):
         return f"{self.center_type} Center ({self.level})"
\ No newline at end of file
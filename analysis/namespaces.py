@@ -0,0 +1,76 @@
+import hashlib
+import logging
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+
+logger = logging.getLogger(__name__)
+
+NAMESPACE_PREFIX = 'ns'
+
+# Cached list responses; a namespace bump makes them unreachable long before this
+RESPONSE_CACHE_TTL = getattr(settings, 'RESPONSE_CACHE_TTL', 60 * 60 * 6)
+
+
+def _source_key(source):
+    return f"{NAMESPACE_PREFIX}:{source}"
+
+
+def _slot_key(source, level, key):
+    return f"{NAMESPACE_PREFIX}:{source}:{level}:{key}"
+
+
+def _fresh_value():
+    # A missing counter must never restart at a value it had before, or entries
+    # cached under that old value would become reachable again.
+    return time.time_ns()
+
+
+def _incr(key):
+    try:
+        cache.incr(key)
+    except ValueError:
+        # Never read since the counter was evicted; any new value is fine
+        cache.set(key, _fresh_value(), timeout=None)
+
+
+def _versions(keys):
+    values = cache.get_many(keys)
+    missing = [key for key in keys if key not in values]
+    for key in missing:
+        cache.add(key, _fresh_value(), timeout=None)
+    if missing:
+        values.update(cache.get_many(missing))
+    return [values.get(key, 0) for key in keys]
+
+
+def namespace(sources, level, key):
+    """
+    Return the namespace token for data of ``sources`` at (level, time key).
+
+    The token changes whenever one of those sources is bumped for that level
+    and time (or as a whole), so keys built from it go stale in O(1).
+    """
+    keys = []
+    for source in sources:
+        keys += [_source_key(source), _slot_key(source, level, key)]
+    return '.'.join(str(value) for value in _versions(keys))
+
+
+def namespaced_key(prefix, sources, level, key, *parts):
+    """Build a cache key under the namespace of ``sources`` at (level, time key)."""
+    digest = hashlib.sha1('|'.join(str(part) for part in parts).encode('utf-8')).hexdigest()
+    return f"{prefix}:{level}:{key}:{namespace(sources, level, key)}:{digest}"
+
+
+def bump_namespaces(source, keys):
+    """Invalidate cached entries of ``source`` for (level, time key) pairs."""
+    for level, key in keys:
+        _incr(_slot_key(source, level, key))
+
+
+def bump_source(source):
+    """Invalidate every cached entry of ``source``, at all levels and times."""
+    _incr(_source_key(source))
+    logger.info(f"Bumped cache namespace for {source}")
@@ -0,0 +1,168 @@
+import base64
+import json
+import logging
+
+from django.db.models import BooleanField, Expression, F, Q, Value
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import replace_query_param
+
+logger = logging.getLogger(__name__)
+
+
+class RowCompare(Expression):
+    """``(a, b, ...) < (%s, %s, ...)``: a row-value comparison PostgreSQL runs as one index range scan."""
+    output_field = BooleanField()
+
+    def __init__(self, names, values, operator):
+        super().__init__()
+        self.columns = [F(name) for name in names]
+        self.values = [Value(value) for value in values]
+        self.operator = operator
+
+    def get_source_expressions(self):
+        return [*self.columns, *self.values]
+
+    def set_source_expressions(self, expressions):
+        self.columns, self.values = expressions[:len(self.columns)], expressions[len(self.columns):]
+
+    def as_sql(self, compiler, connection):
+        rows, params = [], []
+        for expressions in (self.columns, self.values):
+            parts = []
+            for expression in expressions:
+                sql, expression_params = compiler.compile(expression)
+                parts.append(sql)
+                params.extend(expression_params)
+            rows.append(f"({', '.join(parts)})")
+        return f"{rows[0]} {self.operator} {rows[1]}", params
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (seek) pagination on a composite, unique ordering key.
+
+    The cursor carries the ordering values of the last row of the page, and
+    the next page is fetched with a row-value comparison on the indexed key.
+    Deep pages cost the same as the first one, and no COUNT(*) is issued.
+    The response is {"next": url-or-null, "results": ...}.
+
+    ``limit`` keeps its meaning from LimitOffsetPagination (page size); without
+    it the endpoint returns the full, unpaginated result as before.
+    """
+    ordering = ('-observation_time', '-id')
+    page_size = None
+    page_size_query_param = 'limit'
+    max_page_size = 5000
+    cursor_query_param = 'cursor'
+    invalid_cursor_message = 'Invalid cursor'
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        if size <= 0:
+            return self.page_size
+        return min(size, self.max_page_size)
+
+    def _keys(self):
+        return [(field.lstrip('-'), field.startswith('-')) for field in self.ordering]
+
+    def encode_cursor(self, row):
+        values = []
+        for name, _ in self._keys():
+            value = getattr(row, name)
+            values.append(value.isoformat() if hasattr(value, 'isoformat') else value)
+        encoded = base64.urlsafe_b64encode(json.dumps(values, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.request.build_absolute_uri(), self.cursor_query_param, encoded)
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            values = json.loads(base64.urlsafe_b64decode(encoded.encode('ascii')).decode('utf-8'))
+            keys = self._keys()
+            if not isinstance(values, list) or len(values) != len(keys):
+                raise ValueError('cursor does not match ordering')
+            opts = model._meta
+            return [opts.get_field(name).to_python(value) for (name, _), value in zip(keys, values)]
+        except Exception as e:
+            logger.warning(f"Rejected pagination cursor {encoded[:40]}: {e}")
+            raise NotFound(self.invalid_cursor_message)
+
+    def seek_filter(self, values):
+        """
+        Rows strictly after ``values`` in ordering order. A key sorted in one
+        direction is a single row-value comparison; mixed directions fall back
+        to the equivalent lexicographic OR chain.
+        """
+        keys = self._keys()
+        directions = {descending for _, descending in keys}
+        if len(directions) == 1:
+            return RowCompare([name for name, _ in keys], values, '<' if directions.pop() else '>')
+        condition = Q()
+        for i, (name, descending) in enumerate(keys):
+            equal = {keys[j][0]: values[j] for j in range(i)}
+            equal[f"{name}__{'lt' if descending else 'gt'}"] = values[i]
+            condition |= Q(**equal)
+        return condition
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.page_size = self.get_page_size(request)
+        if not self.page_size:
+            return None
+        self.request = request
+        queryset = queryset.order_by(*self.ordering)
+        cursor = self.decode_cursor(request, queryset.model)
+        if cursor is not None:
+            queryset = queryset.filter(self.seek_filter(cursor))
+        rows = list(queryset[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.page = rows[:self.page_size]
+        return self.page
+
+    def get_next_link(self):
+        if not self.has_next or not self.page:
+            return None
+        return self.encode_cursor(self.page[-1])
+
+    def get_paginated_response(self, data):
+        return Response({'next': self.get_next_link(), 'results': data})
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'required': ['results'],
+            'properties': {
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+
+class ObservationKeysetPagination(KeysetPagination):
+    """Reports and grids: newest observation time first, id as tie-breaker."""
+    ordering = ('-observation_time', '-id')
+
+
+class IsobarKeysetPagination(KeysetPagination):
+    """Isobars: by level and contour value, on the (level, pressure, id) index."""
+    ordering = ('level', 'pressure', 'id')
+
+
+class IsothermKeysetPagination(KeysetPagination):
+    """Isotherms: by level and contour value, on the (level, temperature, id) index."""
+    ordering = ('level', 'temperature', 'id')
+
+
+class TendencyKeysetPagination(KeysetPagination):
+    """Tendency contours: by level and change, on the (level, change, id) index."""
+    ordering = ('level', 'change', 'id')
+
+
+class ExportKeysetPagination(KeysetPagination):
+    """Exported maps: newest first."""
+    ordering = ('-created_at', '-id')
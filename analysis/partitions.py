@@ -0,0 +1,185 @@
+import logging
+import re
+from datetime import datetime, timezone
+
+from django.conf import settings
+from django.db import connection, transaction
+
+from .catalogue import forget_before
+from .models import (
+    AnalysisRun, Isobar, Isotherm, PressureCenter, SynopReport,
+    UpperAirIsobar, UpperAirIsotherm, UpperAirPressureCenter, UpperAirSynopReport,
+)
+
+logger = logging.getLogger(__name__)
+
+# Tables range-partitioned by month on observation_time, grouped by retention policy
+REPORT_MODELS = [SynopReport, UpperAirSynopReport]
+ANALYSIS_MODELS = [Isobar, Isotherm, PressureCenter, UpperAirIsobar, UpperAirIsotherm, UpperAirPressureCenter]
+
+MONTHS_AHEAD = getattr(settings, 'PARTITION_MONTHS_AHEAD', 3)
+REPORT_RETENTION_MONTHS = getattr(settings, 'REPORT_RETENTION_MONTHS', 24)
+ANALYSIS_RETENTION_MONTHS = getattr(settings, 'ANALYSIS_RETENTION_MONTHS', 6)
+
+_PARTITION_SUFFIX = re.compile(r'_p(\d{4})(\d{2})$')
+
+
+def month_start(value):
+    """Return the first instant (UTC) of the month containing ``value``."""
+    if value.tzinfo is not None:
+        value = value.astimezone(timezone.utc)
+    return datetime(value.year, value.month, 1, tzinfo=timezone.utc)
+
+
+def add_months(month, count):
+    index = month.year * 12 + (month.month - 1) + count
+    return datetime(index // 12, index % 12 + 1, 1, tzinfo=timezone.utc)
+
+
+def partition_name(table, month):
+    return f"{table}_p{month:%Y%m}"
+
+
+def is_partitioned(cursor, table):
+    cursor.execute(
+        "SELECT 1 FROM pg_partitioned_table pt JOIN pg_class c ON c.oid = pt.partrelid WHERE c.relname = %s",
+        [table],
+    )
+    return cursor.fetchone() is not None
+
+
+def monthly_partitions(cursor, table):
+    """Return {month: partition name} for the monthly partitions attached to ``table``."""
+    cursor.execute(
+        """
+        SELECT child.relname
+        FROM pg_inherits
+        JOIN pg_class parent ON parent.oid = pg_inherits.inhparent
+        JOIN pg_class child ON child.oid = pg_inherits.inhrelid
+        WHERE parent.relname = %s
+        """,
+        [table],
+    )
+    partitions = {}
+    for (name,) in cursor.fetchall():
+        match = _PARTITION_SUFFIX.search(name)
+        if match:
+            partitions[datetime(int(match.group(1)), int(match.group(2)), 1, tzinfo=timezone.utc)] = name
+    return partitions
+
+
+def ensure_partition(cursor, table, month):
+    """
+    Create the partition of ``table`` for ``month`` if it does not exist.
+
+    Rows that already landed in the default partition for that month are
+    moved into the new partition so it can be attached.
+    """
+    name = partition_name(table, month)
+    if month in monthly_partitions(cursor, table):
+        return False
+    lower, upper = month, add_months(month, 1)
+    default = f"{table}_default"
+    cursor.execute(
+        f'SELECT EXISTS (SELECT 1 FROM "{default}" WHERE observation_time >= %s AND observation_time < %s)',
+        [lower, upper],
+    )
+    if cursor.fetchone()[0]:
+        cursor.execute(f'CREATE TABLE "{name}" (LIKE "{table}" INCLUDING DEFAULTS)')
+        cursor.execute(
+            f'WITH moved AS (DELETE FROM "{default}" WHERE observation_time >= %s AND observation_time < %s RETURNING *) '
+            f'INSERT INTO "{name}" SELECT * FROM moved',
+            [lower, upper],
+        )
+        cursor.execute(f'ALTER TABLE "{table}" ATTACH PARTITION "{name}" FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+        logger.info(f"Created partition {name} and moved its rows out of {default}")
+    else:
+        cursor.execute(f'CREATE TABLE "{name}" PARTITION OF "{table}" FOR VALUES FROM (%s) TO (%s)', [lower, upper])
+        logger.info(f"Created partition {name}")
+    return True
+
+
+def _default_months(cursor, table):
+    """Months with rows in the default partition of ``table``, i.e. months that never got a partition."""
+    default = f"{table}_default"
+    cursor.execute("SELECT to_regclass(%s) IS NOT NULL", [default])
+    if not cursor.fetchone()[0]:
+        return []
+    cursor.execute(f"SELECT DISTINCT date_trunc('month', observation_time AT TIME ZONE 'UTC') FROM \"{default}\"")
+    return sorted(month.replace(tzinfo=timezone.utc) for (month,) in cursor.fetchall())
+
+
+def ensure_future_partitions(months_ahead=None, now=None):
+    """
+    Create monthly partitions from the current month up to ``months_ahead``
+    months out, and for every month whose rows landed in the default
+    partition (late or back-filled reports), which moves them out of it.
+    """
+    months_ahead = MONTHS_AHEAD if months_ahead is None else months_ahead
+    current = month_start(now or datetime.now(timezone.utc))
+    created = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for model in REPORT_MODELS + ANALYSIS_MODELS:
+            table = model._meta.db_table
+            if not is_partitioned(cursor, table):
+                logger.warning(f"{table} is not partitioned; skipping partition maintenance")
+                continue
+            months = [add_months(current, offset) for offset in range(months_ahead + 1)]
+            for month in months + _default_months(cursor, table):
+                if ensure_partition(cursor, table, month):
+                    created.append(partition_name(table, month))
+    return created
+
+
+def _drop_partitions_before(cursor, table, cutoff):
+    dropped = []
+    for month, name in sorted(monthly_partitions(cursor, table).items()):
+        if add_months(month, 1) <= cutoff:
+            cursor.execute(f'ALTER TABLE "{table}" DETACH PARTITION "{name}"')
+            cursor.execute(f'DROP TABLE "{name}"')
+            dropped.append(name)
+            logger.info(f"Detached and dropped partition {name}")
+    return dropped
+
+
+def drop_expired_partitions(report_months=None, analysis_months=None, now=None):
+    """
+    Apply retention by detaching and dropping whole monthly partitions.
+
+    A partition is dropped once its entire month is older than the retention
+    window. Rows are never deleted one by one: ensure_future_partitions()
+    runs first (see maintain_partitions) and moves rows out of the default
+    partition into monthly ones. Analysis runs for dropped months are deleted
+    afterwards so the current-run pointers never reference rows that no
+    longer exist, and the observation-time catalogue forgets the dropped
+    report months.
+    """
+    report_months = REPORT_RETENTION_MONTHS if report_months is None else report_months
+    analysis_months = ANALYSIS_RETENTION_MONTHS if analysis_months is None else analysis_months
+    current = month_start(now or datetime.now(timezone.utc))
+    dropped = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for models, months in ((REPORT_MODELS, report_months), (ANALYSIS_MODELS, analysis_months)):
+            cutoff = add_months(current, -months)
+            for model in models:
+                table = model._meta.db_table
+                if is_partitioned(cursor, table):
+                    dropped += _drop_partitions_before(cursor, table, cutoff)
+
+        analysis_cutoff = add_months(current, -analysis_months)
+        expired_runs, _ = AnalysisRun.objects.filter(observation_time__lt=analysis_cutoff).delete()
+        forget_before(add_months(current, -report_months))
+    if expired_runs:
+        logger.info(f"Deleted {expired_runs} analysis run records older than {analysis_cutoff:%Y-%m}")
+    return dropped
+
+
+def maintain_partitions():
+    """Create upcoming partitions and drop expired ones."""
+    if connection.vendor != 'postgresql':
+        logger.info("Partition maintenance skipped: database is not PostgreSQL")
+        return {'created': [], 'dropped': []}
+    created = ensure_future_partitions()
+    dropped = drop_expired_partitions()
+    logger.info(f"Partition maintenance created {len(created)} and dropped {len(dropped)} partitions")
+    return {'created': created, 'dropped': dropped}
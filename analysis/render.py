@@ -0,0 +1,330 @@
+import hashlib
+import json
+import logging
+import math
+import multiprocessing
+import os
+import time
+import uuid
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timezone
+from functools import lru_cache
+from io import BytesIO
+
+import numpy as np
+from django.conf import settings
+from django.contrib.gis.geos import Polygon
+from django.core.files.base import ContentFile
+
+from .bundles import BUNDLE_LAYERS, CONTOUR_LAYERS
+from .domains import analysis_domains
+from .generalize import tolerance_for
+from .models import ExportedMap
+from .runs import current_run
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Export format -> (file extension, content type)
+RENDER_FORMATS = {
+    'PNG': ('png', 'image/png'),
+    'SVG': ('svg', 'image/svg+xml'),
+    'PDF': ('pdf', 'application/pdf'),
+}
+
+# Colours and line widths of each map style
+RENDER_STYLES = {
+    'default': {
+        'background': '#ffffff', 'basemap': '#7f7f7f', 'graticule': '#e0e0e0',
+        'isobars': '#1f4e9c', 'isotherms': '#c0392b', 'HIGH': '#1f4e9c', 'LOW': '#c0392b',
+        'stations': '#222222', 'linewidth': 0.9, 'font_size': 6,
+    },
+    'mono': {
+        'background': '#ffffff', 'basemap': '#555555', 'graticule': '#dddddd',
+        'isobars': '#000000', 'isotherms': '#777777', 'HIGH': '#000000', 'LOW': '#000000',
+        'stations': '#000000', 'linewidth': 0.8, 'font_size': 6,
+    },
+}
+
+# Value field of each contour layer
+CONTOUR_VALUES = {'isobars': 'pressure', 'isotherms': 'temperature'}
+
+RENDER_DPI = 100
+DEFAULT_SIZE = (1600, 1200)
+RENDER_MAX_PIXELS = getattr(settings, 'RENDER_MAX_PIXELS', 6000 * 6000)
+# Worker processes drawing maps; 0 (the default) draws in the calling process
+# and leaves parallelism to Celery concurrency
+RENDER_WORKERS = getattr(settings, 'RENDER_WORKERS', 0)
+RENDER_TIMEOUT = getattr(settings, 'RENDER_TIMEOUT', 120)
+# GeoJSON (EPSG:4326) of coastlines and boundaries drawn under every map
+RENDER_BASEMAP = getattr(settings, 'RENDER_BASEMAP', '')
+
+
+class RenderError(ValueError):
+    """Invalid render parameters, or no analysis to render."""
+
+
+def parse_extent(kind, value=None):
+    """(min_lon, min_lat, max_lon, max_lat) from "a,b,c,d", defaulting to the primary domain."""
+    if not value:
+        domain = analysis_domains(kind)[0]
+        return (domain['min_lon'], domain['min_lat'], domain['max_lon'], domain['max_lat'])
+    try:
+        extent = tuple(float(part) for part in (value.split(',') if isinstance(value, str) else value))
+    except (TypeError, ValueError):
+        raise RenderError("extent must be min_lon,min_lat,max_lon,max_lat")
+    if len(extent) != 4 or not (-180 <= extent[0] < extent[2] <= 180 and -90 <= extent[1] < extent[3] <= 90):
+        raise RenderError("extent must be min_lon,min_lat,max_lon,max_lat within -180..180 and -90..90")
+    return extent
+
+
+def parse_size(value=None):
+    """(width, height) in pixels from "WIDTHxHEIGHT"."""
+    if not value:
+        return DEFAULT_SIZE
+    try:
+        width, height = (int(part) for part in (value.lower().split('x') if isinstance(value, str) else value))
+    except (TypeError, ValueError):
+        raise RenderError("size must be WIDTHxHEIGHT in pixels")
+    if width < 64 or height < 64 or width * height > RENDER_MAX_PIXELS:
+        raise RenderError(f"size must be at least 64x64 and at most {RENDER_MAX_PIXELS} pixels")
+    return width, height
+
+
+def parse_style(value=None):
+    style = value or 'default'
+    if style not in RENDER_STYLES:
+        raise RenderError(f"style must be one of {', '.join(RENDER_STYLES)}")
+    return style
+
+
+def render_key(run, fmt, style, extent, size):
+    """Cache key of a render: the same run drawn the same way is never drawn twice."""
+    return hashlib.sha256(
+        json.dumps([run.pk, run.fingerprint, fmt, style, list(extent), list(size)]).encode('utf-8')
+    ).hexdigest()
+
+
+def collect_layers(run, extent, size):
+    """
+    Read everything a map shows into plain lists, so drawing can happen in a
+    worker process without a database connection.
+    """
+    layers = BUNDLE_LAYERS[run.kind]
+    bbox = Polygon.from_bbox(extent)
+    bbox.srid = 4326
+    # Contours generalized to about one pixel of the output
+    tolerance = tolerance_for((extent[2] - extent[0]) / size[0])
+    collected = {}
+    for name in CONTOUR_LAYERS:
+        model = layers[name][0]
+        rows = model.objects.filter(
+            run_id=run.pk, domain=analysis_domains(run.kind)[0]['name'], tolerance=tolerance,
+            geometry__intersects=bbox,
+        ).values_list(CONTOUR_VALUES[name], 'geometry')
+        collected[name] = [(value, geometry.coords) for value, geometry in rows]
+    centres = layers['pressure_centers'][0].objects.filter(run_id=run.pk, location__intersects=bbox)
+    collected['pressure_centers'] = [
+        (centre.center_type, centre.location.x, centre.location.y, centre.pressure) for centre in centres
+    ]
+    reports = layers['reports'][0].objects.filter(
+        level=run.level, observation_time=run.observation_time, station__is_visible=True,
+        station__location__intersects=bbox,
+    ).select_related('station')
+    collected['reports'] = [
+        (report.station.location.x, report.station.location.y, report.temperature, report.wind_direction, report.wind_speed)
+        for report in reports
+    ]
+    return collected
+
+
+@lru_cache(maxsize=1)
+def basemap_lines():
+    """Line coordinates of RENDER_BASEMAP (polygon rings and lines), read once per process."""
+    if not RENDER_BASEMAP or not os.path.exists(RENDER_BASEMAP):
+        return []
+    with open(RENDER_BASEMAP, encoding='utf-8') as handle:
+        data = json.load(handle)
+    lines = []
+
+    def add(geometry):
+        kind, coords = geometry['type'], geometry.get('coordinates', [])
+        if kind == 'LineString':
+            lines.append(coords)
+        elif kind in ('MultiLineString', 'Polygon'):
+            lines.extend(coords)
+        elif kind == 'MultiPolygon':
+            for polygon in coords:
+                lines.extend(polygon)
+        elif kind == 'GeometryCollection':
+            for part in geometry['geometries']:
+                add(part)
+
+    for feature in data.get('features', [data]):
+        add(feature.get('geometry', feature))
+    return [np.asarray(line, dtype='f8')[:, :2] for line in lines if len(line) > 1]
+
+
+def draw_map(layers, title, fmt, style, extent, size):
+    """Draw collected layers onto a plate carrée map and return the file bytes."""
+    from matplotlib.collections import LineCollection
+    from matplotlib.figure import Figure
+
+    colours = RENDER_STYLES[style]
+    min_lon, min_lat, max_lon, max_lat = extent
+    fig = Figure(figsize=(size[0] / RENDER_DPI, size[1] / RENDER_DPI), dpi=RENDER_DPI, facecolor=colours['background'])
+    ax = fig.add_axes([0, 0, 1, 1])
+    # Widen the extent to the output's shape at the local degree aspect, keeping it centred
+    aspect = 1 / math.cos(math.radians((min_lat + max_lat) / 2))
+    lon_span = max(max_lon - min_lon, (max_lat - min_lat) * aspect * size[0] / size[1])
+    lat_span = lon_span * size[1] / (size[0] * aspect)
+    centre_lon, centre_lat = (min_lon + max_lon) / 2, (min_lat + max_lat) / 2
+    ax.set_xlim(centre_lon - lon_span / 2, centre_lon + lon_span / 2)
+    ax.set_ylim(centre_lat - lat_span / 2, centre_lat + lat_span / 2)
+    ax.set_axis_off()
+
+    step = 10 if max_lon - min_lon > 40 else 5 if max_lon - min_lon > 10 else 1
+    for lon in np.arange(math.ceil(min_lon / step) * step, max_lon, step):
+        ax.axvline(lon, color=colours['graticule'], linewidth=0.4, zorder=0)
+    for lat in np.arange(math.ceil(min_lat / step) * step, max_lat, step):
+        ax.axhline(lat, color=colours['graticule'], linewidth=0.4, zorder=0)
+    basemap = basemap_lines()
+    if basemap:
+        ax.add_collection(LineCollection(basemap, colors=colours['basemap'], linewidths=0.5, zorder=1))
+
+    font_size = colours['font_size']
+    for name in CONTOUR_LAYERS:
+        lines = [np.asarray(coords) for _, coords in layers[name]]
+        if not lines:
+            continue
+        dashes = 'dashed' if name == 'isotherms' else 'solid'
+        ax.add_collection(LineCollection(lines, colors=colours[name], linewidths=colours['linewidth'], linestyles=dashes, zorder=2))
+        for (value, _), line in zip(layers[name], lines):
+            x, y = line[len(line) // 2]
+            ax.text(x, y, f"{value:g}", color=colours[name], fontsize=font_size, ha='center', va='center', zorder=3,
+                    bbox={'facecolor': colours['background'], 'edgecolor': 'none', 'pad': 0.5}, clip_on=True)
+
+    for center_type, x, y, pressure in layers['pressure_centers']:
+        ax.text(x, y, 'H' if center_type == 'HIGH' else 'L', color=colours[center_type], fontsize=font_size * 3,
+                fontweight='bold', ha='center', va='center', zorder=4, clip_on=True)
+        ax.text(x, y, f"\n\n{pressure:.0f}", color=colours[center_type], fontsize=font_size, ha='center', va='center',
+                zorder=4, clip_on=True)
+
+    reports = layers['reports']
+    if reports:
+        lons, lats = np.array([r[0] for r in reports]), np.array([r[1] for r in reports])
+        ax.scatter(lons, lats, s=4, color=colours['stations'], zorder=5)
+        winds = [r for r in reports if r[3] is not None and r[4] is not None]
+        if winds:
+            direction = np.radians([r[3] for r in winds])
+            speed = np.array([r[4] for r in winds], dtype='f8')
+            ax.barbs([r[0] for r in winds], [r[1] for r in winds], -speed * np.sin(direction), -speed * np.cos(direction),
+                     length=4.5, linewidth=0.5, color=colours['stations'], zorder=5)
+        for x, y, temperature, _, _ in reports:
+            if temperature is not None:
+                ax.annotate(f"{temperature:.0f}", (x, y), xytext=(-3, 3), textcoords='offset points', ha='right',
+                            fontsize=font_size, color=colours['stations'], zorder=6, annotation_clip=True)
+
+    ax.text(0.01, 0.99, title, transform=ax.transAxes, ha='left', va='top', fontsize=font_size * 1.6, zorder=7,
+            bbox={'facecolor': colours['background'], 'edgecolor': colours['basemap'], 'pad': 3})
+    output = BytesIO()
+    fig.savefig(output, format=RENDER_FORMATS[fmt][0], dpi=RENDER_DPI, facecolor=colours['background'])
+    return output.getvalue()
+
+
+_executor = None
+
+
+def _render_executor():
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=RENDER_WORKERS)
+    return _executor
+
+
+def draw_in_pool(*args):
+    """
+    Run draw_map in the render process pool, or inline when RENDER_WORKERS is
+    0 or the caller is a daemonic process (a Celery prefork child), which may
+    not start children of its own.
+    """
+    if RENDER_WORKERS <= 0:
+        return draw_map(*args)
+    if multiprocessing.current_process().daemon:
+        logger.warning("RENDER_WORKERS is set but this worker process cannot have children; drawing inline")
+        return draw_map(*args)
+    return _render_executor().submit(draw_map, *args).result(timeout=RENDER_TIMEOUT)
+
+
+def parse_observation_time(value):
+    if isinstance(value, datetime):
+        observation_time = value
+    else:
+        try:
+            observation_time = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except (AttributeError, ValueError):
+            raise RenderError("observation_time must be an ISO timestamp")
+    return observation_time if observation_time.tzinfo else observation_time.replace(tzinfo=timezone.utc)
+
+
+def cached_render(run, fmt, style, extent, size):
+    """The stored export of an identical earlier render, or None."""
+    export = ExportedMap.objects.filter(render_key=render_key(run, fmt, style, extent, size)).order_by('-created_at').first()
+    if export is not None and export.file_path and os.path.exists(export.file_path.path):
+        return export
+    return None
+
+
+def render_export(kind, level, observation_time, fmt='PNG', style=None, extent=None, size=None, progress=None):
+    """
+    Render the published analysis of (kind, level, observation_time) and store
+    it as an ExportedMap; returns (export, cached). The analysis is run first
+    if it has not been published yet.
+    """
+    def report_stage(stage, fraction):
+        if progress is not None:
+            progress(stage, fraction)
+
+    if fmt not in RENDER_FORMATS:
+        raise RenderError(f"map_type must be one of {', '.join(RENDER_FORMATS)}")
+    style, extent, size = parse_style(style), parse_extent(kind, extent), parse_size(size)
+    observation_time = parse_observation_time(observation_time)
+
+    run = current_run(kind, level, observation_time)
+    if run is None:
+        from .contours import generate_contours
+        from .upperair_counters import upper_air_generate_contours
+
+        report_stage('analysis', 0.1)
+        generator = upper_air_generate_contours if kind == 'upperair' else generate_contours
+        generator(level, observation_time.isoformat())
+        run = current_run(kind, level, observation_time)
+        if run is None:
+            raise RenderError(f"No {kind} analysis for level={level} at {observation_time.isoformat()}")
+
+    export = cached_render(run, fmt, style, extent, size)
+    if export is not None:
+        metrics.incr('render.cached')
+        return export, True
+
+    report_stage('collecting', 0.4)
+    layers = collect_layers(run, extent, size)
+    report_stage('drawing', 0.6)
+    title = f"{level} {observation_time.strftime('%Y-%m-%d %H:%M')} UTC"
+    started = time.monotonic()
+    content = draw_in_pool(layers, title, fmt, style, extent, size)
+    elapsed = time.monotonic() - started
+
+    extension = RENDER_FORMATS[fmt][0]
+    filename = f"weather_map_{level}_{observation_time.strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:8]}.{extension}"
+    export = ExportedMap.objects.create(
+        file_name=filename,
+        file_path=ContentFile(content, name=filename),
+        map_type=fmt,
+        level=level,
+        observation_time=observation_time,
+        render_key=render_key(run, fmt, style, extent, size),
+    )
+    metrics.incr('render.rendered')
+    logger.info(f"Rendered {fmt} map {filename} for run {run.pk} ({len(content)} bytes, {style}, {size[0]}x{size[1]}) in {elapsed:.2f}s")
+    return export, False
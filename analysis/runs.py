@@ -0,0 +1,140 @@
+import logging
+from datetime import timedelta
+
+from django.db import transaction
+from django.utils import timezone
+
+from .models import (
+    AnalysisRun, CurrentAnalysisRun, Isobar, Isotherm, PressureCenter, TendencyContour,
+    UpperAirIsobar, UpperAirIsotherm, UpperAirPressureCenter,
+)
+from .catalogue import mark_analysis
+from .versions import ANALYSIS_SOURCES, bump
+
+logger = logging.getLogger(__name__)
+
+# Row models that belong to an analysis run
+RUN_ROW_MODELS = [
+    Isobar, Isotherm, PressureCenter, UpperAirIsobar, UpperAirIsotherm, UpperAirPressureCenter, TendencyContour,
+]
+
+
+def current_run(kind, level, observation_time):
+    """Return the run currently published for a key, or None."""
+    pointer = (
+        CurrentAnalysisRun.objects
+        .filter(kind=kind, level=level, observation_time=observation_time)
+        .select_related('run')
+        .first()
+    )
+    return pointer.run if pointer else None
+
+
+async def acurrent_run(kind, level, observation_time):
+    """Async variant of current_run."""
+    pointer = await (
+        CurrentAnalysisRun.objects
+        .filter(kind=kind, level=level, observation_time=observation_time)
+        .select_related('run')
+        .afirst()
+    )
+    return pointer.run if pointer else None
+
+
+def current_rows(queryset):
+    """Restrict a contour/centre queryset to rows of currently published runs."""
+    return queryset.filter(run__current_pointer__isnull=False)
+
+
+def start_run(kind, level, observation_time, fingerprint, engine_params):
+    """Record a new run in RUNNING state; its rows stay invisible until activated."""
+    run = AnalysisRun.objects.create(
+        kind=kind,
+        level=level,
+        observation_time=observation_time,
+        fingerprint=fingerprint,
+        engine_params=engine_params,
+        status=AnalysisRun.STATUS_RUNNING,
+    )
+    logger.info(f"Started {kind} analysis run {run.pk} for level={level}, observation_time={observation_time}")
+    return run
+
+
+def fail_run(run, reason=''):
+    """Mark a run as failed; any rows it wrote are removed by gc_runs."""
+    now = timezone.now()
+    AnalysisRun.objects.filter(pk=run.pk).update(status=AnalysisRun.STATUS_FAILED, completed_at=now, updated_at=now)
+    logger.warning(f"Analysis run {run.pk} failed: {reason}")
+
+
+def heartbeat(run):
+    """Record that a RUNNING run is still making progress, so gc_runs leaves it alone."""
+    AnalysisRun.objects.filter(pk=run.pk, status=AnalysisRun.STATUS_RUNNING).update(updated_at=timezone.now())
+
+
+def activate_run(run):
+    """
+    Publish a completed run by flipping the current-run pointer for its key.
+
+    Must be called inside the transaction that wrote the run's rows, so readers
+    switch from the previous run to the new one in a single commit.
+    """
+    with transaction.atomic():
+        previous = (
+            CurrentAnalysisRun.objects
+            .select_for_update()
+            .filter(kind=run.kind, level=run.level, observation_time=run.observation_time)
+            .first()
+        )
+        if previous:
+            previous_run_id = previous.run_id
+            previous.run = run
+            previous.save(update_fields=['run', 'updated_at'])
+            AnalysisRun.objects.filter(pk=previous_run_id).update(
+                status=AnalysisRun.STATUS_SUPERSEDED, updated_at=timezone.now()
+            )
+        else:
+            CurrentAnalysisRun.objects.create(
+                kind=run.kind, level=run.level, observation_time=run.observation_time, run=run
+            )
+        run.status = AnalysisRun.STATUS_COMPLETE
+        run.completed_at = run.updated_at = timezone.now()
+        run.save(update_fields=['status', 'completed_at', 'updated_at'])
+        bump(ANALYSIS_SOURCES[run.kind], run.level, run.observation_time)
+        mark_analysis(run.kind, run.level, run.observation_time)
+    logger.info(f"Activated analysis run {run.pk} for {run.kind} level={run.level}, observation_time={run.observation_time}")
+
+
+def gc_runs(grace_minutes=10, stale_minutes=60):
+    """
+    Delete superseded and failed runs and their rows in bulk by run id.
+
+    Superseded and failed runs are kept for ``grace_minutes`` after they were
+    superseded or failed, so in-flight readers can finish; RUNNING runs
+    without a heartbeat for ``stale_minutes`` are treated as crashed.
+    Rows without a run (written before runs existed) are removed as well.
+    """
+    now = timezone.now()
+    dead_ids = list(
+        AnalysisRun.objects.filter(
+            status__in=[AnalysisRun.STATUS_SUPERSEDED, AnalysisRun.STATUS_FAILED],
+            updated_at__lt=now - timedelta(minutes=grace_minutes),
+        ).values_list('id', flat=True)
+    )
+    dead_ids += list(
+        AnalysisRun.objects.filter(
+            status=AnalysisRun.STATUS_RUNNING,
+            updated_at__lt=now - timedelta(minutes=stale_minutes),
+        ).values_list('id', flat=True)
+    )
+
+    deleted_rows = 0
+    for model in RUN_ROW_MODELS:
+        if dead_ids:
+            count, _ = model.objects.filter(run_id__in=dead_ids).delete()
+            deleted_rows += count
+        count, _ = model.objects.filter(run__isnull=True).delete()
+        deleted_rows += count
+    deleted_runs, _ = AnalysisRun.objects.filter(id__in=dead_ids).delete() if dead_ids else (0, {})
+    logger.info(f"Analysis GC removed {deleted_runs} runs and {deleted_rows} rows")
+    return {'runs': deleted_runs, 'rows': deleted_rows}
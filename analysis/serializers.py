@@ -1,10 +1,13 @@
 
+import json
+
 from rest_framework import serializers
 from rest_framework_gis.serializers import GeoFeatureModelSerializer
 from django.contrib.gis.geos import GEOSGeometry
-from .models import (WeatherStation, SynopReport, Isobar, Isotherm, PressureCenter, ExportedMap, GridData,UpperAirWeatherStation,UpperAirSynopReport,UpperAirIsobar,UpperAirIsotherm,UpperAirPressureCenter)
+from .models import (WeatherStation, SynopReport, Isobar, Isotherm, PressureCenter, ExportedMap, AnalysisGrid,UpperAirWeatherStation,UpperAirSynopReport,UpperAirIsobar,UpperAirIsotherm,UpperAirPressureCenter,TendencyContour)
 import logging
 from django.core.exceptions import ValidationError as DjangoValidationError
+from django.urls import reverse
 
 logger = logging.getLogger(__name__)
 
@@ -60,9 +63,9 @@ class SynopReportSerializer(GeoFeatureModelSerializer):
         }
 
     def get_location(self, obj):
-        """Return station location as GeoJSON."""
+        """Return station location as a GeoJSON object, as the SQL fast path builds it."""
         try:
-            return obj.station.location.geojson
+            return json.loads(obj.station.location.geojson)
         except Exception as e:
             logger.error(f"Error serializing location for SynopReport {obj.id}: {e}")
             return None
@@ -103,9 +106,9 @@ class UpperAirSynopReportSerializer(GeoFeatureModelSerializer):
         }
 
     def get_location(self, obj):
-        """Return station location as GeoJSON."""
+        """Return station location as a GeoJSON object, as the SQL fast path builds it."""
         try:
-            return obj.station.location.geojson
+            return json.loads(obj.station.location.geojson)
         except Exception as e:
             logger.error(f"Error serializing location for UpperAirSynopReport {obj.id}: {e}")
             return None
@@ -226,12 +229,19 @@ class UpperAirPressureCenterSerializer(GeoFeatureModelSerializer):
             raise serializers.ValidationError("Location must be a valid Point geometry.")
         return value
 
+class TendencyContourSerializer(GeoFeatureModelSerializer):
+    class Meta:
+        model = TendencyContour
+        geo_field = 'geometry'
+        fields = ['id', 'field', 'change', 'hours', 'geometry', 'level', 'observation_time']
+        read_only_fields = fields
+
 class ExportedMapSerializer(serializers.ModelSerializer):
     absolute_url = serializers.SerializerMethodField()
 
     class Meta:
         model = ExportedMap
-        fields = ['id', 'file_name', 'map_type', 'absolute_url', 'created_at', 'level', 'observation_time']
+        fields = ['id', 'file_name', 'map_type', 'absolute_url', 'created_at', 'level', 'observation_time', 'content_hash']
 
     def get_absolute_url(self, obj):
         try:
@@ -240,26 +250,30 @@ class ExportedMapSerializer(serializers.ModelSerializer):
             logger.error(f"Error generating absolute URL for ExportedMap {obj.id}: {e}")
             return None
 
-class GridDataSerializer(GeoFeatureModelSerializer):
+class AnalysisGridSerializer(serializers.ModelSerializer):
+    """Grid geometry and stored fields of a run; values are read through the grid store."""
+    bounds = serializers.SerializerMethodField()
+    shape = serializers.SerializerMethodField()
+    arrays = serializers.SerializerMethodField()
+
     class Meta:
-        model = GridData
-        geo_field = 'geometry'
-        fields = ['id', 'level', 'observation_time', 'geometry']
+        model = AnalysisGrid
+        fields = [
+            'id', 'run', 'domain', 'level', 'observation_time', 'bounds', 'resolution', 'shape',
+            'fields', 'arrays', 'raw_size', 'created_at',
+        ]
 
-    def validate_geometry(self, value):
-        """Ensure valid GeometryCollection with Points."""
-        if not isinstance(value, GEOSGeometry) or value.geom_type != 'GeometryCollection':
-            logger.error(f"Invalid geometry for GridData: {value}")
-            raise serializers.ValidationError("Geometry must be a valid GeometryCollection.")
-        if not all(geom.geom_type == 'Point' for geom in value):
-            logger.error(f"Non-Point geometries in GridData: {value}")
-            raise serializers.ValidationError("GeometryCollection must contain only Points.")
-        return value
+    def get_bounds(self, obj):
+        return [obj.min_lon, obj.min_lat, obj.max_lon, obj.max_lat]
 
-    def to_representation(self, instance):
-        """Optimize large GeoJSON output."""
-        ret = super().to_representation(instance)
-        geometry = ret.get('geometry')
-        if geometry and len(geometry.get('geometries', [])) > 1000:
-            logger.info(f"Serializing large GridData with {len(geometry.get('geometries', []))} points")
-        return ret
+    def get_shape(self, obj):
+        return [obj.ny, obj.nx]
+
+    def get_arrays(self, obj):
+        """Binary transfer URL of each field (/grid/{run}/{field}.bin?domain=)."""
+        request = self.context.get('request')
+        urls = {}
+        for name in obj.fields:
+            url = f"{reverse('grid-binary', kwargs={'run_id': obj.run_id, 'field': name})}?domain={obj.domain}"
+            urls[name] = request.build_absolute_uri(url) if request else url
+        return urls
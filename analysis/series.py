@@ -0,0 +1,110 @@
+import logging
+from datetime import timedelta, timezone
+
+from django.db.models import Avg, Count, Max, Min
+from django.db.models.functions import Trunc
+
+from .models import SynopReport, UpperAirSynopReport
+
+logger = logging.getLogger(__name__)
+
+# Numeric report fields a series can carry, per report model
+SERIES_FIELDS = {
+    SynopReport: [
+        'temperature', 'dew_point', 'sea_level_pressure', 'station_pressure', 'pressure_change',
+        'wind_speed', 'wind_direction', 'cloud_cover', 'visibility',
+        'max_temperature', 'min_temperature', 'precipitation', 'precipitation_24h',
+    ],
+    UpperAirSynopReport: ['temperature', 'dew_point', 'height', 'pressure', 'wind_speed', 'wind_direction'],
+}
+DEFAULT_FIELDS = {
+    SynopReport: ['temperature', 'dew_point', 'sea_level_pressure', 'wind_speed', 'wind_direction'],
+    UpperAirSynopReport: ['temperature', 'dew_point', 'height', 'wind_speed', 'wind_direction'],
+}
+# Directions have no meaningful min/max/mean; they are only served raw
+NOT_AGGREGATABLE = {'wind_direction'}
+
+INTERVALS = ('raw', 'hour', 'day')
+DEFAULT_RANGE = timedelta(days=7)
+# Longer ranges are aggregated by day when the interval is 'auto'
+AUTO_RAW_RANGE = timedelta(days=31)
+MAX_RAW_RANGE = timedelta(days=92)
+MAX_RANGE = timedelta(days=366 * 2)
+
+
+class SeriesError(ValueError):
+    """Invalid series request (unknown field, interval or range)."""
+
+
+def resolve_fields(report_model, requested):
+    """Validate a comma-separated field list, falling back to the model defaults."""
+    if not requested:
+        return list(DEFAULT_FIELDS[report_model])
+    fields = [name.strip() for name in requested.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in SERIES_FIELDS[report_model]]
+    if unknown:
+        raise SeriesError(f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(SERIES_FIELDS[report_model])}")
+    return fields
+
+
+def resolve_interval(requested, start, end):
+    interval = requested or 'auto'
+    if interval == 'auto':
+        interval = 'raw' if end - start <= AUTO_RAW_RANGE else 'day'
+    if interval not in INTERVALS:
+        raise SeriesError(f"interval must be one of auto, {', '.join(INTERVALS)}")
+    if end <= start:
+        raise SeriesError("'from' must be before 'to'")
+    if end - start > MAX_RANGE:
+        raise SeriesError(f"Range is limited to {MAX_RANGE.days} days")
+    if interval == 'raw' and end - start > MAX_RAW_RANGE:
+        raise SeriesError(f"Raw series are limited to {MAX_RAW_RANGE.days} days; use interval=hour or day")
+    return interval
+
+
+def _iso(value):
+    return value.isoformat().replace('+00:00', 'Z')
+
+
+def station_series(report_model, station_id, level, start, end, fields, interval):
+    """
+    Return one station's reports in [start, end) as columnar arrays.
+
+    Raw series carry one value per report and field. Aggregated series carry
+    min/max/mean per hour or day bucket and a report count, so long ranges
+    stay small. Served by the (station, level, observation_time) index.
+    """
+    reports = report_model.objects.filter(
+        station_id=station_id, level=level, observation_time__gte=start, observation_time__lt=end,
+    )
+    series = {'station': station_id, 'level': level, 'from': _iso(start), 'to': _iso(end), 'interval': interval}
+
+    if interval == 'raw':
+        rows = list(reports.order_by('observation_time').values_list('observation_time', *fields))
+        series['time'] = [_iso(row[0]) for row in rows]
+        for i, name in enumerate(fields, start=1):
+            series[name] = [row[i] for row in rows]
+        return series
+
+    dropped = [name for name in fields if name in NOT_AGGREGATABLE]
+    fields = [name for name in fields if name not in NOT_AGGREGATABLE]
+    aggregates = {'count': Count('id')}
+    for name in fields:
+        aggregates.update({f'{name}_min': Min(name), f'{name}_max': Max(name), f'{name}_mean': Avg(name)})
+    rows = list(
+        reports
+        .annotate(bucket=Trunc('observation_time', interval, tzinfo=timezone.utc))
+        .values('bucket')
+        .annotate(**aggregates)
+        .order_by('bucket')
+    )
+    series['time'] = [_iso(row['bucket']) for row in rows]
+    series['count'] = [row['count'] for row in rows]
+    for name in fields:
+        series[name] = {
+            stat: [row[f'{name}_{stat}'] for row in rows]
+            for stat in ('min', 'max', 'mean')
+        }
+    if dropped:
+        series['omitted'] = dropped
+    return series
@@ -0,0 +1,306 @@
+import logging
+import math
+from functools import lru_cache
+from io import BytesIO
+
+from django.conf import settings
+from django.db import transaction
+from PIL import Image, ImageDraw, ImageFont
+
+from .catalogue import SURFACE, UPPERAIR
+from .locks import single_flight
+from .models import StationSprites, SynopReport, UpperAirSynopReport
+from .versions import reports_version
+
+logger = logging.getLogger(__name__)
+
+# Station-model glyphs drawn per kind, as toggled by the layer switcher
+# (frontend/synop.js and uppeAirSynop.js)
+SPRITE_TYPES = {
+    SURFACE: (
+        'station', 'wind', 'cloud', 'temperature', 'dewpoint', 'pressure', 'pressure_change', 'visibility',
+        'station_id', 'cloud_low_type', 'cloud_mid_type', 'cloud_high_type',
+    ),
+    UPPERAIR: ('station', 'wind', 'temperature', 'dewpoint', 'pressure', 'station_id'),
+}
+REPORT_MODELS = {SURFACE: SynopReport, UPPERAIR: UpperAirSynopReport}
+
+# Glyphs are drawn on the clients' 150 px station canvas and scaled down to a
+# SPRITE_CELL square, which the clients showed at half size (75 px)
+CANVAS = 150
+SPRITE_CELL = getattr(settings, 'SPRITE_CELL', 76)
+KNOTS_PER_MS = 1.94384
+
+
+@lru_cache(maxsize=4)
+def _font(size):
+    from matplotlib import font_manager
+
+    path = font_manager.findfont(font_manager.FontProperties(family='DejaVu Sans', weight='bold'))
+    return ImageFont.truetype(path, size)
+
+
+def _round(value):
+    """Half-up rounding, as Math.round in the browser."""
+    return int(math.floor(value + 0.5))
+
+
+def _quad(start, control, end, steps=12):
+    """Points along a quadratic Bézier curve."""
+    return [
+        (
+            (1 - t) ** 2 * start[0] + 2 * (1 - t) * t * control[0] + t ** 2 * end[0],
+            (1 - t) ** 2 * start[1] + 2 * (1 - t) * t * control[1] + t ** 2 * end[1],
+        )
+        for t in (i / steps for i in range(steps + 1))
+    ]
+
+
+def _lines(draw, origin, paths, width=3, colour='black'):
+    for path in paths:
+        draw.line([(origin[0] + x, origin[1] + y) for x, y in path], fill=colour, width=width, joint='curve')
+
+
+def _text(draw, position, text, size=18, colour='black'):
+    draw.text(position, text, fill=colour, font=_font(size))
+
+
+CENTRE = (CANVAS / 2, CANVAS / 2)
+ROW_Y = CENTRE[1] - 20
+
+# Cloud-type symbols (WMO CL, CM, CH codes 1-9) as strokes around their anchor
+CLOUD_LOW = {
+    1: [_quad((-10, 0), (0, -10), (10, 0))],
+    2: [_quad((-10, 0), (0, -10), (10, 0)), _quad((-10, 8), (0, -2), (10, 8))],
+    3: [_quad((-10, 0), (0, -10), (10, 0)), [(-10, 10), (10, 10)]],
+    4: [[(-10, 5), (10, 5)], [(-1, 5), (1, 5)]],
+    5: [[(-10, 0), (10, 0)], [(-10, 5), (10, 5)]],
+    6: [[(-10, 0), (10, 0)]],
+    7: [[(-10, 0), (-5, 0)], [(-2, 0), (2, 0)], [(5, 0), (10, 0)]],
+    8: [[(-10, 10), (10, 10)], _quad((-10, 10), (0, 0), (10, 10))],
+    9: [[(-10, 10), (10, 10)], _quad((-10, 10), (0, -15), (10, 10))],
+}
+CLOUD_MID = {
+    1: [[(-10, 0), (10, 0)]],
+    2: [[(-10, 0), (0, 0), (10, 5)]],
+    3: [_quad((-10, 0), (-5, -5), (0, 0)) + _quad((0, 0), (5, 5), (10, 0))],
+    4: [[(-10, 0), (0, 0)], [(0, 5), (10, 5)]],
+    5: [_quad((-10, 0), (-5, -5), (0, 0)) + _quad((0, 0), (5, 5), (10, 0)),
+        _quad((-10, 5), (-5, 0), (0, 5)) + _quad((0, 5), (5, 10), (10, 5))],
+    6: [_quad((-10, 5), (0, -5), (10, 5))],
+    7: [[(-10, 0), (10, 0)], [(-10, 5), (10, 5)], [(-10, 10), (10, 10)]],
+    8: [[(-10, 10), (10, 10)], _quad((-10, 10), (0, 0), (10, 10))],
+    9: [[(-10, -5), (0, 5), (10, -5)], [(-10, 5), (10, 5)]],
+}
+CLOUD_HIGH = {
+    1: [[(-10, 0), (0, -5), (10, 0)]],
+    2: [[(-10, 0), (0, -5), (10, 0)], [(-10, 5), (0, 0), (10, 5)]],
+    3: [[(-10, 0), (0, -5), (10, 0)], [(-5, -5), (5, -5)]],
+    4: [_quad((-10, 0), (-5, -10), (0, -5)) + _quad((0, -5), (5, 0), (10, -5))],
+    5: [[(-10, -2), (0, 0), (10, -2)], [(-10, 2), (0, 0), (10, 2)]],
+    6: [[(-10, -5), (0, 0), (10, -5)], [(-10, 5), (0, 0), (10, 5)]],
+    7: [[(-10, -5), (10, -5)], [(-10, 0), (10, 0)], [(-10, 5), (10, 5)]],
+    8: [[(-10, -2), (10, -2)], [(-10, 2), (10, 2)]],
+    9: [[(-10, 5), (0, -5), (10, 5)], [(-5, -5), (5, -5)]],
+}
+CLOUD_ANCHORS = {
+    'cloud_low_type': ((CENTRE[0] - 10, CENTRE[1] + 20), CLOUD_LOW),
+    'cloud_mid_type': ((CENTRE[0], ROW_Y), CLOUD_MID),
+    'cloud_high_type': ((CENTRE[0], CENTRE[1] - 40), CLOUD_HIGH),
+}
+# Text glyphs: top-left corner and font size
+TEXT_ANCHORS = {
+    'temperature': ((CENTRE[0] - 40, ROW_Y), 18, 'black'),
+    'dewpoint': ((CENTRE[0] - 40, CENTRE[1] + 20), 18, 'black'),
+    'pressure': ((CENTRE[0] + 20, ROW_Y), 18, 'black'),
+    'pressure_change': ((CENTRE[0] + 20, CENTRE[1]), 18, 'black'),
+    'visibility': ((CENTRE[0] - 60, CENTRE[1]), 18, 'black'),
+    'station_id': ((CENTRE[0] - 35, CENTRE[1] - 60), 16, '#0000FF'),
+}
+
+
+def _draw_sky(draw, state):
+    x, y = CENTRE
+    circle = [x - 10, y - 10, x + 10, y + 10]
+    if state == 1:
+        _lines(draw, CENTRE, [[(0, 10), (0, -10)]], width=8)
+    elif state == 7:
+        draw.ellipse(circle, fill='black')
+        _lines(draw, CENTRE, [[(0, 10), (0, -10)]], width=8, colour='white')
+    elif state == 9:
+        _lines(draw, CENTRE, [[(8.84, 8.84), (-8.84, -8.84)], [(-8.84, 8.84), (8.84, -8.84)]], width=4)
+    elif 2 <= state <= 8:
+        end = 90 * (state // 2 - 1)
+        if end - (-90) >= 360:
+            draw.ellipse(circle, fill='black')
+        else:
+            draw.pieslice(circle, -90, end, fill='black')
+        if state == 3:
+            _lines(draw, CENTRE, [[(1, 0), (1, 10)]])
+        elif state == 5:
+            _lines(draw, CENTRE, [[(0, 0), (-10, 0)]])
+
+
+def _draw_wind(draw, direction, speed):
+    """Barb rotated to the direction the wind blows from; a circle when calm."""
+    x, y = CENTRE
+    if speed <= 2:
+        draw.ellipse([x - 5, y - 5, x + 5, y + 5], outline='black', width=2)
+        return
+    angle = math.radians(direction)
+
+    def turn(point):
+        px, py = point
+        return (px * math.cos(angle) - py * math.sin(angle), px * math.sin(angle) + py * math.cos(angle))
+
+    _lines(draw, CENTRE, [[turn((0, 0)), turn((0, -40))]], width=2)
+    marker = -40
+    if speed >= 50:
+        draw.polygon([(x + px, y + py) for px, py in map(turn, [(0, marker), (10, marker + 5), (0, marker + 10)])], fill='black')
+        speed -= 50
+        marker += 10
+    while speed >= 10:
+        _lines(draw, CENTRE, [[turn((0, marker)), turn((10, marker))]], width=2)
+        speed -= 10
+        marker += 5
+    if speed >= 5:
+        _lines(draw, CENTRE, [[turn((0, marker)), turn((5, marker - 2.5))]], width=2)
+
+
+def draw_glyph(name):
+    """Draw one glyph, named "type:value", at CANVAS size and return it scaled to SPRITE_CELL."""
+    kind, _, value = name.partition(':')
+    image = Image.new('RGBA', (CANVAS, CANVAS), (0, 0, 0, 0))
+    draw = ImageDraw.Draw(image)
+    if kind == 'station':
+        draw.ellipse([CENTRE[0] - 10, CENTRE[1] - 10, CENTRE[0] + 10, CENTRE[1] + 10], outline='black', width=2)
+    elif kind == 'wind':
+        direction, speed = value.split(':')
+        _draw_wind(draw, int(direction), int(speed))
+    elif kind == 'cloud':
+        _draw_sky(draw, int(value))
+    elif kind in CLOUD_ANCHORS:
+        anchor, symbols = CLOUD_ANCHORS[kind]
+        _lines(draw, anchor, symbols.get(int(value), []))
+    elif kind in TEXT_ANCHORS:
+        position, size, colour = TEXT_ANCHORS[kind]
+        _text(draw, position, value, size, colour)
+    return image.resize((SPRITE_CELL, SPRITE_CELL), Image.LANCZOS)
+
+
+def _code(value):
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        return 0
+
+
+def station_glyphs(kind, report):
+    """
+    Glyph names of one report by sprite type, formatted as the browser did.
+    Values the report lacks get no glyph rather than a made-up default.
+    """
+    station = report.station
+    pressure = report.sea_level_pressure if kind == SURFACE else report.height
+    glyphs = {'station': 'station', 'station_id': f"station_id:{station.station_id}"}
+    if report.wind_speed is not None:
+        speed = _round(report.wind_speed * KNOTS_PER_MS)
+        # Barbs resolve 5 kt; directions are reported in tens of degrees
+        glyphs['wind'] = 'wind:0:0' if speed <= 2 else f"wind:{_round((report.wind_direction or 0) / 10) * 10 % 360}:{min(speed, 200) // 5 * 5}"
+    if report.temperature is not None:
+        glyphs['temperature'] = f"temperature:{_round(report.temperature)}"
+    if report.dew_point is not None:
+        glyphs['dewpoint'] = f"dewpoint:{_round(report.dew_point)}"
+    if pressure is not None:
+        glyphs['pressure'] = f"pressure:{_round(pressure * 10) % 1000:04d}"
+    if kind == SURFACE:
+        if report.cloud_cover is not None:
+            glyphs['cloud'] = f"cloud:{report.cloud_cover}"
+        if report.pressure_change is not None:
+            glyphs['pressure_change'] = f"pressure_change:{'+' if report.pressure_change >= 0 else '-'}{abs(report.pressure_change):.1f}"
+        if report.visibility is not None:
+            glyphs['visibility'] = f"visibility:{_round(report.visibility)}"
+        for name, value in (
+            ('cloud_low_type', report.cloud_low_type),
+            ('cloud_mid_type', report.cloud_mid_type),
+            ('cloud_high_type', report.cloud_high_type),
+        ):
+            if _code(value):
+                glyphs[name] = f"{name}:{_code(value)}"
+    return {name: glyph for name, glyph in glyphs.items() if name in SPRITE_TYPES[kind]}
+
+
+def build_atlas(kind, level, observation_time):
+    """
+    Draw the station models of (kind, level, observation_time) into one PNG.
+
+    Identical glyphs (the same barb, value or cloud symbol) are drawn once
+    and shared by every station showing them. Returns (png bytes, index):
+    the index maps sprite names to their cell in the image, in the Mapbox
+    sprite format, and lists each station with its glyph names by type.
+    """
+    reports = REPORT_MODELS[kind].objects.filter(
+        level=level, observation_time=observation_time, station__is_visible=True,
+    ).select_related('station')
+    stations = []
+    names = set()
+    for report in reports:
+        glyphs = station_glyphs(kind, report)
+        names.update(glyphs.values())
+        location = report.station.location
+        stations.append({
+            'station_id': report.station.station_id,
+            'coordinates': [location.x, location.y],
+            'glyphs': glyphs,
+        })
+
+    names = sorted(names)
+    columns = max(1, math.ceil(math.sqrt(len(names))))
+    rows = max(1, math.ceil(len(names) / columns))
+    atlas = Image.new('RGBA', (columns * SPRITE_CELL, rows * SPRITE_CELL), (0, 0, 0, 0))
+    sprites = {}
+    for position, name in enumerate(names):
+        x, y = position % columns * SPRITE_CELL, position // columns * SPRITE_CELL
+        atlas.paste(draw_glyph(name), (x, y))
+        sprites[name] = {'x': x, 'y': y, 'width': SPRITE_CELL, 'height': SPRITE_CELL, 'pixelRatio': 1}
+    output = BytesIO()
+    atlas.save(output, format='PNG', optimize=True)
+    index = {
+        'kind': kind,
+        'level': level,
+        'observation_time': observation_time.isoformat(),
+        'types': list(SPRITE_TYPES[kind]),
+        # Every sprite is a full station-model cell centred on the station
+        'anchor': [0.5, 0.5],
+        'sprites': sprites,
+        'stations': stations,
+    }
+    return output.getvalue(), index
+
+
+def store_sprites(kind, level, observation_time):
+    """Build and store the atlas for a time unless the stored one is current."""
+    with single_flight(f"sprites-{kind}", level, observation_time):
+        version = reports_version(kind, level, observation_time)
+        existing = StationSprites.objects.filter(kind=kind, level=level, observation_time=observation_time).first()
+        if existing is not None and existing.reports_version == version:
+            return existing
+        image, index = build_atlas(kind, level, observation_time)
+        with transaction.atomic():
+            sprites, _ = StationSprites.objects.update_or_create(
+                kind=kind, level=level, observation_time=observation_time,
+                defaults={'image': image, 'index': index, 'reports_version': version},
+            )
+        logger.info(
+            f"Stored {kind} station sprites for level={level}, observation_time={observation_time}: "
+            f"{len(index['sprites'])} glyphs for {len(index['stations'])} stations, {len(image)} bytes"
+        )
+        return sprites
+
+
+def current_sprites(kind, level, observation_time):
+    """The stored atlas for a time, rebuilt first if reports changed since it was drawn."""
+    sprites = StationSprites.objects.filter(kind=kind, level=level, observation_time=observation_time).first()
+    if sprites is not None and sprites.reports_version == reports_version(kind, level, observation_time):
+        return sprites
+    return store_sprites(kind, level, observation_time)
@@ -0,0 +1,133 @@
+import logging
+
+from django.conf import settings
+from django.contrib.gis.db.models import GeometryField
+from django.core.exceptions import FieldDoesNotExist
+from django.db import connection
+from django.http import HttpResponse
+from rest_framework.renderers import JSONRenderer
+
+logger = logging.getLogger(__name__)
+
+# Coordinate precision of SQL-built GeoJSON (5 decimals is roughly 1 m)
+MAX_DECIMAL_DIGITS = getattr(settings, 'GEOJSON_MAX_DECIMAL_DIGITS', 5)
+# Serve the SQL fast path by default instead of only on ?geojson=sql
+FAST_PATH_DEFAULT = getattr(settings, 'GEOJSON_SQL_FAST_PATH', False)
+
+
+def _datetime_sql(column):
+    """
+    Format a timestamptz column the way DRF renders it with USE_TZ in UTC:
+    ISO 8601 with a 'Z' suffix and microseconds only when non-zero.
+    """
+    utc = f"({column} AT TIME ZONE 'UTC')"
+    return (
+        f"(to_char({utc}, 'YYYY-MM-DD\"T\"HH24:MI:SS') "
+        f"|| CASE WHEN mod(extract(microseconds FROM {utc})::bigint, 1000000) <> 0 THEN to_char({utc}, '.US') ELSE '' END "
+        f"|| 'Z')"
+    )
+
+
+def _feature_sql(serializer_class):
+    """
+    Build the per-row ``json_build_object`` expression for a
+    GeoFeatureModelSerializer, with the same id, geometry and properties.
+
+    Reports serialise the location of their station, so a geo_field that is
+    not a model field is taken from the joined station row.
+    """
+    meta = serializer_class.Meta
+    model = meta.model
+    opts = model._meta
+    join = ''
+    try:
+        geom = f"t.{opts.get_field(meta.geo_field).column}"
+    except FieldDoesNotExist:
+        station_table = opts.get_field('station').related_model._meta.db_table
+        join = f" JOIN {station_table} s ON s.station_id = t.station_id"
+        geom = f"s.{meta.geo_field}"
+
+    properties = []
+    for name in meta.fields:
+        if name in (opts.pk.name, meta.geo_field):
+            continue
+        field = opts.get_field(name)
+        value = f"t.{field.column}"
+        if field.get_internal_type() == 'DateTimeField':
+            value = _datetime_sql(value)
+        properties.append(f"'{name}', {value}")
+    return (
+        "json_build_object("
+        "'type', 'Feature', "
+        f"'id', t.{opts.pk.column}, "
+        f"'geometry', ST_AsGeoJSON({geom}, {int(MAX_DECIMAL_DIGITS)})::json, "
+        f"'properties', json_build_object({', '.join(properties)})"
+        ")"
+    ), f"{opts.db_table} t{join}"
+
+
+def feature_collection(serializer_class, id_sql, id_params, order_by_ids=None):
+    """
+    Return a GeoJSON FeatureCollection as bytes, assembled by PostgreSQL.
+
+    ``id_sql``/``id_params`` select the primary keys to include. When
+    ``order_by_ids`` is given, features keep that order (a paginated page).
+    """
+    feature, source = _feature_sql(serializer_class)
+    pk_field = serializer_class.Meta.model._meta.pk
+    pk = pk_field.column
+    if order_by_ids is not None:
+        order = f"array_position(%s::{pk_field.rel_db_type(connection)}[], t.{pk})"
+        params = [list(order_by_ids)] + list(id_params)
+    else:
+        order = f"t.{pk}"
+        params = list(id_params)
+    sql = (
+        "SELECT json_build_object('type', 'FeatureCollection', 'features', "
+        "COALESCE(json_agg(f.feature ORDER BY f.ord), '[]'::json))::text "
+        f"FROM (SELECT {feature} AS feature, {order} AS ord FROM {source} "
+        f"WHERE t.{pk} IN ({id_sql})) f"
+    )
+    with connection.cursor() as cursor:
+        cursor.execute(sql, params)
+        return cursor.fetchone()[0].encode('utf-8')
+
+
+class SqlGeoJSONMixin:
+    """
+    Optional fast path for GeoJSON list endpoints: the FeatureCollection is
+    built in PostgreSQL and returned as raw bytes, skipping per-row Python
+    serialization. Filters and pagination are applied exactly as on the DRF
+    path. Enabled with ?geojson=sql, or for every request by setting
+    GEOJSON_SQL_FAST_PATH.
+    """
+
+    def use_sql_geojson(self, request):
+        if connection.vendor != 'postgresql':
+            return False
+        requested = request.query_params.get('geojson')
+        if requested:
+            return requested == 'sql'
+        return FAST_PATH_DEFAULT
+
+    def list(self, request, *args, **kwargs):
+        if not self.use_sql_geojson(request):
+            return super().list(request, *args, **kwargs)
+
+        queryset = self.filter_queryset(self.get_queryset())
+        serializer_class = self.get_serializer_class()
+        geometry_fields = [f.name for f in queryset.model._meta.concrete_fields if isinstance(f, GeometryField)]
+        # The paginator only needs keys and ordering columns, never geometries
+        page = self.paginate_queryset(queryset.select_related(None).defer(*geometry_fields))
+        if page is None:
+            id_sql, id_params = queryset.values('pk').query.sql_with_params()
+            return HttpResponse(feature_collection(serializer_class, id_sql, id_params), content_type='application/json')
+
+        ids = [obj.pk for obj in page]
+        pk_type = queryset.model._meta.pk.rel_db_type(connection)
+        collection = feature_collection(serializer_class, f'SELECT unnest(%s::{pk_type}[])', [ids], order_by_ids=ids)
+        envelope = dict(self.get_paginated_response(None).data)
+        envelope.pop('results', None)
+        head = JSONRenderer().render(envelope)[:-1]
+        body = head + (b',' if envelope else b'') + b'"results":' + collection + b'}'
+        return HttpResponse(body, content_type='application/json')
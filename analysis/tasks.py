@@ -6,6 +6,20 @@ from django.contrib.gis.geos import Point
 from datetime import datetime, timedelta, timezone
 from django.utils import timezone as django_timezone
 from analysis.models import WeatherStation, SynopReport, ExportedMap
+from analysis.contours import generate_contours
+from analysis.upperair_counters import upper_air_generate_contours
+from analysis.tendency import TENDENCY_KINDS, generate_tendency, refresh_tendencies
+from analysis.render import render_export
+from analysis import admission
+from analysis.sprites import store_sprites
+from analysis.uploads import prune_uploads
+from analysis.runs import gc_runs
+from analysis.grids import prune_grids
+from analysis.partitions import maintain_partitions
+from analysis.versions import SURFACE_REPORTS, bump_many
+from analysis.catalogue import SURFACE, record_report
+from analysis.visibility import refresh_visibility
+from django.db import transaction
 from django.conf import settings
 import logging
 import os
@@ -197,6 +211,7 @@ def fetch_meteo_data(self):
     logger.info(f"Fetching data from {begin_str} to {end_str} (last 3 days)")
 
     total_rows = 0
+    ingested = set()  # (level, observation_time) keys that received new reports
     for block in blocks:
         params = {
             'begin': begin_str,
@@ -252,35 +267,39 @@ def fetch_meteo_data(self):
                 if not parsed_data:
                     logger.warning(f"Failed to parse report for station {station_id}: {report}")
                     continue
-                SynopReport.objects.create(
-                    station=station,
-                    observation_time=observation_time,
-                    level='SURFACE',
-                    wind_direction=parsed_data['wind_direction'],
-                    wind_speed=parsed_data['wind_speed'],
-                    temperature=parsed_data['temperature'],
-                    dew_point=parsed_data['dew_point'],
-                    station_pressure=parsed_data['section1'].get('station_pressure'),
-                    sea_level_pressure=parsed_data['section1'].get('sea_level_pressure'),
-                    cloud_cover=parsed_data['cloud_cover'],
-                    cloud_low_type=parsed_data['section1']['clouds']['low_type'],
-                    cloud_mid_type=parsed_data['section1']['clouds']['mid_type'],
-                    cloud_high_type=parsed_data['section1']['clouds']['high_type'],
-                    visibility=parsed_data['visibility'],
-                    weather_present=parsed_data['section1']['weather']['present'],
-                    weather_past=parsed_data['section1']['weather']['past'],
-                    pressure_tendency=parsed_data['pressure_tendency'],
-                    pressure_change=parsed_data['pressure_change'],
-                    max_temperature=parsed_data['section3'].get('max_temperature', {}).get('value'),
-                    min_temperature=parsed_data['section3'].get('min_temperature', {}).get('value'),
-                    precipitation=parsed_data['section3'].get('precipitation'),
-                    precipitation_24h=parsed_data['section3'].get('precipitation_24h')
-                )
+                with transaction.atomic():
+                    SynopReport.objects.create(
+                        station=station,
+                        observation_time=observation_time,
+                        level='SURFACE',
+                        wind_direction=parsed_data['wind_direction'],
+                        wind_speed=parsed_data['wind_speed'],
+                        temperature=parsed_data['temperature'],
+                        dew_point=parsed_data['dew_point'],
+                        station_pressure=parsed_data['section1'].get('station_pressure'),
+                        sea_level_pressure=parsed_data['section1'].get('sea_level_pressure'),
+                        cloud_cover=parsed_data['cloud_cover'],
+                        cloud_low_type=parsed_data['section1']['clouds']['low_type'],
+                        cloud_mid_type=parsed_data['section1']['clouds']['mid_type'],
+                        cloud_high_type=parsed_data['section1']['clouds']['high_type'],
+                        visibility=parsed_data['visibility'],
+                        weather_present=parsed_data['section1']['weather']['present'],
+                        weather_past=parsed_data['section1']['weather']['past'],
+                        pressure_tendency=parsed_data['pressure_tendency'],
+                        pressure_change=parsed_data['pressure_change'],
+                        max_temperature=parsed_data['section3'].get('max_temperature', {}).get('value'),
+                        min_temperature=parsed_data['section3'].get('min_temperature', {}).get('value'),
+                        precipitation=parsed_data['section3'].get('precipitation'),
+                        precipitation_24h=parsed_data['section3'].get('precipitation_24h')
+                    )
+                    record_report(SURFACE, 'SURFACE', observation_time, len(station_map))
                 logger.info(f"Created SynopReport for station {station_id} at {observation_time}")
+                ingested.add(('SURFACE', observation_time))
             logger.info(f"Processed {row_count} rows for block {block}")
             total_rows += row_count
         except requests.RequestException as e:
             logger.error(f"Error fetching data for block {block}: {e}")
+            bump_many(SURFACE_REPORTS, ingested)
             raise self.retry(exc=e, countdown=60)
     
     # Fallback: Try the previous 24 hours
@@ -348,42 +367,128 @@ def fetch_meteo_data(self):
                         logger.warning(f"Failed to parse report for station {station_id}: {report}")
                         continue
 
-                    SynopReport.objects.create(
-                        station=station,
-                        observation_time=observation_time,
-                        level='SURFACE',
-                        wind_direction=parsed_data['wind_direction'],
-                        wind_speed=parsed_data['wind_speed'],
-                        temperature=parsed_data['temperature'],
-                        dew_point=parsed_data['dew_point'],
-                        station_pressure=parsed_data['section1'].get('station_pressure'),
-                        sea_level_pressure=parsed_data['section1'].get('sea_level_pressure'),
-                        cloud_cover=parsed_data['cloud_cover'],
-                        cloud_low_type=parsed_data['section1']['clouds']['low_type'],
-                        cloud_mid_type=parsed_data['section1']['clouds']['mid_type'],
-                        cloud_high_type=parsed_data['section1']['clouds']['high_type'],
-                        visibility=parsed_data['visibility'],
-                        weather_present=parsed_data['section1']['weather']['present'],
-                        weather_past=parsed_data['section1']['weather']['past'],
-                        pressure_tendency=parsed_data['pressure_tendency'],
-                        pressure_change=parsed_data['pressure_change'],
-                        max_temperature=parsed_data['section3'].get('max_temperature', {}).get('value'),
-                        min_temperature=parsed_data['section3'].get('min_temperature', {}).get('value'),
-                        precipitation=parsed_data['section3'].get('precipitation'),
-                        precipitation_24h=parsed_data['section3'].get('precipitation_24h')
-                    )
+                    with transaction.atomic():
+                        SynopReport.objects.create(
+                            station=station,
+                            observation_time=observation_time,
+                            level='SURFACE',
+                            wind_direction=parsed_data['wind_direction'],
+                            wind_speed=parsed_data['wind_speed'],
+                            temperature=parsed_data['temperature'],
+                            dew_point=parsed_data['dew_point'],
+                            station_pressure=parsed_data['section1'].get('station_pressure'),
+                            sea_level_pressure=parsed_data['section1'].get('sea_level_pressure'),
+                            cloud_cover=parsed_data['cloud_cover'],
+                            cloud_low_type=parsed_data['section1']['clouds']['low_type'],
+                            cloud_mid_type=parsed_data['section1']['clouds']['mid_type'],
+                            cloud_high_type=parsed_data['section1']['clouds']['high_type'],
+                            visibility=parsed_data['visibility'],
+                            weather_present=parsed_data['section1']['weather']['present'],
+                            weather_past=parsed_data['section1']['weather']['past'],
+                            pressure_tendency=parsed_data['pressure_tendency'],
+                            pressure_change=parsed_data['pressure_change'],
+                            max_temperature=parsed_data['section3'].get('max_temperature', {}).get('value'),
+                            min_temperature=parsed_data['section3'].get('min_temperature', {}).get('value'),
+                            precipitation=parsed_data['section3'].get('precipitation'),
+                            precipitation_24h=parsed_data['section3'].get('precipitation_24h')
+                        )
+                        record_report(SURFACE, 'SURFACE', observation_time, len(station_map))
                     logger.info(f"Created SynopReport for station {station_id} at {observation_time}")
+                    ingested.add(('SURFACE', observation_time))
                 logger.info(f"Processed {row_count} rows for block {block}")
                 total_rows += row_count
             except requests.RequestException as e:
                 logger.error(f"Error fetching data for block {block}: {e}")
+                bump_many(SURFACE_REPORTS, ingested)
                 raise self.retry(exc=e, countdown=60)
 
     if total_rows == 0:
         logger.warning("No new data fetched even after fallback.")
 
+    bump_many(SURFACE_REPORTS, ingested)
+    if ingested:
+        render_station_sprites.delay(SURFACE, [[level, time.isoformat()] for level, time in ingested])
+
     logger.info("Upper-level data fetching not implemented. Requires external data source.")
 
+@shared_task(bind=True)
+def run_analysis(self, kind, level, observation_time=None):
+    """Run a surface, upper-air or tendency analysis, publishing stage progress as task state."""
+    def progress(stage, fraction):
+        self.update_state(state='PROGRESS', meta={'stage': stage, 'progress': fraction})
+
+    try:
+        with admission.slot(queued=True):
+            if kind in TENDENCY_KINDS:
+                result = generate_tendency(level, observation_time, TENDENCY_KINDS[kind], progress=progress)
+            else:
+                generator = upper_air_generate_contours if kind == 'upperair' else generate_contours
+                result = generator(level, observation_time, progress=progress)
+            if not result:
+                logger.warning(f"{kind} analysis produced no result for level={level}, observation_time={observation_time}")
+            elif kind not in TENDENCY_KINDS and observation_time:
+                # Published tendencies built on a replaced run are recomputed (milliseconds each)
+                refresh_tendencies(level, observation_time)
+    except admission.Saturated as e:
+        # Every slot is busy: wait on the queue instead of kriging alongside them
+        raise self.retry(countdown=e.retry_after, max_retries=None)
+    return {
+        'kind': kind,
+        'level': level,
+        'observation_time': observation_time,
+        'success': bool(result),
+    }
+
+@shared_task(bind=True)
+def render_map(self, kind, level, observation_time, map_type, style=None, extent=None, size=None):
+    """Render a map of a published analysis server-side; the export is reported as the job result."""
+    def progress(stage, fraction):
+        self.update_state(state='PROGRESS', meta={'stage': stage, 'progress': fraction})
+
+    try:
+        with admission.slot(queued=True):
+            export, cached = render_export(kind, level, observation_time, map_type, style, extent, size, progress=progress)
+    except admission.Saturated as e:
+        raise self.retry(countdown=e.retry_after, max_retries=None)
+    return {
+        'export': export.pk,
+        'file_name': export.file_name,
+        'map_type': export.map_type,
+        'url': export.get_absolute_url(),
+        'cached': cached,
+    }
+
+@shared_task
+def render_station_sprites(kind, keys):
+    """Draw the station-model sprite atlas of each ingested (level, observation_time)."""
+    stored = 0
+    for level, observation_time in keys:
+        store_sprites(kind, level, datetime.fromisoformat(observation_time))
+        stored += 1
+    return {'kind': kind, 'stored': stored}
+
+@shared_task
+def gc_analysis_runs():
+    """Delete superseded and failed analysis runs with their contour rows and grids."""
+    result = gc_runs()
+    result['grids'] = prune_grids()
+    return result
+
+@shared_task
+def prune_export_uploads():
+    """Delete abandoned resumable export uploads and stray staging files."""
+    return prune_uploads()
+
+@shared_task
+def maintain_table_partitions():
+    """Create upcoming monthly partitions and drop those past retention."""
+    return maintain_partitions()
+
+@shared_task
+def refresh_station_visibility():
+    """Recompute station visibility when the policy settings or CSV changed."""
+    return refresh_visibility()
+
 @shared_task
 def clean_exported_maps():
     """Clean up exported maps older than 7 days."""
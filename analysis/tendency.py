@@ -0,0 +1,183 @@
+import hashlib
+import json
+import logging
+from datetime import datetime, timedelta, timezone
+
+import contourpy
+import numpy as np
+from django.contrib.gis.geos import LineString
+from django.db import transaction
+
+from .generalize import CONTOUR_TOLERANCES, generalize
+from .grids import open_grid, run_domains, write_grids
+from .locks import single_flight
+from .models import AnalysisRun, CurrentAnalysisRun, TendencyContour
+from .runs import activate_run, current_run, fail_run, start_run
+from . import metrics
+
+logger = logging.getLogger(__name__)
+
+# Tendency intervals in hours; each is its own run kind (tend3h, tend24h)
+TENDENCY_HOURS = (3, 24)
+TENDENCY_KINDS = {f"tend{hours}h": hours for hours in TENDENCY_HOURS}
+
+# Differenced fields of each base analysis and their contour interval
+TENDENCY_FIELDS = {
+    'surface': {'pressure': 1.0, 'temperature': 2.0},
+    'upperair': {'height': 20.0, 'temperature': 2.0},
+}
+
+
+def tendency_kind(hours):
+    return f"tend{hours}h"
+
+
+def base_kind(level):
+    return 'surface' if level == 'SURFACE' else 'upperair'
+
+
+def _parse_time(observation_time):
+    value = datetime.fromisoformat(observation_time.replace('Z', '+00:00'))
+    return value if value.tzinfo else value.replace(tzinfo=timezone.utc)
+
+
+def _latest_time(kind, level):
+    pointer = CurrentAnalysisRun.objects.filter(kind=kind, level=level).order_by('-observation_time').first()
+    return pointer.observation_time if pointer else None
+
+
+def base_runs(level, observation_time, hours):
+    """The published base runs at ``observation_time`` and ``hours`` before it (either may be None)."""
+    kind = base_kind(level)
+    return current_run(kind, level, observation_time), current_run(kind, level, observation_time - timedelta(hours=hours))
+
+
+def is_stale(run):
+    """True if a published tendency run was built from base runs that are no longer current."""
+    hours = TENDENCY_KINDS[run.kind]
+    later, earlier = base_runs(run.level, run.observation_time, hours)
+    used = run.engine_params.get('base_runs', [])
+    return [later and later.pk, earlier and earlier.pk] != used
+
+
+def contour_levels(values, interval):
+    finite = values[np.isfinite(values)]
+    if not finite.size:
+        return np.array([])
+    return interval * np.arange(np.floor(finite.min() / interval), np.ceil(finite.max() / interval) + 1)
+
+
+def generate_tendency(level, observation_time=None, hours=3, progress=None):
+    """
+    Compute and store the ``hours`` tendency for a level and observation time.
+
+    The difference of two published analyses (at the time and ``hours``
+    earlier) is taken per domain from their stored grids, contoured and
+    published as a run of kind tend{hours}h. Nothing is kriged, so once both
+    base analyses exist this costs milliseconds.
+    """
+    kind = tendency_kind(hours)
+    if observation_time is None:
+        observation_time = _latest_time(base_kind(level), level)
+        if observation_time is None:
+            logger.warning(f"No {base_kind(level)} analysis published for level={level}")
+            return False
+    elif isinstance(observation_time, str):
+        try:
+            observation_time = _parse_time(observation_time)
+        except ValueError:
+            logger.error(f"Invalid observation_time format: {observation_time}")
+            return False
+    with single_flight(kind, level, observation_time):
+        return _generate_tendency(kind, level, observation_time, hours, progress)
+
+
+def _generate_tendency(kind, level, observation_time, hours, progress=None):
+    def report_stage(stage, fraction):
+        if progress is not None:
+            progress(stage, fraction)
+
+    later, earlier = base_runs(level, observation_time, hours)
+    if later is None or earlier is None:
+        missing = observation_time if later is None else observation_time - timedelta(hours=hours)
+        logger.warning(f"No {base_kind(level)} analysis for level={level} at {missing}; cannot compute {kind}")
+        return False
+
+    params = {
+        'hours': hours,
+        'base_runs': [later.pk, earlier.pk],
+        'fields': TENDENCY_FIELDS[base_kind(level)],
+        'contour_tolerances': CONTOUR_TOLERANCES,
+    }
+    fingerprint = hashlib.sha256(
+        json.dumps([later.fingerprint, earlier.fingerprint, params], sort_keys=True).encode('utf-8')
+    ).hexdigest()
+    published = current_run(kind, level, observation_time)
+    if published is not None and published.fingerprint == fingerprint:
+        metrics.incr('tendency.skipped')
+        logger.info(f"{kind} for level={level}, observation_time={observation_time} is current (run {published.pk})")
+        return {'run': published.pk}
+    metrics.incr('tendency.recomputed')
+
+    run = start_run(kind, level, observation_time, fingerprint, params)
+    report_stage('differencing', 0.2)
+    rows = []
+    grids = {}
+    for domain in run_domains(later.pk):
+        if domain not in run_domains(earlier.pk):
+            continue
+        now_grid, then_grid = open_grid(later.pk, domain), open_grid(earlier.pk, domain)
+        if now_grid is None or then_grid is None or now_grid.meta['bounds'] != then_grid.meta['bounds'] \
+                or now_grid.meta['shape'] != then_grid.meta['shape']:
+            logger.warning(f"Grids of runs {later.pk} and {earlier.pk} differ for domain {domain}; skipping it")
+            continue
+        lons = np.linspace(now_grid.min_lon, now_grid.max_lon, now_grid.nx)
+        lats = np.linspace(now_grid.min_lat, now_grid.max_lat, now_grid.ny)
+        changes = {}
+        for field, interval in TENDENCY_FIELDS[base_kind(level)].items():
+            # Both grids are memory-mapped; the difference is one vectorized pass
+            change = np.subtract(now_grid.fields[field], then_grid.fields[field], dtype='f4')
+            changes[f"{field}_change"] = change
+            generator = contourpy.contour_generator(lons, lats, change, line_type='Separate')
+            for value in contour_levels(change, interval):
+                for line in generator.lines(value):
+                    if len(line) > 1:
+                        rows.append(TendencyContour(
+                            run=run, domain=domain, level=level, observation_time=observation_time, hours=hours,
+                            field=field, change=float(value), geometry=LineString(line, srid=4326),
+                        ))
+        grids[domain] = (now_grid.meta['bounds'], now_grid.meta['resolution'], changes)
+
+    if not grids:
+        fail_run(run, f"No common analysis domains between runs {later.pk} and {earlier.pk}")
+        return False
+    logger.info(f"Generated {len(rows)} {kind} contours for level={level}, observation_time={observation_time} over {len(grids)} domains")
+
+    report_stage('storing', 0.8)
+    for domain, (bounds, resolution, changes) in grids.items():
+        try:
+            write_grids(run, bounds, resolution, changes, domain=domain)
+        except Exception as e:
+            logger.error(f"Failed to store {domain} tendency grids for run {run.pk}: {str(e)}")
+    with transaction.atomic():
+        TendencyContour.objects.bulk_create(generalize(rows))
+        activate_run(run)
+    return {'run': run.pk}
+
+
+def refresh_tendencies(level, observation_time):
+    """
+    Recompute the published tendencies that use the base analysis at
+    (level, observation_time), if that analysis changed since they were built.
+    """
+    if isinstance(observation_time, str):
+        observation_time = _parse_time(observation_time)
+    refreshed = []
+    for hours in TENDENCY_HOURS:
+        kind = tendency_kind(hours)
+        for time in (observation_time, observation_time + timedelta(hours=hours)):
+            published = current_run(kind, level, time)
+            if published is not None and published.status == AnalysisRun.STATUS_COMPLETE and is_stale(published):
+                if generate_tendency(level, time, hours):
+                    refreshed.append((kind, time))
+    return refreshed
@@ -1,3 +1,1512 @@
-from django.test import TestCase
+import gzip
+import hashlib
+import io
+import json
+import os
+import shutil
+import struct
+import tempfile
+import threading
+from datetime import datetime, timedelta, timezone
+from unittest import mock
 
-# Create your tests here.
+import numpy as np
+from asgiref.sync import sync_to_async
+from django.contrib.gis.geos import LineString, Point
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone as django_timezone
+from rest_framework.exceptions import NotFound
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory
+
+from . import (
+    admission, catalogue, contours, grids, jobs, namespaces, partitions, render, sprites, tendency, uploads, visibility,
+)
+from .checks import check_shared_cache
+from .domains import DomainError, analysis_domains, boundary_weights, primary_domain, resolve_domain, tile_domain
+from .fingerprint import compute_fingerprint
+from .generalize import CONTOUR_TOLERANCES, FULL_DETAIL, generalize, pixel_tolerance, tolerance_for
+from .locks import LockTimeout, canonical_time, single_flight
+from .models import (
+    AnalysisBundle, AnalysisGrid, AnalysisRun, CurrentAnalysisRun, ExportedMap, ExportUpload, Isobar, ObservationSlot,
+    PressureCenter, SynopReport, TendencyContour, WeatherStation,
+)
+from .pagination import ExportKeysetPagination, IsobarKeysetPagination
+from .runs import activate_run, current_run, gc_runs, heartbeat, start_run
+from .versions import SURFACE_REPORTS, bump_many
+
+OBSERVATION_TIME = datetime(2025, 4, 24, 6, 0, tzinfo=timezone.utc)
+LINE = LineString((85.0, 27.0), (86.0, 28.0), srid=4326)
+PNG_BYTES = b'\x89PNG\r\n\x1a\n' + bytes(range(256)) * 40
+LOCAL_CACHE = {'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}}
+
+
+def make_station(station_id, lon=85.3, lat=27.7, **fields):
+    return WeatherStation.objects.create(
+        station_id=station_id, name=station_id, location=Point(lon, lat, srid=4326), elevation=1300, **fields,
+    )
+
+
+def make_report(station, observation_time=OBSERVATION_TIME, level='SURFACE', **fields):
+    return SynopReport.objects.create(station=station, observation_time=observation_time, level=level, **fields)
+
+
+def publish_surface_run(observation_time=OBSERVATION_TIME, pressures=(1000, 1004)):
+    """Store and activate a small surface analysis: isobars in every stored detail and one low."""
+    run = start_run('surface', 'SURFACE', observation_time, 'a' * 64, {})
+    for pressure in pressures:
+        for tolerance in (0.0, 0.02):
+            Isobar.objects.create(
+                run=run, pressure=pressure, geometry=LINE, level='SURFACE', observation_time=observation_time,
+                domain=primary_domain('surface'), tolerance=tolerance,
+            )
+    PressureCenter.objects.create(
+        run=run, center_type='LOW', location=Point(85.5, 27.5, srid=4326), pressure=996.0, level='SURFACE',
+        observation_time=observation_time,
+    )
+    activate_run(run)
+    return run
+
+
+def isolate_admission(test):
+    """Give a test its own process-local admission counts (used when the cache is not shared)."""
+    patcher = mock.patch.object(admission, '_local', admission.LocalAdmission())
+    patcher.start()
+    test.addCleanup(patcher.stop)
+
+
+def walk_pages(pagination_class, queryset, limit):
+    """Follow the next links of a keyset paginator and return every row in page order."""
+    factory = APIRequestFactory()
+    url, rows = f'/api/list/?limit={limit}', []
+    while url:
+        paginator = pagination_class()
+        rows += paginator.paginate_queryset(queryset, Request(factory.get(url)))
+        url = paginator.get_next_link()
+    return rows
+
+
+class KeysetCursorTests(SimpleTestCase):
+    def setUp(self):
+        self.factory = APIRequestFactory()
+
+    def test_cursor_round_trip(self):
+        paginator = ExportKeysetPagination()
+        paginator.request = Request(self.factory.get('/api/export-list/', {'limit': 2}))
+        created = datetime(2025, 4, 24, 6, 30, 15, 250000, tzinfo=timezone.utc)
+        url = paginator.encode_cursor(ExportedMap(id=42, created_at=created))
+
+        cursor = url.split('cursor=')[1]
+        request = Request(self.factory.get('/api/export-list/', {'cursor': cursor}))
+        self.assertEqual(paginator.decode_cursor(request, ExportedMap), [created, 42])
+
+    def test_missing_cursor_is_first_page(self):
+        request = Request(self.factory.get('/api/export-list/'))
+        self.assertIsNone(ExportKeysetPagination().decode_cursor(request, ExportedMap))
+
+    def test_tampered_cursor_is_rejected(self):
+        for cursor in ('not-base64!', 'WzFd'):  # garbage, and a one-value list for a two-field key
+            request = Request(self.factory.get('/api/export-list/', {'cursor': cursor}))
+            with self.assertRaises(NotFound):
+                ExportKeysetPagination().decode_cursor(request, ExportedMap)
+
+
+
+class KeysetPageTests(TestCase):
+    def test_contours_page_on_level_pressure_id(self):
+        for pressure in (1004, 1000, 1000, 1008, 996, 1000):
+            Isobar.objects.create(pressure=pressure, geometry=LINE, level='SURFACE', observation_time=OBSERVATION_TIME)
+        queryset = Isobar.objects.filter(level='SURFACE')
+
+        rows = walk_pages(IsobarKeysetPagination, queryset, 2)
+        self.assertEqual([row.pk for row in rows], list(queryset.order_by('pressure', 'id').values_list('pk', flat=True)))
+
+    def test_exports_page_newest_first_across_ties(self):
+        for _ in range(5):
+            ExportedMap.objects.create(file_name='map.png', file_path='exports/map.png', map_type='PNG', level='SURFACE')
+        # Two rows share a timestamp, so the id tie-breaker decides
+        first = ExportedMap.objects.order_by('id').first()
+        ExportedMap.objects.filter(pk__lte=first.pk + 1).update(created_at=OBSERVATION_TIME)
+        queryset = ExportedMap.objects.all()
+
+        rows = walk_pages(ExportKeysetPagination, queryset, 2)
+        self.assertEqual([row.pk for row in rows], list(queryset.order_by('-created_at', '-id').values_list('pk', flat=True)))
+
+    def test_row_value_seek_on_single_direction_key(self):
+        sql, params = Isobar.objects.filter(IsobarKeysetPagination().seek_filter(['SURFACE', 1000.0, 7])).query.sql_with_params()
+        self.assertIn('("analysis_isobar"."level", "analysis_isobar"."pressure", "analysis_isobar"."id") > (%s, %s, %s)', sql)
+        self.assertEqual(params[-3:], ('SURFACE', 1000.0, 7))
+
+
+class FingerprintTests(SimpleTestCase):
+    rows = [(85.3, 27.7, 1012.4, '44454', OBSERVATION_TIME), (83.9, 28.2, 1010.0, '44409', OBSERVATION_TIME)]
+
+    def fingerprint(self, rows=None, grid=None, engine=None):
+        return compute_fingerprint({'sea_level_pressure': rows or self.rows}, grid or {'resolution': 0.1}, engine or {'sigma': 2.0})
+
+    def test_row_order_and_float_noise_are_ignored(self):
+        noisy = [(lon, lat, value + 1e-5, station, time) for lon, lat, value, station, time in reversed(self.rows)]
+        self.assertEqual(self.fingerprint(noisy), self.fingerprint())
+
+    def test_any_input_change_is_detected(self):
+        changed = [self.rows[0][:2] + (1012.5,) + self.rows[0][3:], self.rows[1]]
+        fingerprints = {
+            self.fingerprint(),
+            self.fingerprint(rows=changed),
+            self.fingerprint(grid={'resolution': 0.05}),
+            self.fingerprint(engine={'sigma': 1.0}),
+        }
+        self.assertEqual(len(fingerprints), 4)
+
+
+class FingerprintSkipTests(TestCase):
+    def setUp(self):
+        for station_id, lon, lat in (('44454', 85.3, 27.7), ('44409', 83.9, 28.2), ('44477', 87.3, 26.8)):
+            make_report(make_station(station_id, lon, lat), sea_level_pressure=1010.0, temperature=20.0)
+        self.run = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'f' * 64, {})
+        activate_run(self.run)
+
+    def generate(self, fingerprint):
+        with mock.patch.object(contours, 'compute_fingerprint', return_value=fingerprint), \
+                mock.patch.object(contours, 'start_run', side_effect=RuntimeError('recomputed')) as start:
+            try:
+                return contours._generate_contours('SURFACE', OBSERVATION_TIME.isoformat()), start.called
+            except RuntimeError:
+                return None, start.called
+
+    def test_unchanged_inputs_reuse_published_run(self):
+        result, recomputed = self.generate('f' * 64)
+        self.assertFalse(recomputed)
+        self.assertEqual(result, contours.stored_contours(self.run))
+
+    def test_changed_inputs_start_a_new_run(self):
+        _, recomputed = self.generate('e' * 64)
+        self.assertTrue(recomputed)
+
+
+@override_settings(DEBUG=False, CACHES=LOCAL_CACHE)
+class SharedCacheCheckTests(SimpleTestCase):
+    def test_local_cache_is_an_error_in_production(self):
+        self.assertEqual([message.id for message in check_shared_cache(None)], ['analysis.E001'])
+
+    @override_settings(DEBUG=True)
+    def test_local_cache_is_a_warning_with_debug(self):
+        self.assertEqual([message.id for message in check_shared_cache(None)], ['analysis.W001'])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.redis.RedisCache', 'LOCATION': 'redis://127.0.0.1:6379/1'}})
+    def test_shared_cache_passes(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+
+class CanonicalTimeTests(SimpleTestCase):
+    def test_equal_instants_share_a_key(self):
+        keys = {
+            canonical_time('2025-04-24T06:00:00Z'),
+            canonical_time('2025-04-24T11:45:00+05:45'),
+            canonical_time(datetime(2025, 4, 24, 6, 0)),
+            canonical_time(OBSERVATION_TIME),
+        }
+        self.assertEqual(keys, {'2025-04-24T06:00:00Z'})
+
+    def test_missing_time_is_the_resolved_hour(self):
+        hour = datetime(2025, 4, 24, 11, 45, tzinfo=timezone(timedelta(hours=5, minutes=45)))
+        with mock.patch('analysis.locks.default_observation_time', return_value=hour):
+            self.assertEqual(canonical_time(None), '2025-04-24T06:00:00Z')
+
+    def test_generator_locks_on_the_resolved_hour(self):
+        hour = datetime(2025, 4, 24, 11, 45, tzinfo=timezone(timedelta(hours=5, minutes=45)))
+        with mock.patch.object(contours, 'default_observation_time', return_value=hour), \
+                mock.patch.object(contours, 'single_flight') as lock, \
+                mock.patch.object(contours, '_generate_contours') as generate:
+            contours.generate_contours('SURFACE')
+        lock.assert_called_once_with('surface', 'SURFACE', hour.isoformat())
+        self.assertEqual(generate.call_args.args[1], hour.isoformat())
+
+
+class SingleFlightTests(TransactionTestCase):
+    def test_concurrent_callers_for_one_key_are_serialised(self):
+        holding, release = threading.Event(), threading.Event()
+
+        def hold():
+            try:
+                with single_flight('surface', 'SURFACE', '2025-04-24T06:00:00Z'):
+                    holding.set()
+                    release.wait(5)
+            finally:
+                connection.close()
+
+        holder = threading.Thread(target=hold)
+        holder.start()
+        self.assertTrue(holding.wait(5))
+        try:
+            with self.assertRaises(LockTimeout):
+                with single_flight('surface', 'SURFACE', '2025-04-24T11:45:00+05:45', timeout=0.3, poll_interval=0.05):
+                    pass
+            # Other keys are not blocked
+            with single_flight('surface', '850HPA', '2025-04-24T06:00:00Z', timeout=0.3, poll_interval=0.05):
+                pass
+        finally:
+            release.set()
+            holder.join()
+        with single_flight('surface', 'SURFACE', '2025-04-24T06:00:00Z', timeout=1, poll_interval=0.05):
+            pass
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AnalysisJobTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        isolate_admission(self)
+        patcher = mock.patch('analysis.jobs.AsyncResult', return_value=mock.Mock(state='PENDING', info=None))
+        self.result = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    @mock.patch('analysis.tasks.run_analysis')
+    def test_one_job_per_key(self, task):
+        first = jobs.enqueue_analysis('surface', 'SURFACE', '2025-04-24T06:00:00Z')
+        second = jobs.enqueue_analysis('surface', 'SURFACE', '2025-04-24T11:45:00+05:45')
+        self.assertEqual(second['job_id'], first['job_id'])
+        self.assertEqual(second['status'], 'queued')
+        task.apply_async.assert_called_once()
+
+    @mock.patch('analysis.tasks.run_analysis')
+    def test_broker_failure_releases_the_key(self, task):
+        depth = admission.queue_depth()
+        task.apply_async.side_effect = OSError('broker unreachable')
+        with self.assertRaises(OSError):
+            jobs.enqueue_analysis('surface', 'SURFACE', '2025-04-24T06:00:00Z')
+        self.assertIsNone(cache.get(jobs._job_cache_key('surface', 'SURFACE', '2025-04-24T06:00:00Z')))
+        self.assertEqual(admission.queue_depth(), depth)
+
+        task.apply_async.side_effect = None
+        job = jobs.enqueue_analysis('surface', 'SURFACE', '2025-04-24T06:00:00Z')
+        self.assertEqual(task.apply_async.call_args.kwargs['task_id'], job['job_id'])
+
+    @mock.patch('analysis.tasks.render_map')
+    def test_render_broker_failure_releases_the_key(self, task):
+        task.apply_async.side_effect = OSError('broker unreachable')
+        params = ('surface', 'SURFACE', '2025-04-24T06:00:00Z', 'PNG', None, None, None)
+        with self.assertRaises(OSError):
+            jobs.enqueue_render(*params)
+        task.apply_async.side_effect = None
+        jobs.enqueue_render(*params)
+        self.assertEqual(task.apply_async.call_count, 2)
+
+    def test_progress_status(self):
+        self.result.return_value = mock.Mock(state='PROGRESS', info={'stage': 'kriging', 'progress': 0.4})
+        self.assertEqual(
+            jobs.job_status('abc'),
+            {'job_id': 'abc', 'status': 'running', 'stage': 'kriging', 'progress': 0.4},
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AnalysisOnDemandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        isolate_admission(self)
+
+    @mock.patch('analysis.jobs.AsyncResult', return_value=mock.Mock(state='PENDING', info=None))
+    @mock.patch('analysis.tasks.run_analysis')
+    def test_missing_analysis_is_accepted_for_polling(self, task, result):
+        # Isobars and pressure centres share the surface analysis job
+        for name in ('isobar-list', 'pressurecenter-list'):
+            response = self.client.get(reverse(name), {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'})
+            self.assertEqual(response.status_code, 202, name)
+            self.assertIn('Retry-After', response)
+            self.assertTrue(response.json()['status_url'].endswith(reverse('analysis-job-detail', args=[response.json()['job_id']])))
+        self.assertEqual(task.apply_async.call_count, 1)
+
+
+class RunPointerTests(TestCase):
+    def test_activation_swaps_pointer_and_supersedes(self):
+        first = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'a' * 64, {})
+        self.assertIsNone(current_run('surface', 'SURFACE', OBSERVATION_TIME))
+        activate_run(first)
+        second = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'b' * 64, {})
+        activate_run(second)
+
+        self.assertEqual(current_run('surface', 'SURFACE', OBSERVATION_TIME), second)
+        self.assertEqual(CurrentAnalysisRun.objects.count(), 1)
+        self.assertEqual(AnalysisRun.objects.get(pk=first.pk).status, AnalysisRun.STATUS_SUPERSEDED)
+
+    def test_gc_grace_counts_from_supersession(self):
+        first = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'a' * 64, {})
+        activate_run(first)
+        AnalysisRun.objects.filter(pk=first.pk).update(created_at=django_timezone.now() - timedelta(days=1))
+        activate_run(start_run('surface', 'SURFACE', OBSERVATION_TIME, 'b' * 64, {}))
+
+        gc_runs(grace_minutes=10)
+        self.assertTrue(AnalysisRun.objects.filter(pk=first.pk).exists())
+
+        AnalysisRun.objects.filter(pk=first.pk).update(updated_at=django_timezone.now() - timedelta(minutes=11))
+        gc_runs(grace_minutes=10)
+        self.assertFalse(AnalysisRun.objects.filter(pk=first.pk).exists())
+
+    def test_heartbeat_keeps_a_long_run_alive(self):
+        run = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'a' * 64, {})
+        AnalysisRun.objects.filter(pk=run.pk).update(created_at=django_timezone.now() - timedelta(hours=2),
+                                                     updated_at=django_timezone.now() - timedelta(hours=2))
+        heartbeat(run)
+        gc_runs(stale_minutes=60)
+        self.assertTrue(AnalysisRun.objects.filter(pk=run.pk).exists())
+
+        AnalysisRun.objects.filter(pk=run.pk).update(updated_at=django_timezone.now() - timedelta(minutes=61))
+        gc_runs(stale_minutes=60)
+        self.assertFalse(AnalysisRun.objects.filter(pk=run.pk).exists())
+
+
+class PartitionTests(TestCase):
+    def default_rows(self, table):
+        with connection.cursor() as cursor:
+            cursor.execute(f'SELECT count(*) FROM "{table}_default"')
+            return cursor.fetchone()[0]
+
+    def test_upcoming_months_get_partitions_once(self):
+        now = datetime(2031, 1, 15, tzinfo=timezone.utc)
+        created = partitions.ensure_future_partitions(months_ahead=1, now=now)
+        self.assertIn('analysis_synopreport_p203101', created)
+        self.assertIn('analysis_isobar_p203102', created)
+        self.assertEqual(partitions.ensure_future_partitions(months_ahead=1, now=now), [])
+
+    def test_default_partition_rows_are_moved_then_dropped_with_their_month(self):
+        report = make_report(make_station('44454'), observation_time=datetime(2001, 3, 10, 6, tzinfo=timezone.utc), temperature=20.0)
+        self.assertEqual(self.default_rows('analysis_synopreport'), 1)
+
+        self.assertIn('analysis_synopreport_p200103', partitions.ensure_future_partitions(months_ahead=0))
+        self.assertEqual(self.default_rows('analysis_synopreport'), 0)
+        self.assertTrue(SynopReport.objects.filter(pk=report.pk).exists())
+
+        with CaptureQueriesContext(connection) as queries:
+            dropped = partitions.drop_expired_partitions()
+        self.assertIn('analysis_synopreport_p200103', dropped)
+        self.assertFalse(SynopReport.objects.filter(pk=report.pk).exists())
+        row_deletes = [q['sql'] for q in queries.captured_queries if q['sql'].startswith('DELETE FROM "analysis_synopreport')]
+        self.assertEqual(row_deletes, [])
+
+    def test_recent_partitions_are_kept(self):
+        now = datetime.now(timezone.utc)
+        report = make_report(make_station('44454'), observation_time=now - timedelta(days=1), temperature=20.0)
+        partitions.maintain_partitions()
+        self.assertTrue(SynopReport.objects.filter(pk=report.pk).exists())
+        with connection.cursor() as cursor:
+            months = partitions.monthly_partitions(cursor, 'analysis_synopreport')
+        self.assertIn(partitions.month_start(now + timedelta(days=40)), months)
+
+
+class AnalysisBundleTests(TestCase):
+    def setUp(self):
+        make_report(make_station('44454'), temperature=21.0, sea_level_pressure=1010.0)
+        make_report(make_station('44409', 83.9, 28.2, is_visible=False), temperature=19.0)
+        self.run = publish_surface_run()
+        self.params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+
+    def get(self, **headers):
+        return self.client.get(reverse('analysis-bundle'), self.params, **headers)
+
+    def test_bundle_holds_every_layer_of_the_map(self):
+        response = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn('Content-Encoding', response)
+        payload = json.loads(response.content)
+        self.assertEqual(payload['run'], self.run.pk)
+        self.assertEqual(len(payload['stations']['features']), 2)
+        # Only visible stations' reports, and only full-detail contours
+        self.assertEqual([f['properties']['station_id'] for f in payload['reports']['features']], ['44454'])
+        self.assertEqual(sorted(f['properties']['pressure'] for f in payload['isobars']['features']), [1000.0, 1004.0])
+        self.assertEqual(len(payload['pressure_centers']['features']), 1)
+
+    def test_precompressed_encodings(self):
+        plain = self.get().content
+        response = self.get(HTTP_ACCEPT_ENCODING='gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(response.content), plain)
+        self.assertEqual(response['Vary'], 'Accept-Encoding')
+
+    def test_revalidation(self):
+        etag = self.get()['ETag']
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+    def test_late_reports_rebuild_the_bundle(self):
+        first = self.get()
+        make_report(make_station('44477', 87.3, 26.8), temperature=23.0)
+        bump_many(SURFACE_REPORTS, [('SURFACE', OBSERVATION_TIME)])
+
+        response = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(len(json.loads(response.content)['reports']['features']), 2)
+        self.assertEqual(AnalysisBundle.objects.get(run=self.run).reports_version, 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        make_report(make_station('44454'), temperature=21.0)
+        self.ingest()
+        self.params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+
+    def ingest(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_many(SURFACE_REPORTS, [('SURFACE', OBSERVATION_TIME)])
+
+    def get(self, params=None, **headers):
+        return self.client.get(reverse('synopreport-list'), params or self.params, **headers)
+
+    def test_unchanged_data_is_not_modified(self):
+        first = self.get()
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(first['Cache-Control'], 'no-cache')
+        self.assertEqual(self.get(HTTP_IF_NONE_MATCH=first['ETag']).status_code, 304)
+        self.assertEqual(self.get(HTTP_IF_MODIFIED_SINCE=first['Last-Modified']).status_code, 304)
+
+    def test_ingest_changes_the_etag_and_the_cached_body(self):
+        first = self.get()
+        make_report(make_station('44409', 83.9, 28.2), temperature=19.0)
+        self.ingest()
+
+        response = self.get(HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], first['ETag'])
+        self.assertEqual(len(json.loads(response.content)['features']), 2)
+
+    def test_each_representation_has_its_own_etag(self):
+        full = self.get()
+        page = self.get({**self.params, 'limit': 1})
+        self.assertNotEqual(full['ETag'], page['ETag'])
+        self.assertEqual(self.get({**self.params, 'limit': 1}, HTTP_IF_NONE_MATCH=page['ETag']).status_code, 304)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class VectorTileTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        make_report(make_station('44454'), temperature=21.0)
+        self.params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+
+    def tile(self, layer, z=0, x=0, y=0, params=None, **headers):
+        url = reverse('vector-tile', kwargs={'layer': layer, 'z': z, 'x': x, 'y': y})
+        return self.client.get(url, params or {}, **headers)
+
+    def test_tile_covering_a_station_has_features(self):
+        response = self.tile('stations')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/vnd.mapbox-vector-tile')
+        self.assertIn(b'stations', response.content)
+        self.assertIn(b'44454', response.content)
+        self.assertEqual(self.tile('stations', HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304)
+
+    def test_tile_away_from_stations_is_empty(self):
+        response = self.tile('reports', 2, 0, 3, self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.content, b'')
+
+    def test_report_tiles_follow_ingests(self):
+        first = self.tile('reports', params=self.params)
+        self.assertIn(b'44454', first.content)
+        make_report(make_station('44409', 83.9, 28.2), temperature=19.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_many(SURFACE_REPORTS, [('SURFACE', OBSERVATION_TIME)])
+
+        second = self.tile('reports', params=self.params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertNotEqual(second['ETag'], first['ETag'])
+        self.assertIn(b'44409', second.content)
+
+    def test_analysis_tile_needs_a_published_run(self):
+        self.assertEqual(self.tile('isobars', params=self.params).status_code, 404)
+        publish_surface_run(OBSERVATION_TIME)
+        response = self.tile('isobars', params=self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn(b'isobars', response.content)
+
+    def test_bad_requests(self):
+        self.assertEqual(self.tile('rivers').status_code, 404)
+        self.assertEqual(self.tile('stations', 1, 2, 0).status_code, 400)
+        self.assertEqual(self.tile('reports').status_code, 400)
+
+
+class SqlGeoJSONTests(TestCase):
+    def setUp(self):
+        make_report(make_station('44454'), temperature=21.5, wind_speed=5, wind_direction=270)
+        make_report(make_station('44409', 83.9, 28.2), temperature=19.0, dew_point=12.25)
+        self.params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+
+    def both(self, name, params):
+        drf = self.client.get(reverse(name), {**params, 'geojson': 'drf'})
+        sql = self.client.get(reverse(name), {**params, 'geojson': 'sql'})
+        self.assertEqual(drf.status_code, 200)
+        self.assertEqual(sql.status_code, 200)
+        return json.loads(drf.content), json.loads(sql.content)
+
+    def test_report_collection_matches_the_serializer(self):
+        drf, sql = self.both('synopreport-list', self.params)
+        by_id = lambda collection: sorted(collection['features'], key=lambda feature: feature['id'])
+        self.assertEqual(by_id(sql), by_id(drf))
+        self.assertEqual(sql['features'][0]['geometry']['type'], 'Point')
+
+    def test_report_page_matches_the_serializer(self):
+        drf, sql = self.both('synopreport-list', {**self.params, 'limit': 1})
+        self.assertEqual(sql, drf)
+
+    def test_isobar_collection_matches_the_serializer(self):
+        publish_surface_run()
+        drf, sql = self.both('isobar-list', self.params)
+        self.assertEqual(len(sql['features']), len(drf['features']))
+        self.assertEqual(
+            sorted(feature['properties']['pressure'] for feature in sql['features']),
+            sorted(feature['properties']['pressure'] for feature in drf['features']),
+        )
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class CatalogueTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.recent = django_timezone.now().replace(minute=0, second=0, microsecond=0) - timedelta(hours=3)
+
+    def ingest(self, observation_time, stations=1, level='SURFACE', expected=4):
+        with self.captureOnCommitCallbacks(execute=True):
+            for _ in range(stations):
+                catalogue.record_report(catalogue.SURFACE, level, observation_time, expected)
+
+    def test_reports_are_counted_per_slot(self):
+        self.ingest(self.recent, stations=3)
+        slot = ObservationSlot.objects.get(source='surface', level='SURFACE', observation_time=self.recent)
+        self.assertEqual(slot.station_count, 3)
+        self.assertAlmostEqual(slot.completeness, 0.75)
+        self.assertEqual(catalogue.available_levels('surface'), [{'level': 'SURFACE', 'count': 3}])
+
+    def test_cached_times_are_invalidated_by_ingest(self):
+        self.ingest(self.recent)
+        self.assertEqual(catalogue.observation_times('surface', 'SURFACE'), [self.recent])
+        later = self.recent + timedelta(hours=3)
+        self.ingest(later)
+        self.assertEqual(catalogue.observation_times('surface', 'SURFACE'), [later, self.recent])
+
+    def test_times_outside_the_picker_window_are_left_out(self):
+        self.ingest(self.recent - timedelta(days=8))
+        self.assertEqual(catalogue.observation_times('surface', 'SURFACE'), [])
+
+    def test_forgotten_slots_disappear(self):
+        old = self.recent - timedelta(days=2)
+        self.ingest(old)
+        self.ingest(self.recent)
+        catalogue.observation_times('surface', 'SURFACE')
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(catalogue.forget_before(self.recent - timedelta(days=1)), 1)
+        self.assertEqual(catalogue.observation_times('surface', 'SURFACE'), [self.recent])
+
+    def test_observation_times_endpoint_reads_the_catalogue(self):
+        self.ingest(self.recent)
+        response = self.client.get(reverse('observation-times'), {'level': 'SURFACE'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()), 1)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class NamespaceTests(SimpleTestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def key(self, level='SURFACE', time='2025-04-24T06:00:00+00:00'):
+        return namespaces.namespaced_key('response', [SURFACE_REPORTS], level, time, '/api/synop-reports/')
+
+    def test_key_is_stable_until_bumped(self):
+        before = self.key()
+        self.assertEqual(self.key(), before)
+        namespaces.bump_namespaces(SURFACE_REPORTS, [('SURFACE', '2025-04-24T06:00:00+00:00')])
+        self.assertNotEqual(self.key(), before)
+
+    def test_bump_only_touches_its_own_slot(self):
+        before, other = self.key(), self.key(level='850HPA')
+        namespaces.bump_namespaces(SURFACE_REPORTS, [('SURFACE', '2025-04-24T06:00:00+00:00')])
+        self.assertNotEqual(self.key(), before)
+        self.assertEqual(self.key(level='850HPA'), other)
+
+    def test_source_bump_touches_every_slot(self):
+        before, other = self.key(), self.key(level='850HPA')
+        namespaces.bump_source(SURFACE_REPORTS)
+        self.assertNotEqual(self.key(), before)
+        self.assertNotEqual(self.key(level='850HPA'), other)
+
+    def test_evicted_counter_never_restores_an_old_namespace(self):
+        before = self.key()
+        namespaces.bump_namespaces(SURFACE_REPORTS, [('SURFACE', '2025-04-24T06:00:00+00:00')])
+        cache.delete(namespaces._slot_key(SURFACE_REPORTS, 'SURFACE', '2025-04-24T06:00:00+00:00'))
+        self.assertNotEqual(self.key(), before)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class ClearCacheCommandTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+
+    def test_default_bumps_namespaces_and_keeps_other_keys(self):
+        before = namespaces.namespace([SURFACE_REPORTS], 'SURFACE', 'ALL')
+        cache.set('job:render:abc', 'job-id')
+        call_command('clear_cache', stdout=io.StringIO())
+        self.assertNotEqual(namespaces.namespace([SURFACE_REPORTS], 'SURFACE', 'ALL'), before)
+        self.assertEqual(cache.get('job:render:abc'), 'job-id')
+
+    def test_all_wipes_the_cache(self):
+        cache.set('job:render:abc', 'job-id')
+        call_command('clear_cache', '--all', stdout=io.StringIO())
+        self.assertIsNone(cache.get('job:render:abc'))
+
+
+@override_settings(CACHES=LOCAL_CACHE, STATION_FREE_COUNTRIES=[], STATION_RESTRICTED_COUNTRIES=['IN'])
+class StationVisibilityTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.nepal = make_station('44454', country='NP')
+        self.listed = make_station('42182', 77.2, 28.6, country='IN')
+        self.unlisted = make_station('42809', 88.3, 22.6, country='IN')
+        with tempfile.NamedTemporaryFile('w', suffix='.csv', delete=False) as csvfile:
+            csvfile.write('station_id,name\n42182,New Delhi\n')
+        self.addCleanup(os.remove, csvfile.name)
+        self.csv = csvfile.name
+
+    def visible_ids(self):
+        return set(WeatherStation.objects.filter(is_visible=True).values_list('station_id', flat=True))
+
+    def test_restricted_countries_publish_only_listed_stations(self):
+        with self.settings(STATION_POLICY_CSV=self.csv):
+            changed = visibility.apply_visibility(models=[WeatherStation])
+        self.assertEqual(changed, {'WeatherStation': 1})
+        self.assertEqual(self.visible_ids(), {'44454', '42182'})
+
+    def test_free_countries_hide_everything_else(self):
+        with self.settings(STATION_FREE_COUNTRIES=['NP'], STATION_POLICY_CSV=self.csv):
+            visibility.apply_visibility(models=[WeatherStation])
+        self.assertEqual(self.visible_ids(), {'44454', '42182'})
+        with self.settings(STATION_FREE_COUNTRIES=['NP'], STATION_RESTRICTED_COUNTRIES=[]):
+            visibility.apply_visibility(models=[WeatherStation])
+        self.assertEqual(self.visible_ids(), {'44454'})
+
+    def test_policy_change_hides_reports_from_cached_responses(self):
+        make_report(self.unlisted, temperature=30.0)
+        make_report(self.nepal, temperature=21.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_many(SURFACE_REPORTS, [('SURFACE', OBSERVATION_TIME)])
+        params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+        first = self.client.get(reverse('synopreport-list'), params)
+        self.assertEqual(len(first.json()['features']), 2)
+
+        with self.settings(STATION_POLICY_CSV=self.csv), self.captureOnCommitCallbacks(execute=True):
+            visibility.apply_visibility(models=[WeatherStation])
+        second = self.client.get(reverse('synopreport-list'), params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual([f['properties']['station_id'] for f in second.json()['features']], ['44454'])
+
+    def test_unchanged_policy_is_not_reapplied(self):
+        with self.settings(STATION_POLICY_CSV=self.csv):
+            visibility.apply_visibility(models=[WeatherStation])
+            with CaptureQueriesContext(connection) as queries:
+                self.assertEqual(visibility.refresh_visibility(), {})
+        self.assertEqual(len(queries), 0)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class StationSeriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        self.station = make_station('44454')
+        for hours, temperature in ((0, 20.0), (3, 24.0), (24, 18.0)):
+            make_report(self.station, OBSERVATION_TIME + timedelta(hours=hours), temperature=temperature, wind_direction=90)
+        self.url = reverse('station-series', kwargs={'pk': '44454'})
+        self.range = {'from': '2025-04-24T00:00:00Z', 'to': '2025-04-26T00:00:00Z'}
+
+    def test_raw_series_is_columnar(self):
+        response = self.client.get(self.url, {**self.range, 'fields': 'temperature', 'interval': 'raw'})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['time'], ['2025-04-24T06:00:00Z', '2025-04-24T09:00:00Z', '2025-04-25T06:00:00Z'])
+        self.assertEqual(data['temperature'], [20.0, 24.0, 18.0])
+
+    def test_daily_series_is_aggregated(self):
+        data = self.client.get(self.url, {**self.range, 'fields': 'temperature,wind_direction', 'interval': 'day'}).json()
+        self.assertEqual(data['time'], ['2025-04-24T00:00:00Z', '2025-04-25T00:00:00Z'])
+        self.assertEqual(data['count'], [2, 1])
+        self.assertEqual(data['temperature'], {'min': [20.0, 18.0], 'max': [24.0, 18.0], 'mean': [22.0, 18.0]})
+        self.assertEqual(data['omitted'], ['wind_direction'])
+
+    def test_invalid_requests(self):
+        self.assertEqual(self.client.get(self.url, {**self.range, 'fields': 'humidity'}).status_code, 400)
+        self.assertEqual(self.client.get(self.url, {'from': '2025-04-26T00:00:00Z', 'to': '2025-04-24T00:00:00Z'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(self.url, {'from': '2024-01-01T00:00:00Z', 'to': '2025-04-26T00:00:00Z', 'interval': 'raw'}).status_code,
+            400,
+        )
+
+    def test_hidden_stations_have_no_series(self):
+        WeatherStation.objects.filter(pk='44454').update(is_visible=False)
+        self.assertEqual(self.client.get(self.url, self.range).status_code, 404)
+
+    def test_cached_series_follows_ingests(self):
+        params = {**self.range, 'fields': 'temperature', 'interval': 'raw'}
+        self.assertEqual(len(self.client.get(self.url, params).json()['time']), 3)
+        make_report(self.station, OBSERVATION_TIME + timedelta(hours=6), temperature=22.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_many(SURFACE_REPORTS, [('SURFACE', OBSERVATION_TIME + timedelta(hours=6))])
+        self.assertEqual(len(self.client.get(self.url, params).json()['time']), 4)
+
+
+# Two nested surface grids with distinguishable pressures (base + lon) and temperature = lat
+GRID_DOMAINS = (('regional', (80.0, 26.0, 88.0, 30.0), 1.0, 1000.0), ('nepal', (84.0, 27.0, 87.0, 29.0), 0.5, 2000.0))
+
+
+def grid_fields(bounds, resolution, base, slope=1.0):
+    lon, lat = np.meshgrid(
+        np.arange(bounds[0], bounds[2] + resolution / 2, resolution),
+        np.arange(bounds[1], bounds[3] + resolution / 2, resolution),
+    )
+    return {
+        'pressure': base + slope * lon, 'temperature': lat,
+        'pressure_variance': np.zeros_like(lon), 'temperature_variance': np.zeros_like(lon),
+    }
+
+
+class GridStoreMixin:
+    """Keep the local grid copies of a test in a temporary directory."""
+
+    def setUp(self):
+        super().setUp()
+        self.grid_root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.grid_root, ignore_errors=True)
+        patcher = mock.patch.object(grids, 'GRID_STORE_ROOT', self.grid_root)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        grids.forget_grids()
+        self.addCleanup(grids.forget_grids)
+
+    def publish_grids(self, observation_time=OBSERVATION_TIME, domains=GRID_DOMAINS, slope=1.0):
+        run = start_run('surface', 'SURFACE', observation_time, 'a' * 64, {})
+        for name, bounds, resolution, base in domains:
+            grids.write_grids(run, bounds, resolution, grid_fields(bounds, resolution, base, slope), name)
+        activate_run(run)
+        return run
+
+
+class SampleTests(GridStoreMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.run = self.publish_grids()
+        self.params = {'level': 'SURFACE', 'time': '2025-04-24T06:00:00Z'}
+
+    def test_point_is_read_from_the_finest_domain(self):
+        response = self.client.get(reverse('sample'), {**self.params, 'lon': 85.5, 'lat': 27.25})
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['run'], self.run.pk)
+        self.assertEqual(data['domain'], 'nepal')
+        self.assertEqual(data['values']['pressure'], 2085.5)
+        self.assertEqual(data['values']['temperature'], 27.25)
+
+    def test_requested_domain_is_used(self):
+        data = self.client.get(reverse('sample'), {**self.params, 'lon': 85.5, 'lat': 27.25, 'domain': 'regional'}).json()
+        self.assertEqual(data['values']['pressure'], 1085.5)
+
+    def test_many_points(self):
+        response = self.client.post(
+            reverse('sample'),
+            {**self.params, 'fields': ['pressure'], 'points': [[85.5, 27.25], [81.0, 26.5], [120.0, 0.0]]},
+            content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(data['domains'], ['nepal', 'regional', None])
+        self.assertEqual(data['values'], {'pressure': [2085.5, 1081.0, None]})
+
+    def test_invalid_requests(self):
+        point = {'lon': 85.5, 'lat': 27.25}
+        self.assertEqual(self.client.get(reverse('sample'), {'level': 'SURFACE', **point}).status_code, 400)
+        self.assertEqual(self.client.get(reverse('sample'), {**self.params, **point, 'fields': 'humidity'}).status_code, 400)
+        self.assertEqual(
+            self.client.get(reverse('sample'), {**point, 'level': 'SURFACE', 'time': '2025-04-24T09:00:00Z'}).status_code,
+            404,
+        )
+
+
+class GridStoreTests(GridStoreMixin, TestCase):
+    FINE = (('nepal', (80.0, 26.0, 88.0, 30.0), 0.05, 2000.0),)
+
+    def test_fields_round_trip_by_row_band(self):
+        run = self.publish_grids(domains=self.FINE)
+        grid = AnalysisGrid.objects.get(run=run, domain='nepal')
+        expected = grid_fields((80.0, 26.0, 88.0, 30.0), 0.05, 2000.0)['pressure'].astype('f4')
+        self.assertEqual((grid.ny, grid.nx), expected.shape)
+        self.assertLess(len(grid.payload), grid.raw_size)
+        np.testing.assert_array_equal(grids.read_field(grid, 'pressure'), expected)
+        np.testing.assert_array_equal(grids.read_field(grid, 'pressure', rows=(30, 70)), expected[30:70])
+
+    def test_mismatched_fields_are_refused(self):
+        run = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'a' * 64, {})
+        with self.assertRaises(ValueError):
+            grids.write_grids(run, (80, 26, 88, 30), 1.0, {'pressure': np.zeros((5, 9)), 'temperature': np.zeros((4, 9))}, 'regional')
+
+    def test_lost_local_copy_is_restored_from_the_store(self):
+        run = self.publish_grids()
+        shutil.rmtree(grids.run_dir(run.pk))
+        grids.forget_grids()
+        grid = grids.open_grid(run.pk, 'nepal')
+        self.assertAlmostEqual(float(grid.sample('pressure', 85.5, 27.25)[0]), 2085.5, places=3)
+
+    def test_copies_of_deleted_runs_are_pruned(self):
+        kept, deleted = self.publish_grids(), self.publish_grids(OBSERVATION_TIME + timedelta(hours=3))
+        deleted.delete()
+        self.assertEqual(grids.prune_grids(), 1)
+        self.assertEqual(os.listdir(self.grid_root), [str(kept.pk)])
+
+
+class GridEncodingTests(SimpleTestCase):
+    def setUp(self):
+        self.path = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.path)
+        self.values = np.linspace(950.0, 1040.0, 12, dtype='f4').reshape(3, 4)
+        self.values[1, 2] = np.nan
+        np.save(os.path.join(self.path, 'pressure.npy'), self.values)
+        with open(os.path.join(self.path, 'meta.json'), 'w') as f:
+            json.dump({'run': 1, 'domain': 'regional', 'bounds': [80.0, 26.0, 88.0, 30.0], 'shape': [3, 4],
+                       'fields': ['pressure']}, f)
+        self.grid = grids.RunGrid(self.path)
+
+    def decode(self, body):
+        (length,) = struct.unpack('<I', body[:4])
+        header = json.loads(body[4:4 + length])
+        self.assertEqual((4 + length) % 4, 0)
+        array = np.frombuffer(body[4 + length:], dtype=header['dtype']).reshape(header['shape'])
+        return header, array
+
+    def test_int16_packing_round_trip(self):
+        header, packed = self.decode(grids.encode_field(self.grid, 'pressure', 'int16'))
+        self.assertEqual(packed[1, 2], grids.BINARY_ENCODINGS['int16'][1])
+        restored = packed.astype('f8') * header['scale'] + header['offset']
+        mask = np.isfinite(self.values)
+        np.testing.assert_allclose(restored[mask], self.values[mask], atol=header['scale'])
+
+    def test_float32_is_sent_as_stored(self):
+        header, values = self.decode(grids.encode_field(self.grid, 'pressure', 'float32'))
+        self.assertEqual((header['scale'], header['offset'], header['nodata']), (1.0, 0.0, None))
+        np.testing.assert_array_equal(values, self.values)
+
+
+class GridBinaryTests(GridStoreMixin, TestCase):
+    def setUp(self):
+        super().setUp()
+        self.run = self.publish_grids()
+        self.url = reverse('grid-binary', kwargs={'run_id': self.run.pk, 'field': 'pressure'})
+        self.body = grids.encode_field(grids.open_grid(self.run.pk, 'regional'), 'pressure', 'float32')
+
+    def get(self, **headers):
+        response = self.client.get(self.url, **headers)
+        content = b''.join(response.streaming_content) if response.streaming else response.content
+        response.close()
+        return response, content
+
+    def test_whole_field(self):
+        response, content = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(content, self.body)
+        response, content = self.get(HTTP_ACCEPT_ENCODING='gzip')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertEqual(gzip.decompress(content), self.body)
+
+    def test_byte_ranges(self):
+        response, content = self.get(HTTP_RANGE='bytes=4-11')
+        self.assertEqual(response.status_code, 206)
+        self.assertEqual(response['Content-Range'], f'bytes 4-11/{len(self.body)}')
+        self.assertEqual(content, self.body[4:12])
+        response, content = self.get(HTTP_RANGE='bytes=-8')
+        self.assertEqual(content, self.body[-8:])
+
+    def test_invalid_ranges_are_ignored(self):
+        for header in ('bytes=5-3', 'bytes=a-b', 'lines=1-2', 'bytes=0-1,4-5'):
+            response, content = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 200, header)
+            self.assertEqual(content, self.body)
+
+    def test_unsatisfiable_ranges(self):
+        for header in (f'bytes={len(self.body)}-', 'bytes=-0'):
+            response, _ = self.get(HTTP_RANGE=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], f'bytes */{len(self.body)}')
+
+    def test_grids_of_unpublished_runs_are_not_cached(self):
+        run = start_run('surface', 'SURFACE', OBSERVATION_TIME + timedelta(hours=3), 'b' * 64, {})
+        self.assertIsNone(grids.open_grid(run.pk, 'regional'))
+        self.assertEqual(grids.run_domains(run.pk), ())
+        name, bounds, resolution, base = GRID_DOMAINS[0]
+        grids.write_grids(run, bounds, resolution, grid_fields(bounds, resolution, base), name)
+        self.assertIsNotNone(grids.open_grid(run.pk, 'regional'))
+        self.assertEqual(grids.run_domains(run.pk), ('regional',))
+        self.assertNotIn((run.pk, 'regional'), grids._open_grids)
+
+        name, bounds, resolution, base = GRID_DOMAINS[1]
+        grids.write_grids(run, bounds, resolution, grid_fields(bounds, resolution, base), name)
+        activate_run(run)
+        self.assertEqual(grids.run_domains(run.pk), ('regional', 'nepal'))
+        self.assertIs(grids.open_grid(run.pk, 'nepal'), grids.open_grid(run.pk, 'nepal'))
+
+
+NESTED_DOMAINS = {
+    'surface': [
+        {'name': 'regional', 'min_lon': 50.0, 'max_lon': 100.0, 'min_lat': 5.0, 'max_lat': 35.0, 'resolution': 0.5},
+        {'name': 'nepal', 'parent': 'regional', 'min_lon': 79.5, 'max_lon': 89.0, 'min_lat': 25.5, 'max_lat': 31.0,
+         'resolution': 0.05, 'min_zoom': 6},
+    ],
+    'upperair': [
+        {'name': 'regional', 'min_lon': 35.0, 'max_lon': 120.0, 'min_lat': 0.0, 'max_lat': 45.0, 'resolution': 0.5},
+    ],
+}
+
+
+@override_settings(ANALYSIS_DOMAINS=NESTED_DOMAINS)
+class DomainTests(SimpleTestCase):
+    def test_nests_must_lie_inside_their_parent(self):
+        outside = dict(NESTED_DOMAINS['surface'][1], max_lon=101.0)
+        with self.settings(ANALYSIS_DOMAINS={'surface': [NESTED_DOMAINS['surface'][0], outside]}):
+            with self.assertRaises(DomainError):
+                analysis_domains('surface')
+        with self.settings(ANALYSIS_DOMAINS={'surface': NESTED_DOMAINS['surface'][::-1]}):
+            with self.assertRaises(DomainError):
+                analysis_domains('surface')
+
+    def test_requested_domain_is_validated(self):
+        self.assertEqual(resolve_domain('surface', None), 'regional')
+        self.assertEqual(resolve_domain('surface', 'nepal'), 'nepal')
+        with self.assertRaises(DomainError):
+            resolve_domain('upperair', 'nepal')
+
+    def test_tiles_use_the_finest_covering_domain_from_its_zoom(self):
+        self.assertEqual(tile_domain('surface', 0, 0, 0), 'regional')
+        self.assertEqual(tile_domain('surface', 8, 188, 107), 'nepal')
+        nepal_from_9 = [NESTED_DOMAINS['surface'][0], dict(NESTED_DOMAINS['surface'][1], min_zoom=9)]
+        with self.settings(ANALYSIS_DOMAINS={'surface': nepal_from_9}):
+            self.assertEqual(tile_domain('surface', 8, 188, 107), 'regional')
+
+    def test_nest_fades_into_its_parent_at_the_boundary(self):
+        weights = boundary_weights((21, 21), 5)
+        self.assertEqual(weights[0].max(), 0.0)
+        self.assertEqual(weights[:, -1].max(), 0.0)
+        self.assertEqual(weights[10, 10], 1.0)
+        self.assertEqual(weights[2, 10], 0.4)
+
+    def test_domains_endpoint(self):
+        response = self.client.get(reverse('analysis-domains'), {'kind': 'surface'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(d['name'], d['primary'], d['parent'], d['min_zoom']) for d in response.json()],
+            [('regional', True, None, 0), ('nepal', False, 'regional', 6)],
+        )
+        self.assertEqual(self.client.get(reverse('analysis-domains'), {'kind': 'ocean'}).status_code, 400)
+
+
+class ToleranceTests(SimpleTestCase):
+    def test_zero_and_negative_are_full_detail(self):
+        self.assertEqual(tolerance_for(0), FULL_DETAIL)
+        self.assertEqual(tolerance_for(-1), FULL_DETAIL)
+
+    def test_coarsest_stored_tolerance_not_above_request(self):
+        for tolerance in CONTOUR_TOLERANCES:
+            self.assertEqual(tolerance_for(tolerance), tolerance)
+            self.assertEqual(tolerance_for(tolerance * 1.01), tolerance)
+        self.assertEqual(tolerance_for(CONTOUR_TOLERANCES[0] * 0.99), FULL_DETAIL)
+        self.assertEqual(tolerance_for(1000), CONTOUR_TOLERANCES[-1])
+
+    def test_higher_zoom_never_gets_coarser(self):
+        tolerances = [tolerance_for(pixel_tolerance(z)) for z in range(0, 15)]
+        self.assertEqual(tolerances, sorted(tolerances, reverse=True))
+
+
+class GeneralizeTests(SimpleTestCase):
+    def test_one_simplified_copy_per_tolerance(self):
+        wiggle = LineString([(80 + i * 0.05, 27 + 0.01 * ((-1) ** i)) for i in range(200)], srid=4326)
+        row = Isobar(pressure=1000, geometry=wiggle, level='SURFACE', observation_time=OBSERVATION_TIME, domain='regional')
+        pyramid = generalize([row])
+        self.assertEqual([copy.tolerance for copy in pyramid], [FULL_DETAIL, *CONTOUR_TOLERANCES])
+        points = [copy.geometry.num_points for copy in pyramid]
+        self.assertEqual(points[0], 200)
+        self.assertEqual(points, sorted(points, reverse=True))
+        self.assertLess(points[-1], 10)
+        self.assertTrue(all(copy.pressure == 1000 for copy in pyramid))
+
+
+class ContourToleranceTests(TestCase):
+    def setUp(self):
+        run = start_run('surface', 'SURFACE', OBSERVATION_TIME, 'a' * 64, {})
+        # A different pressure per stored copy, to tell which copy was served
+        for pressure, tolerance in ((1000, FULL_DETAIL), (1008, CONTOUR_TOLERANCES[1])):
+            Isobar.objects.create(
+                run=run, pressure=pressure, geometry=LINE, level='SURFACE', observation_time=OBSERVATION_TIME,
+                domain=primary_domain('surface'), tolerance=tolerance,
+            )
+        activate_run(run)
+        self.params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+
+    def pressures(self, **params):
+        response = self.client.get(reverse('isobar-list'), {**self.params, **params})
+        self.assertEqual(response.status_code, 200)
+        return [feature['properties']['pressure'] for feature in response.json()['features']]
+
+    def test_full_detail_by_default(self):
+        self.assertEqual(self.pressures(), [1000])
+        self.assertEqual(self.pressures(tolerance=CONTOUR_TOLERANCES[0] / 2), [1000])
+
+    def test_zoom_or_tolerance_picks_a_simplified_copy(self):
+        self.assertEqual(self.pressures(tolerance=CONTOUR_TOLERANCES[1] * 1.5), [1008])
+        zoom = next(z for z in range(20) if tolerance_for(pixel_tolerance(z)) == CONTOUR_TOLERANCES[1])
+        self.assertEqual(self.pressures(zoom=zoom), [1008])
+
+    def test_invalid_tolerance(self):
+        response = self.client.get(reverse('isobar-list'), {**self.params, 'zoom': 'near'})
+        self.assertEqual(response.status_code, 400)
+
+
+class TendencyTests(GridStoreMixin, TestCase):
+    EARLIER = OBSERVATION_TIME - timedelta(hours=3)
+
+    def setUp(self):
+        super().setUp()
+        self.earlier = self.publish_grids(self.EARLIER)
+        # Pressure rose by the longitude (in hPa) over the three hours
+        self.later = self.publish_grids(slope=2.0)
+
+    def test_change_is_the_difference_of_the_stored_grids(self):
+        result = tendency.generate_tendency('SURFACE', OBSERVATION_TIME, hours=3)
+        run = AnalysisRun.objects.get(pk=result['run'])
+        self.assertEqual((run.kind, run.engine_params['base_runs']), ('tend3h', [self.later.pk, self.earlier.pk]))
+        self.assertEqual(current_run('tend3h', 'SURFACE', OBSERVATION_TIME), run)
+
+        values, domains = grids.sample_run(run.pk, 'pressure_change', [85.5, 81.0], [27.25, 26.5])
+        np.testing.assert_allclose(values, [85.5, 81.0], atol=1e-3)
+        self.assertEqual(list(domains), ['nepal', 'regional'])
+        np.testing.assert_allclose(grids.sample_run(run.pk, 'temperature_change', 85.5, 27.25)[0], [0.0])
+
+    def test_contours_follow_the_change(self):
+        run_id = tendency.generate_tendency('SURFACE', OBSERVATION_TIME, hours=3)['run']
+        lines = TendencyContour.objects.filter(run_id=run_id, domain='regional', field='pressure', tolerance=FULL_DETAIL)
+        self.assertTrue({81.0, 84.0, 87.0} <= set(lines.values_list('change', flat=True)))
+        line = lines.filter(change=84.0).first().geometry
+        self.assertTrue(all(abs(lon - 84.0) < 1e-6 for lon, _ in line.coords))
+
+    def test_unchanged_bases_are_not_recomputed(self):
+        first = tendency.generate_tendency('SURFACE', OBSERVATION_TIME, hours=3)
+        self.assertEqual(tendency.generate_tendency('SURFACE', OBSERVATION_TIME, hours=3), first)
+        self.assertEqual(AnalysisRun.objects.filter(kind='tend3h').count(), 1)
+
+    def test_new_base_analysis_refreshes_the_tendency(self):
+        first = tendency.generate_tendency('SURFACE', OBSERVATION_TIME, hours=3)['run']
+        self.publish_grids(slope=3.0)
+        self.assertTrue(tendency.is_stale(AnalysisRun.objects.get(pk=first)))
+        self.assertEqual(tendency.refresh_tendencies('SURFACE', OBSERVATION_TIME), [('tend3h', OBSERVATION_TIME)])
+        run = current_run('tend3h', 'SURFACE', OBSERVATION_TIME)
+        self.assertNotEqual(run.pk, first)
+        np.testing.assert_allclose(grids.sample_run(run.pk, 'pressure_change', 81.0, 26.5)[0], [162.0], atol=1e-3)
+
+    def test_missing_base_analysis(self):
+        self.assertFalse(tendency.generate_tendency('SURFACE', OBSERVATION_TIME, hours=24))
+
+
+class RenderParameterTests(SimpleTestCase):
+    def test_defaults(self):
+        self.assertEqual(render.parse_style(None), 'default')
+        self.assertEqual(render.parse_size(None), render.DEFAULT_SIZE)
+        self.assertEqual(render.parse_size('800x600'), (800, 600))
+        self.assertEqual(render.parse_extent('surface', '80,26,88,30'), (80.0, 26.0, 88.0, 30.0))
+
+    def test_invalid_parameters(self):
+        for parse, value in (
+            (render.parse_style, 'neon'), (render.parse_size, '10x10'), (render.parse_size, '100000x100000'),
+            (render.parse_size, 'big'), (render.parse_observation_time, 'yesterday'),
+        ):
+            with self.assertRaises(render.RenderError, msg=value):
+                parse(value)
+        for extent in ('88,26,80,30', '80,26,88', '0,-100,10,10'):
+            with self.assertRaises(render.RenderError, msg=extent):
+                render.parse_extent('surface', extent)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class RenderExportTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        isolate_admission(self)
+        media = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, media, ignore_errors=True)
+        settings_override = self.settings(MEDIA_ROOT=media)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+        make_report(make_station('44454'), temperature=21.0, wind_speed=10, wind_direction=270)
+        self.run = publish_surface_run()
+        self.request = {
+            'map_type': 'PNG', 'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z',
+            'extent': '80,26,88,30', 'size': '320x240',
+        }
+
+    def test_identical_render_is_drawn_once(self):
+        export, cached = render.render_export('surface', 'SURFACE', OBSERVATION_TIME, 'PNG', extent='80,26,88,30', size='320x240')
+        self.assertFalse(cached)
+        with export.file_path.open('rb') as image:
+            self.assertEqual(image.read(8), b'\x89PNG\r\n\x1a\n')
+        again, cached = render.render_export('surface', 'SURFACE', OBSERVATION_TIME, 'PNG', extent='80,26,88,30', size='320x240')
+        self.assertTrue(cached)
+        self.assertEqual(again.pk, export.pk)
+        _, cached = render.render_export('surface', 'SURFACE', OBSERVATION_TIME, 'PNG', style='mono', extent='80,26,88,30', size='320x240')
+        self.assertFalse(cached)
+
+    def test_layers_are_clipped_to_the_extent(self):
+        layers = render.collect_layers(self.run, (80.0, 26.0, 88.0, 30.0), (320, 240))
+        self.assertEqual(sorted(value for value, _ in layers['isobars']), [1000, 1004])
+        self.assertEqual(layers['reports'], [(85.3, 27.7, 21.0, 270, 10)])
+        self.assertEqual(render.collect_layers(self.run, (60.0, 10.0, 70.0, 20.0), (320, 240))['isobars'], [])
+
+    @mock.patch('analysis.jobs.AsyncResult', return_value=mock.Mock(state='PENDING', info=None))
+    @mock.patch('analysis.tasks.render_map')
+    def test_export_view_enqueues_new_renders_and_serves_earlier_ones(self, task, _):
+        response = self.client.post(reverse('export-map'), self.request, content_type='application/json')
+        self.assertEqual(response.status_code, 202)
+        task.apply_async.assert_called_once()
+
+        render.render_export('surface', 'SURFACE', OBSERVATION_TIME, 'PNG', extent='80,26,88,30', size='320x240')
+        response = self.client.post(reverse('export-map'), self.request, content_type='application/json')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(task.apply_async.call_count, 1)
+
+    def test_export_view_validates_parameters(self):
+        for change in ({'map_type': 'GIF'}, {'size': '1x1'}, {'observation_time': ''}):
+            response = self.client.post(reverse('export-map'), {**self.request, **change}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, change)
+
+
+class StationGlyphTests(SimpleTestCase):
+    def test_glyphs_are_formatted_like_the_browser(self):
+        station = WeatherStation(station_id='44454', location=Point(85.3, 27.7, srid=4326))
+        report = SynopReport(
+            station=station, wind_speed=5.0, wind_direction=268, temperature=21.5, dew_point=None,
+            sea_level_pressure=1013.2, pressure_change=-1.5, cloud_cover=4, visibility=9.6,
+            cloud_low_type='0', cloud_mid_type='2',
+        )
+        self.assertEqual(sprites.station_glyphs('surface', report), {
+            'station': 'station', 'station_id': 'station_id:44454', 'wind': 'wind:270:10',
+            'temperature': 'temperature:22', 'pressure': 'pressure:0132', 'cloud': 'cloud:4',
+            'pressure_change': 'pressure_change:-1.5', 'visibility': 'visibility:10', 'cloud_mid_type': 'cloud_mid_type:2',
+        })
+
+    def test_calm_wind_is_a_circle(self):
+        report = SynopReport(station=WeatherStation(station_id='44454'), wind_speed=0.5, wind_direction=90)
+        self.assertEqual(sprites.station_glyphs('surface', report)['wind'], 'wind:0:0')
+        self.assertEqual(sprites.draw_glyph('wind:0:0').size, (sprites.SPRITE_CELL, sprites.SPRITE_CELL))
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class StationSpritesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        for station_id, lon in (('44454', 85.3), ('44409', 83.9)):
+            make_report(make_station(station_id, lon), temperature=21.0, wind_speed=5.0, wind_direction=270)
+        self.params = {'level': 'SURFACE', 'observation_time': '2025-04-24T06:00:00Z'}
+
+    def test_identical_glyphs_are_drawn_once(self):
+        image, index = sprites.build_atlas('surface', 'SURFACE', OBSERVATION_TIME)
+        self.assertEqual(len(index['stations']), 2)
+        # station, wind and temperature are shared; only the station ids differ
+        self.assertEqual(len(index['sprites']), 5)
+        self.assertEqual(image[:8], b'\x89PNG\r\n\x1a\n')
+        glyphs = {station['station_id']: station['glyphs'] for station in index['stations']}
+        self.assertEqual(glyphs['44454']['wind'], glyphs['44409']['wind'])
+
+    def test_index_and_image_revalidate(self):
+        response = self.client.get(reverse('station-sprites'), self.params)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('v=0', response.json()['image'])
+        self.assertEqual(
+            self.client.get(reverse('station-sprites'), self.params, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 304,
+        )
+        image = self.client.get(reverse('station-sprites-image'), {**self.params, 'v': 0})
+        self.assertEqual(image['Content-Type'], 'image/png')
+        self.assertIn('immutable', image['Cache-Control'])
+
+    def test_new_reports_redraw_the_atlas(self):
+        first = self.client.get(reverse('station-sprites'), self.params)
+        make_report(make_station('42182', 77.2, 28.6), temperature=30.0)
+        with self.captureOnCommitCallbacks(execute=True):
+            bump_many(SURFACE_REPORTS, [('SURFACE', OBSERVATION_TIME)])
+        second = self.client.get(reverse('station-sprites'), self.params, HTTP_IF_NONE_MATCH=first['ETag'])
+        self.assertEqual(second.status_code, 200)
+        self.assertIn('v=1', second.json()['image'])
+        self.assertEqual(len(second.json()['stations']), 3)
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AsyncReadPathTests(GridStoreMixin, TestCase):
+    """The async variants answer exactly like the synchronous views they stand in for."""
+
+    def setUp(self):
+        super().setUp()
+        cache.clear()
+        self.addCleanup(cache.clear)
+        isolate_admission(self)
+        make_report(make_station('44454'), temperature=21.0)
+        recent = django_timezone.now().replace(minute=0, second=0, microsecond=0)
+        with self.captureOnCommitCallbacks(execute=True):
+            catalogue.record_report(catalogue.SURFACE, 'SURFACE', recent, 1)
+            catalogue.record_report(catalogue.UPPERAIR, '500HPA', recent, 1)
+        self.run = self.publish_grids()
+
+    async def both(self, method, path, data=None, **extra):
+        sync = await sync_to_async(getattr(self.client, method))(path, data, **extra)
+        with self.settings(ROOT_URLCONF='weather_map.asgi_urls'):
+            asynchronous = await getattr(self.async_client, method)(path, data, **extra)
+        self.assertEqual(asynchronous.status_code, sync.status_code)
+        return sync, asynchronous
+
+    async def test_catalogue_endpoints(self):
+        for path in ('/api/observation-times/', '/api/available-levels/'):
+            sync, asynchronous = await self.both('get', path)
+            self.assertEqual(asynchronous.status_code, 200)
+            self.assertEqual(json.loads(asynchronous.content), json.loads(sync.content))
+
+    async def test_sample(self):
+        params = {'level': 'SURFACE', 'time': '2025-04-24T06:00:00Z', 'lon': 85.5, 'lat': 27.25}
+        sync, asynchronous = await self.both('get', '/api/sample/', params)
+        self.assertEqual(json.loads(asynchronous.content), json.loads(sync.content))
+        body = {'level': 'SURFACE', 'time': '2025-04-24T06:00:00Z', 'points': [[85.5, 27.25], [120.0, 0.0]]}
+        sync, asynchronous = await self.both('post', '/api/sample/', body, content_type='application/json')
+        self.assertEqual(json.loads(asynchronous.content), json.loads(sync.content))
+
+    async def test_bundle(self):
+        await sync_to_async(publish_surface_run)(OBSERVATION_TIME + timedelta(hours=3))
+        params = {'level': 'SURFACE', 'observation_time': '2025-04-24T09:00:00Z'}
+        sync, asynchronous = await self.both('get', '/api/analysis-bundle/', params)
+        self.assertEqual(asynchronous.status_code, 200)
+        self.assertEqual(asynchronous['ETag'], sync['ETag'])
+        self.assertEqual(json.loads(asynchronous.content), json.loads(sync.content))
+
+    @mock.patch('analysis.jobs.AsyncResult', return_value=mock.Mock(state='PENDING', info=None))
+    @mock.patch('analysis.tasks.run_analysis')
+    async def test_missing_bundle_starts_one_analysis(self, task, _):
+        params = {'level': 'SURFACE', 'observation_time': '2025-04-24T12:00:00Z'}
+        with self.settings(ROOT_URLCONF='weather_map.asgi_urls'):
+            first = await self.async_client.get('/api/analysis-bundle/', params)
+            second = await self.async_client.get('/api/analysis-bundle/', params)
+        self.assertEqual((first.status_code, second.status_code), (202, 202))
+        self.assertEqual(json.loads(first.content)['job_id'], json.loads(second.content)['job_id'])
+        self.assertIn('Retry-After', first)
+        task.apply_async.assert_called_once()
+
+
+@override_settings(CACHES=LOCAL_CACHE)
+class AdmissionTests(SimpleTestCase):
+    """Limits counted in the shared cache (locmem stands in for Redis here)."""
+
+    def setUp(self):
+        cache.clear()
+        self.addCleanup(cache.clear)
+        patcher = mock.patch.object(admission, 'SHARED', True)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_queue_limit(self):
+        for _ in range(admission.QUEUE_LIMIT):
+            admission.admit()
+        self.assertEqual(admission.queue_depth(), admission.QUEUE_LIMIT)
+        with self.assertRaises(admission.Saturated) as raised:
+            admission.admit()
+        self.assertGreaterEqual(raised.exception.retry_after, 1)
+        self.assertEqual(admission.queue_depth(), admission.QUEUE_LIMIT)
+
+        admission.withdraw()
+        admission.admit()
+        self.assertEqual(admission.queue_depth(), admission.QUEUE_LIMIT)
+
+    def test_concurrent_admits_never_overshoot(self):
+        admitted, rejected = [], []
+
+        def admit():
+            try:
+                admission.admit()
+                admitted.append(True)
+            except admission.Saturated:
+                rejected.append(True)
+
+        threads = [threading.Thread(target=admit) for _ in range(admission.QUEUE_LIMIT * 3)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(admitted), admission.QUEUE_LIMIT)
+        self.assertEqual(len(rejected), admission.QUEUE_LIMIT * 2)
+        self.assertEqual(admission.queue_depth(), admission.QUEUE_LIMIT)
+
+    def test_admitting_does_not_extend_the_counter(self):
+        with mock.patch.object(cache, 'touch') as touch, mock.patch.object(cache, 'set') as set_:
+            for _ in range(3):
+                admission.admit()
+        touch.assert_not_called()
+        set_.assert_not_called()
+
+    def test_withdraw_never_goes_negative(self):
+        admission.withdraw()
+        admission.withdraw()
+        self.assertEqual(admission.queue_depth(), 0)
+
+    def test_slots_bound_running_jobs(self):
+        admission.admit()
+        with admission.slot(queued=True):
+            self.assertEqual(admission.queue_depth(), 0)
+            leases = [admission.acquire() for _ in range(admission.MAX_RUNNING - 1)]
+            self.assertNotIn(None, leases)
+            with self.assertRaises(admission.Saturated):
+                with admission.slot():
+                    pass
+            for lease in leases:
+                admission.release(lease)
+        self.assertEqual(admission.running(), 0)
+
+
+class LocalAdmissionTests(SimpleTestCase):
+    """Without a shared cache the same limits hold within one process."""
+
+    def setUp(self):
+        patcher = mock.patch.object(admission, 'SHARED', False)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        isolate_admission(self)
+
+    def test_queue_limit(self):
+        for _ in range(admission.QUEUE_LIMIT):
+            admission.admit()
+        with self.assertRaises(admission.Saturated):
+            admission.admit()
+        admission.withdraw()
+        admission.admit()
+        self.assertEqual(admission.status()['queue_depth'], admission.QUEUE_LIMIT)
+        self.assertEqual(admission.status()['scope'], 'process')
+
+    def test_queued_jobs_are_forgotten_after_the_ttl(self):
+        for _ in range(admission.QUEUE_LIMIT):
+            admission.admit()
+        later = admission.time.monotonic() + admission.QUEUE_TTL + 1
+        with mock.patch.object(admission.time, 'monotonic', return_value=later):
+            self.assertEqual(admission.queue_depth(), 0)
+            admission.admit()
+
+    def test_slots_bound_running_jobs(self):
+        admission.admit()
+        with admission.slot(queued=True):
+            self.assertEqual(admission.queue_depth(), 0)
+            leases = [admission.acquire() for _ in range(admission.MAX_RUNNING - 1)]
+            self.assertNotIn(None, leases)
+            self.assertEqual(admission.running(), admission.MAX_RUNNING)
+            with self.assertRaises(admission.Saturated):
+                with admission.slot():
+                    pass
+            for lease in leases:
+                admission.release(lease)
+        self.assertEqual(admission.running(), 0)
+
+
+class UploadReceiveTests(SimpleTestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        self.path = os.path.join(root, 'upload.part')
+
+    def test_streams_and_hashes(self):
+        digest = hashlib.sha256()
+        written = uploads.receive(io.BytesIO(PNG_BYTES), self.path, 'PNG', digest=digest)
+        self.assertEqual(written, len(PNG_BYTES))
+        self.assertEqual(digest.hexdigest(), hashlib.sha256(PNG_BYTES).hexdigest())
+        self.assertEqual(uploads.file_sha256(self.path), digest.hexdigest())
+
+    def test_wrong_magic_bytes(self):
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.receive(io.BytesIO(b'%PDF-1.4 ...'), self.path, 'PNG')
+        self.assertEqual(raised.exception.status, 400)
+
+    def test_empty_body(self):
+        with self.assertRaisesMessage(uploads.UploadError, "File data is required"):
+            uploads.receive(io.BytesIO(b''), self.path, 'PDF')
+
+    def test_limit(self):
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.receive(io.BytesIO(PNG_BYTES), self.path, 'PNG', limit=100)
+        self.assertEqual(raised.exception.status, 413)
+
+    def test_chunks_shorter_than_the_magic(self):
+        offset = 0
+        for size in (4, 2, len(PNG_BYTES) - 6):
+            offset += uploads.receive(
+                io.BytesIO(PNG_BYTES[offset:offset + size]), self.path, 'PNG', offset=offset, final=False,
+            )
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), PNG_BYTES)
+        with self.assertRaises(uploads.UploadError):
+            uploads.receive(io.BytesIO(b'\x89PNX'), self.path, 'PNG', final=False)
+
+    def test_resume_drops_bytes_after_offset(self):
+        uploads.receive(io.BytesIO(PNG_BYTES[:1000] + b'partial chunk'), self.path, 'PNG', final=False)
+        uploads.receive(io.BytesIO(PNG_BYTES[1000:]), self.path, 'PNG', offset=1000)
+        self.assertEqual(uploads.file_sha256(self.path), hashlib.sha256(PNG_BYTES).hexdigest())
+
+
+class ResumableUploadTests(TestCase):
+    def setUp(self):
+        root = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, root)
+        patcher = mock.patch.object(uploads, 'UPLOAD_ROOT', os.path.join(root, 'uploads'))
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        media = override_settings(MEDIA_ROOT=os.path.join(root, 'media'))
+        media.enable()
+        self.addCleanup(media.disable)
+
+    def test_chunks_publish_export(self):
+        upload = uploads.start_upload('PNG', 'SURFACE', None, len(PNG_BYTES))
+        upload = uploads.append_chunk(upload.pk, 0, io.BytesIO(PNG_BYTES[:5000]))
+        self.assertEqual((upload.received, upload.export_id), (5000, None))
+
+        upload = uploads.append_chunk(upload.pk, 5000, io.BytesIO(PNG_BYTES[5000:]))
+        self.assertEqual(upload.received, len(PNG_BYTES))
+        self.assertEqual(upload.export.content_hash, hashlib.sha256(PNG_BYTES).hexdigest())
+        with upload.export.file_path.open('rb') as f:
+            self.assertEqual(f.read(), PNG_BYTES)
+        self.assertFalse(os.path.exists(uploads.staging_path(upload)))
+
+    def test_offset_mismatch_and_completed_upload_conflict(self):
+        upload = uploads.start_upload('PNG', 'SURFACE', None, len(PNG_BYTES))
+        uploads.append_chunk(upload.pk, 0, io.BytesIO(PNG_BYTES[:100]))
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.append_chunk(upload.pk, 50, io.BytesIO(PNG_BYTES[50:]))
+        self.assertEqual(raised.exception.status, 409)
+        self.assertEqual(ExportUpload.objects.get(pk=upload.pk).received, 100)
+
+        uploads.append_chunk(upload.pk, 100, io.BytesIO(PNG_BYTES[100:]))
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.append_chunk(upload.pk, len(PNG_BYTES), io.BytesIO(b''))
+        self.assertEqual(raised.exception.status, 409)
+
+    def test_chunk_past_announced_size(self):
+        upload = uploads.start_upload('PNG', 'SURFACE', None, 100)
+        with self.assertRaises(uploads.UploadError) as raised:
+            uploads.append_chunk(upload.pk, 0, io.BytesIO(PNG_BYTES))
+        self.assertEqual(raised.exception.status, 413)
+        self.assertEqual(ExportUpload.objects.get(pk=upload.pk).received, 0)
@@ -0,0 +1,173 @@
+import hashlib
+import logging
+
+from django.core.cache import cache
+from django.db import connection
+
+from .models import (
+    Isobar, Isotherm, PressureCenter, SynopReport, WeatherStation,
+    UpperAirIsobar, UpperAirIsotherm, UpperAirPressureCenter, UpperAirSynopReport, UpperAirWeatherStation,
+)
+from .domains import tile_domain
+from .generalize import pixel_tolerance, tolerance_for_zoom
+from .runs import current_run
+from .namespaces import namespace
+from .versions import SURFACE_REPORTS, UPPERAIR_REPORTS, time_key
+
+logger = logging.getLogger(__name__)
+
+TILE_EXTENT = 4096
+TILE_BUFFER = 64
+MAX_ZOOM = 16
+
+# Tiles keyed by an analysis run never change; report tiles follow the cache namespace
+RUN_TILE_TTL = 60 * 60 * 24
+VERSION_TILE_TTL = 60 * 60
+STATION_TILE_TTL = 60 * 60
+
+# layer -> how to build it
+#   kind:    surface/upperair analysis or report source the layer follows
+#   source:  'stations' (static), 'reports' (level + time) or 'analysis' (current run)
+#   geom:    geometry expression; reports take the station location
+#   columns: attributes carried into the tile
+#   domains: the layer is stored per analysis domain and tolerance; tiles draw
+#            from the finest domain covering them at their zoom
+#            (analysis.domains) and the matching simplified copy
+#            (analysis.generalize)
+TILE_LAYERS = {
+    'stations': {
+        'kind': 'surface', 'source': 'stations', 'model': WeatherStation, 'geom': 't.location',
+        'columns': ['station_id', 'name', 'elevation', 'country'],
+    },
+    'reports': {
+        'kind': 'surface', 'source': 'reports', 'model': SynopReport, 'station_model': WeatherStation,
+        'geom': 's.location',
+        'columns': [
+            'id', 'station_id', 'wind_direction', 'wind_speed', 'temperature', 'dew_point',
+            'sea_level_pressure', 'pressure_tendency', 'pressure_change', 'cloud_cover', 'visibility',
+            'cloud_low_type', 'cloud_mid_type', 'cloud_high_type', 'weather_present', 'weather_past',
+        ],
+    },
+    'isobars': {
+        'kind': 'surface', 'source': 'analysis', 'model': Isobar, 'geom': 't.geometry', 'columns': ['pressure'],
+        'domains': True,
+    },
+    'isotherms': {
+        'kind': 'surface', 'source': 'analysis', 'model': Isotherm, 'geom': 't.geometry', 'columns': ['temperature'],
+        'domains': True,
+    },
+    'pressure-centers': {
+        'kind': 'surface', 'source': 'analysis', 'model': PressureCenter, 'geom': 't.location',
+        'columns': ['center_type', 'pressure'],
+    },
+    'upperair-stations': {
+        'kind': 'upperair', 'source': 'stations', 'model': UpperAirWeatherStation, 'geom': 't.location',
+        'columns': ['station_id', 'name', 'elevation', 'country'],
+    },
+    'upperair-reports': {
+        'kind': 'upperair', 'source': 'reports', 'model': UpperAirSynopReport, 'station_model': UpperAirWeatherStation,
+        'geom': 's.location',
+        'columns': ['id', 'station_id', 'wind_direction', 'wind_speed', 'temperature', 'dew_point', 'pressure', 'height'],
+    },
+    'upperair-isobars': {
+        'kind': 'upperair', 'source': 'analysis', 'model': UpperAirIsobar, 'geom': 't.geometry', 'columns': ['pressure'],
+        'domains': True,
+    },
+    'upperair-isotherms': {
+        'kind': 'upperair', 'source': 'analysis', 'model': UpperAirIsotherm, 'geom': 't.geometry',
+        'columns': ['temperature'], 'domains': True,
+    },
+    'upperair-pressure-centers': {
+        'kind': 'upperair', 'source': 'analysis', 'model': UpperAirPressureCenter, 'geom': 't.location',
+        'columns': ['center_type', 'pressure'],
+    },
+}
+REPORT_VERSION_SOURCES = {'surface': SURFACE_REPORTS, 'upperair': UPPERAIR_REPORTS}
+
+
+def valid_tile(z, x, y):
+    return 0 <= z <= MAX_ZOOM and 0 <= x < 2 ** z and 0 <= y < 2 ** z
+
+
+def _tile_sql(name, config, z):
+    """
+    Build the ST_AsMVT query for a layer. Line layers read the stored copy
+    generalized for the zoom and are simplified the rest of the way to a pixel.
+    """
+    table = config['model']._meta.db_table
+    geom = config['geom']
+    if config['model'] in (Isobar, Isotherm, UpperAirIsobar, UpperAirIsotherm):
+        geom = f"ST_SimplifyPreserveTopology({geom}, {pixel_tolerance(z)!r})"
+    columns = ', '.join(f"t.{column}" for column in config['columns'])
+    joins, filters = '', []
+    if config['source'] == 'reports':
+        joins = f" JOIN {config['station_model']._meta.db_table} s ON s.station_id = t.station_id"
+        filters = ['t.level = %(level)s', 't.observation_time = %(observation_time)s', 's.is_visible']
+    elif config['source'] == 'analysis':
+        filters = ['t.run_id = %(run_id)s']
+        if config.get('domains'):
+            # Coarsest copy within the zoom's tolerance that the run stored
+            filters += ['t.domain = %(domain)s', f"""t.tolerance = (
+                SELECT MAX(g.tolerance) FROM {table} g
+                WHERE g.run_id = %(run_id)s AND g.domain = %(domain)s AND g.tolerance <= %(tolerance)s
+            )"""]
+    where = ' AND '.join([f"{config['geom']} && ST_Transform(bounds.geom, 4326)"] + filters)
+    return f"""
+        WITH bounds AS (SELECT ST_TileEnvelope(%(z)s, %(x)s, %(y)s) AS geom),
+        features AS (
+            SELECT ST_AsMVTGeom(ST_Transform({geom}, 3857), bounds.geom, {TILE_EXTENT}, {TILE_BUFFER}, true) AS mvt_geom,
+                   {columns}
+            FROM {table} t{joins}, bounds
+            WHERE {where}
+        )
+        SELECT ST_AsMVT(features.*, %(layer)s, {TILE_EXTENT}, 'mvt_geom') FROM features
+    """
+
+
+def tile_cache_key(name, level, observation_time):
+    """
+    Return the cache key prefix identifying the data a tile is drawn from,
+    with its TTL and the run id for analysis layers, or None if nothing is
+    published for that level and time yet.
+    """
+    config = TILE_LAYERS[name]
+    if config['source'] == 'stations':
+        return f"tile:{name}", STATION_TILE_TTL, None
+    if config['source'] == 'analysis':
+        run = current_run(config['kind'], level, observation_time)
+        if run is None:
+            return None
+        return f"tile:{name}:run{run.pk}", RUN_TILE_TTL, run.pk
+    token = namespace([REPORT_VERSION_SOURCES[config['kind']]], level, time_key(observation_time))
+    digest = hashlib.sha1(f"{level}|{observation_time.isoformat()}".encode('utf-8')).hexdigest()[:12]
+    return f"tile:{name}:{digest}:ns{token}", VERSION_TILE_TTL, None
+
+
+def render_tile(name, z, x, y, level=None, observation_time=None):
+    """
+    Return (tile bytes, cache key) for one layer tile, or (None, None) if the
+    layer has no published data for that level and time. Tiles are rendered by
+    PostGIS and cached under the run (analysis layers) or report cache namespace.
+    """
+    config = TILE_LAYERS[name]
+    keyed = tile_cache_key(name, level, observation_time)
+    if keyed is None:
+        return None, None
+    prefix, ttl, run_id = keyed
+    key = f"{prefix}:{z}/{x}/{y}"
+    tile = cache.get(key)
+    if tile is not None:
+        return tile, key
+
+    with connection.cursor() as cursor:
+        cursor.execute(_tile_sql(name, config, z), {
+            'z': z, 'x': x, 'y': y, 'layer': name,
+            'level': level, 'observation_time': observation_time, 'run_id': run_id,
+            'domain': tile_domain(config['kind'], z, x, y) if config.get('domains') else None,
+            'tolerance': tolerance_for_zoom(z),
+        })
+        row = cursor.fetchone()
+    tile = bytes(row[0]) if row and row[0] else b''
+    cache.set(key, tile, timeout=ttl)
+    logger.debug(f"Rendered tile {key} ({len(tile)} bytes)")
+    return tile, key
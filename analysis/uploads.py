@@ -0,0 +1,262 @@
+"""
+Streaming uploads of exported maps (ExportUploadView and the resumable
+ExportUploadSession views).
+
+Request bodies are read in READ_SIZE pieces and written straight to a staging
+file under EXPORT_UPLOAD_ROOT while their magic bytes are checked and their
+SHA-256 computed, so an upload never sits in worker memory whole. A finished
+staging file is moved into export storage, which is a rename when
+EXPORT_UPLOAD_ROOT is on the same filesystem as MEDIA_ROOT.
+
+Large exports can be sent as a session (ExportUpload): each PATCH appends one
+chunk at the session's current offset, so an interrupted upload resumes from
+the last stored byte. The hash of a session is computed from the staging file
+once the last chunk arrives, since it spans several requests.
+"""
+import hashlib
+import logging
+import os
+import tempfile
+import time
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import transaction
+from django.utils import timezone
+
+from .models import ExportedMap, ExportUpload
+
+logger = logging.getLogger(__name__)
+
+UPLOAD_ROOT = getattr(settings, 'EXPORT_UPLOAD_ROOT', os.path.join(settings.BASE_DIR, 'var', 'uploads'))
+MAX_UPLOAD_SIZE = getattr(settings, 'EXPORT_UPLOAD_MAX_SIZE', 500 * 1024 * 1024)
+# Unfinished sessions and stray staging files older than this are pruned
+UPLOAD_TTL = getattr(settings, 'EXPORT_UPLOAD_TTL', 24 * 3600)
+READ_SIZE = 1024 * 1024
+
+MAGIC_BYTES = {
+    'PDF': b'%PDF-',
+    'PNG': b'\x89PNG\r\n\x1a\n',
+    'JPEG': b'\xff\xd8\xff',
+}
+SNIFF_BYTES = max(len(magic) for magic in MAGIC_BYTES.values())
+CONTENT_TYPES = {'application/pdf': 'PDF', 'image/png': 'PNG', 'image/jpeg': 'JPEG'}
+FILE_EXTENSIONS = {'PDF': 'pdf', 'PNG': 'png', 'JPEG': 'jpg'}
+
+
+class UploadError(ValueError):
+    """Raised for an unacceptable upload; ``status`` is the HTTP status to answer with."""
+
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def parse_format(value, content_type=None):
+    """The export format from ``value`` (?format=) or else the body's Content-Type."""
+    if value:
+        map_type = str(value).upper()
+    else:
+        map_type = CONTENT_TYPES.get((content_type or '').split(';')[0].strip().lower())
+    if map_type not in MAGIC_BYTES:
+        raise UploadError(f"Format must be {', '.join(MAGIC_BYTES)}")
+    return map_type
+
+
+def parse_observation_time(value):
+    if not value:
+        return None
+    try:
+        return datetime.fromisoformat(value.replace('Z', '+00:00'))
+    except ValueError:
+        raise UploadError("Invalid observation_time format")
+
+
+def parse_size(value, limit=MAX_UPLOAD_SIZE):
+    try:
+        size = int(value)
+    except (TypeError, ValueError):
+        raise UploadError("size must be the total number of bytes")
+    if size <= 0:
+        raise UploadError("size must be positive")
+    if size > limit:
+        raise UploadError(f"Uploads are limited to {limit} bytes", status=413)
+    return size
+
+
+def sniff(head, map_type, complete=True):
+    """
+    Check the first bytes of a file against the magic bytes of ``map_type``.
+    With ``complete`` False, a head shorter than the magic only has to match
+    as far as it goes (more bytes are still to come).
+    """
+    magic = MAGIC_BYTES[map_type]
+    if not head.startswith(magic if complete else magic[:len(head)]):
+        logger.error(f"Invalid {map_type} header. First 10 bytes: {head[:10]}")
+        raise UploadError(f"Invalid {map_type} file format")
+
+
+def receive(stream, path, map_type, offset=0, limit=MAX_UPLOAD_SIZE, digest=None, final=True):
+    """
+    Write ``stream`` to ``path`` from ``offset`` on and return the bytes written.
+
+    Bytes past ``offset`` left by an interrupted request are dropped first.
+    The magic bytes are checked as soon as the start of the file has arrived,
+    possibly over several calls, and ``digest`` (a hashlib object) is fed
+    each piece as it is written. ``final`` is False for a chunk that may be
+    followed by more, so a file still shorter than its magic is accepted.
+    """
+    written = 0
+    head = None
+    with open(path, 'r+b' if offset else 'wb') as f:
+        if offset < SNIFF_BYTES:
+            # Start of the file stored by earlier chunks, if any
+            f.seek(0)
+            head = f.read(offset) if offset else b''
+        f.seek(offset)
+        f.truncate()
+        while stream is not None:
+            chunk = stream.read(READ_SIZE)
+            if not chunk:
+                break
+            if offset + written + len(chunk) > limit:
+                raise UploadError(f"Upload exceeds {limit} bytes", status=413)
+            if head is not None:
+                head += chunk[:SNIFF_BYTES]
+                if len(head) >= SNIFF_BYTES:
+                    sniff(head, map_type)
+                    head = None
+            if digest is not None:
+                digest.update(chunk)
+            f.write(chunk)
+            written += len(chunk)
+    if head == b'':
+        raise UploadError("File data is required")
+    if head is not None:
+        sniff(head, map_type, complete=final)
+    return written
+
+
+def file_head(path):
+    with open(path, 'rb') as f:
+        return f.read(SNIFF_BYTES)
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(READ_SIZE), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def export_file_name(level, observation_time, map_type):
+    timestamp = observation_time.strftime('%Y%m%d_%H%M%S') if observation_time else 'latest'
+    return f"weather_map_{level}_{timestamp}_{uuid.uuid4().hex[:8]}.{FILE_EXTENSIONS[map_type]}"
+
+
+class StagedFile(File):
+    """A finished staging file; like TemporaryUploadedFile, storages move it into place instead of copying."""
+
+    def temporary_file_path(self):
+        return self.file.name
+
+
+def publish(path, map_type, level, observation_time, content_hash):
+    """Move a finished staging file into export storage and record the export."""
+    file_name = export_file_name(level, observation_time, map_type)
+    with open(path, 'rb') as f:
+        export = ExportedMap.objects.create(
+            file_name=file_name,
+            file_path=StagedFile(f, name=file_name),
+            map_type=map_type,
+            level=level,
+            observation_time=observation_time,
+            content_hash=content_hash,
+        )
+    if os.path.exists(path):
+        # Left behind by storages that copy rather than move
+        os.remove(path)
+    logger.info(f"Stored uploaded {map_type} export {export.pk} ({export.file_path.size} bytes, sha256 {content_hash[:12]})")
+    return export
+
+
+def store_upload(stream, map_type, level='SURFACE', observation_time=None, length=None):
+    """Stream one request body into a new export. ``length`` is the declared Content-Length, if any."""
+    if length is not None and length > MAX_UPLOAD_SIZE:
+        raise UploadError(f"Uploads are limited to {MAX_UPLOAD_SIZE} bytes", status=413)
+    os.makedirs(UPLOAD_ROOT, exist_ok=True)
+    fd, path = tempfile.mkstemp(suffix='.part', dir=UPLOAD_ROOT)
+    os.close(fd)
+    try:
+        digest = hashlib.sha256()
+        receive(stream, path, map_type, digest=digest)
+        return publish(path, map_type, level, observation_time, digest.hexdigest())
+    finally:
+        if os.path.exists(path):
+            os.remove(path)
+
+
+def staging_path(upload):
+    return os.path.join(UPLOAD_ROOT, f"{upload.pk}.part")
+
+
+def start_upload(map_type, level, observation_time, size):
+    """Open a resumable upload session of ``size`` bytes."""
+    upload = ExportUpload.objects.create(map_type=map_type, level=level, observation_time=observation_time, size=size)
+    os.makedirs(UPLOAD_ROOT, exist_ok=True)
+    open(staging_path(upload), 'wb').close()
+    logger.info(f"Started {map_type} upload {upload.pk} of {size} bytes")
+    return upload
+
+
+def append_chunk(upload_id, offset, stream):
+    """
+    Append one chunk at ``offset`` to a session and publish the export once
+    the last byte is in. The session row stays locked while the chunk is
+    written, so concurrent requests for the same offset cannot interleave.
+    Raises ExportUpload.DoesNotExist for an unknown session.
+    """
+    with transaction.atomic():
+        upload = ExportUpload.objects.select_for_update().get(pk=upload_id)
+        if upload.export_id:
+            raise UploadError("Upload is already complete", status=409)
+        if offset != upload.received:
+            raise UploadError(f"Chunk must start at offset {upload.received}", status=409)
+        path = staging_path(upload)
+        if not os.path.exists(path):
+            raise UploadError("Upload data expired; start a new upload", status=410)
+        upload.received += receive(stream, path, upload.map_type, offset, limit=upload.size, final=False)
+        if upload.received == upload.size:
+            sniff(file_head(path), upload.map_type)
+            upload.export = publish(path, upload.map_type, upload.level, upload.observation_time, file_sha256(path))
+        upload.save(update_fields=['received', 'export', 'updated_at'])
+    return upload
+
+
+def abort_upload(upload):
+    path = staging_path(upload)
+    if os.path.exists(path):
+        os.remove(path)
+    upload.delete()
+
+
+def prune_uploads(max_age=UPLOAD_TTL):
+    """Delete unfinished sessions and stray staging files idle for more than ``max_age`` seconds."""
+    stale = ExportUpload.objects.filter(export__isnull=True, updated_at__lt=timezone.now() - timedelta(seconds=max_age))
+    sessions = 0
+    for upload in stale:
+        abort_upload(upload)
+        sessions += 1
+    files = 0
+    if os.path.isdir(UPLOAD_ROOT):
+        cutoff = time.time() - max_age
+        for entry in os.scandir(UPLOAD_ROOT):
+            if entry.name.endswith('.part') and entry.stat().st_mtime < cutoff:
+                os.remove(entry.path)
+                files += 1
+    if sessions or files:
+        logger.info(f"Pruned {sessions} stale upload sessions and {files} staging files")
+    return {'sessions': sessions, 'files': files}
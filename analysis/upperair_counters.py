@@ -1,6 +1,5 @@
 import numpy as np
 from scipy.spatial import distance_matrix
-from scipy.ndimage import gaussian_filter
 from scipy.interpolate import splprep, splev
 from django.contrib.gis.geos import LineString, Point
 from django.db import transaction, utils as db_utils
@@ -11,11 +10,33 @@ from datetime import datetime, timedelta
 import matplotlib
 matplotlib.use('Agg')  # Force non-GUI backend to avoid Tkinter
 import matplotlib.pyplot as plt
-from pykrige.ok import OrdinaryKriging
+from .fingerprint import compute_fingerprint
+from . import metrics
+from .locks import default_observation_time, single_flight
+from .runs import activate_run, current_run, fail_run, heartbeat, start_run
+from .bundles import store_bundle
+from .grids import write_grids
+from .domains import analyse_domain, analysis_domains, domain_axes, primary_domain
+from .generalize import CONTOUR_TOLERANCES, FULL_DETAIL, generalize
 
 # Set up logging
 logger = logging.getLogger(__name__)
 
+# Analysis engine parameters. They feed the input fingerprint together with
+# the analysis domains (settings.ANALYSIS_DOMAINS), so any change here
+# invalidates previously stored analyses.
+ENGINE_PARAMS = {
+    'variogram_model': 'spherical',
+    'variogram_range': 10.0,
+    'variogram_nugget': 0.1,
+    'smoothing_sigma': 2.0,
+    'spline_points': 200,
+    'spline_smoothing': 0.1,
+    'height_interval': 60,
+    'temperature_interval': 1,
+    'time_tolerance_minutes': 30,
+}
+
 def validate_data(data, data_type, level, observation_time, time_tolerance_minutes=30):
     if not data:
         logger.warning(f"No {data_type} data provided")
@@ -52,12 +73,63 @@ def validate_data(data, data_type, level, observation_time, time_tolerance_minut
     logger.info(f"Validated {len(validated_data)} {data_type} data points")
     return validated_data
 
-def upper_air_generate_contours(level, observation_time=None, map_type=None):
+def stored_upper_air_contours(run):
+    """Rebuild the generator's GeoJSON result from a stored analysis run."""
+    level = run.level
+    time_str = run.observation_time.isoformat()
+    domain = primary_domain('upperair')
+    return {
+        "height_contours": {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [list(c) for c in contour.geometry.coords]},
+                "properties": {"height": contour.pressure, "level": level, "time": time_str}
+            }
+            for contour in UpperAirIsobar.objects.filter(run_id=run.pk, domain=domain, tolerance=FULL_DETAIL)
+        ]},
+        "isotherms": {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "LineString", "coordinates": [list(c) for c in isotherm.geometry.coords]},
+                "properties": {"temperature": isotherm.temperature, "level": level, "time": time_str}
+            }
+            for isotherm in UpperAirIsotherm.objects.filter(run_id=run.pk, domain=domain, tolerance=FULL_DETAIL)
+        ]},
+        "centers": {"type": "FeatureCollection", "features": [
+            {
+                "type": "Feature",
+                "geometry": {"type": "Point", "coordinates": [center.location.x, center.location.y]},
+                "properties": {"type": center.center_type, "height": center.pressure, "level": level, "time": time_str}
+            }
+            for center in UpperAirPressureCenter.objects.filter(run_id=run.pk)
+        ]},
+    }
+
+def upper_air_generate_contours(level, observation_time=None, map_type=None, progress=None):
+    """
+    Generate and store the analysis for a level and observation time.
+
+    Concurrent callers for the same key are serialised; callers that waited
+    reuse the stored result through the input fingerprint check.
+
+    ``progress`` is an optional callable(stage, fraction) used by the job API
+    to report which pipeline stage is running. Without ``observation_time``
+    the current hour is analysed; it is resolved before locking so the call
+    shares the lock of an explicit request for that hour.
+    """
+    if observation_time is None:
+        observation_time = default_observation_time().isoformat()
+    with single_flight('upperair', level, observation_time):
+        return _upper_air_generate_contours(level, observation_time, map_type, progress)
+
+def _upper_air_generate_contours(level, observation_time=None, map_type=None, progress=None):
+    def report_stage(stage, fraction):
+        if progress is not None:
+            progress(stage, fraction)
+
     # Set dynamic observation time to current Nepal time if not provided
     if observation_time is None:
-        observation_time = datetime.now(tz=pytz.timezone('Asia/Kathmandu')).replace(
-            microsecond=0, second=0, minute=0
-        )
+        observation_time = default_observation_time()
         logger.info(f"No observation time provided, using current time: {observation_time}")
     else:
         try:
@@ -72,6 +144,7 @@ def upper_air_generate_contours(level, observation_time=None, map_type=None):
             return False
 
     logger.info(f"Using observation time: {observation_time}")
+    report_stage('fetching', 0.05)
 
     # Fetch reports with retry mechanism
     for attempt in range(3):
@@ -109,161 +182,149 @@ def upper_air_generate_contours(level, observation_time=None, map_type=None):
             logger.warning(f"Database error, retrying ({attempt+1}/3): {str(db_err)}")
             continue
 
-    height_data = validate_data(height_data, 'height', level, observation_time)
-    temperature_data = validate_data(temperature_data, 'temperature', level, observation_time)
+    # Skip the pipeline if the stored analysis was built from identical inputs
+    fingerprint = compute_fingerprint(
+        {'height': height_data, 'temperature': temperature_data},
+        {'domains': analysis_domains('upperair'), 'contour_tolerances': CONTOUR_TOLERANCES}, ENGINE_PARAMS
+    )
+    published = current_run('upperair', level, observation_time)
+    if published is not None and published.fingerprint == fingerprint:
+        metrics.incr('upperair.skipped')
+        logger.info(f"Inputs unchanged for level={level}, observation_time={observation_time} (fingerprint {fingerprint[:12]}), reusing run {published.pk}")
+        return stored_upper_air_contours(published)
+    metrics.incr('upperair.recomputed')
+    logger.info(f"Recomputing upper air analysis for level={level}, observation_time={observation_time} (fingerprint {fingerprint[:12]})")
+
+    tolerance = ENGINE_PARAMS['time_tolerance_minutes']
+    height_data = validate_data(height_data, 'height', level, observation_time, tolerance)
+    temperature_data = validate_data(temperature_data, 'temperature', level, observation_time, tolerance)
     if len(height_data) < 3 or len(temperature_data) < 3:
         logger.error("Insufficient valid data")
         return False
 
+    # Rows written by this run stay invisible to readers until activate_run()
+    run = start_run('upperair', level, observation_time, fingerprint, {
+        'grid': {'domains': analysis_domains('upperair'), 'contour_tolerances': CONTOUR_TOLERANCES}, 'engine': ENGINE_PARAMS,
+    })
+
     height_lons, height_lats, height_vals = zip(*height_data)
     temp_lons, temp_lats, temp_vals = zip(*temperature_data)
 
     # Determine height levels based on station data with 60 GPM interval
-    min_height = np.floor(min(height_vals) / 60) * 60
-    max_height = np.ceil(max(height_vals) / 60) * 60
-    height_levels = np.arange(min_height, max_height + 60, 60)
-    temp_levels = np.arange(np.floor(min(temp_vals)), np.ceil(max(temp_vals)) + 1, 1)  # 1°C intervals
+    height_interval = ENGINE_PARAMS['height_interval']
+    temp_interval = ENGINE_PARAMS['temperature_interval']
+    min_height = np.floor(min(height_vals) / height_interval) * height_interval
+    max_height = np.ceil(max(height_vals) / height_interval) * height_interval
+    height_levels = np.arange(min_height, max_height + height_interval, height_interval)
+    temp_levels = np.arange(np.floor(min(temp_vals)), np.ceil(max(temp_vals)) + temp_interval, temp_interval)  # 1°C intervals
     logger.info(f"Dynamic height range: {min_height} to {max_height} meters, temperature range: {min(temp_vals)} to {max(temp_vals)}°C")
 
-    with transaction.atomic():
-        UpperAirIsobar.objects.filter(level=level, observation_time=observation_time).delete()
-        UpperAirPressureCenter.objects.filter(level=level, observation_time=observation_time).delete()
-
-        # Identify pressure centers directly from station data (using height for context)
-        geojson_centers = {"type": "FeatureCollection", "features": []}
-        pressure_center_count = 0
-        centers = []
-        height_range = max(height_vals) - min(height_vals)
-        threshold = max(90, 0.015 * height_range)  # Adjusted threshold (min 90 meters)
-        for i, (lon, lat, val) in enumerate(height_data):
-            neighbors = []
-            for j, (lon2, lat2, val2) in enumerate(height_data):
-                if i != j and distance_matrix([[lon, lat]], [[lon2, lat2]])[0][0] < 4:  # Reduced to 4°
-                    neighbors.append(val2)
-            if neighbors and len(neighbors) > 3:  # Ensure at least 3 neighbors
-                neighbor_max = max(neighbors)
-                neighbor_min = min(neighbors)
-                if val > neighbor_max + threshold:  # High pressure (low height) center
-                    centers.append(('HIGH', lon, lat, val))
-                    UpperAirPressureCenter.objects.create(
-                        level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
-                        center_type='HIGH', pressure=float(val)  # Using height as proxy for pressure center
-                    )
-                    pressure_center_count += 1
-                    geojson_centers["features"].append({
-                        "type": "Feature",
-                        "geometry": {"type": "Point", "coordinates": [lon, lat]},
-                        "properties": {"type": "HIGH", "height": float(val), "level": level, "time": observation_time.isoformat()}
-                    })
-                elif val < neighbor_min - threshold:  # Low pressure (high height) center
-                    centers.append(('LOW', lon, lat, val))
-                    UpperAirPressureCenter.objects.create(
-                        level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
-                        center_type='LOW', pressure=float(val)  # Using height as proxy for pressure center
-                    )
-                    pressure_center_count += 1
-                    geojson_centers["features"].append({
-                        "type": "Feature",
-                        "geometry": {"type": "Point", "coordinates": [lon, lat]},
-                        "properties": {"type": "LOW", "height": float(val), "level": level, "time": observation_time.isoformat()}
-                    })
-                logger.debug(f"Station {i}: val={val}, neighbors={len(neighbors)}, max_diff={max(val - neighbor_max, neighbor_min - val) if neighbors else 0}")
-            else:
-                logger.debug(f"Station {i}: val={val}, neighbors={len(neighbors)}, max_diff=0")
-        logger.info(f"Generated {pressure_center_count} pressure centers")
-
-        # Create region-wide grid based on upper air coverage
-        min_lon, max_lon = 35.0, 120.0
-        min_lat, max_lat = 0.0, 45.0
-        resolution = 0.25  # Finer resolution for smoother contours
-        num_points_lon = int((max_lon - min_lon) / resolution) + 1
-        num_points_lat = int((max_lat - min_lat) / resolution) + 1
-        grid_lon, grid_lat = np.meshgrid(
-            np.linspace(min_lon, max_lon, num_points_lon),
-            np.linspace(min_lat, max_lat, num_points_lat)
-        )
-        logger.debug(f"Grid shapes: grid_lon={grid_lon.shape}, grid_lat={grid_lat.shape}")
-
-        # Interpolate height and temperature values onto the grid using Kriging
-        try:
-            # Kriging for height
-            ok_height = OrdinaryKriging(
-                height_lons,
-                height_lats,
-                height_vals,
-                variogram_model='spherical',
-                variogram_parameters={'sill': np.var(height_vals), 'range': 10.0, 'nugget': 0.1},
-                verbose=False,
-                enable_plotting=False
-            )
-            grid_height, _ = ok_height.execute('grid', np.linspace(min_lon, max_lon, num_points_lon), np.linspace(min_lat, max_lat, num_points_lat))
-            grid_height = np.array(grid_height)  # Ensure it's a numpy array
-            logger.debug(f"Height grid shape after Kriging: {grid_height.shape}")
-
-            # Kriging for temperature
-            ok_temp = OrdinaryKriging(
-                temp_lons,
-                temp_lats,
-                temp_vals,
-                variogram_model='spherical',
-                variogram_parameters={'sill': np.var(temp_vals), 'range': 10.0, 'nugget': 0.1},
-                verbose=False,
-                enable_plotting=False
-            )
-            grid_temp, _ = ok_temp.execute('grid', np.linspace(min_lon, max_lon, num_points_lon), np.linspace(min_lat, max_lat, num_points_lat))
-            grid_temp = np.array(grid_temp)  # Ensure it's a numpy array
-            logger.debug(f"Temperature grid shape after Kriging: {grid_temp.shape}")
-
-            # Ensure grid shapes match
-            if grid_height.shape != grid_lon.shape:
-                logger.warning(f"Reshaping grid_height from {grid_height.shape} to {grid_lon.shape}")
-                grid_height = grid_height.reshape(grid_lon.shape)
-            if grid_temp.shape != grid_lon.shape:
-                logger.warning(f"Reshaping grid_temp from {grid_temp.shape} to {grid_lon.shape}")
-                grid_temp = grid_temp.reshape(grid_lon.shape)
+    report_stage('centers', 0.15)
+    # Identify pressure centers directly from station data (using height for context)
+    center_rows = []
+    geojson_centers = {"type": "FeatureCollection", "features": []}
+    pressure_center_count = 0
+    centers = []
+    height_range = max(height_vals) - min(height_vals)
+    threshold = max(90, 0.015 * height_range)  # Adjusted threshold (min 90 meters)
+    for i, (lon, lat, val) in enumerate(height_data):
+        neighbors = []
+        for j, (lon2, lat2, val2) in enumerate(height_data):
+            if i != j and distance_matrix([[lon, lat]], [[lon2, lat2]])[0][0] < 4:  # Reduced to 4°
+                neighbors.append(val2)
+        if neighbors and len(neighbors) > 3:  # Ensure at least 3 neighbors
+            neighbor_max = max(neighbors)
+            neighbor_min = min(neighbors)
+            if val > neighbor_max + threshold:  # High pressure (low height) center
+                centers.append(('HIGH', lon, lat, val))
+                center_rows.append(UpperAirPressureCenter(
+                    run=run, level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
+                    center_type='HIGH', pressure=float(val)  # Using height as proxy for pressure center
+                ))
+                pressure_center_count += 1
+                geojson_centers["features"].append({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"type": "HIGH", "height": float(val), "level": level, "time": observation_time.isoformat()}
+                })
+            elif val < neighbor_min - threshold:  # Low pressure (high height) center
+                centers.append(('LOW', lon, lat, val))
+                center_rows.append(UpperAirPressureCenter(
+                    run=run, level=level, observation_time=observation_time, location=Point(lon, lat, srid=4326),
+                    center_type='LOW', pressure=float(val)  # Using height as proxy for pressure center
+                ))
+                pressure_center_count += 1
+                geojson_centers["features"].append({
+                    "type": "Feature",
+                    "geometry": {"type": "Point", "coordinates": [lon, lat]},
+                    "properties": {"type": "LOW", "height": float(val), "level": level, "time": observation_time.isoformat()}
+                })
+            logger.debug(f"Station {i}: val={val}, neighbors={len(neighbors)}, max_diff={max(val - neighbor_max, neighbor_min - val) if neighbors else 0}")
+        else:
+            logger.debug(f"Station {i}: val={val}, neighbors={len(neighbors)}, max_diff=0")
+    logger.info(f"Generated {pressure_center_count} pressure centers")
+
+    # Analyse every domain from the same validated stations. Domains are listed
+    # parents first, so a nest's background field is always available.
+    domains = analysis_domains('upperair')
+    primary = domains[0]['name']
+    analysed = {}
+    geojson_height_contours = {"type": "FeatureCollection", "features": []}
+    geojson_isotherms = {"type": "FeatureCollection", "features": []}
+    height_contour_count = 0
+    isotherm_count = 0
+    contour_rows = []
+    isotherm_rows = []
 
+    # Function to smooth contour paths using spline interpolation
+    def smooth_contour_path(path, num_points=200, s=0.1):
+        if len(path) < 4:  # Skip smoothing for very short paths
+            logger.debug(f"Skipping spline smoothing for path with {len(path)} points")
+            return path
+        try:
+            x, y = path[:, 0], path[:, 1]
+            # Fit spline
+            spl, u = splprep([x, y], s=s, k=3, quiet=True)
+            # Generate new points
+            u_new = np.linspace(0, 1, num_points)
+            x_new, y_new = splev(u_new, spl)
+            return np.column_stack((x_new, y_new))
         except Exception as e:
-            logger.error(f"Kriging interpolation failed: {str(e)}")
-            return False
+            logger.warning(f"Spline smoothing failed for path with {len(path)} points: {str(e)}")
+            return path
+
+    for index, domain in enumerate(domains):
+        name = domain['name']
+        parent = analysed.get(domain.get('parent'))
+        if domain.get('parent') and parent is None:
+            logger.warning(f"Skipping domain {name}: parent domain {domain['parent']} was not analysed")
+            continue
 
-        # Fill NaN values with nearest neighbor and apply smoothing
-        mask = np.isnan(grid_height)
-        if np.any(mask):
-            from scipy.interpolate import griddata
-            logger.debug(f"Filling {np.sum(mask)} NaN values in grid_height")
-            grid_height[mask] = griddata(
-                [(lon, lat) for lon, lat, _ in height_data],
-                height_vals,
-                (grid_lon[mask], grid_lat[mask]),
-                method='nearest'
+        report_stage('kriging', 0.25 + 0.6 * index / len(domains))
+        heartbeat(run)
+        # Kriging, gap filling and smoothing; nests krige residuals against the parent field
+        try:
+            grid_height, height_variance = analyse_domain(
+                height_data, domain, ENGINE_PARAMS,
+                parent and (parent['axes'], parent['height'], parent['height_variance']),
             )
-        grid_height = gaussian_filter(grid_height, sigma=2.0)  # Increased sigma for smoother contours
-        logger.debug(f"Applied Gaussian filter to grid_height with sigma=2.0")
-
-        mask = np.isnan(grid_temp)
-        if np.any(mask):
-            from scipy.interpolate import griddata
-            logger.debug(f"Filling {np.sum(mask)} NaN values in grid_temp")
-            grid_temp[mask] = griddata(
-                [(lon, lat) for lon, lat, _ in temperature_data],
-                temp_vals,
-                (grid_lon[mask], grid_lat[mask]),
-                method='nearest'
+            grid_temp, temperature_variance = analyse_domain(
+                temperature_data, domain, ENGINE_PARAMS,
+                parent and (parent['axes'], parent['temperature'], parent['temperature_variance']),
             )
-        grid_temp = gaussian_filter(grid_temp, sigma=2.0)  # Increased sigma for smoother contours
-        logger.debug(f"Applied Gaussian filter to grid_temp with sigma=2.0")
-
-        # Verify shapes before contouring
-        logger.debug(f"Final shapes: grid_lon={grid_lon.shape}, grid_lat={grid_lat.shape}, grid_height={grid_height.shape}, grid_temp={grid_temp.shape}")
-        if grid_height.shape != grid_lon.shape or grid_temp.shape != grid_lon.shape:
-            logger.error(f"Shape mismatch: grid_lon={grid_lon.shape}, grid_height={grid_height.shape}, grid_temp={grid_temp.shape}")
-            return False
+        except Exception as e:
+            if name == primary:
+                logger.error(f"Kriging interpolation failed: {str(e)}")
+                fail_run(run, f"Kriging interpolation failed: {e}")
+                return False
+            logger.error(f"Kriging interpolation failed for domain {name}, skipping it: {str(e)}")
+            continue
+        axes = domain_axes(domain)
+        grid_lon, grid_lat = np.meshgrid(*axes)
+        logger.debug(f"Domain {name}: grid {grid_lon.shape} at {domain['resolution']}°")
 
+        report_stage('contouring', 0.25 + 0.6 * (index + 0.5) / len(domains))
         # Generate height contours and isotherms
-        geojson_height_contours = {"type": "FeatureCollection", "features": []}
-        geojson_isotherms = {"type": "FeatureCollection", "features": []}
-        height_contour_count = 0
-        isotherm_count = 0
         fig, ax = plt.subplots()
         try:
             cs_height = ax.contour(grid_lon, grid_lat, grid_height, levels=height_levels, colors='blue', corner_mask=True)
@@ -271,84 +332,99 @@ def upper_air_generate_contours(level, observation_time=None, map_type=None):
             cs_temp = ax.contour(grid_lon, grid_lat, grid_temp, levels=temp_levels, colors='red', linestyles='dashed', corner_mask=True)
             clabels_temp = ax.clabel(cs_temp, fmt='%d°C', inline=True, fontsize=10, inline_spacing=4)
         except Exception as e:
-            logger.error(f"Contour generation failed: {str(e)}")
-            return False
-
-        # Function to smooth contour paths using spline interpolation
-        def smooth_contour_path(path, num_points=200, s=0.1):
-            if len(path) < 4:  # Skip smoothing for very short paths
-                logger.debug(f"Skipping spline smoothing for path with {len(path)} points")
-                return path
-            try:
-                x, y = path[:, 0], path[:, 1]
-                t = np.linspace(0, 1, len(x))
-                spl, u = splprep([x, y], s=s, k=3, quiet=True)
-                u_new = np.linspace(0, 1, num_points)
-                x_new, y_new = splev(u_new, spl)
-                return np.column_stack((x_new, y_new))
-            except Exception as e:
-                logger.warning(f"Spline smoothing failed for path with {len(path)} points: {str(e)}")
-                return path
+            plt.close(fig)
+            if name == primary:
+                logger.error(f"Contour generation failed: {str(e)}")
+                fail_run(run, f"Contour generation failed: {e}")
+                return False
+            logger.error(f"Contour generation failed for domain {name}, skipping it: {str(e)}")
+            continue
+        analysed[name] = {
+            'domain': domain, 'axes': axes,
+            'height': grid_height, 'temperature': grid_temp,
+            'height_variance': height_variance, 'temperature_variance': temperature_variance,
+        }
 
         # Process height contours with spline smoothing
         for i, contour in enumerate(cs_height.allsegs):
             for path in contour:
                 if len(path) > 1:
-                    smoothed_path = smooth_contour_path(path, num_points=200, s=0.1)
-                    logger.debug(f"Height contour path: original points={len(path)}, smoothed points={len(smoothed_path)}")
+                    # Apply spline smoothing
+                    smoothed_path = smooth_contour_path(path, num_points=ENGINE_PARAMS['spline_points'], s=ENGINE_PARAMS['spline_smoothing'])
                     geom = LineString(smoothed_path, srid=4326)
                     level_val = height_levels[i]
-                    UpperAirIsobar.objects.create(
-                        level=level, observation_time=observation_time, pressure=float(level_val), geometry=geom  # Reusing pressure as height placeholder
-                    )
+                    contour_rows.append(UpperAirIsobar(
+                        run=run, domain=name, level=level, observation_time=observation_time, pressure=float(level_val), geometry=geom  # Reusing pressure as height placeholder
+                    ))
                     height_contour_count += 1
-                    geojson_height_contours["features"].append({
-                        "type": "Feature",
-                        "geometry": {"type": "LineString", "coordinates": smoothed_path.tolist()},
-                        "properties": {"height": float(level_val), "level": level, "time": observation_time.isoformat()}
-                    })
+                    if name == primary:
+                        geojson_height_contours["features"].append({
+                            "type": "Feature",
+                            "geometry": {"type": "LineString", "coordinates": smoothed_path.tolist()},
+                            "properties": {"height": float(level_val), "level": level, "time": observation_time.isoformat()}
+                        })
 
         # Process isotherms with spline smoothing
         for i, contour in enumerate(cs_temp.allsegs):
             for path in contour:
                 if len(path) > 1:
-                    smoothed_path = smooth_contour_path(path, num_points=200, s=0.1)
-                    logger.debug(f"Isotherm path: original points={len(path)}, smoothed points={len(smoothed_path)}")
+                    # Apply spline smoothing
+                    smoothed_path = smooth_contour_path(path, num_points=ENGINE_PARAMS['spline_points'], s=ENGINE_PARAMS['spline_smoothing'])
                     geom = LineString(smoothed_path, srid=4326)
                     level_val = temp_levels[i]
-                    try:
-                        UpperAirIsotherm.objects.create(
-                            level=level,
-                            observation_time=observation_time,
-                            temperature=float(level_val),
-                            geometry=geom
-                        )
-                        isotherm_count += 1
+                    isotherm_rows.append(UpperAirIsotherm(
+                        run=run, domain=name, level=level, observation_time=observation_time, temperature=float(level_val), geometry=geom
+                    ))
+                    isotherm_count += 1
+                    if name == primary:
                         geojson_isotherms["features"].append({
                             "type": "Feature",
                             "geometry": {"type": "LineString", "coordinates": smoothed_path.tolist()},
-                            "properties": {
-                                "temperature": float(level_val),
-                                "level": level,
-                                "time": observation_time.isoformat()
-                            }
+                            "properties": {"temperature": float(level_val), "level": level, "time": observation_time.isoformat()}
                         })
-                    except Exception as e:
-                        logger.error(f"Failed to save isotherm for temperature {level_val}°C: {str(e)}")
-                        continue
 
-        logger.info(f"Generated {height_contour_count} height contours, {isotherm_count} isotherms")
-        plt.close(fig)  # Ensure figure is closed to release resources
+        plt.close(fig)
+        # Optional: Plot stations and pressure centers for debugging
         if map_type == 'DEBUG':
             ax.scatter(height_lons, height_lats, c='gray', s=10, alpha=0.5)
             for center_type, lon, lat, val in centers:
                 color = 'blue' if center_type == 'HIGH' else 'red'
                 ax.text(lon, lat, center_type, fontsize=14, ha='center', va='center', color=color, weight='bold')
-            plt.savefig(f"debug_map_{level}_{observation_time.isoformat()}.png", dpi=300, bbox_inches='tight')
-            logger.info("Debug map saved")
+            plt.savefig(f"debug_map_{level}_{name}_{observation_time.isoformat()}.png", dpi=300, bbox_inches='tight')
+            logger.info(f"Debug map saved for domain {name}")
+
+    logger.info(f"Generated {height_contour_count} height contours, {isotherm_count} isotherms over {len(analysed)} domains")
+
+    # Publish the run: rows and the current-run pointer flip in one commit
+    report_stage('storing', 0.9)
+    # Grids first, so a published run always has them for point sampling
+    for name, result in analysed.items():
+        lons, lats = result['axes']
+        try:
+            write_grids(run, (lons[0], lats[0], lons[-1], lats[-1]), result['domain']['resolution'], {
+                'height': result['height'],
+                'temperature': result['temperature'],
+                'height_variance': result['height_variance'],
+                'temperature_variance': result['temperature_variance'],
+            }, domain=name)
+        except Exception as e:
+            logger.error(f"Failed to store {name} analysis grids for run {run.pk}: {str(e)}")
+    with transaction.atomic():
+        UpperAirPressureCenter.objects.bulk_create(center_rows)
+        # Full detail plus the simplified copies served at lower zooms
+        UpperAirIsobar.objects.bulk_create(generalize(contour_rows))
+        UpperAirIsotherm.objects.bulk_create(generalize(isotherm_rows))
+        activate_run(run)
+
+    # Precompute the one-shot map bundle; the analysis stays valid if this fails
+    report_stage('bundling', 0.95)
+    try:
+        store_bundle(run)
+    except Exception as e:
+        logger.error(f"Failed to build analysis bundle for run {run.pk}: {str(e)}")
 
     return {
         "height_contours": geojson_height_contours,
         "isotherms": geojson_isotherms,
         "centers": geojson_centers
-    }
\ No newline at end of file
+    }
@@ -3,6 +3,10 @@ from weather_map.celery import shared_task
 from datetime import datetime, timezone as dt_timezone, timedelta
 from django.utils.timezone import make_aware
 from analysis.models import UpperAirWeatherStation, UpperAirSynopReport
+from analysis.versions import UPPERAIR_REPORTS, bump_many
+from analysis.catalogue import UPPERAIR, record_report
+from analysis.tasks import render_station_sprites
+from django.db import transaction
 from bs4 import BeautifulSoup
 import logging
 import urllib3
@@ -146,6 +150,7 @@ def fetch_upper_air_data(self):
     
     upper_air_url = "https://www.ogimet.com/display_sond.php"
     total_rows = 0
+    ingested = set()  # (level, observation_time) keys that received new reports
 
     for station_id, station in upper_air_station_map.items():
         params = {
@@ -232,26 +237,34 @@ def fetch_upper_air_data(self):
                         logger.debug(f"Report exists for station {station_id} at {obs_time_aware} ({level_data['level']})")
                         continue
 
-                    UpperAirSynopReport.objects.create(
-                        station=station,
-                        observation_time=obs_time_aware,
-                        level=level_data['level'],
-                        pressure=level_data['pressure'],
-                        temperature=level_data['temperature'],
-                        dew_point=level_data['dew_point'],
-                        wind_direction=level_data['wind_direction'],
-                        wind_speed=level_data['wind_speed'],
-                        height=level_data['height']
-                    )
+                    with transaction.atomic():
+                        UpperAirSynopReport.objects.create(
+                            station=station,
+                            observation_time=obs_time_aware,
+                            level=level_data['level'],
+                            pressure=level_data['pressure'],
+                            temperature=level_data['temperature'],
+                            dew_point=level_data['dew_point'],
+                            wind_direction=level_data['wind_direction'],
+                            wind_speed=level_data['wind_speed'],
+                            height=level_data['height']
+                        )
+                        record_report(UPPERAIR, level_data['level'], obs_time_aware, len(upper_air_station_map))
                     logger.info(f"Created report for station {station_id} at {obs_time_aware} ({level_data['level']})")
                     upper_air_row_count += 1
+                    ingested.add((level_data['level'], obs_time_aware))
 
             logger.info(f"Processed {upper_air_row_count} reports for station {station_id}")
             total_rows += upper_air_row_count
 
         except requests.RequestException as e:
             logger.error(f"Error fetching data for station {station_id}: {e}")
+            bump_many(UPPERAIR_REPORTS, ingested)
             raise self.retry(exc=e, countdown=60)
 
     if total_rows == 0:
         logger.warning("No new data fetched for any station.")
+
+    bump_many(UPPERAIR_REPORTS, ingested)
+    if ingested:
+        render_station_sprites.delay(UPPERAIR, [[level, time.isoformat()] for level, time in ingested])
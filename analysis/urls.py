@@ -3,10 +3,13 @@ from rest_framework.routers import DefaultRouter
 from .views import (
     WeatherStationViewSet, SynopReportViewSet, 
     IsobarViewSet, IsothermViewSet, PressureCenterViewSet, ExportMapView,
-    ObservationTimesView,GridDataViewSet,
+    ObservationTimesView,AnalysisGridViewSet,
     UpperAirWeatherStationViewSet,UpperAirSynopReportViewSet,UpperAirIsobarViewSet,UpperAirIsothermViewSet,UpperAirPressureCenterViewSet,AvailableLevelsView,UpperAirObservationTimesView,
-    ExportFileView, ExportListView, ExportDownloadView
-    , ExportDelete
+    ExportFileView, ExportUploadView, ExportUploadSessionListView, ExportUploadSessionView, ExportListView, ExportDownloadView
+    , ExportDelete, AnalysisMetricsView, AnalysisJobListView, AnalysisJobDetailView
+    , AnalysisBundleView, UpperAirAnalysisBundleView, VectorTileView, SampleView, GridBinaryView
+    , AnalysisDomainsView, TendencyContourViewSet
+    , StationSpritesView, StationSpritesImageView, UpperAirStationSpritesView, UpperAirStationSpritesImageView
 )
 from .geoserver_proxy import GeoServerProxy
 
@@ -16,7 +19,8 @@ router.register(r'reports', SynopReportViewSet, basename='synopreport')
 router.register(r'isobars', IsobarViewSet, basename='isobar')
 router.register(r'isotherms', IsothermViewSet, basename='isotherm')
 router.register(r'pressure-centers', PressureCenterViewSet, basename='pressurecenter')
-router.register(r'grid', GridDataViewSet, basename='grid')
+router.register(r'tendency-contours', TendencyContourViewSet, basename='tendencycontour')
+router.register(r'grid', AnalysisGridViewSet, basename='grid')
 
 router.register(r'upperair-stations', UpperAirWeatherStationViewSet, basename='upperair-station')
 router.register(r'upperair-reports', UpperAirSynopReportViewSet, basename='upperair-synopreport')
@@ -30,7 +34,23 @@ urlpatterns = [
     path('observation-times/', ObservationTimesView.as_view(), name='observation-times'),
     path('upperair-observation-times/', UpperAirObservationTimesView.as_view(), name='upperair-observation-times'),
     path('available-levels/', AvailableLevelsView.as_view(), name='available-levels'),
+    path('analysis-bundle/', AnalysisBundleView.as_view(), name='analysis-bundle'),
+    path('upperair-analysis-bundle/', UpperAirAnalysisBundleView.as_view(), name='upperair-analysis-bundle'),
+    path('tiles/<str:layer>/<int:z>/<int:x>/<int:y>.mvt', VectorTileView.as_view(), name='vector-tile'),
+    path('grid/<int:run_id>/<str:field>.bin', GridBinaryView.as_view(), name='grid-binary'),
+    path('sample/', SampleView.as_view(), name='sample'),
+    path('station-sprites/', StationSpritesView.as_view(), name='station-sprites'),
+    path('station-sprites/atlas.png', StationSpritesImageView.as_view(), name='station-sprites-image'),
+    path('upperair-station-sprites/', UpperAirStationSpritesView.as_view(), name='upperair-station-sprites'),
+    path('upperair-station-sprites/atlas.png', UpperAirStationSpritesImageView.as_view(), name='upperair-station-sprites-image'),
+    path('analysis-domains/', AnalysisDomainsView.as_view(), name='analysis-domains'),
+    path('analysis-metrics/', AnalysisMetricsView.as_view(), name='analysis-metrics'),
+    path('analysis-jobs/', AnalysisJobListView.as_view(), name='analysis-job-list'),
+    path('analysis-jobs/<str:job_id>/', AnalysisJobDetailView.as_view(), name='analysis-job-detail'),
     path('export-file/', ExportFileView.as_view(), name='export-file'),
+    path('export-upload/', ExportUploadView.as_view(), name='export-upload'),
+    path('export-uploads/', ExportUploadSessionListView.as_view(), name='export-upload-list'),
+    path('export-uploads/<uuid:upload_id>/', ExportUploadSessionView.as_view(), name='export-upload-detail'),
     path('export-list/', ExportListView.as_view(), name='export-list'),
     path('export-delete/<int:export_id>/', ExportDelete.as_view(), name='export-delete'),
     path('export-download/<int:export_id>/', ExportDownloadView.as_view(), name='export-download'),
@@ -0,0 +1,103 @@
+import hashlib
+import logging
+
+from django.db import IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from .locks import canonical_time
+from .models import DataVersion
+from .namespaces import bump_namespaces, bump_source as bump_source_namespace
+
+logger = logging.getLogger(__name__)
+
+# Version sources: what changed for a (level, observation time)
+SURFACE_REPORTS = 'surface-reports'
+UPPERAIR_REPORTS = 'upperair-reports'
+SURFACE_ANALYSIS = 'surface-analysis'
+UPPERAIR_ANALYSIS = 'upperair-analysis'
+TENDENCY_ANALYSIS = 'tendency-analysis'
+ANALYSIS_SOURCES = {
+    'surface': SURFACE_ANALYSIS, 'upperair': UPPERAIR_ANALYSIS,
+    'tend3h': TENDENCY_ANALYSIS, 'tend24h': TENDENCY_ANALYSIS,
+}
+REPORT_SOURCES = {'surface': SURFACE_REPORTS, 'upperair': UPPERAIR_REPORTS}
+
+# time_key bumped alongside every observation time, for requests without one
+ALL_TIMES = 'ALL'
+
+
+def time_key(observation_time):
+    return ALL_TIMES if observation_time in (None, '') else canonical_time(observation_time)
+
+
+def _bump_key(source, level, key):
+    now = timezone.now()
+    filters = {'source': source, 'level': level, 'time_key': key}
+    if DataVersion.objects.filter(**filters).update(version=F('version') + 1, updated_at=now):
+        return
+    try:
+        with transaction.atomic():
+            DataVersion.objects.create(version=1, updated_at=now, **filters)
+    except IntegrityError:
+        # Created concurrently by another writer
+        DataVersion.objects.filter(**filters).update(version=F('version') + 1, updated_at=now)
+
+
+def _bump_namespaces_on_commit(source, keys):
+    # After commit, so a reader can never cache old rows under the new namespace
+    keys = list(keys)
+    transaction.on_commit(lambda: bump_namespaces(source, keys))
+
+
+def bump(source, level, observation_time):
+    """Record that data for (source, level, observation_time) changed."""
+    key = time_key(observation_time)
+    _bump_key(source, level, key)
+    _bump_key(source, level, ALL_TIMES)
+    _bump_namespaces_on_commit(source, [(level, key), (level, ALL_TIMES)])
+
+
+def bump_many(source, keys):
+    """Bump a set of (level, observation_time) pairs, touching each 'ALL' key once."""
+    keys = {(level, time_key(observation_time)) for level, observation_time in keys}
+    for level, key in keys:
+        _bump_key(source, level, key)
+    levels = {level for level, _ in keys}
+    for level in levels:
+        _bump_key(source, level, ALL_TIMES)
+    _bump_namespaces_on_commit(source, keys | {(level, ALL_TIMES) for level in levels})
+    if keys:
+        logger.debug(f"Bumped {source} data version for {len(keys)} (level, time) keys")
+
+
+def bump_source(source):
+    """Record that data of ``source`` changed at every level and time (e.g. a policy change)."""
+    updated = DataVersion.objects.filter(source=source).update(version=F('version') + 1, updated_at=timezone.now())
+    transaction.on_commit(lambda: bump_source_namespace(source))
+    logger.info(f"Bumped {source} data version for {updated} keys")
+
+
+def current_versions(sources, level, observation_time):
+    """Return DataVersion rows for the given sources at one (level, observation_time)."""
+    key = time_key(observation_time)
+    query = Q()
+    for source in sources:
+        query |= Q(source=source, level=level, time_key=key)
+    return list(DataVersion.objects.filter(query))
+
+
+def reports_version(kind, level, observation_time):
+    """Current version of the reports of one (level, observation_time), 0 if they never changed."""
+    versions = current_versions((REPORT_SOURCES[kind],), level, observation_time)
+    return versions[0].version if versions else 0
+
+
+def version_etag(versions, representation):
+    """
+    Build a strong ETag from data versions and the requested representation
+    (path and query string), so different pages or filters never collide.
+    """
+    parts = sorted(f"{v.source}:{v.level}:{v.time_key}:{v.version}" for v in versions)
+    digest = hashlib.sha1('|'.join(parts + [representation]).encode('utf-8')).hexdigest()
+    return f'"{digest}"'
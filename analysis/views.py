@@ -5,36 +5,229 @@ from rest_framework.response import Response
 from rest_framework.pagination import LimitOffsetPagination
 from rest_framework.decorators import action
 from rest_framework.parsers import MultiPartParser, FormParser
-from django.utils.decorators import method_decorator
-from django.views.decorators.cache import cache_page
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework_gis.filters import InBBoxFilter
-from .models import (WeatherStation, SynopReport, Isobar, Isotherm, PressureCenter, ExportedMap, GridData,UpperAirWeatherStation,UpperAirSynopReport,UpperAirIsobar,UpperAirIsotherm,UpperAirPressureCenter)
+from .models import (WeatherStation, SynopReport, Isobar, Isotherm, PressureCenter, ExportedMap, ExportUpload, AnalysisGrid,UpperAirWeatherStation,UpperAirSynopReport,UpperAirIsobar,UpperAirIsotherm,UpperAirPressureCenter, TendencyContour)
 from .serializers import (
     WeatherStationSerializer, SynopReportSerializer, IsobarSerializer,
-    IsothermSerializer, PressureCenterSerializer, ExportedMapSerializer, GridDataSerializer,
+    IsothermSerializer, PressureCenterSerializer, ExportedMapSerializer, AnalysisGridSerializer,
     UpperAirWeatherStationSerializer, UpperAirSynopReportSerializer, UpperAirIsobarSerializer,
-    UpperAirIsothermSerializer, UpperAirPressureCenterSerializer
+    UpperAirIsothermSerializer, UpperAirPressureCenterSerializer, TendencyContourSerializer
 )
 from rest_framework import serializers
 import pytz
  
 from datetime import datetime,timezone
 import logging
-from .contours import generate_contours
-from .upperair_counters import upper_air_generate_contours
-from celery.result import AsyncResult
+from . import admission, metrics
+from .jobs import ANALYSIS_KINDS, enqueue_analysis, enqueue_render, job_status
+from .runs import current_rows, current_run
+from .bundles import accepts_encoding, build_payload, bundle_response, current_bundle
+from .tiles import TILE_LAYERS, render_tile, valid_tile
+from .grids import BINARY_ENCODINGS, GRID_FIELDS, binary_variants, run_domains, sample_run
+from .domains import DomainError, analysis_domains, resolve_domain
+from .generalize import FULL_DETAIL, pixel_tolerance, tolerance_for
+from .tendency import TENDENCY_HOURS, base_kind, tendency_kind
+from .render import (
+    RENDER_FORMATS, RenderError, cached_render, parse_extent, parse_observation_time, parse_size, parse_style,
+)
+from .sprites import current_sprites
+from .uploads import (
+    UploadError, abort_upload, append_chunk, parse_format as parse_upload_format,
+    parse_observation_time as parse_upload_time, parse_size as parse_upload_size, start_upload, store_upload,
+)
+from .sqljson import SqlGeoJSONMixin
+from .catalogue import SURFACE, UPPERAIR, available_levels, observation_times
+from .namespaces import RESPONSE_CACHE_TTL, namespaced_key
+from .series import DEFAULT_RANGE, SeriesError, resolve_fields, resolve_interval, station_series
+from .pagination import (
+    ExportKeysetPagination, IsobarKeysetPagination, IsothermKeysetPagination, ObservationKeysetPagination,
+    TendencyKeysetPagination,
+)
+from .versions import (
+    ALL_TIMES, SURFACE_ANALYSIS, SURFACE_REPORTS, TENDENCY_ANALYSIS, UPPERAIR_ANALYSIS, UPPERAIR_REPORTS,
+    current_versions, time_key, version_etag,
+)
 import os
-from django.conf import settings
-from django.db.models import Count
+from django.db import connection
+from django.core.cache import cache
 from django.core.files.base import ContentFile
-from django.http import HttpResponse, Http404
+from django.http import FileResponse, HttpResponse, Http404
+from django.urls import reverse
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date
 import base64
+import hashlib
+import re
+import math
+import numpy as np
 import uuid
+from urllib.parse import urlencode
 
 logger = logging.getLogger(__name__)
 
-class WeatherStationViewSet(viewsets.ReadOnlyModelViewSet):
+def job_accepted_response(request, job):
+    """Return a 202 response carrying the job handle and its polling URL."""
+    job = dict(job)
+    job['status_url'] = request.build_absolute_uri(reverse('analysis-job-detail', args=[job['job_id']]))
+    response = Response(job, status=status.HTTP_202_ACCEPTED)
+    # Poll hint: when a job admitted now is likely to have started
+    response['Retry-After'] = str(admission.retry_after())
+    return response
+
+def saturated_response(exc):
+    """Return a 503 telling the client when to retry a job the queue had no room for."""
+    response = Response({"error": str(exc), "retry_after": exc.retry_after}, status=status.HTTP_503_SERVICE_UNAVAILABLE)
+    response['Retry-After'] = str(exc.retry_after)
+    return response
+
+class AnalysisOnDemandMixin:
+    """
+    Serve stored analysis rows, or enqueue the analysis and return 202.
+
+    Web workers never run kriging themselves; clients poll the job status
+    URL and repeat the request once the job is done.
+    """
+    analysis_kind = 'surface'
+    default_level = 'SURFACE'
+
+    def analysis_domain(self):
+        """The ?domain= of the request, defaulting to the primary analysis domain."""
+        try:
+            return resolve_domain(self.analysis_kind, self.request.query_params.get('domain'))
+        except DomainError as e:
+            raise serializers.ValidationError({"domain": str(e)})
+
+    def contour_tolerance(self):
+        """
+        The stored generalization to serve: ?tolerance= (degrees) or ?zoom= (map
+        zoom, one pixel of tolerance) picks the coarsest copy within it.
+        """
+        params = self.request.query_params
+        try:
+            if params.get('tolerance'):
+                return tolerance_for(float(params['tolerance']))
+            if params.get('zoom'):
+                return tolerance_for(pixel_tolerance(int(params['zoom'])))
+        except (ValueError, OverflowError):
+            raise serializers.ValidationError({"tolerance": "tolerance must be a number and zoom an integer"})
+        return FULL_DETAIL
+
+    def pending_analysis_response(self, request):
+        """Return a 202 job response if the analysis is missing and still being computed."""
+        if self.filter_queryset(self.get_queryset()).exists():
+            return None
+        level = request.query_params.get('level', self.default_level)
+        observation_time = request.query_params.get('observation_time')
+        try:
+            job = enqueue_analysis(self.analysis_kind, level, observation_time)
+        except admission.Saturated as e:
+            return saturated_response(e)
+        if job['status'] in ('queued', 'running'):
+            return job_accepted_response(request, job)
+        # The job already finished without producing rows: serve the empty result
+        return None
+
+    def list(self, request, *args, **kwargs):
+        pending = self.pending_analysis_response(request)
+        if pending is not None:
+            return pending
+        return super().list(request, *args, **kwargs)
+
+class ConditionalGetMixin:
+    """
+    Emit ETag/Last-Modified from the data version of (level, observation_time)
+    and answer If-None-Match / If-Modified-Since with 304 before the queryset
+    is built. Rendered JSON bodies are cached under the cache namespace of the
+    same sources, so they go stale as soon as that data changes.
+    """
+    version_sources = ()
+    default_level = 'SURFACE'
+
+    def cached_body_key(self, request, level):
+        return namespaced_key(
+            'response', self.version_sources, level, time_key(request.query_params.get('observation_time')),
+            request.get_full_path(), request.accepted_media_type,
+        )
+
+    def render_body(self, request, response):
+        """Return (bytes, content type) of a list response, rendering DRF responses as the client would get them."""
+        if isinstance(response, Response):
+            renderer = request.accepted_renderer
+            body = renderer.render(response.data, request.accepted_media_type, self.get_renderer_context())
+            content_type = f"{request.accepted_media_type}; charset={renderer.charset}" if renderer.charset else request.accepted_media_type
+            return body, content_type
+        return response.content, response['Content-Type']
+
+    def list(self, request, *args, **kwargs):
+        level = request.query_params.get('level', self.default_level)
+        versions = current_versions(self.version_sources, level, request.query_params.get('observation_time'))
+        if not versions:
+            return super().list(request, *args, **kwargs)
+
+        etag = version_etag(versions, request.get_full_path())
+        last_modified = int(max(v.updated_at for v in versions).timestamp())
+        response = get_conditional_response(request, etag=etag, last_modified=last_modified)
+        if response is None:
+            cacheable = getattr(request.accepted_renderer, 'format', None) == 'json'
+            key = self.cached_body_key(request, level) if cacheable else None
+            cached = cache.get(key) if key else None
+            if cached is not None:
+                response = HttpResponse(cached[0], content_type=cached[1])
+            else:
+                response = super().list(request, *args, **kwargs)
+                if response.status_code != status.HTTP_200_OK:
+                    return response
+                if key:
+                    body, content_type = self.render_body(request, response)
+                    cache.set(key, (body, content_type), timeout=RESPONSE_CACHE_TTL)
+                    response = HttpResponse(body, content_type=content_type)
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        response['Cache-Control'] = 'no-cache'
+        return response
+
+class StationSeriesMixin:
+    """
+    /<stations>/{id}/series/?from=&to=&level=&fields=&interval= — one station's
+    history as columnar arrays, aggregated per hour or day for long ranges.
+    """
+    report_model = SynopReport
+    report_source = SURFACE_REPORTS
+    default_level = 'SURFACE'
+
+    def _parse_time(self, value, name):
+        try:
+            parsed = datetime.fromisoformat(value.replace('Z', '+00:00'))
+        except ValueError:
+            raise serializers.ValidationError({name: "Invalid ISO format (e.g., 2025-04-24T06:00:00Z)"})
+        return parsed if parsed.tzinfo else parsed.replace(tzinfo=timezone.utc)
+
+    @action(detail=True, methods=['get'])
+    def series(self, request, pk=None):
+        station = self.get_object()
+        if not station.is_visible:
+            raise Http404
+        params = request.query_params
+        level = params.get('level', self.default_level)
+        end = self._parse_time(params['to'], 'to') if params.get('to') else datetime.now(timezone.utc)
+        start = self._parse_time(params['from'], 'from') if params.get('from') else end - DEFAULT_RANGE
+        try:
+            fields = resolve_fields(self.report_model, params.get('fields'))
+            interval = resolve_interval(params.get('interval'), start, end)
+        except SeriesError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        # A fixed 'to' is cacheable until new reports arrive at this level
+        key = namespaced_key('series', [self.report_source], level, ALL_TIMES, request.get_full_path()) if params.get('to') else None
+        data = cache.get(key) if key else None
+        if data is None:
+            data = station_series(self.report_model, station.pk, level, start, end, fields, interval)
+            if key:
+                cache.set(key, data, timeout=RESPONSE_CACHE_TTL)
+        return Response(data)
+
+class WeatherStationViewSet(StationSeriesMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
     serializer_class = WeatherStationSerializer
     queryset = WeatherStation.objects.all()
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
@@ -45,7 +238,10 @@ class WeatherStationViewSet(viewsets.ReadOnlyModelViewSet):
     def get_queryset(self):
         """Return queryset with spatial filtering."""
         return super().get_queryset()   
-class UpperAirWeatherStationViewSet(viewsets.ReadOnlyModelViewSet):
+class UpperAirWeatherStationViewSet(StationSeriesMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    report_model = UpperAirSynopReport
+    report_source = UPPERAIR_REPORTS
+    default_level = '200HPA'
     serializer_class = UpperAirWeatherStationSerializer
     queryset = UpperAirWeatherStation.objects.all()
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
@@ -57,22 +253,19 @@ class UpperAirWeatherStationViewSet(viewsets.ReadOnlyModelViewSet):
         """Return queryset with spatial filtering."""
         return super().get_queryset()   
 
-class SynopReportViewSet(viewsets.ReadOnlyModelViewSet):
+class SynopReportViewSet(ConditionalGetMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (SURFACE_REPORTS,)
     serializer_class = SynopReportSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'station__station_id']
     bbox_filter_field = 'station__location'
-    pagination_class = LimitOffsetPagination
+    pagination_class = ObservationKeysetPagination
 
     def get_queryset(self):
         """Filter by level, observation_time, and optimize queries."""
         level = self.request.query_params.get('level', 'SURFACE')
         observation_time = self.request.query_params.get('observation_time')
-        station_q = (
-            Q(station__country__in=_FREE_COUNTRIES) |
-            Q(station__country__in=_CSV_RESTRICTED_COUNTRIES, station__station_id__in=_CSV_STATION_IDS)
-        )
-        queryset = SynopReport.objects.filter(level=level).filter(station_q).select_related('station')
+        queryset = SynopReport.objects.filter(level=level, station__is_visible=True).select_related('station')
         if observation_time:
             try:
                 logger.debug(f"Received observation_time: {observation_time}")
@@ -90,22 +283,20 @@ class SynopReportViewSet(viewsets.ReadOnlyModelViewSet):
                     "observation_time": "Invalid ISO format (e.g., 2025-04-24T06:00:00Z or 2025-04-24T06:00:00+00:00)"
                 })
         return queryset
-class UpperAirSynopReportViewSet(viewsets.ReadOnlyModelViewSet):
+class UpperAirSynopReportViewSet(ConditionalGetMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (UPPERAIR_REPORTS,)
+    default_level = '200HPA'
     serializer_class = UpperAirSynopReportSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'station__station_id']
     bbox_filter_field = 'station__location'
-    pagination_class = LimitOffsetPagination
+    pagination_class = ObservationKeysetPagination
 
     def get_queryset(self):
         """Filter by level, observation_time, and optimize queries."""
         level = self.request.query_params.get('level', '200HPA')
         observation_time = self.request.query_params.get('observation_time')
-        station_q = (
-            Q(station__country__in=_FREE_COUNTRIES) |
-            Q(station__country__in=_CSV_RESTRICTED_COUNTRIES, station__station_id__in=_CSV_STATION_IDS)
-        )
-        queryset = UpperAirSynopReport.objects.filter(level=level).filter(station_q).select_related('station')
+        queryset = UpperAirSynopReport.objects.filter(level=level, station__is_visible=True).select_related('station')
         if observation_time:
             try:
                 logger.debug(f"Received observation_time: {observation_time}")
@@ -140,20 +331,21 @@ class InBBoxFilter:
                 logger.warning(f"Invalid bbox parameters: {e}")
         return queryset
 
-class IsobarViewSet(viewsets.ReadOnlyModelViewSet):
+class IsobarViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (SURFACE_ANALYSIS,)
     serializer_class = IsobarSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'pressure']
     bbox_filter_field = 'geometry'
-    pagination_class = LimitOffsetPagination
+    pagination_class = IsobarKeysetPagination
 
     def get_queryset(self):
-        """Filter isobars and trigger generation if empty."""
+        """Filter isobars for a level and observation time."""
         level = self.request.query_params.get('level', 'SURFACE')
         observation_time_str = self.request.query_params.get('observation_time')
 
         # Initialize queryset
-        queryset = Isobar.objects.filter(level=level)
+        queryset = current_rows(Isobar.objects.filter(level=level, domain=self.analysis_domain(), tolerance=self.contour_tolerance()))
 
         # Handle observation_time with timezone conversion
         observation_time = None
@@ -166,36 +358,24 @@ class IsobarViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
 
-        # Trigger contour generation if no isobars
-        if not queryset.exists() and self.request.method == 'GET':
-            try:
-                result = generate_contours(level, observation_time_str)  # Pass string for compatibility
-                if result and isinstance(result, dict):
-                    logger.info(f"Generated isobars for level={level}, observation_time={observation_time_str}")
-                    queryset = Isobar.objects.filter(level=level)
-                    if observation_time:
-                        queryset = queryset.filter(observation_time=observation_time)
-                else:
-                    logger.warning(f"Failed to generate isobars for level={level}, observation_time={observation_time_str}")
-            except Exception as e:
-                logger.error(f"Error generating isobars: {e}", exc_info=True)
-                raise serializers.ValidationError({"detail": f"Failed to generate contours: {str(e)}"})
-
         return queryset
-class UpperAirIsobarViewSet(viewsets.ReadOnlyModelViewSet):
+class UpperAirIsobarViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (UPPERAIR_ANALYSIS,)
+    analysis_kind = 'upperair'
+    default_level = '200HPA'
     serializer_class = UpperAirIsobarSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'pressure']
     bbox_filter_field = 'geometry'
-    pagination_class = LimitOffsetPagination
+    pagination_class = IsobarKeysetPagination
 
     def get_queryset(self):
-        """Filter isobars and trigger generation of height contours if empty."""
+        """Filter height contours for a level and observation time."""
         level = self.request.query_params.get('level', '200HPA')
         observation_time_str = self.request.query_params.get('observation_time')
 
         # Initialize queryset
-        queryset = UpperAirIsobar.objects.filter(level=level)  # Changed to UpperAirIsobar
+        queryset = current_rows(UpperAirIsobar.objects.filter(level=level, domain=self.analysis_domain(), tolerance=self.contour_tolerance()))  # Changed to UpperAirIsobar
 
         # Handle observation_time with timezone conversion
         observation_time = None
@@ -208,35 +388,21 @@ class UpperAirIsobarViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
 
-        # Trigger contour generation if no isobars (now height contours)
-        if not queryset.exists() and self.request.method == 'GET':
-            try:
-                result = upper_air_generate_contours(level, observation_time_str)  # Pass string for compatibility
-                if result and isinstance(result, dict):
-                    logger.info(f"Generated height contours for level={level}, observation_time={observation_time_str}")
-                    queryset = UpperAirIsobar.objects.filter(level=level)  # Updated to reflect height contours
-                    if observation_time:
-                        queryset = queryset.filter(observation_time=observation_time)
-                else:
-                    logger.warning(f"Failed to generate height contours for level={level}, observation_time={observation_time_str}")
-            except Exception as e:
-                logger.error(f"Error generating height contours: {e}", exc_info=True)
-                raise serializers.ValidationError({"detail": f"Failed to generate contours: {str(e)}"})
-
         return queryset
 
-class IsothermViewSet(viewsets.ReadOnlyModelViewSet):
+class IsothermViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (SURFACE_ANALYSIS,)
     serializer_class = IsothermSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'temperature']
     bbox_filter_field = 'geometry'
-    pagination_class = LimitOffsetPagination
+    pagination_class = IsothermKeysetPagination
 
     def get_queryset(self):
-        """Filter isotherms and trigger generation if empty."""
+        """Filter isotherms for a level and observation time."""
         level = self.request.query_params.get('level', 'SURFACE')
         observation_time = self.request.query_params.get('observation_time')
-        queryset = Isotherm.objects.filter(level=level)
+        queryset = current_rows(Isotherm.objects.filter(level=level, domain=self.analysis_domain(), tolerance=self.contour_tolerance()))
         if observation_time:
             try:
                 observation_time = datetime.fromisoformat(observation_time.replace('Z', '+00:00'))
@@ -244,33 +410,22 @@ class IsothermViewSet(viewsets.ReadOnlyModelViewSet):
             except ValueError as e:
                 logger.error(f"Invalid observation_time format: {observation_time}, {e}")
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
-        
-        # Trigger contour generation if no isotherms
-        if not queryset.exists() and self.request.method == 'GET':
-            try:
-                success = generate_contours(level, observation_time)
-                if success:
-                    queryset = Isotherm.objects.filter(level=level)
-                    if observation_time:
-                        queryset = queryset.filter(observation_time=observation_time)
-                    logger.info(f"Generated isotherms for level={level}, observation_time={observation_time}")
-                else:
-                    logger.warning(f"Failed to generate isotherms for level={level}, observation_time={observation_time}")
-            except Exception as e:
-                logger.error(f"Error generating isotherms: {e}", exc_info=True)
         return queryset
-class UpperAirIsothermViewSet(viewsets.ReadOnlyModelViewSet):
+class UpperAirIsothermViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (UPPERAIR_ANALYSIS,)
+    analysis_kind = 'upperair'
+    default_level = '200HPA'
     serializer_class = UpperAirIsothermSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'temperature']
     bbox_filter_field = 'geometry'
-    pagination_class = LimitOffsetPagination
+    pagination_class = IsothermKeysetPagination
 
     def get_queryset(self):
-        """Filter isotherms and trigger generation if empty."""
+        """Filter isotherms for a level and observation time."""
         level = self.request.query_params.get('level', '200HPA')
         observation_time_str = self.request.query_params.get('observation_time')
-        queryset = UpperAirIsotherm.objects.filter(level=level)  # Changed to UpperAirIsotherm
+        queryset = current_rows(UpperAirIsotherm.objects.filter(level=level, domain=self.analysis_domain(), tolerance=self.contour_tolerance()))  # Changed to UpperAirIsotherm
 
         # Handle observation_time with timezone conversion
         observation_time = None
@@ -283,35 +438,68 @@ class UpperAirIsothermViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
 
-        # Trigger contour generation if no isotherms
-        if not queryset.exists() and self.request.method == 'GET':
-            try:
-                result = upper_air_generate_contours(level, observation_time_str)  # Pass string for compatibility
-                if result and isinstance(result, dict):
-                    logger.info(f"Generated isotherms for level={level}, observation_time={observation_time_str}")
-                    queryset = UpperAirIsotherm.objects.filter(level=level)  # Updated to reflect generated data
-                    if observation_time:
-                        queryset = queryset.filter(observation_time=observation_time)
-                else:
-                    logger.warning(f"Failed to generate isotherms for level={level}, observation_time={observation_time_str}")
-            except Exception as e:
-                logger.error(f"Error generating isotherms: {e}", exc_info=True)
-                raise serializers.ValidationError({"detail": f"Failed to generate contours: {str(e)}"})
+        return queryset
+
+class TendencyContourViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Lines of equal change over ?hours= (3 or 24) of the pressure/height and
+    temperature analyses; computed on demand from the two stored analyses.
+    """
+    version_sources = (TENDENCY_ANALYSIS,)
+    serializer_class = TendencyContourSerializer
+    filter_backends = [DjangoFilterBackend, InBBoxFilter]
+    filterset_fields = ['level', 'observation_time', 'field']
+    bbox_filter_field = 'geometry'
+    pagination_class = TendencyKeysetPagination
+
+    def tendency_hours(self):
+        hours = self.request.query_params.get('hours', str(TENDENCY_HOURS[0]))
+        if hours not in [str(h) for h in TENDENCY_HOURS]:
+            raise serializers.ValidationError({"hours": f"hours must be one of {', '.join(map(str, TENDENCY_HOURS))}"})
+        return int(hours)
 
+    @property
+    def analysis_kind(self):
+        return tendency_kind(self.tendency_hours())
+
+    def analysis_domain(self):
+        # Tendencies are computed on the domains of the analyses they difference
+        try:
+            return resolve_domain(base_kind(self.request.query_params.get('level', 'SURFACE')), self.request.query_params.get('domain'))
+        except DomainError as e:
+            raise serializers.ValidationError({"domain": str(e)})
+
+    def get_queryset(self):
+        """Filter tendency contours for a level, interval and observation time."""
+        level = self.request.query_params.get('level', 'SURFACE')
+        observation_time = self.request.query_params.get('observation_time')
+        queryset = current_rows(TendencyContour.objects.filter(
+            level=level, hours=self.tendency_hours(), domain=self.analysis_domain(), tolerance=self.contour_tolerance(),
+        ))
+        if observation_time:
+            try:
+                observation_time = datetime.fromisoformat(observation_time.replace('Z', '+00:00'))
+                queryset = queryset.filter(observation_time=observation_time)
+            except ValueError as e:
+                logger.error(f"Invalid observation_time format: {observation_time}, {e}")
+                raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
         return queryset
 
-class PressureCenterViewSet(viewsets.ReadOnlyModelViewSet):
+class PressureCenterViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (SURFACE_ANALYSIS,)
+    analysis_kind = 'surface'
+    default_level = 'SURFACE'
     serializer_class = PressureCenterSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'center_type']
     bbox_filter_field = 'location'
-    pagination_class = LimitOffsetPagination
+    pagination_class = ObservationKeysetPagination
 
     def get_queryset(self):
         """Filter pressure centers."""
         level = self.request.query_params.get('level', 'SURFACE')
         observation_time = self.request.query_params.get('observation_time')
-        queryset = PressureCenter.objects.filter(level=level)
+        queryset = current_rows(PressureCenter.objects.filter(level=level))
         if observation_time:
             try:
                 observation_time = datetime.fromisoformat(observation_time.replace('Z', '+00:00'))
@@ -320,18 +508,21 @@ class PressureCenterViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.error(f"Invalid observation_time format: {observation_time}, {e}")
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
         return queryset
-class UpperAirPressureCenterViewSet(viewsets.ReadOnlyModelViewSet):
+class UpperAirPressureCenterViewSet(ConditionalGetMixin, AnalysisOnDemandMixin, SqlGeoJSONMixin, viewsets.ReadOnlyModelViewSet):
+    version_sources = (UPPERAIR_ANALYSIS,)
+    analysis_kind = 'upperair'
+    default_level = '200HPA'
     serializer_class = UpperAirPressureCenterSerializer
     filter_backends = [DjangoFilterBackend, InBBoxFilter]
     filterset_fields = ['level', 'observation_time', 'center_type']
     bbox_filter_field = 'location'
-    pagination_class = LimitOffsetPagination
+    pagination_class = ObservationKeysetPagination
 
     def get_queryset(self):
-        """Filter pressure centers and trigger generation if empty."""
+        """Filter pressure centers for a level and observation time."""
         level = self.request.query_params.get('level', '200HPA')
         observation_time_str = self.request.query_params.get('observation_time')
-        queryset = UpperAirPressureCenter.objects.filter(level=level)  # Changed to UpperAirPressureCenter
+        queryset = current_rows(UpperAirPressureCenter.objects.filter(level=level))  # Changed to UpperAirPressureCenter
 
         # Handle observation_time with timezone conversion
         observation_time = None
@@ -344,96 +535,52 @@ class UpperAirPressureCenterViewSet(viewsets.ReadOnlyModelViewSet):
                 logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
 
-        # Trigger contour generation if no pressure centers
-        if not queryset.exists() and self.request.method == 'GET':
-            try:
-                result = upper_air_generate_contours(level, observation_time_str)  # Pass string for compatibility
-                if result and isinstance(result, dict):
-                    logger.info(f"Generated pressure centers for level={level}, observation_time={observation_time_str}")
-                    queryset = UpperAirPressureCenter.objects.filter(level=level)  # Updated to reflect generated data
-                    if observation_time:
-                        queryset = queryset.filter(observation_time=observation_time)
-                else:
-                    logger.warning(f"Failed to generate pressure centers for level={level}, observation_time={observation_time_str}")
-            except Exception as e:
-                logger.error(f"Error generating pressure centers: {e}", exc_info=True)
-                raise serializers.ValidationError({"detail": f"Failed to generate contours: {str(e)}"})
-
         return queryset
 
 class ExportMapView(APIView):
+    """
+    Render a map of the published analysis server-side: POST {map_type
+    (PNG/SVG/PDF), level, observation_time, style, extent, size}. An identical
+    earlier render is returned at once (200); otherwise a render job is
+    enqueued (202) whose result names the stored export.
+    """
+
     def post(self, request):
-        map_type = request.data.get('map_type')
+        map_type = str(request.data.get('map_type', 'PNG')).upper()
         level = request.data.get('level', 'SURFACE')
-        observation_time = request.data.get('observation_time')
-        if map_type not in ['PNG', 'SVG']:
-            return Response({"error": "Invalid map type"}, status=400)
-        success = generate_contours(level, observation_time, map_type)
-        if success:
-            timestamp = observation_time or 'latest'
-            map_filename = f'map_{level}_{timestamp}.{map_type.lower()}'
-            map_url = os.path.join(settings.MEDIA_URL, 'exports', map_filename)
-            return Response({"message": "Map export started", "map_url": map_url})
-        return Response({"error": "Map export failed"}, status=500)
-class ObservationTimesView(APIView):
-    # Temporarily disabled cache to force refresh
-    # @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
-    def get(self, request):
-        """Return distinct observation times for a level (last 7 days)."""
-        level = request.query_params.get('level', 'SURFACE')
+        kind = 'surface' if level == 'SURFACE' else 'upperair'
+        observation_time_str = request.data.get('observation_time')
+        if not observation_time_str:
+            return Response({"error": "observation_time is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if map_type not in RENDER_FORMATS:
+            return Response({"error": f"map_type must be one of {', '.join(RENDER_FORMATS)}"}, status=status.HTTP_400_BAD_REQUEST)
         try:
-            # Calculate the date range: last 7 days to ensure we get data
-            from datetime import timedelta
-            now = datetime.now(timezone.utc)
-            seven_days_ago = now - timedelta(days=7)
-            
-            logger.info(f"Fetching observation times for level={level}, from {seven_days_ago} to {now}")
-            
-            observation_times = (
-                SynopReport.objects.filter(
-                    level=level,
-                    observation_time__gte=seven_days_ago
-                )
-                .values('observation_time')
-                .distinct()
-                .order_by('-observation_time')
-            )
-            
-            logger.info(f"Found {observation_times.count()} observation times for level={level}")
-            times = [t['observation_time'].isoformat() + 'Z' for t in observation_times]
-            return Response(times)
-        except Exception as e:
-            logger.error(f"Error fetching observation times for level={level}: {e}", exc_info=True)
-            return Response(
-                {"error": f"Failed to fetch observation times: {str(e)}"},
-                status=status.HTTP_500_INTERNAL_SERVER_ERROR
-            )
-class UpperAirObservationTimesView(APIView):
-    # Temporarily disabled cache to force refresh
-    # @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
+            observation_time = parse_observation_time(observation_time_str)
+            style = parse_style(request.data.get('style'))
+            extent = parse_extent(kind, request.data.get('extent'))
+            size = parse_size(request.data.get('size'))
+        except RenderError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+
+        run = current_run(kind, level, observation_time)
+        export = cached_render(run, map_type, style, extent, size) if run else None
+        if export is not None:
+            return Response(ExportedMapSerializer(export).data)
+        try:
+            job = enqueue_render(kind, level, observation_time.isoformat(), map_type, style, list(extent), list(size))
+        except admission.Saturated as e:
+            return saturated_response(e)
+        return job_accepted_response(request, job)
+class ObservationTimesView(APIView):
+    """Return observation times with reports for a level (last 7 days), from the catalogue."""
+    source = SURFACE
+    default_level = 'SURFACE'
+
     def get(self, request):
-        """Return distinct observation times for a level (last 30 days including today)."""
-        level = request.query_params.get('level', '200HPA')
+        level = request.query_params.get('level', self.default_level)
         try:
-            # Calculate the date range: last 30 days (1 month) to ensure we get upper air data
-            from datetime import timedelta
-            now = datetime.now(timezone.utc)  # Use timezone-aware datetime
-            thirty_days_ago = now - timedelta(days=30)
-            
-            logger.info(f"Fetching upper air observation times for level={level}, from {thirty_days_ago} to {now}")
-            
-            observation_times = (
-                UpperAirSynopReport.objects.filter(
-                    level=level,
-                    observation_time__gte=thirty_days_ago
-                )
-                .values('observation_time')
-                .distinct()
-                .order_by('-observation_time')
-            )
-            
-            logger.info(f"Found {observation_times.count()} observation times for level={level}")
-            times = [t['observation_time'].isoformat() + 'Z' for t in observation_times]
+            times = [t.isoformat() + 'Z' for t in observation_times(self.source, level)]
+            logger.debug(f"Returning {len(times)} {self.source} observation times for level={level}")
             return Response(times)
         except Exception as e:
             logger.error(f"Error fetching observation times for level={level}: {e}", exc_info=True)
@@ -441,29 +588,22 @@ class UpperAirObservationTimesView(APIView):
                 {"error": f"Failed to fetch observation times: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
+class UpperAirObservationTimesView(ObservationTimesView):
+    """Return upper-air observation times for a level (last 30 days), from the catalogue."""
+    source = UPPERAIR
+    default_level = '200HPA'
 class AvailableLevelsView(APIView):
-    """Return available pressure levels from both surface and upper air reports."""
+    """Return available pressure levels of upper-air reports, from the catalogue."""
 
-    @method_decorator(cache_page(60 * 15))  # Cache for 15 minutes
     def get(self, request):
         try:
-            # Upper-air levels
-            upper_levels = UpperAirSynopReport.objects.values('level').annotate(count=Count('id'))
-            logger.info(f"Upper air levels fetched: {list(upper_levels)}")
-
-            # Combine both sources
-            combined_levels = {}
-            for entry in upper_levels:
-                combined_levels[entry['level']] = combined_levels.get(entry['level'], 0) + entry['count']
+            levels = list(available_levels(UPPERAIR))
 
-            # Prepare response
-            levels = [{'level': level, 'count': count} for level, count in combined_levels.items()]
-            
             # Sort levels in a logical order (200, 500, 700, 850, etc.)
             level_order = {'200HPA': 1, '500HPA': 2, '700HPA': 3, '850HPA': 4}
             levels.sort(key=lambda x: level_order.get(x['level'], 999))
 
-            logger.info(f"Returning {len(levels)} pressure levels")
+            logger.debug(f"Returning {len(levels)} pressure levels")
             return Response(levels)
         except Exception as e:
             logger.error(f"Error fetching available levels: {e}", exc_info=True)
@@ -471,18 +611,368 @@ class AvailableLevelsView(APIView):
                 {"error": f"Failed to fetch levels: {str(e)}"},
                 status=status.HTTP_500_INTERNAL_SERVER_ERROR
             )
-class GridDataViewSet(viewsets.ReadOnlyModelViewSet):
-    serializer_class = GridDataSerializer
-    filter_backends = [DjangoFilterBackend, InBBoxFilter]
-    filterset_fields = ['level', 'observation_time']
-    bbox_filter_field = 'geometry'
-    pagination_class = LimitOffsetPagination
+class AnalysisDomainsView(APIView):
+    """
+    List the analysis domains of a kind (?kind=surface|upperair): bounds,
+    resolution, parent and the zoom from which their contours are preferred.
+    Contour and grid endpoints take the name as ?domain=.
+    """
+
+    def get(self, request):
+        kind = request.query_params.get('kind', 'surface')
+        if kind not in ANALYSIS_KINDS:
+            return Response({"error": f"kind must be one of {', '.join(ANALYSIS_KINDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        domains = analysis_domains(kind)
+        return Response([
+            {
+                'name': domain['name'],
+                'primary': index == 0,
+                'parent': domain.get('parent'),
+                'bounds': [domain['min_lon'], domain['min_lat'], domain['max_lon'], domain['max_lat']],
+                'resolution': domain['resolution'],
+                'min_zoom': domain.get('min_zoom', 0),
+            }
+            for index, domain in enumerate(domains)
+        ])
+class AnalysisJobListView(APIView):
+    """Enqueue an analysis job: POST {kind, level, observation_time}."""
+
+    def post(self, request):
+        kind = request.data.get('kind', 'surface')
+        level = request.data.get('level', '200HPA' if kind == 'upperair' else 'SURFACE')
+        observation_time = request.data.get('observation_time')
+        if kind not in ANALYSIS_KINDS:
+            return Response({"error": f"kind must be one of {', '.join(ANALYSIS_KINDS)}"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            job = enqueue_analysis(kind, level, observation_time)
+        except admission.Saturated as e:
+            return saturated_response(e)
+        return job_accepted_response(request, job)
+class AnalysisJobDetailView(APIView):
+    """Report job status: queued, running (with stage/progress), done or failed."""
+
+    def get(self, request, job_id):
+        return Response(job_status(job_id))
+class AnalysisBundleView(APIView):
+    """
+    Return stations, reports, isobars, isotherms and pressure centres for one
+    map in a single document, served precompressed from the published run.
+    """
+    analysis_kind = 'surface'
+    default_level = 'SURFACE'
+
+    def get(self, request):
+        level = request.query_params.get('level', self.default_level)
+        observation_time_str = request.query_params.get('observation_time')
+        if not observation_time_str:
+            return Response({"error": "observation_time is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            observation_time = datetime.fromisoformat(observation_time_str.replace('Z', '+00:00'))
+        except ValueError as e:
+            logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
+            return Response({"observation_time": "Invalid ISO format"}, status=status.HTTP_400_BAD_REQUEST)
+        if observation_time.tzinfo is None:
+            observation_time = observation_time.replace(tzinfo=timezone.utc)
+
+        run = current_run(self.analysis_kind, level, observation_time)
+        if run is None:
+            try:
+                job = enqueue_analysis(self.analysis_kind, level, observation_time_str)
+            except admission.Saturated as e:
+                return saturated_response(e)
+            if job['status'] in ('queued', 'running'):
+                return job_accepted_response(request, job)
+            # The analysis finished without a result: serve stations and reports only
+            return Response(build_payload(self.analysis_kind, level, observation_time))
+
+        return bundle_response(request, current_bundle(run))
+class UpperAirAnalysisBundleView(AnalysisBundleView):
+    """Upper-air counterpart of AnalysisBundleView used by upperMain.js."""
+    analysis_kind = 'upperair'
+    default_level = '200HPA'
+class VectorTileView(APIView):
+    """
+    Serve a Mapbox Vector Tile for one layer: /tiles/{layer}/{z}/{x}/{y}.mvt
+    with ?level= and ?observation_time= for report and analysis layers.
+    """
+
+    def get(self, request, layer, z, x, y):
+        if layer not in TILE_LAYERS:
+            return Response({"error": f"Unknown tile layer: {layer}"}, status=status.HTTP_404_NOT_FOUND)
+        if not valid_tile(z, x, y):
+            return Response({"error": "Invalid tile coordinates"}, status=status.HTTP_400_BAD_REQUEST)
+        if connection.vendor != 'postgresql':
+            return Response({"error": "Vector tiles require PostGIS"}, status=status.HTTP_501_NOT_IMPLEMENTED)
+
+        config = TILE_LAYERS[layer]
+        level = request.query_params.get('level', '200HPA' if config['kind'] == 'upperair' else 'SURFACE')
+        observation_time = None
+        if config['source'] != 'stations':
+            observation_time_str = request.query_params.get('observation_time')
+            if not observation_time_str:
+                return Response({"error": "observation_time is required"}, status=status.HTTP_400_BAD_REQUEST)
+            try:
+                observation_time = datetime.fromisoformat(observation_time_str.replace('Z', '+00:00'))
+            except ValueError as e:
+                logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
+                return Response({"observation_time": "Invalid ISO format"}, status=status.HTTP_400_BAD_REQUEST)
+            if observation_time.tzinfo is None:
+                observation_time = observation_time.replace(tzinfo=timezone.utc)
+
+        tile, key = render_tile(layer, z, x, y, level, observation_time)
+        if tile is None:
+            return Response({"error": "No analysis published for this level and time"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"{hashlib.sha1(key.encode("utf-8")).hexdigest()}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(tile, content_type='application/vnd.mapbox-vector-tile')
+        response['ETag'] = etag
+        response['Cache-Control'] = 'no-cache'
+        return response
+class SampleView(APIView):
+    """
+    Sample the published analysis grids at points, bilinearly interpolated.
+    Each point is read from the finest domain covering it unless ``domain``
+    names one.
+
+    GET  /sample/?lon=&lat=&level=&time=&fields=&domain=
+    POST /sample/ {"level", "time", "fields", "domain", "points": [[lon, lat], ...]}
+    """
+    max_points = 10000
+
+    def _resolve(self, level, time_str, fields_str, domain):
+        """Return (run, fields, domain) or an error Response."""
+        if not time_str:
+            return Response({"error": "time is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            observation_time = datetime.fromisoformat(time_str.replace('Z', '+00:00'))
+        except ValueError:
+            return Response({"time": "Invalid ISO format"}, status=status.HTTP_400_BAD_REQUEST)
+        if observation_time.tzinfo is None:
+            observation_time = observation_time.replace(tzinfo=timezone.utc)
+        kind = 'surface' if level == 'SURFACE' else 'upperair'
+        fields = [f.strip() for f in fields_str.split(',') if f.strip()] if fields_str else list(GRID_FIELDS[kind])
+        unknown = [f for f in fields if f not in GRID_FIELDS[kind]]
+        if unknown:
+            return Response(
+                {"error": f"Unknown fields: {', '.join(unknown)}; choose from {', '.join(GRID_FIELDS[kind])}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        if domain:
+            try:
+                resolve_domain(kind, domain)
+            except DomainError as e:
+                return Response({"domain": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        run = current_run(kind, level, observation_time)
+        if run is None or not run_domains(run.pk) or (domain and domain not in run_domains(run.pk)):
+            return Response({"error": "No analysis grid published for this level and time"}, status=status.HTTP_404_NOT_FOUND)
+        return run, fields, domain
+
+    def get(self, request):
+        params = request.query_params
+        level = params.get('level', 'SURFACE')
+        resolved = self._resolve(
+            level, params.get('time') or params.get('observation_time'), params.get('fields'), params.get('domain')
+        )
+        if isinstance(resolved, Response):
+            return resolved
+        run, fields, domain = resolved
+        try:
+            lon, lat = float(params['lon']), float(params['lat'])
+        except (KeyError, ValueError):
+            return Response({"error": "lon and lat are required numbers"}, status=status.HTTP_400_BAD_REQUEST)
+        values = {}
+        for field in fields:
+            sampled, sources = sample_run(run.pk, field, lon, lat, domain)
+            value = float(sampled[0])
+            values[field] = None if math.isnan(value) else round(value, 2)
+        return Response({'run': run.pk, 'level': level, 'domain': sources[0], 'lon': lon, 'lat': lat, 'values': values})
+
+    def post(self, request):
+        level = request.data.get('level', 'SURFACE')
+        fields_str = request.data.get('fields')
+        if isinstance(fields_str, list):
+            fields_str = ','.join(fields_str)
+        resolved = self._resolve(
+            level, request.data.get('time') or request.data.get('observation_time'), fields_str, request.data.get('domain')
+        )
+        if isinstance(resolved, Response):
+            return resolved
+        run, fields, domain = resolved
+        try:
+            points = np.asarray(request.data.get('points') or [], dtype='f8').reshape(-1, 2)
+        except (TypeError, ValueError):
+            return Response({"error": "points must be a list of [lon, lat] pairs"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(points) > self.max_points:
+            return Response({"error": f"At most {self.max_points} points per request"}, status=status.HTTP_400_BAD_REQUEST)
+        values = {}
+        for field in fields:
+            sampled, sources = sample_run(run.pk, field, points[:, 0], points[:, 1], domain)
+            values[field] = [None if math.isnan(v) else v for v in np.round(sampled, 2).tolist()]
+        return Response({
+            'run': run.pk, 'level': level, 'count': len(points), 'domains': sources.tolist(), 'values': values,
+        })
+class StationSpritesView(APIView):
+    """
+    Index of the station-model sprite atlas of one observation time: sprite
+    cells of the PNG (Mapbox sprite format), and per station its coordinates
+    and the sprite name of each glyph type. Clients place image slices
+    instead of drawing every station model themselves.
+    """
+    kind = SURFACE
+    default_level = 'SURFACE'
+    image_url_name = 'station-sprites-image'
+
+    def sprites(self, request):
+        level = request.query_params.get('level', self.default_level)
+        observation_time_str = request.query_params.get('observation_time')
+        if not observation_time_str:
+            raise serializers.ValidationError({"observation_time": "observation_time is required"})
+        try:
+            observation_time = datetime.fromisoformat(observation_time_str.replace('Z', '+00:00'))
+        except ValueError as e:
+            logger.error(f"Invalid observation_time format: {observation_time_str}, {e}")
+            raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
+        if observation_time.tzinfo is None:
+            observation_time = observation_time.replace(tzinfo=timezone.utc)
+        return current_sprites(self.kind, level, observation_time)
+
+    def etag(self, sprites, part):
+        return f'"sprites-{sprites.pk}-{sprites.reports_version}-{part}"'
+
+    def get(self, request):
+        sprites = self.sprites(request)
+        etag = self.etag(sprites, 'index')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            query = urlencode({
+                'level': sprites.level,
+                'observation_time': sprites.observation_time.isoformat(),
+                'v': sprites.reports_version,
+            })
+            image_url = request.build_absolute_uri(f"{reverse(self.image_url_name)}?{query}")
+            response = Response(dict(sprites.index, image=image_url))
+        response['ETag'] = etag
+        return response
+class StationSpritesImageView(StationSpritesView):
+    """The PNG atlas itself; URLs carry the reports version, so they are immutable."""
+
+    def get(self, request):
+        sprites = self.sprites(request)
+        etag = self.etag(sprites, 'image')
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            response = HttpResponse(bytes(sprites.image), content_type='image/png')
+        response['ETag'] = etag
+        if request.query_params.get('v') == str(sprites.reports_version):
+            response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+class UpperAirStationSpritesView(StationSpritesView):
+    kind = UPPERAIR
+    default_level = '200HPA'
+    image_url_name = 'upperair-station-sprites-image'
+class UpperAirStationSpritesImageView(StationSpritesImageView):
+    kind = UPPERAIR
+    default_level = '200HPA'
+    image_url_name = 'upperair-station-sprites-image'
+class GridBinaryView(APIView):
+    """
+    Stream one field of a run's analysis grid as a binary array:
+    /grid/{run}/{field}.bin?encoding=float32|int16&domain=
+
+    The body is a uint32 header length, a JSON header and the little-endian
+    array (see analysis.grids.encode_field). Gzip/Brotli variants are
+    precompressed; single byte ranges are served from the identity variant.
+    URLs are keyed by run, so responses are immutable.
+    """
+    range_pattern = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+    def get(self, request, run_id, field):
+        encoding = request.query_params.get('encoding', 'float32')
+        if encoding not in BINARY_ENCODINGS:
+            return Response(
+                {"error": f"encoding must be one of {', '.join(BINARY_ENCODINGS)}"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        domains = run_domains(run_id)
+        domain = request.query_params.get('domain') or (domains[0] if domains else None)
+        variants = binary_variants(run_id, domain, field, encoding) if domain in domains else None
+        if variants is None:
+            return Response({"error": "No such grid field for this run"}, status=status.HTTP_404_NOT_FOUND)
+
+        etag = f'"grid-{run_id}-{domain}-{field}-{encoding}"'
+        response = get_conditional_response(request, etag=etag)
+        if response is not None:
+            response['ETag'] = etag
+            return response
+
+        range_header = request.headers.get('Range')
+        accept_encoding = request.headers.get('Accept-Encoding', '')
+        if range_header:
+            response = self._range_response(variants['identity'], range_header)
+        elif 'br' in variants and accepts_encoding(accept_encoding, 'br'):
+            response = FileResponse(open(variants['br'], 'rb'), content_type='application/octet-stream')
+            response['Content-Encoding'] = 'br'
+        elif accepts_encoding(accept_encoding, 'gzip'):
+            response = FileResponse(open(variants['gzip'], 'rb'), content_type='application/octet-stream')
+            response['Content-Encoding'] = 'gzip'
+        else:
+            response = FileResponse(open(variants['identity'], 'rb'), content_type='application/octet-stream')
+        response['ETag'] = etag
+        response['Accept-Ranges'] = 'bytes'
+        response['Vary'] = 'Accept-Encoding'
+        response['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
+
+    def _range_response(self, path, range_header):
+        """
+        Serve a single byte range of the identity file (206). Invalid or
+        unsupported Range headers are ignored and the whole file is served;
+        only a valid range that lies beyond the end of the file gets 416.
+        """
+        size = os.path.getsize(path)
+        match = self.range_pattern.match(range_header.strip())
+        first, last = match.groups() if match else (None, None)
+        if not (first or last) or (first and last and int(last) < int(first)):
+            return FileResponse(open(path, 'rb'), content_type='application/octet-stream')
+        if first:
+            start, end = int(first), min(int(last), size - 1) if last else size - 1
+        else:
+            start, end = max(size - int(last), 0), size - 1
+        if start >= size:
+            response = HttpResponse(status=416)
+            response['Content-Range'] = f"bytes */{size}"
+            return response
+        with open(path, 'rb') as f:
+            f.seek(start)
+            body = f.read(end - start + 1)
+        response = HttpResponse(body, status=206, content_type='application/octet-stream')
+        response['Content-Range'] = f"bytes {start}-{end}/{size}"
+        return response
+class AnalysisMetricsView(APIView):
+    """Expose analysis counters (fingerprint skips vs. recomputes, admissions) and the job queue."""
+
+    def get(self, request):
+        return Response({**metrics.snapshot(), 'admission': admission.status()})
+class AnalysisGridViewSet(AnalysisOnDemandMixin, viewsets.ReadOnlyModelViewSet):
+    """
+    Metadata of the analysis grids published for a level and time; values are
+    sampled through /sample/ or fetched as binary arrays.
+    """
+    serializer_class = AnalysisGridSerializer
+    filter_backends = [DjangoFilterBackend]
+    filterset_fields = ['level', 'observation_time', 'domain']
+    pagination_class = ObservationKeysetPagination
+
+    @property
+    def analysis_kind(self):
+        return 'surface' if self.request.query_params.get('level', 'SURFACE') == 'SURFACE' else 'upperair'
 
     def get_queryset(self):
-        """Filter grid data and optimize queries."""
+        """Grids of currently published runs, without their compressed payload."""
         level = self.request.query_params.get('level', 'SURFACE')
         observation_time = self.request.query_params.get('observation_time')
-        queryset = GridData.objects.filter(level=level)
+        queryset = current_rows(AnalysisGrid.objects.filter(level=level, run__kind=self.analysis_kind)).defer('payload', 'chunk_index')
         if observation_time:
             try:
                 observation_time = datetime.fromisoformat(observation_time.replace('Z', '+00:00'))
@@ -492,36 +982,13 @@ class GridDataViewSet(viewsets.ReadOnlyModelViewSet):
                 raise serializers.ValidationError({"observation_time": "Invalid ISO format"})
         return queryset
 
-    def list(self, request, *args, **kwargs):
-        """Log large responses and trigger generation if empty."""
-        queryset = self.filter_queryset(self.get_queryset())
-        if not queryset.exists() and request.method == 'GET':
-            level = request.query_params.get('level', 'SURFACE')
-            observation_time = request.query_params.get('observation_time')
-            try:
-                success = generate_contours(level, observation_time)
-                if success:
-                    queryset = self.filter_queryset(self.get_queryset())
-                    logger.info(f"Generated grid data for level={level}, observation_time={observation_time}")
-                else:
-                    logger.warning(f"Failed to generate grid data for level={level}, observation_time={observation_time}")
-            except Exception as e:
-                logger.error(f"Error generating grid data: {e}", exc_info=True)
-        
-        page = self.paginate_queryset(queryset)
-        if page is not None:
-            serializer = self.get_serializer(page, many=True)
-            return self.get_paginated_response(serializer.data)
-        
-        serializer = self.get_serializer(queryset, many=True)
-        data = serializer.data
-        if len(data) > 1000:
-            logger.info(f"Returning large GridData response with {len(data)} items")
-        return Response(data)
-
 
 class ExportFileView(APIView):
-    """Handle export file uploads (PDF, PNG, JPEG) and save them to the database."""
+    """
+    Handle export file uploads (PDF, PNG, JPEG) sent as base64 form fields and
+    save them to the database. Kept for older clients: ExportUploadView takes
+    the raw bytes and streams them to storage instead.
+    """
     parser_classes = [MultiPartParser, FormParser]
 
     def post(self, request):
@@ -629,7 +1096,8 @@ class ExportFileView(APIView):
                 file_path=export_file,
                 map_type=map_type,
                 level=level,
-                observation_time=observation_time
+                observation_time=observation_time,
+                content_hash=hashlib.sha256(file_bytes).hexdigest(),
             )
             logger.info(f"Successfully created ExportedMap with ID: {exported_map.id}")
             
@@ -645,6 +1113,103 @@ class ExportFileView(APIView):
             )
 
 
+class ExportUploadView(APIView):
+    """
+    Upload an export as the raw request body: POST with ?format= (or a
+    Content-Type of application/pdf, image/png or image/jpeg), ?level= and
+    ?observation_time=. The body is streamed to storage (analysis.uploads).
+    """
+
+    def post(self, request):
+        params = request.query_params
+        try:
+            map_type = parse_upload_format(params.get('format'), request.content_type)
+            observation_time = parse_upload_time(params.get('observation_time'))
+            length = request.META.get('CONTENT_LENGTH')
+            export = store_upload(
+                request.stream, map_type, params.get('level', 'SURFACE'), observation_time,
+                length=int(length) if length else None,
+            )
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+        return Response(ExportedMapSerializer(export).data, status=status.HTTP_201_CREATED)
+
+
+def upload_session_payload(request, upload):
+    return {
+        'upload_id': str(upload.pk),
+        'url': request.build_absolute_uri(reverse('export-upload-detail', args=[upload.pk])),
+        'offset': upload.received,
+        'size': upload.size,
+        'complete': upload.export_id is not None,
+        'export': ExportedMapSerializer(upload.export).data if upload.export_id else None,
+    }
+
+
+class ExportUploadSessionListView(APIView):
+    """
+    Start a resumable upload for a large export: POST {format, size, level,
+    observation_time}. The returned url takes the bytes as PATCH chunks.
+    """
+
+    def post(self, request):
+        try:
+            map_type = parse_upload_format(request.data.get('format'))
+            size = parse_upload_size(request.data.get('size'))
+            observation_time = parse_upload_time(request.data.get('observation_time'))
+        except UploadError as e:
+            return Response({"error": str(e)}, status=e.status)
+        upload = start_upload(map_type, request.data.get('level', 'SURFACE'), observation_time, size)
+        response = Response(upload_session_payload(request, upload), status=status.HTTP_201_CREATED)
+        response['Location'] = response.data['url']
+        return response
+
+
+class ExportUploadSessionView(APIView):
+    """
+    One resumable upload. GET reports the stored offset; PATCH appends the raw
+    body at the Upload-Offset header (409 with the expected offset if it does
+    not match) and publishes the export with the last chunk; DELETE aborts.
+    """
+
+    def get_upload(self, upload_id):
+        try:
+            return ExportUpload.objects.select_related('export').get(pk=upload_id)
+        except ExportUpload.DoesNotExist:
+            raise Http404("Upload not found")
+
+    def get(self, request, upload_id):
+        upload = self.get_upload(upload_id)
+        response = Response(upload_session_payload(request, upload))
+        response['Upload-Offset'] = str(upload.received)
+        return response
+
+    def patch(self, request, upload_id):
+        try:
+            offset = int(request.headers.get('Upload-Offset', ''))
+        except ValueError:
+            return Response({"error": "Upload-Offset header is required"}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            upload = append_chunk(upload_id, offset, request.stream)
+        except ExportUpload.DoesNotExist:
+            raise Http404("Upload not found")
+        except UploadError as e:
+            body = {"error": str(e)}
+            if e.status == status.HTTP_409_CONFLICT:
+                body['offset'] = self.get_upload(upload_id).received
+            return Response(body, status=e.status)
+        response = Response(
+            upload_session_payload(request, upload),
+            status=status.HTTP_201_CREATED if upload.export_id else status.HTTP_200_OK,
+        )
+        response['Upload-Offset'] = str(upload.received)
+        return response
+
+    def delete(self, request, upload_id):
+        abort_upload(self.get_upload(upload_id))
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+
 class ExportListView(APIView):
     """List all saved exports (PDF, PNG, JPEG)."""
     
@@ -673,6 +1238,11 @@ class ExportListView(APIView):
                 except ValueError:
                     pass  # Ignore invalid time format
             
+            paginator = ExportKeysetPagination()
+            page = paginator.paginate_queryset(exports, request, view=self)
+            if page is not None:
+                return paginator.get_paginated_response(ExportedMapSerializer(page, many=True).data)
+
             serializer = ExportedMapSerializer(exports, many=True)
             return Response(serializer.data)
             
@@ -731,6 +1301,7 @@ class ExportDownloadView(APIView):
             content_type_map = {
                 'PDF': 'application/pdf',
                 'PNG': 'image/png',
+                'SVG': 'image/svg+xml',
                 'JPEG': 'image/jpeg'
             }
             content_type = content_type_map.get(export.map_type, 'application/octet-stream')
@@ -0,0 +1,84 @@
+import csv
+import hashlib
+import logging
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import Case, Q, Value, When
+
+from .models import AnalysisBundle, UpperAirWeatherStation, WeatherStation
+from .versions import SURFACE_REPORTS, UPPERAIR_REPORTS, bump_source
+
+logger = logging.getLogger(__name__)
+
+# Station model -> report version source whose responses depend on its visibility
+STATION_MODELS = {WeatherStation: SURFACE_REPORTS, UpperAirWeatherStation: UPPERAIR_REPORTS}
+
+POLICY_CACHE_KEY = 'station-visibility:fingerprint'
+
+
+def _policy_station_ids(path):
+    if not path:
+        return set()
+    try:
+        with open(path, newline='', encoding='utf-8') as csvfile:
+            return {row['station_id'].strip() for row in csv.DictReader(csvfile) if row.get('station_id')}
+    except FileNotFoundError:
+        logger.error(f"Station policy CSV not found: {path}")
+        return set()
+
+
+def load_policy():
+    """
+    Return the visibility policy as a dict of free countries, restricted
+    countries, allowed station ids and a fingerprint of all three.
+    """
+    free = sorted(set(getattr(settings, 'STATION_FREE_COUNTRIES', [])))
+    restricted = sorted(set(getattr(settings, 'STATION_RESTRICTED_COUNTRIES', [])))
+    station_ids = sorted(_policy_station_ids(getattr(settings, 'STATION_POLICY_CSV', '')))
+    digest = hashlib.sha1('|'.join([','.join(free), ','.join(restricted), ','.join(station_ids)]).encode('utf-8'))
+    return {'free': free, 'restricted': restricted, 'station_ids': station_ids, 'fingerprint': digest.hexdigest()}
+
+
+def visible_condition(policy):
+    """Q for stations whose reports are published under ``policy``."""
+    allowed = Q(country__in=policy['restricted'], station_id__in=policy['station_ids'])
+    if policy['free']:
+        return Q(country__in=policy['free']) | allowed
+    return ~Q(country__in=policy['restricted']) | allowed
+
+
+def apply_visibility(policy=None, models=None):
+    """
+    Recompute ``is_visible`` for every station in one UPDATE per model.
+
+    Cached report responses, ETags and stored bundles of a model are
+    invalidated only if some station actually changed.
+    """
+    policy = policy or load_policy()
+    condition = visible_condition(policy)
+    changed = {}
+    with transaction.atomic():
+        for model in models or STATION_MODELS:
+            target = Case(When(condition, then=Value(True)), default=Value(False))
+            stale = model.objects.exclude(is_visible=target)
+            count = stale.count()
+            if count:
+                model.objects.update(is_visible=target)
+                bump_source(STATION_MODELS[model])
+            changed[model.__name__] = count
+        if any(changed.values()):
+            # Bundles embed reports; they are rebuilt on the next request
+            AnalysisBundle.objects.all().delete()
+    cache.set(POLICY_CACHE_KEY, policy['fingerprint'], timeout=None)
+    logger.info(f"Applied station visibility policy {policy['fingerprint'][:12]}: {changed} stations changed")
+    return changed
+
+
+def refresh_visibility():
+    """Recompute visibility only if the policy (settings or CSV) changed since the last run."""
+    policy = load_policy()
+    if cache.get(POLICY_CACHE_KEY) == policy['fingerprint']:
+        return {}
+    return apply_visibility(policy)
@@ -223,19 +223,8 @@ function exportMap(map, format, filename, selection) {
           const imgData = finalCanvas.toDataURL('image/png', 1.0);
           pdf.addImage(imgData, 'PNG', 0, 0, finalCanvas.width, finalCanvas.height);
 
-          // ✅ FIX: Generate proper base64 PDF for backend
-          const arrayBuffer = pdf.output('arraybuffer');
-          const base64Data = btoa(
-            new Uint8Array(arrayBuffer)
-              .reduce((data, byte) => data + String.fromCharCode(byte), '')
-          );
-          const pdfData = `data:application/pdf;base64,${base64Data}`;
-
-          console.log('Fixed PDF data URI length:', pdfData.length);
-          console.log('Starts with:', pdfData.substring(0, 50));
-
-          // Save to database
-          saveExportToDatabaseDirect(pdfData, filename, 'PDF', normalizedSelection?.extent || null)
+          // Save to database: the PDF bytes are uploaded as-is (no base64)
+          saveExportBlobToDatabase(pdf.output('blob'), 'PDF')
             .then(() => showWarning('PDF saved to database successfully.', false))
             .catch((error) => {
               console.error('Failed to save PDF to database:', error);
@@ -252,7 +241,8 @@ function exportMap(map, format, filename, selection) {
           const quality = format === 'jpeg' ? 0.9 : 1.0;
           const dataUrl = finalCanvas.toDataURL(mimeType, quality);
 
-          saveExportToDatabaseDirect(dataUrl, filename, format.toUpperCase(), normalizedSelection?.extent || null)
+          canvasToBlob(finalCanvas, mimeType, quality)
+            .then((blob) => saveExportBlobToDatabase(blob, format.toUpperCase()))
             .then(() => showWarning(`${format.toUpperCase()} saved to database successfully.`, false))
             .catch((error) => {
               console.error(`Failed to save ${format} to database:`, error);
@@ -617,9 +607,109 @@ async function saveExportToDatabaseDirect(fileDataUri, filename, format, extent
   }
 }
 
+// Exports larger than this go up as a resumable upload in chunks of this size
+const EXPORT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024;
+const EXPORT_UPLOAD_RETRIES = 3;
+
+function canvasToBlob(canvas, mimeType, quality) {
+  return new Promise((resolve, reject) => {
+    canvas.toBlob((blob) => (blob ? resolve(blob) : reject(new Error('Canvas could not be encoded'))), mimeType, quality);
+  });
+}
+
+function exportUploadContext() {
+  const observationTimeElement = document.getElementById('observation-time');
+  const observationTime = observationTimeElement ? observationTimeElement.value : null;
+  const isUpperAirDashboard = document.getElementById('upper-export-drawer') !== null;
+  return { level: isUpperAirDashboard ? 'UPPERAIRMAP' : 'SURFACE', observationTime };
+}
+
+async function exportUploadError(response, format) {
+  let errorData;
+  try {
+    errorData = await response.json();
+  } catch (e) {
+    errorData = { error: `HTTP ${response.status}` };
+  }
+  return new Error(errorData.error || `Failed to save ${format}`);
+}
+
+/**
+ * Save an export blob to the database as raw bytes. Small files are sent in
+ * one request (api/export-upload/); large ones as a resumable upload
+ * (api/export-uploads/) whose chunks are retried from the stored offset.
+ * @param {Blob} blob - The exported file
+ * @param {string} format - The file format (PDF, PNG, JPEG)
+ */
+async function saveExportBlobToDatabase(blob, format) {
+  const { level, observationTime } = exportUploadContext();
+  const params = new URLSearchParams({ format, level });
+  if (observationTime) {
+    params.append('observation_time', observationTime);
+  }
+
+  if (blob.size <= EXPORT_UPLOAD_CHUNK_SIZE) {
+    const response = await fetch(apiUrl(`api/export-upload/?${params}`), { method: 'POST', body: blob });
+    if (!response.ok) {
+      throw await exportUploadError(response, format);
+    }
+    return response.json();
+  }
+
+  const start = await fetch(apiUrl('api/export-uploads/'), {
+    method: 'POST',
+    headers: { 'Content-Type': 'application/json' },
+    body: JSON.stringify({ format, level, observation_time: observationTime, size: blob.size }),
+  });
+  if (!start.ok) {
+    throw await exportUploadError(start, format);
+  }
+  const upload = await start.json();
+  const uploadUrl = apiUrl(`api/export-uploads/${upload.upload_id}/`);
+  let offset = 0;
+  let failures = 0;
+  while (true) {
+    let response;
+    try {
+      response = await fetch(uploadUrl, {
+        method: 'PATCH',
+        headers: { 'Upload-Offset': String(offset), 'Content-Type': 'application/octet-stream' },
+        body: blob.slice(offset, offset + EXPORT_UPLOAD_CHUNK_SIZE),
+      });
+    } catch (error) {
+      response = null;
+    }
+    if (response && response.ok) {
+      const state = await response.json();
+      if (state.complete) {
+        console.log(`${format} saved to database:`, state.export);
+        return state.export;
+      }
+      failures = 0;
+      offset = state.offset;
+      continue;
+    }
+    if (response && response.status < 500 && response.status !== 409) {
+      throw await exportUploadError(response, format);
+    }
+    if (++failures > EXPORT_UPLOAD_RETRIES) {
+      throw new Error(`Failed to save ${format}: upload interrupted`);
+    }
+    // Resume from whatever the server stored before the failure (or offset conflict)
+    const status = await fetch(uploadUrl);
+    if (status.ok) {
+      const state = await status.json();
+      if (state.complete) {
+        return state.export;
+      }
+      offset = state.offset;
+    }
+  }
+}
+
 // Keep backward compatibility function
 async function savePDFToDatabaseDirect(pdfDataUri, filename, extent = null) {
   return saveExportToDatabaseDirect(pdfDataUri, filename, 'PDF', extent);
 }
 
-export { exportMap, copyMapToClipboard, savePDFToDatabase, savePDFToDatabaseDirect, saveExportToDatabaseDirect };
+export { exportMap, copyMapToClipboard, savePDFToDatabase, savePDFToDatabaseDirect, saveExportToDatabaseDirect, saveExportBlobToDatabase };
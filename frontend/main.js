@@ -18,9 +18,9 @@ import {
   COUNTRY_WMS
 } from './layers.js';
 import { addStationsToMap } from './stations.js';
-import { synopObservation } from './synop.js';
+import { synopObservation, synopSpriteObservation } from './synop.js';
 import { createPopup, setupToolbarInteractions } from './interactions.js';
-import { showSpinner, hideSpinner, showWarning, hideWarning, fetchWithRetry, debounce, getWeatherIcon, getCountryFlag, getPressureTrendClass, getPressureTrendSymbol } from './utils.js';
+import { showSpinner, hideSpinner, showWarning, hideWarning, fetchWithRetry, fetchAnalysis, debounce, getWeatherIcon, getCountryFlag, getPressureTrendClass, getPressureTrendSymbol } from './utils.js';
 import Modify from 'ol/interaction/Modify.js';
 import Select from 'ol/interaction/Select.js';
 import { defaults as defaultInteractions } from 'ol/interaction/defaults.js';
@@ -350,10 +350,13 @@ async function refreshLayers(observationTime) {
       console.warn('Failed to clear edit features or interactions:', err);
     }
 
-    // Normalize apiBaseUrl
-  // Fetch and add stations
-  const stationsResponse = await fetchWithRetry(apiUrl('api/weather-stations/?limit=1000'));
-    const stationData = await stationsResponse.json();
+    // Fetch every layer for this map in one precompressed document
+  const bundleUrl = apiUrl(`api/analysis-bundle/?level=SURFACE&observation_time=${encodeURIComponent(observationTime)}`);
+    const bundleResponse = await fetchAnalysis(bundleUrl);
+    const bundle = await bundleResponse.json();
+
+    // Add stations
+    const stationData = bundle.stations;
     // Ensure we have an array for stations
     let stations = [];
     if (Array.isArray(stationData)) {
@@ -372,10 +375,8 @@ async function refreshLayers(observationTime) {
       showWarning('No weather stations available.');
     }
 
-    // Fetch and add SYNOP reports
-  const reportUrl = apiUrl(`api/reports/?level=SURFACE&observation_time=${encodeURIComponent(observationTime)}&limit=1000`);
-    const reportsResponse = await fetchWithRetry(reportUrl);
-    const reportData = await reportsResponse.json();
+    // Add SYNOP reports
+    const reportData = bundle.reports;
     // Ensure we have an array to work with
     let reportArray = [];
     if (Array.isArray(reportData)) {
@@ -419,7 +420,15 @@ async function refreshLayers(observationTime) {
       };
     });
     if (weatherReports.length > 0) {
-      synopObservation(weatherReports);
+      try {
+        // Server-drawn station models; fall back to drawing them here
+        const spritesResponse = await fetch(apiUrl(`api/station-sprites/?level=SURFACE&observation_time=${encodeURIComponent(observationTime)}`));
+        if (!spritesResponse.ok) throw new Error(`HTTP ${spritesResponse.status}`);
+        synopSpriteObservation(await spritesResponse.json());
+      } catch (err) {
+        console.warn('Station sprites unavailable, drawing station models in the browser:', err);
+        synopObservation(weatherReports);
+      }
     } else {
       showWarning('No weather reports available for the selected time.');
     }
@@ -442,12 +451,8 @@ async function refreshLayers(observationTime) {
       });
     };
 
-    // Fetch and add isobars
-  const isobarUrl = apiUrl(`api/isobars/?level=SURFACE&observation_time=${encodeURIComponent(observationTime)}`);
-    console.log(`Fetching isobars from: ${isobarUrl}`);
-
-    const isobarResponse = await fetchWithRetry(isobarUrl);
-    const isobarData = await isobarResponse.json();
+    // Add isobars
+    const isobarData = bundle.isobars;
     console.log('Isobar data received:', isobarData); // Debug the response
 
     if (isobarData.features?.length > 0) {
@@ -472,10 +477,8 @@ async function refreshLayers(observationTime) {
     }
 
 
-     // Fetch and add isotherms
-  const isothermUrl = apiUrl(`api/isotherms/?level=SURFACE&observation_time=${encodeURIComponent(observationTime)}`);
-    const isothermResponse = await fetchWithRetry(isothermUrl);
-    const isothermData = await isothermResponse.json();
+     // Add isotherms
+    const isothermData = bundle.isotherms;
     if (isothermData.features?.length > 0) {
       const isothermFeatures = new GeoJSON().readFeatures(isothermData, {
         featureProjection: 'EPSG:3857'
@@ -498,10 +501,8 @@ async function refreshLayers(observationTime) {
       showWarning('No isotherms available for the selected time.');
     }
 
-    // Fetch and add pressure centers
-  const pressureUrl = apiUrl(`api/pressure-centers/?level=SURFACE&observation_time=${encodeURIComponent(observationTime)}`);
-    const pressureResponse = await fetchWithRetry(pressureUrl);
-    const pressureData = await pressureResponse.json();
+    // Add pressure centers
+    const pressureData = bundle.pressure_centers;
     if (pressureData.features?.length > 0) {
       const pressureFeatures = new GeoJSON().readFeatures(pressureData, {
         featureProjection: 'EPSG:3857'
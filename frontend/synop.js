@@ -441,4 +441,58 @@ export function synopObservation(data) {
     });
     temperatureLayers.getLayers().push(layer);
   });
-}
\ No newline at end of file
+}
+
+const SPRITE_LAYER_TITLES = {
+  station: 'Station Circle',
+  wind: 'Wind Barbs',
+  cloud: 'Cloud Cover',
+  temperature: 'Temperature',
+  dewpoint: 'Dew Point',
+  pressure: 'Pressure',
+  pressure_change: 'Pressure Change',
+  visibility: 'Visibility',
+  station_id: 'Station ID',
+  cloud_low_type: 'Low Cloud Type',
+  cloud_mid_type: 'Mid Cloud Type',
+  cloud_high_type: 'High Cloud Type'
+};
+
+// Station models from the server-drawn sprite atlas (api/station-sprites/):
+// each glyph is a slice of one shared image, so nothing is rasterized here.
+export function synopSpriteObservation(index, layerGroup = temperatureLayers, titles = SPRITE_LAYER_TITLES) {
+  const iconCache = {};
+  const icon = (name) => {
+    if (!iconCache[name]) {
+      const sprite = index.sprites[name];
+      iconCache[name] = new Style({
+        image: new Icon({
+          src: index.image,
+          offset: [sprite.x, sprite.y],
+          size: [sprite.width, sprite.height],
+          anchor: index.anchor
+        })
+      });
+    }
+    return iconCache[name];
+  };
+
+  const features = index.stations.map(station => new Feature({
+    geometry: new Point(fromLonLat(station.coordinates)),
+    glyphs: station.glyphs,
+    stationId: station.station_id
+  }));
+
+  index.types.forEach(type => {
+    const layer = new VectorLayer({
+      title: titles[type] || type,
+      source: new VectorSource({ features }),
+      visible: type === 'station',
+      style: (feature) => {
+        const name = feature.get('glyphs')[type];
+        return name ? icon(name) : null;
+      }
+    });
+    layerGroup.getLayers().push(layer);
+  });
+}
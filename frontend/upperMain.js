@@ -23,7 +23,7 @@ import { createPopup, setupToolbarInteractions } from './interactions.js';
 import { clearMeasureInteractions } from './measureInteractions.js';
 import { editSource, editLayer } from './interactionLayers.js';
 import { clearEditInteractions, addIsobarModifyInteraction, removeIsobarModifyInteraction, registerEraserSources, clearEraserSources } from './editInteractions.js';
-import { showSpinner, hideSpinner, showWarning, hideWarning, fetchWithRetry, debounce, getWeatherIcon, getCountryFlag, getPressureTrendClass, getPressureTrendSymbol } from './utils.js';
+import { showSpinner, hideSpinner, showWarning, hideWarning, fetchWithRetry, fetchAnalysis, debounce, getWeatherIcon, getCountryFlag, getPressureTrendClass, getPressureTrendSymbol } from './utils.js';
 import Modify from 'ol/interaction/Modify.js';
 import Select from 'ol/interaction/Select.js';
 import { defaults as defaultInteractions } from 'ol/interaction/defaults.js';
@@ -437,10 +437,13 @@ async function refreshLayers(observationTime, level = '850HPA') {
       console.warn('Failed to clear edit features or interactions:', err);
     }
 
-    // Normalize apiBaseUrl
-  // Always fetch upper-air stations
-  const stationsResponse = await fetchWithRetry(apiUrl('api/upperair-stations/'));
-    const stationData = await stationsResponse.json();
+    // Fetch every layer for this level and time in one precompressed document
+  const bundleUrl = apiUrl(`api/upperair-analysis-bundle/?level=${encodeURIComponent(level)}&observation_time=${encodeURIComponent(observationTime)}`);
+    const bundleResponse = await fetchAnalysis(bundleUrl);
+    const bundle = await bundleResponse.json();
+
+    // Add upper-air stations
+    const stationData = bundle.stations;
     const stations = Array.isArray(stationData) ? stationData : (stationData.features || []);
     if (stations.length > 0) {
       addStationsToMap(stations);
@@ -448,11 +451,8 @@ async function refreshLayers(observationTime, level = '850HPA') {
       showWarning('No upper-air weather stations available.');
     }
 
-    // Always fetch upper-air reports
-  const reportUrl = apiUrl(`api/upperair-reports/?level=${encodeURIComponent(level)}&observation_time=${encodeURIComponent(observationTime)}`);
-    console.log(`Fetching reports from: ${reportUrl}`);
-    const reportsResponse = await fetchWithRetry(reportUrl);
-    const reportData = await reportsResponse.json();
+    // Add upper-air reports
+    const reportData = bundle.reports;
 
     weatherReports = (Array.isArray(reportData) ? reportData : (reportData.features || [])).map(report => {
       let geometry = report.geometry;
@@ -504,12 +504,8 @@ async function refreshLayers(observationTime, level = '850HPA') {
       });
     };
 
-    // Fetch and add isobars
-  const isobarUrl = apiUrl(`api/upperair-isobars/?level=${encodeURIComponent(level)}&observation_time=${encodeURIComponent(observationTime)}`);
-    console.log(`Fetching isobars from: ${isobarUrl}`);
-
-    const isobarResponse = await fetchWithRetry(isobarUrl);
-    const isobarData = await isobarResponse.json();
+    // Add isobars
+    const isobarData = bundle.isobars;
     console.log('Isobar data received:', isobarData); // Debug the response
 
     if (isobarData.features?.length > 0) {
@@ -534,10 +530,8 @@ async function refreshLayers(observationTime, level = '850HPA') {
     }
 
 
-     // Fetch and add isotherms
-  const isothermUrl = apiUrl(`api/upperair-isotherms/?level=${encodeURIComponent(level)}&observation_time=${encodeURIComponent(observationTime)}`);
-    const isothermResponse = await fetchWithRetry(isothermUrl);
-    const isothermData = await isothermResponse.json();
+     // Add isotherms
+    const isothermData = bundle.isotherms;
     if (isothermData.features?.length > 0) {
       const isothermFeatures = new GeoJSON().readFeatures(isothermData, {
         featureProjection: 'EPSG:3857'
@@ -62,6 +62,30 @@ export async function fetchWithRetry(url, retries = 3, delay = 1000) {
   }
 }
 
+/**
+ * Fetches an analysis endpoint. If the server answers 202 with a job handle
+ * (analysis still being computed), polls the job's status_url until it is
+ * done and then repeats the original request.
+ */
+export async function fetchAnalysis(url, { pollInterval = 1500, timeout = 120000 } = {}) {
+  const deadline = Date.now() + timeout;
+  let response = await fetchWithRetry(url);
+  while (response.status === 202) {
+    const job = await response.json();
+    let status = job;
+    while (status.status === 'queued' || status.status === 'running') {
+      if (Date.now() > deadline) throw new Error(`Analysis job ${job.job_id} timed out`);
+      await new Promise(resolve => setTimeout(resolve, pollInterval));
+      const statusResponse = await fetchWithRetry(job.status_url);
+      status = await statusResponse.json();
+    }
+    if (status.status === 'failed') throw new Error(`Analysis job ${job.job_id} failed: ${status.error || ''}`);
+    response = await fetchWithRetry(url);
+    if (response.status === 202 && Date.now() > deadline) throw new Error(`Analysis for ${url} timed out`);
+  }
+  return response;
+}
+
 export function debounce(func, wait) {
   let timeout;
   return function (...args) {
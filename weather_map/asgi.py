@@ -2,6 +2,10 @@
 ASGI config for weather_map project.
 
 It exposes the ASGI callable as a module-level variable named ``application``.
+Under ASGI the hot read endpoints are served by async views
+(weather_map.asgi_urls); run it with e.g.
+
+    gunicorn -k uvicorn.workers.UvicornWorker --workers 3 weather_map.asgi:application
 
 For more information on this file, see
 https://docs.djangoproject.com/en/5.1/howto/deployment/asgi/
@@ -12,5 +16,6 @@ import os
 from django.core.asgi import get_asgi_application
 
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'weather_map.settings')
+os.environ.setdefault('ROOT_URLCONF', 'weather_map.asgi_urls')
 
 application = get_asgi_application()
@@ -0,0 +1,22 @@
+"""
+URLconf of the ASGI deployment (weather_map.asgi): the hot read endpoints
+resolve to their async variants (analysis.async_views); every other URL is
+served by the regular URLconf.
+"""
+from django.urls import path
+
+from analysis.async_views import (
+    AsyncAnalysisBundleView, AsyncAvailableLevelsView, AsyncGeoServerProxy, AsyncObservationTimesView,
+    AsyncSampleView, AsyncUpperAirAnalysisBundleView, AsyncUpperAirObservationTimesView,
+)
+from weather_map.urls import urlpatterns as wsgi_urlpatterns
+
+urlpatterns = [
+    path('api/observation-times/', AsyncObservationTimesView.as_view()),
+    path('api/upperair-observation-times/', AsyncUpperAirObservationTimesView.as_view()),
+    path('api/available-levels/', AsyncAvailableLevelsView.as_view()),
+    path('api/analysis-bundle/', AsyncAnalysisBundleView.as_view()),
+    path('api/upperair-analysis-bundle/', AsyncUpperAirAnalysisBundleView.as_view()),
+    path('api/sample/', AsyncSampleView.as_view()),
+    path('api/geoserver/<path:wms_path>', AsyncGeoServerProxy.as_view()),
+] + wsgi_urlpatterns
@@ -71,7 +71,8 @@ MIDDLEWARE = [
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
-ROOT_URLCONF = 'weather_map.urls'
+# weather_map.asgi switches to weather_map.asgi_urls (async read endpoints)
+ROOT_URLCONF = env('ROOT_URLCONF', default='weather_map.urls')
 
 TEMPLATES = [
     {
@@ -105,10 +106,39 @@ DATABASES = {
         'PASSWORD': env('DB_PASSWORD'),
         'HOST': env('DB_HOST'),
         'PORT': env('DB_PORT'),
+        'CONN_HEALTH_CHECKS': True,
     }
 }
+# Connection reuse. Under ASGI every request runs its ORM calls in its own
+# thread, so persistent connections (DB_CONN_MAX_AGE) are per thread there;
+# set DB_POOL_MAX_SIZE instead to use a shared pool (psycopg 3 with its pool,
+# psycopg[binary,pool] in requirements.txt), or put PgBouncer in front of the
+# database.
+DB_POOL_MAX_SIZE = env.int('DB_POOL_MAX_SIZE', default=0)
+if DB_POOL_MAX_SIZE:
+    DATABASES['default']['OPTIONS'] = {
+        'pool': {
+            'min_size': env.int('DB_POOL_MIN_SIZE', default=2),
+            'max_size': DB_POOL_MAX_SIZE,
+            'timeout': env.int('DB_POOL_TIMEOUT', default=10),
+        },
+    }
+else:
+    DATABASES['default']['CONN_MAX_AGE'] = env.int('DB_CONN_MAX_AGE', default=0)
 #postgis_db
 
+# Shared cache (analysis counters, job keys, cached responses, admission
+# control). Production must point CACHE_URL at Redis (e.g.
+# redis://127.0.0.1:6379/1) so web and Celery processes see the same values;
+# the local-memory default is per process and only accepted with DEBUG on
+# (system check analysis.E001). Set it in .env so Celery workers get it too.
+CACHES = {
+    'default': env.cache('CACHE_URL', default='locmemcache://'),
+}
+# Cached list responses live under per-(source, level, time) namespaces
+# (analysis.namespaces); ingest and analysis bump them, so this only bounds memory
+RESPONSE_CACHE_TTL = env.int('RESPONSE_CACHE_TTL', default=60 * 60 * 6)
+
 # Password validation
 # https://docs.djangoproject.com/en/5.1/ref/settings/#auth-password-validators
 
@@ -164,6 +194,7 @@ CELERY_TASK_SERIALIZER = 'json'
 CELERY_RESULT_SERIALIZER = 'json'
 CELERY_TIMEZONE = 'UTC'
 CELERY_ENABLE_UTC = True
+CELERY_TASK_TRACK_STARTED = True  # Lets the analysis job API distinguish queued from running
 
 CELERY_BEAT_SCHEDULE = {
     'fetch-meteo-data': {
@@ -175,8 +206,109 @@ CELERY_BEAT_SCHEDULE = {
         'task': 'analysis.upperair_task.fetch_upper_air_data',
         'schedule': 10800.0,  # Every 3 hours
     },
+    'gc-analysis-runs': {
+        'task': 'analysis.tasks.gc_analysis_runs',
+        'schedule': 3600.0,  # Hourly
+    },
+    'prune-export-uploads': {
+        'task': 'analysis.tasks.prune_export_uploads',
+        'schedule': 3600.0,  # Hourly
+    },
+    'maintain-table-partitions': {
+        'task': 'analysis.tasks.maintain_table_partitions',
+        'schedule': 86400.0,  # Daily
+    },
+    'refresh-station-visibility': {
+        'task': 'analysis.tasks.refresh_station_visibility',
+        'schedule': 3600.0,  # Hourly; only recomputes when the policy changed
+    },
 }
 
+# SQL-built GeoJSON fast path for list endpoints (analysis.sqljson); ?geojson=sql opts in per request
+GEOJSON_SQL_FAST_PATH = env.bool('GEOJSON_SQL_FAST_PATH', default=False)
+GEOJSON_MAX_DECIMAL_DIGITS = env.int('GEOJSON_MAX_DECIMAL_DIGITS', default=5)
+
+# Monthly partitions on observation_time (analysis.partitions)
+PARTITION_MONTHS_AHEAD = env.int('PARTITION_MONTHS_AHEAD', default=3)
+REPORT_RETENTION_MONTHS = env.int('REPORT_RETENTION_MONTHS', default=24)
+ANALYSIS_RETENTION_MONTHS = env.int('ANALYSIS_RETENTION_MONTHS', default=6)
+
+# Per-run analysis grids for point sampling (analysis.grids)
+GRID_STORE_ROOT = env('GRID_STORE_ROOT', default=os.path.join(BASE_DIR, 'var', 'grids'))
+GRID_CACHE_SIZE = env.int('GRID_CACHE_SIZE', default=32)
+
+# Simplified copies of every isobar/isotherm stored besides full detail
+# (analysis.generalize); degrees, picked by the contour endpoints' ?zoom=
+CONTOUR_TOLERANCES = env.list('CONTOUR_TOLERANCES', cast=float, default=[0.005, 0.02, 0.08])
+
+# Analysis domains per kind (analysis.domains), analysed in one job from the
+# same station data. The first domain is the primary one served by default; a
+# domain with a parent is a nest analysed against the parent's field.
+# smoothing_sigma is in grid cells; min_zoom is the first map zoom at which
+# tiles prefer the domain. Changing a domain changes the input fingerprint.
+ANALYSIS_DOMAINS = {
+    'surface': [
+        {'name': 'regional', 'min_lon': 50.0, 'max_lon': 100.0, 'min_lat': 5.0, 'max_lat': 35.0,
+         'resolution': 0.5, 'smoothing_sigma': 1.0},
+        {'name': 'nepal', 'parent': 'regional', 'min_lon': 79.5, 'max_lon': 89.0, 'min_lat': 25.5, 'max_lat': 31.0,
+         'resolution': 0.05, 'smoothing_sigma': 3.0, 'min_zoom': 6, 'margin': 2.0, 'blend_cells': 10},
+    ],
+    'upperair': [
+        {'name': 'regional', 'min_lon': 35.0, 'max_lon': 120.0, 'min_lat': 0.0, 'max_lat': 45.0,
+         'resolution': 0.5, 'smoothing_sigma': 1.0},
+        {'name': 'nepal', 'parent': 'regional', 'min_lon': 79.5, 'max_lon': 89.0, 'min_lat': 25.5, 'max_lat': 31.0,
+         'resolution': 0.05, 'smoothing_sigma': 3.0, 'min_zoom': 6, 'margin': 3.0, 'blend_cells': 10},
+    ],
+}
+
+# Server-side map rendering (analysis.render). Renders run in the
+# analysis.tasks.render_map Celery task and draw inline, so Celery concurrency
+# sets how many run at once. RENDER_WORKERS > 0 draws in a separate process
+# pool instead, which needs a worker pool whose processes may have children
+# (e.g. --pool=threads or solo; prefork children are daemonic and draw inline).
+# RENDER_BASEMAP is an optional GeoJSON of coastlines/boundaries drawn under
+# every map.
+RENDER_WORKERS = env.int('RENDER_WORKERS', default=0)
+RENDER_TIMEOUT = env.int('RENDER_TIMEOUT', default=120)
+RENDER_MAX_PIXELS = env.int('RENDER_MAX_PIXELS', default=6000 * 6000)
+RENDER_BASEMAP = env('RENDER_BASEMAP', default='')
+
+# Admission control for analysis and render jobs (analysis.admission): at
+# most ANALYSIS_MAX_CONCURRENT run at once across all Celery workers, and
+# once ANALYSIS_QUEUE_LIMIT are waiting new ones get 503 with Retry-After.
+# Counted across workers with a shared CACHE_URL (Redis); with a
+# process-local cache each process applies the limits to itself.
+ANALYSIS_MAX_CONCURRENT = env.int('ANALYSIS_MAX_CONCURRENT', default=2)
+ANALYSIS_QUEUE_LIMIT = env.int('ANALYSIS_QUEUE_LIMIT', default=20)
+ANALYSIS_SLOT_LEASE = env.int('ANALYSIS_SLOT_LEASE', default=900)
+ANALYSIS_QUEUE_TTL = env.int('ANALYSIS_QUEUE_TTL', default=1800)
+ANALYSIS_JOB_SECONDS = env.int('ANALYSIS_JOB_SECONDS', default=20)
+
+# GeoServer behind /api/geoserver/ (analysis.geoserver_proxy, and pooled
+# async connections under ASGI in analysis.async_views)
+GEOSERVER_URL = env('GEOSERVER_URL', default='http://127.0.0.1:8081/geoserver')
+GEOSERVER_TIMEOUT = env.int('GEOSERVER_TIMEOUT', default=30)
+GEOSERVER_POOL_SIZE = env.int('GEOSERVER_POOL_SIZE', default=64)
+
+# Streamed export uploads (analysis.uploads). Bodies are staged under
+# EXPORT_UPLOAD_ROOT, then moved into MEDIA_ROOT: keep both on one filesystem
+# so that is a rename. Unfinished resumable uploads expire after EXPORT_UPLOAD_TTL.
+EXPORT_UPLOAD_ROOT = env('EXPORT_UPLOAD_ROOT', default=os.path.join(BASE_DIR, 'var', 'uploads'))
+EXPORT_UPLOAD_MAX_SIZE = env.int('EXPORT_UPLOAD_MAX_SIZE', default=500 * 1024 * 1024)
+EXPORT_UPLOAD_TTL = env.int('EXPORT_UPLOAD_TTL', default=24 * 3600)
+
+# Station-model sprite atlases (analysis.sprites), drawn after each ingest;
+# cell size in pixels of one station model
+SPRITE_CELL = env.int('SPRITE_CELL', default=76)
+
+# Station visibility policy (analysis.visibility): reports of stations in free
+# countries are published; in restricted countries only stations listed in the
+# policy CSV (station_id column). An empty free list means "every country that
+# is not restricted".
+STATION_FREE_COUNTRIES = env.list('STATION_FREE_COUNTRIES', default=[])
+STATION_RESTRICTED_COUNTRIES = env.list('STATION_RESTRICTED_COUNTRIES', default=[])
+STATION_POLICY_CSV = env('STATION_POLICY_CSV', default='')
+
 METEO_STATION_BLOCKS = ['44', '42', '41']  # Configurable station blocks
 
 MEDIA_ROOT = 'media/'